@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Бенчмарк извлечения JSON: доля успешных разборов и время разбора
+
+Сравнивает прежний каскад регулярных выражений из _extract_json с
+ux_json_utils.extract_json на корпусе ответов LLM (corpus/llm_responses.jsonl).
+
+Запуск:
+    python benchmarks/bench_json_extraction.py [--repeat 50] [--output result.json]
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(current_dir))
+
+from ux_json_utils import extract_json_with_status, STATUS_FAILED
+
+CORPUS_PATH = os.path.join(current_dir, 'corpus', 'llm_responses.jsonl')
+
+
+def legacy_extract_json(text):
+    """Прежний каскад из AdvancedGeminiAnalyzer._extract_json"""
+    try:
+        try:
+            return json.loads(text)
+        except Exception:
+            pass
+
+        json_match = re.search(r'```json\s*(.*?)\s*```', text, re.DOTALL)
+        if json_match:
+            return json.loads(json_match.group(1))
+
+        json_match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', text, re.DOTALL)
+        if json_match:
+            return json.loads(json_match.group(0))
+
+        json_match = re.search(r'\[[^\[\]]*(?:\[[^\[\]]*\][^\[\]]*)*\]', text, re.DOTALL)
+        if json_match:
+            return json.loads(json_match.group(0))
+
+        return {}
+    except Exception:
+        return {}
+
+
+def new_extract_json(text):
+    data, status = extract_json_with_status(text)
+    return {} if status == STATUS_FAILED else data
+
+
+def is_success(data, expected):
+    """Разбор успешен, если получена ожидаемая структура верхнего уровня"""
+    if expected == 'list':
+        return isinstance(data, list) and len(data) > 0
+    return isinstance(data, dict) and all(key in data for key in expected)
+
+
+def load_corpus():
+    with open(CORPUS_PATH, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run_extractor(extractor, corpus, repeat):
+    per_item = []
+    for item in corpus:
+        data = extractor(item['response'])
+        start = time.perf_counter()
+        for _ in range(repeat):
+            extractor(item['response'])
+        elapsed_ms = (time.perf_counter() - start) / repeat * 1000
+        per_item.append({
+            'name': item['name'],
+            'kind': item['kind'],
+            'success': is_success(data, item['expected']),
+            'parse_ms': round(elapsed_ms, 4)
+        })
+
+    successes = sum(1 for r in per_item if r['success'])
+    return {
+        'success_rate': round(successes / len(per_item), 3),
+        'successes': successes,
+        'total': len(per_item),
+        'total_parse_ms': round(sum(r['parse_ms'] for r in per_item), 3),
+        'items': per_item
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк извлечения JSON из ответов LLM')
+    parser.add_argument('--repeat', type=int, default=50, help='Повторов разбора на ответ')
+    parser.add_argument('--output', help='Файл для сохранения результатов в JSON')
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    results = {
+        'corpus_size': len(corpus),
+        'corpus_bytes': sum(len(item['response'].encode('utf-8')) for item in corpus),
+        'legacy': run_extractor(legacy_extract_json, corpus, args.repeat),
+        'incremental': run_extractor(new_extract_json, corpus, args.repeat)
+    }
+
+    print(f"Корпус: {results['corpus_size']} ответов, {results['corpus_bytes'] / 1024:.1f} KB")
+    print(f"{'Ответ':<34} {'Тип':<16} {'legacy':>14} {'incremental':>14}")
+    for legacy, new in zip(results['legacy']['items'], results['incremental']['items']):
+        legacy_cell = f"{'OK' if legacy['success'] else '--'} {legacy['parse_ms']:.3f}ms"
+        new_cell = f"{'OK' if new['success'] else '--'} {new['parse_ms']:.3f}ms"
+        print(f"{legacy['name']:<34} {legacy['kind']:<16} {legacy_cell:>14} {new_cell:>14}")
+
+    for name in ('legacy', 'incremental'):
+        summary = results[name]
+        print(f"{name}: успешно {summary['successes']}/{summary['total']} "
+              f"({summary['success_rate'] * 100:.0f}%), суммарно {summary['total_parse_ms']:.2f} ms")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
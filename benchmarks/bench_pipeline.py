@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Сквозной бенчмарк анализа: analyze_transcripts и analyze_transcripts_parallel
+
+Генерирует синтетические диаризованные транскрипты на русском языке и
+прогоняет AdvancedUXAnalyzer против локального mock LLM
+(benchmarks/mock_llm_server.py). Каждый прогон выполняется в отдельном
+процессе, чтобы пиковый RSS относился только к нему. Результаты (время,
+число вызовов LLM, токены, пиковая память, время по этапам) сохраняются
+в JSON для сравнения между версиями.
+
+Запуск:
+    python benchmarks/bench_pipeline.py --interviews 1 10 50 --turns 40 \\
+        --modes sequential parallel --latency 0.05 --output results.json
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+repo_dir = os.path.dirname(current_dir)
+sys.path.insert(0, repo_dir)
+sys.path.insert(0, current_dir)
+
+from mock_llm_server import MockLLMServer, MockLLMConfig
+
+MAX_INTERVIEWS = 200
+
+# ========================================================================
+# СИНТЕТИЧЕСКИЕ ТРАНСКРИПТЫ
+# ========================================================================
+QUESTIONS = [
+    "Расскажите, как вы обычно пользуетесь сервисом в течение недели?",
+    "Что вызывает у вас больше всего сложностей при работе с отчетами?",
+    "Вспомните последний случай, когда что-то пошло не так. Что произошло?",
+    "Как вы решаете эту проблему сейчас?",
+    "Что для вас было бы идеальным решением?",
+    "Как часто вы сталкиваетесь с этой ситуацией?",
+    "Кто еще в команде участвует в этом процессе?",
+    "Что вы почувствовали в этот момент?",
+]
+
+ANSWER_PARTS = [
+    "Честно говоря, каждый понедельник я трачу почти час на то, чтобы собрать данные из разных источников",
+    "самое неприятное, что отчет грузится очень долго и иногда просто зависает на середине",
+    "мы пробовали выгружать все в таблицы, но это превращается в ручную работу и ошибки",
+    "руководитель ждет цифры к десяти утра, а я сижу и смотрю на индикатор загрузки",
+    "если бы можно было один раз настроить фильтры и получать готовую сводку, это сэкономило бы массу времени",
+    "в мобильном приложении половины функций нет, поэтому приходится открывать ноутбук",
+    "коллеги из продаж постоянно спрашивают у меня одни и те же показатели",
+    "я уже привыкла, но новичкам в команде объяснять все это очень тяжело",
+    "когда данные не сходятся, я не понимаю, кому верить и где искать ошибку",
+    "мне нравится, что интерфейс стал чище, но найти нужную кнопку все равно сложно",
+]
+
+
+def generate_transcript(rng: random.Random, turns: int, interview_id: int) -> str:
+    """Диаризованный транскрипт: чередование реплик интервьюера и респондента"""
+    lines = [f"Интервьюер: Здравствуйте! Это интервью номер {interview_id}, спасибо, что нашли время."]
+    lines.append("Респондент: Здравствуйте, рада помочь.")
+    for _ in range(turns):
+        lines.append(f"Интервьюер: {rng.choice(QUESTIONS)}")
+        answer = ", ".join(rng.sample(ANSWER_PARTS, rng.randint(2, 4)))
+        lines.append(f"Респондент: {answer}.")
+    return "\n".join(lines)
+
+
+def generate_transcripts(count: int, turns: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [generate_transcript(rng, turns, i + 1) for i in range(count)]
+
+
+# ========================================================================
+# ОДИН ПРОГОН (В ОТДЕЛЬНОМ ПРОЦЕССЕ)
+# ========================================================================
+def run_case(mode: str, interviews: int, turns: int, seed: int, workers: int) -> dict:
+    """Прогон анализатора; вызывается в дочернем процессе"""
+    from ux_analyzer_core import AdvancedUXAnalyzer
+
+    transcripts = generate_transcripts(interviews, turns, seed)
+    analyzer = AdvancedUXAnalyzer('mock-key', checkpoint_dir=os.path.join(os.getcwd(), 'checkpoints'))
+
+    started = time.perf_counter()
+    if mode == 'parallel':
+        analyzer.analyze_transcripts_parallel(transcripts, max_workers=workers)
+    else:
+        analyzer.analyze_transcripts(transcripts)
+    wall_time = time.perf_counter() - started
+
+    # ru_maxrss в Linux - килобайты
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    summary = analyzer.metrics.summary()
+    return {
+        'wall_time': round(wall_time, 3),
+        'peak_rss_mb': round(peak_rss_mb, 1),
+        'transcript_chars': sum(len(t) for t in transcripts),
+        'stage_timings': {stage: entry['wall_time'] for stage, entry in summary['stages'].items()},
+        'client_metrics': summary['totals']
+    }
+
+
+def run_case_subprocess(server: MockLLMServer, mode: str, interviews: int, args) -> dict:
+    """Запуск прогона в отдельном процессе и сбор статистики mock-сервера"""
+    stats_before = dict(server.config.stats)
+
+    with tempfile.TemporaryDirectory(prefix='bench_pipeline_') as workdir:
+        result_path = os.path.join(workdir, 'result.json')
+        env = dict(os.environ, OPENROUTER_BASE_URL=server.url, PYTHONPATH=repo_dir)
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker', mode, str(interviews),
+             '--turns', str(args.turns), '--seed', str(args.seed), '--workers', str(args.workers),
+             '--result-path', result_path],
+            cwd=workdir, env=env, capture_output=True, text=True
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"Прогон {mode}/{interviews} завершился с ошибкой:\n{completed.stderr[-2000:]}")
+        with open(result_path, encoding='utf-8') as f:
+            result = json.load(f)
+
+    stats = {key: server.config.stats[key] - stats_before.get(key, 0) for key in server.config.stats}
+    result.update({
+        'mode': mode,
+        'interviews': interviews,
+        'llm_calls': stats['requests'],
+        'prompt_tokens': stats['prompt_tokens'],
+        'completion_tokens': stats['completion_tokens'],
+        'errors_429': stats['errors_429'],
+        'errors_503': stats['errors_503']
+    })
+    return result
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repo_dir,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сквозной бенчмарк анализа транскриптов')
+    parser.add_argument('--interviews', type=int, nargs='+', default=[1, 10],
+                        help=f'Число интервью в прогоне (1-{MAX_INTERVIEWS})')
+    parser.add_argument('--turns', type=int, default=30, help='Пар вопрос-ответ в транскрипте')
+    parser.add_argument('--modes', nargs='+', choices=['sequential', 'parallel'], default=['sequential', 'parallel'])
+    parser.add_argument('--workers', type=int, default=3, help='Потоков для analyze_transcripts_parallel')
+    parser.add_argument('--latency', type=float, default=0.05, help='Задержка mock LLM, сек')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Случайная добавка к задержке, сек')
+    parser.add_argument('--tokens-per-second', type=float, default=0.0, help='Скорость потока mock LLM')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Файл для сохранения результатов в JSON')
+    parser.add_argument('--worker', nargs=2, metavar=('MODE', 'INTERVIEWS'), help=argparse.SUPPRESS)
+    parser.add_argument('--result-path', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        mode, interviews = args.worker[0], int(args.worker[1])
+        result = run_case(mode, interviews, args.turns, args.seed, args.workers)
+        with open(args.result_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False)
+        return
+
+    for count in args.interviews:
+        if not 1 <= count <= MAX_INTERVIEWS:
+            parser.error(f'--interviews: допустимо от 1 до {MAX_INTERVIEWS}')
+
+    mock_config = MockLLMConfig(latency=args.latency, jitter=args.jitter,
+                                tokens_per_second=args.tokens_per_second, seed=args.seed)
+    results = {
+        'revision': git_revision(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'config': {
+            'turns': args.turns,
+            'workers': args.workers,
+            'latency': args.latency,
+            'jitter': args.jitter,
+            'tokens_per_second': args.tokens_per_second,
+            'seed': args.seed
+        },
+        'runs': []
+    }
+
+    with MockLLMServer(mock_config) as server:
+        for count in args.interviews:
+            for mode in args.modes:
+                print(f"⏱️ {mode}: {count} интервью...")
+                run = run_case_subprocess(server, mode, count, args)
+                results['runs'].append(run)
+                print(f"   {run['wall_time']:.2f} с, вызовов LLM: {run['llm_calls']}, "
+                      f"токенов: {run['prompt_tokens']} + {run['completion_tokens']}, "
+                      f"пиковый RSS: {run['peak_rss_mb']:.0f} MB")
+
+    print(f"\n{'Режим':<12} {'Интервью':>9} {'Время, с':>10} {'Вызовы':>8} {'Токены':>10} {'RSS, MB':>9}")
+    for run in results['runs']:
+        tokens = run['prompt_tokens'] + run['completion_tokens']
+        print(f"{run['mode']:<12} {run['interviews']:>9} {run['wall_time']:>10.2f} "
+              f"{run['llm_calls']:>8} {tokens:>10} {run['peak_rss_mb']:>9.0f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Бенчмарк генерации HTML отчетов: время рендеринга и размер отчета
+
+Рендерит серию отчетов EnhancedReportGenerator на синтетических
+результатах анализа (без вызовов LLM) и сравнивает режимы:
+
+    inline   - CSS встроен в каждый отчет (по умолчанию в приложении)
+    linked   - CSS в общем файле с отпечатком в имени, отчет ссылается на него
+    pooled   - разделы рендерятся одновременно в пуле процессов (--workers)
+    baseline - генератор из другой ревизии git (--baseline REV), например
+               версия до выноса CSS в предкомпилированную константу
+
+Запуск:
+    python benchmarks/bench_report_render.py [--reports 200] [--interviews 10 100]
+        [--workers 4] [--baseline HEAD~1] [--output result.json]
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from datetime import datetime
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+repo_dir = os.path.dirname(current_dir)
+sys.path.insert(0, repo_dir)
+sys.path.insert(0, current_dir)
+
+from bench_pipeline import ANSWER_PARTS, git_revision
+from ux_analyzer_classes import CompanyConfig, InterviewSummary, ResearchFindings
+from ux_tracing import get_tracer
+import ux_report_generator
+
+# ========================================================================
+# СИНТЕТИЧЕСКИЕ РЕЗУЛЬТАТЫ АНАЛИЗА
+# ========================================================================
+SEVERITIES = ['critical', 'high', 'medium', 'low']
+WARMUP_REPORTS = 10
+
+
+def generate_analysis_data(interviews: int, seed: int) -> dict:
+    """Результаты анализа в формате analyze_transcripts для заданного числа интервью"""
+    rng = random.Random(seed)
+
+    def sentence(parts: int = 2) -> str:
+        return ", ".join(rng.sample(ANSWER_PARTS, parts)).capitalize() + "."
+
+    summaries = [
+        InterviewSummary(
+            interview_id=i + 1,
+            respondent_profile={'demographics': '30-40 лет', 'occupation': 'аналитик', 'context': sentence()},
+            key_themes=[{'theme': f'Тема {k + 1}', 'description': sentence()} for k in range(3)],
+            pain_points=[{'pain': sentence(), 'severity': rng.choice(SEVERITIES)} for _ in range(3)],
+            needs=[{'need': sentence(1)} for _ in range(2)],
+            insights=[sentence() for _ in range(3)],
+            emotional_journey=[{'stage': 'отчет', 'emotion': 'раздражение', 'intensity': rng.randint(1, 10)}],
+            contradictions=[sentence(1)],
+            quotes=[{'text': sentence(3), 'context': 'работа с отчетами', 'importance': rng.randint(1, 10)}
+                    for _ in range(4)],
+            sentiment_score=round(rng.uniform(-1, 1), 2)
+        )
+        for i in range(interviews)
+    ]
+    key_insights = [
+        {'title': f'Инсайт {k + 1}', 'description': sentence(3), 'severity': rng.choice(SEVERITIES),
+         'affected_percentage': f'{rng.randint(10, 90)}%',
+         'quotes': [{'text': sentence(2)} for _ in range(2)]}
+        for k in range(8)
+    ]
+    findings = ResearchFindings(
+        executive_summary=" ".join(sentence(3) for _ in range(4)),
+        key_insights=key_insights,
+        behavioral_patterns=[{'pattern': f'Паттерн {k + 1}', 'description': sentence(), 'frequency': rng.randint(1, interviews),
+                              'severity': rng.randint(1, 10)} for k in range(6)],
+        user_segments=[], pain_points_map={}, opportunities=[], recommendations=[], risks=[], personas=[]
+    )
+    personas = [
+        {'persona_id': f'P{k + 1}', 'name': f'Персона {k + 1}', 'tagline': sentence(1), 'description': sentence(3),
+         'demographics': {'возраст': '30-40', 'роль': 'аналитик'}, 'goals': [sentence(1) for _ in range(3)],
+         'frustrations': [sentence(1) for _ in range(3)], 'needs': [sentence(1) for _ in range(3)],
+         'real_quotes': [sentence(2) for _ in range(2)], 'typical_scenario': sentence(3)}
+        for k in range(4)
+    ]
+    recommendations = {
+        'quick_wins': [{'title': f'Быстрая победа {k + 1}', 'description': sentence(2),
+                        'implementation_steps': [sentence(1) for _ in range(3)], 'timeline': '2 недели',
+                        'expected_impact': 'высокий'} for k in range(5)],
+        'strategic_initiatives': [{'title': f'Инициатива {k + 1}', 'description': sentence(3),
+                                   'implementation_phases': [sentence(1) for _ in range(3)], 'expected_roi': '150%'}
+                                  for k in range(3)]
+    }
+    return {
+        'findings': findings,
+        'personas': personas,
+        'recommendations': recommendations,
+        'brief_data': {'research_goals': [sentence(1) for _ in range(3)],
+                       'research_questions': [sentence(1) for _ in range(4)]},
+        'brief_answers': {'answers': [{'question': sentence(1), 'answer': sentence(3),
+                                       'supporting_quotes': [sentence(2)], 'confidence': 8} for _ in range(4)]},
+        'current_metrics': {'estimated_nps': 32, 'satisfaction_score': 6.5},
+        'interview_summaries': summaries,
+        'total_interviews': interviews
+    }
+
+
+# ========================================================================
+# ЗАМЕРЫ
+# ========================================================================
+def load_baseline(revision: str) -> types.ModuleType:
+    """ux_report_generator из другой ревизии git"""
+    source = subprocess.run(['git', 'show', f'{revision}:ux_report_generator.py'], cwd=repo_dir,
+                            capture_output=True, text=True, check=True).stdout
+    module = types.ModuleType('ux_report_generator_baseline')
+    module.__file__ = f'{revision}:ux_report_generator.py'
+    exec(compile(source, module.__file__, 'exec'), module.__dict__)
+    return module
+
+
+def measure(generator, analysis_data: dict, reports: int, executor=None, section_timings: bool = True) -> dict:
+    """Рендеринг reports отчетов подряд: время на отчет, размер отчета и
+    среднее время рендеринга разделов (section_timings=False - для генераторов
+    из ревизий, где замера разделов еще нет)"""
+    tracer = get_tracer()
+    timings = []
+    sections = {}
+    size = 0
+    # Сборка мусора после генерации данных не должна попадать в замер
+    gc.collect()
+    for _ in range(reports):
+        report_timings = {}
+        kwargs = {'executor': executor, 'timings': report_timings} if section_timings else {}
+        # Генератор печатает отладочные сообщения - в замер они не попадают
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            html = generator.generate_html(analysis_data, **kwargs)
+            timings.append(time.perf_counter() - started)
+        size = len(html.encode('utf-8'))
+        for name, seconds in report_timings.items():
+            sections[name] = sections.get(name, 0.0) + seconds
+        tracer.clear()
+    timings.sort()
+    return {
+        'mean_ms': round(statistics.mean(timings) * 1000, 3),
+        'p95_ms': round(timings[min(int(len(timings) * 0.95), len(timings) - 1)] * 1000, 3),
+        'report_bytes': size,
+        'section_ms': {name: round(total / reports * 1000, 4) for name, total in sections.items()}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк генерации HTML отчетов')
+    parser.add_argument('--reports', type=int, default=200, help='Отчетов в серии на каждый режим')
+    parser.add_argument('--interviews', type=int, nargs='+', default=[10, 100], help='Число интервью в отчете')
+    parser.add_argument('--workers', type=int, default=4, help='Процессов в пуле для режима pooled')
+    parser.add_argument('--baseline', help='Ревизия git для сравнения (например, HEAD~1)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Файл для сохранения результатов в JSON')
+    args = parser.parse_args()
+
+    config = CompanyConfig(name='Бенчмарк', report_title='Отчет UX исследования', author='Команда')
+    stylesheet_dir = tempfile.mkdtemp(prefix='bench_report_css_')
+    stylesheet = ux_report_generator.write_stylesheet(stylesheet_dir)
+    stylesheet_bytes = os.path.getsize(os.path.join(stylesheet_dir, stylesheet))
+
+    inline = ux_report_generator.EnhancedReportGenerator(config)
+    # (генератор, нужен ли пул): pooled рендерит тем же генератором, что и inline.
+    # Пул создается перед первым прогоном pooled - запуск процессов мешает
+    # замерам остальных режимов
+    modes = {
+        'inline': (inline, False),
+        'linked': (ux_report_generator.EnhancedReportGenerator(config, css_href=stylesheet), False),
+        'pooled': (inline, True),
+    }
+    pool = None
+    baseline = load_baseline(args.baseline).EnhancedReportGenerator(config) if args.baseline else None
+
+    results = {
+        'revision': git_revision(),
+        'baseline': args.baseline,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'config': {'reports': args.reports, 'workers': args.workers, 'seed': args.seed},
+        'stylesheet_bytes': stylesheet_bytes,
+        'runs': []
+    }
+
+    for interviews in args.interviews:
+        analysis_data = generate_analysis_data(interviews, args.seed)
+        for mode, (generator, pooled) in modes.items():
+            print(f"⏱️ {mode}: {args.reports} отчетов по {interviews} интервью...")
+            if pooled and pool is None:
+                pool = ux_report_generator.get_render_pool(args.workers)
+            executor = pool if pooled else None
+            # Прогрев: первые отчеты и запуск процессов пула в замер не входят
+            measure(generator, analysis_data, WARMUP_REPORTS, executor)
+            run = {'mode': mode, 'interviews': interviews, **measure(generator, analysis_data, args.reports, executor)}
+            # Для серии отчетов общий файл стилей пишется один раз
+            run['series_bytes'] = run['report_bytes'] * args.reports + (stylesheet_bytes if mode == 'linked' else 0)
+            results['runs'].append(run)
+        if baseline is not None:
+            print(f"⏱️ baseline: {args.reports} отчетов по {interviews} интервью...")
+            measure(baseline, analysis_data, WARMUP_REPORTS, section_timings=False)
+            run = {'mode': 'baseline', 'interviews': interviews,
+                   **measure(baseline, analysis_data, args.reports, section_timings=False)}
+            run['series_bytes'] = run['report_bytes'] * args.reports
+            results['runs'].append(run)
+
+    print(f"\n{'Режим':<10} {'Интервью':>9} {'Среднее, мс':>12} {'p95, мс':>9} {'Отчет, КБ':>10} {'Серия, МБ':>10}")
+    for run in results['runs']:
+        print(f"{run['mode']:<10} {run['interviews']:>9} {run['mean_ms']:>12.3f} {run['p95_ms']:>9.3f} "
+              f"{run['report_bytes'] / 1024:>10.1f} {run['series_bytes'] / 1024 / 1024:>10.2f}")
+
+    # Самые медленные разделы: режим inline, наибольшее число интервью
+    slowest = max((run for run in results['runs'] if run['mode'] == 'inline'), key=lambda run: run['interviews'])
+    print(f"\nСамые медленные разделы ({slowest['interviews']} интервью, мс на отчет):")
+    for name, ms in sorted(slowest['section_ms'].items(), key=lambda item: item[1], reverse=True)[:5]:
+        print(f"  {name:<22} {ms:>8.3f}")
+
+    if pool is not None:
+        pool.shutdown()
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Локальный заменитель OpenRouter chat/completions для бенчмарков
+
+Отвечает в формате OpenAI-совместимого API (обычный ответ и SSE-поток),
+умеет имитировать задержку, ошибки 429/503 и отдавать заготовленный JSON:
+по схеме из response_format, по шаблону из самого промпта или из файла
+правил. Режим record проксирует запросы в настоящий API и сохраняет ответы
+в фикстуры, режим replay воспроизводит их без обращения к сети.
+
+Запуск:
+    python benchmarks/mock_llm_server.py [--port 8765] [--latency 0.2] [--error-rate-429 0.05]
+    python benchmarks/mock_llm_server.py --mode record --fixtures benchmarks/fixtures/run.jsonl
+    python benchmarks/mock_llm_server.py --mode replay --fixtures benchmarks/fixtures/run.jsonl
+
+Анализатор направляется на сервер переменной окружения:
+    OPENROUTER_BASE_URL=http://127.0.0.1:8765/api/v1/chat/completions
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+import requests
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(current_dir))
+
+from ux_json_utils import extract_json_with_status, STATUS_FAILED
+
+UPSTREAM_URL = "https://openrouter.ai/api/v1/chat/completions"
+COMPLETIONS_PATHS = ('/api/v1/chat/completions', '/v1/chat/completions', '/chat/completions')
+
+# Ответ на промпты без JSON (саммари чанков интервью)
+CANNED_TEXT = """### РЕСПОНДЕНТ
+Менеджер проекта, 34 года, пользуется продуктом около года.
+
+### КЛЮЧЕВЫЕ ПРОБЛЕМЫ
+- Проблема: долгая загрузка отчетов
+- Цитата: "Каждый понедельник я жду по десять минут, пока соберется отчет, и за это время успеваю забыть, зачем вообще его открыла, это очень раздражает и ломает весь ритм работы команды"
+- Эмоции: раздражение, усталость
+
+### ПОТРЕБНОСТИ И ЖЕЛАНИЯ
+- Явные потребности: быстрый доступ к свежим данным
+
+### ИНСАЙТЫ И ПРОТИВОРЕЧИЯ
+- Ключевые инсайты: скорость важнее количества функций"""
+
+
+@dataclass
+class MockLLMConfig:
+    """Параметры поведения сервера"""
+    mode: str = 'mock'                    # mock / record / replay
+    latency: float = 0.0                  # задержка до первого байта, сек
+    jitter: float = 0.0                   # случайная добавка к задержке, сек
+    tokens_per_second: float = 0.0        # скорость потоковой выдачи (0 - без задержки)
+    error_rate_429: float = 0.0
+    error_rate_503: float = 0.0
+    seed: int = 42
+    fixtures_path: Optional[str] = None
+    rules_path: Optional[str] = None
+    upstream_url: str = UPSTREAM_URL
+    stats: Dict[str, int] = field(default_factory=lambda: {
+        'requests': 0, 'errors_429': 0, 'errors_503': 0, 'replay_misses': 0,
+        'prompt_tokens': 0, 'completion_tokens': 0
+    })
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов (около 4 символов на токен)"""
+    return max(1, len(text) // 4)
+
+
+def message_text(content: Any) -> str:
+    """Текст сообщения: строка или список частей (cache_control)"""
+    if isinstance(content, str):
+        return content
+    return ''.join(part.get('text', '') for part in content)
+
+
+def request_key(body: Dict) -> str:
+    """Ключ фикстуры: модель, сообщения и формат ответа; температура не учитывается"""
+    payload = {
+        'model': body.get('model'),
+        'messages': [(m.get('role'), message_text(m.get('content', ''))) for m in body.get('messages', [])],
+        'response_format': body.get('response_format')
+    }
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def sample_from_schema(schema: Dict, rng: random.Random) -> Any:
+    """Детерминированный пример значения по JSON Schema из response_format"""
+    schema_type = schema.get('type')
+    if schema_type == 'object':
+        return {key: sample_from_schema(value, rng) for key, value in schema.get('properties', {}).items()}
+    if schema_type == 'array':
+        return [sample_from_schema(schema.get('items', {}), rng) for _ in range(2)]
+    if schema_type == 'number':
+        return rng.randint(1, 10)
+    if schema_type == 'boolean':
+        return True
+    return schema.get('description', 'Не упоминается в интервью')
+
+
+class FixtureStore:
+    """Фикстуры record/replay в JSONL: одна строка - один ответ"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry['key']] = entry
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self.entries.get(key)
+
+    def add(self, entry: Dict):
+        with self.lock:
+            self.entries[entry['key']] = entry
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Клиент вправе закрыть поток раньше, когда JSON уже получен
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class MockLLMServer:
+    """HTTP-сервер в отдельном потоке; можно запускать из бенчмарков"""
+
+    def __init__(self, config: MockLLMConfig = None, host: str = '127.0.0.1', port: int = 0):
+        self.config = config or MockLLMConfig()
+        self.rng = random.Random(self.config.seed)
+        self.rng_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.fixtures = FixtureStore(self.config.fixtures_path) if self.config.fixtures_path else None
+        self.rules = self._load_rules(self.config.rules_path)
+        self.httpd = _QuietHTTPServer((host, port), self._handler_class())
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/api/v1/chat/completions"
+
+    def start(self) -> 'MockLLMServer':
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _load_rules(self, path: Optional[str]) -> List[Dict]:
+        """Правила вида {"match": "подстрока промпта", "response": строка или JSON}"""
+        if not path:
+            return []
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    # --------------------------------------------------------------------
+    # Формирование ответа
+    # --------------------------------------------------------------------
+    def count(self, name: str, value: int = 1):
+        with self.stats_lock:
+            self.config.stats[name] += value
+
+    def _random(self) -> float:
+        with self.rng_lock:
+            return self.rng.random()
+
+    def pick_error(self) -> Optional[int]:
+        roll = self._random()
+        if roll < self.config.error_rate_429:
+            return 429
+        if roll < self.config.error_rate_429 + self.config.error_rate_503:
+            return 503
+        return None
+
+    def canned_content(self, body: Dict) -> str:
+        """Заготовленный ответ: правило, схема из response_format или шаблон из промпта"""
+        prompt = message_text(body['messages'][0].get('content', '')) if body.get('messages') else ''
+
+        for rule in self.rules:
+            if rule['match'] in prompt:
+                response = rule['response']
+                return response if isinstance(response, str) else json.dumps(response, ensure_ascii=False)
+
+        response_format = body.get('response_format') or {}
+        schema = response_format.get('json_schema', {}).get('schema')
+        if schema:
+            rng = random.Random(request_key(body))
+            return json.dumps(sample_from_schema(schema, rng), ensure_ascii=False)
+
+        # Без схемы: возвращаем пример из шаблона ответа, вписанного в промпт
+        template_start = prompt.rfind('JSON')
+        if template_start >= 0:
+            data, status = extract_json_with_status(prompt[template_start:])
+            if status != STATUS_FAILED:
+                return json.dumps(data, ensure_ascii=False)
+
+        return CANNED_TEXT
+
+    def completion_content(self, body: Dict, headers) -> Optional[Dict]:
+        """Текст ответа с учетом режима; None - промах в режиме replay"""
+        if self.config.mode == 'mock':
+            content, finish_reason = self.canned_content(body), 'stop'
+        else:
+            key = request_key(body)
+            entry = self.fixtures.get(key) if self.fixtures else None
+            if entry is None and self.config.mode == 'record':
+                entry = self._record(body, headers, key)
+            if entry is None:
+                self.count('replay_misses')
+                return None
+            content, finish_reason = entry['content'], entry.get('finish_reason', 'stop')
+
+        # Префилл ассистента: отдаем только продолжение
+        messages = body.get('messages', [])
+        if messages and messages[-1].get('role') == 'assistant':
+            prefix = message_text(messages[-1].get('content', ''))
+            if content.startswith(prefix):
+                content = content[len(prefix):]
+
+        prompt_text = ''.join(message_text(m.get('content', '')) for m in messages)
+        return {
+            'content': content,
+            'finish_reason': finish_reason,
+            'usage': {
+                'prompt_tokens': estimate_tokens(prompt_text),
+                'completion_tokens': estimate_tokens(content),
+                'total_tokens': estimate_tokens(prompt_text) + estimate_tokens(content)
+            }
+        }
+
+    def _record(self, body: Dict, headers, key: str) -> Optional[Dict]:
+        """Запрос в настоящий API и сохранение ответа в фикстуры"""
+        upstream_body = {k: v for k, v in body.items() if k not in ('stream', 'usage')}
+        response = requests.post(
+            self.config.upstream_url,
+            headers={
+                'Authorization': headers.get('Authorization', ''),
+                'Content-Type': 'application/json'
+            },
+            json=upstream_body,
+            timeout=300
+        )
+        if response.status_code != 200:
+            return None
+
+        choice = response.json()['choices'][0]
+        entry = {
+            'key': key,
+            'model': body.get('model'),
+            'content': choice['message']['content'],
+            'finish_reason': choice.get('finish_reason', 'stop')
+        }
+        self.fixtures.add(entry)
+        return entry
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if self.path.rstrip('/') not in COMPLETIONS_PATHS:
+                    self._send_json(404, {'error': {'code': 404, 'message': 'Not found'}})
+                    return
+
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                server.count('requests')
+
+                delay = server.config.latency + server.config.jitter * server._random()
+                if delay:
+                    time.sleep(delay)
+
+                error = server.pick_error()
+                if error:
+                    server.count(f'errors_{error}')
+                    message = 'Rate limit exceeded' if error == 429 else 'Service temporarily overloaded'
+                    self._send_json(error, {'error': {'code': error, 'message': message}})
+                    return
+
+                result = server.completion_content(body, self.headers)
+                if result is None:
+                    self._send_json(404, {'error': {'code': 404, 'message': 'No recorded fixture for request'}})
+                    return
+
+                server.count('prompt_tokens', result['usage']['prompt_tokens'])
+                server.count('completion_tokens', result['usage']['completion_tokens'])
+                if body.get('stream'):
+                    self._send_stream(body, result)
+                else:
+                    self._send_json(200, {
+                        'id': 'mock-completion',
+                        'object': 'chat.completion',
+                        'model': body.get('model'),
+                        'choices': [{
+                            'index': 0,
+                            'message': {'role': 'assistant', 'content': result['content']},
+                            'finish_reason': result['finish_reason']
+                        }],
+                        'usage': result['usage']
+                    })
+
+            def _send_json(self, status: int, payload: Dict):
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_event(self, payload: str):
+                data = f"{payload}\n\n".encode('utf-8')
+                self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                self.wfile.flush()
+
+            def _send_stream(self, body: Dict, result: Dict):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+
+                content = result['content']
+                chunk_size = 64
+                pause = chunk_size / 4 / server.config.tokens_per_second if server.config.tokens_per_second else 0
+                try:
+                    self._send_event(': OPENROUTER PROCESSING')
+                    for start in range(0, len(content), chunk_size):
+                        event = {'choices': [{'index': 0, 'delta': {'content': content[start:start + chunk_size]},
+                                              'finish_reason': None}]}
+                        self._send_event('data: ' + json.dumps(event, ensure_ascii=False))
+                        if pause:
+                            time.sleep(pause)
+
+                    final = {'choices': [{'index': 0, 'delta': {}, 'finish_reason': result['finish_reason']}]}
+                    if body.get('usage', {}).get('include'):
+                        final['usage'] = result['usage']
+                    self._send_event('data: ' + json.dumps(final))
+                    self._send_event('data: [DONE]')
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # Клиент закрыл поток раньше (JSON уже получен полностью)
+                    self.close_connection = True
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальный mock OpenRouter chat/completions')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--mode', choices=['mock', 'record', 'replay'], default='mock')
+    parser.add_argument('--latency', type=float, default=0.0, help='Задержка до первого байта, сек')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Случайная добавка к задержке, сек')
+    parser.add_argument('--tokens-per-second', type=float, default=0.0, help='Скорость потоковой выдачи')
+    parser.add_argument('--error-rate-429', type=float, default=0.0)
+    parser.add_argument('--error-rate-503', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--fixtures', help='JSONL с записанными ответами (record/replay)')
+    parser.add_argument('--rules', help='JSON со списком правил {"match": ..., "response": ...}')
+    parser.add_argument('--upstream', default=UPSTREAM_URL, help='Настоящий API для режима record')
+    args = parser.parse_args()
+
+    if args.mode != 'mock' and not args.fixtures:
+        parser.error('для режимов record/replay нужен --fixtures')
+
+    config = MockLLMConfig(
+        mode=args.mode,
+        latency=args.latency,
+        jitter=args.jitter,
+        tokens_per_second=args.tokens_per_second,
+        error_rate_429=args.error_rate_429,
+        error_rate_503=args.error_rate_503,
+        seed=args.seed,
+        fixtures_path=args.fixtures,
+        rules_path=args.rules,
+        upstream_url=args.upstream
+    )
+    server = MockLLMServer(config, args.host, args.port)
+    print(f"🧪 Mock LLM ({args.mode}) слушает {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"📊 {json.dumps(config.stats, ensure_ascii=False)}")
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
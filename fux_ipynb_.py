@@ -65,18 +65,27 @@ import time
 import logging
 import yaml
 from datetime import datetime
-from typing import Dict, List, Optional, Union, Tuple, Any
-from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Union, Tuple, Any, Iterator, TextIO
+from dataclasses import dataclass, field, replace
 from pathlib import Path
 import traceback
 import base64
-from collections import defaultdict
+from collections import defaultdict, deque
 import concurrent.futures
-from io import BytesIO
+from io import BytesIO, StringIO
 import numpy as np
 import random
+import shutil
+import statistics
+import zipfile
+from xml.sax.saxutils import escape as xml_escape
 import hashlib
 import pickle
+import tempfile
+import threading
+import uuid
+from functools import partial
+from contextlib import contextmanager, redirect_stdout
 from tqdm.notebook import tqdm
 
 import requests
@@ -85,6 +94,8 @@ from docx import Document
 from docx.shared import Inches, Pt, RGBColor
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.enum.style import WD_STYLE_TYPE
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
 from weasyprint import HTML as WeasyHTML
 from google.colab import files
 from IPython.display import display, HTML, clear_output, FileLink
@@ -121,29 +132,107 @@ api:
   openrouter:
     models:
       - "anthropic/claude-3.5-sonnet"
+      - "anthropic/claude-3-haiku"
       - "anthropic/claude-3-opus"
       - "openai/gpt-4-turbo-preview"
       - "google/gemini-pro-1.5"
     default_model: "anthropic/claude-3.5-sonnet"
+    base_url: "https://openrouter.ai/api/v1/chat/completions"
     temperature: 0.0
     max_output_tokens: 8192
+    stream: true
+    max_continuations: 2
+    json_mode: true
+    # USD за 1M токенов: промпт, ответ, промпт из кэша
+    pricing:
+      anthropic/claude-3.5-sonnet: [3.0, 15.0, 0.3]
+      anthropic/claude-3-haiku: [0.25, 1.25, 0.03]
+      anthropic/claude-3-opus: [15.0, 75.0, 1.5]
+      openai/gpt-4-turbo-preview: [10.0, 30.0, 10.0]
+      openai/gpt-4o-mini: [0.15, 0.6, 0.075]
+      google/gemini-pro-1.5: [1.25, 5.0, 0.3125]
+routing:
+  enabled: true
+  # Модели по уровням; null - модель, выбранная в интерфейсе
+  tiers:
+    fast: "anthropic/claude-3-haiku"
+    premium: null
+  # Уровень модели для этапов; этапы без записи идут на premium
+  stages:
+    summarize_chunk: fast
+    deduplicated_pains: fast
+    interview_merged: premium
+    findings: premium
+    personas: premium
+resilience:
+  # Дубль запроса к резервной модели, если основная отвечает дольше
+  # перцентиля своих прошлых вызовов на этом этапе или падает. Выключено,
+  # пока не измерена доля дублей на долгих этапах (каждый дубль - второй счет)
+  hedging: false
+  hedge_percentile: 0.95
+  hedge_min_delay: 5        # сек: быстрые вызовы не дублируем
+  hedge_initial_delay: 45   # сек: порог, пока по модели и этапу мало статистики
+  # Выключатель: после серии ошибок модель исключается на breaker_reset сек
+  breaker_failures: 3
+  breaker_reset: 60
+  fallback_models:
+    anthropic/claude-3.5-sonnet: "google/gemini-pro-1.5"
+    anthropic/claude-3-haiku: "openai/gpt-4o-mini"
+    anthropic/claude-3-opus: "anthropic/claude-3.5-sonnet"
+    openai/gpt-4-turbo-preview: "anthropic/claude-3.5-sonnet"
+    google/gemini-pro-1.5: "anthropic/claude-3.5-sonnet"
 analysis:
   window_size: 10000
   overlap: 2000
   max_retries: 5
   retry_delay: 5
+  max_field_retries: 1
+  extraction_mode: merged  # merged - все разделы интервью одним запросом, per_section - отдельными
   min_interviews_recommended: 8
   use_speaker_splitting: true
   require_exact_quotes: true
   min_quote_length: 50
 output:
   formats: ['html', 'pdf', 'docx']
+  # Процессов для одновременного рендеринга разделов отчета; 0 - по очереди.
+  # Окупается только на тяжелых разделах: передача данных в процесс дороже
+  # рендеринга простого раздела
+  render_workers: 0
+  # Графики рисуются в отдельных процессах (Agg) и кэшируются на диске по
+  # хешу входных данных: повторный отчет по тем же данным их не рисует
+  chart_workers: 2
+  chart_cache_dir: "chart_cache"
+  chart_dpi: 150
+  # Формат графиков: "png" (растр в base64) или "svg" (вектор прямо в HTML;
+  # отчет и PDF заметно меньше, текст графиков остается текстом)
+  chart_format: "png"
+  # PDF (WeasyPrint) формируется в отдельных процессах, не блокируя интерфейс;
+  # готовые PDF кэшируются по хешу HTML (без даты формирования), в кэше не
+  # больше pdf_cache_max_entries файлов - давно не использованные удаляются
+  pdf_workers: 2
+  pdf_cache_dir: "pdf_cache"
+  pdf_cache_max_entries: 200
+  # Приложение с интервью: "inline" - карточки первых 10 интервью прямо в
+  # отчете; "lazy" - все интервью во фрагментах рядом с отчетом, которые
+  # браузер подгружает постранично при открытии приложения (для 50+ интервью).
+  # PDF в режиме lazy строится из отдельной версии отчета для печати
+  appendix_mode: "inline"
+  appendix_page_size: 20
 """
 config = yaml.safe_load(config_str)
 
 # ========================================================================
 # КЛАСС ДЛЯ УПРАВЛЕНИЯ БРИФОМ
 # ========================================================================
+# Граница кэшируемого префикса промпта: все до нее одинаково для многих
+# запросов (бриф, инструкции этапа), после - данные конкретного запроса.
+# Обертка API удаляет маркер перед отправкой.
+PROMPT_CACHE_BREAK = "\x1e"
+
+# Модели, которым кэшируемые части нужно отметить явно (cache_control);
+# остальные провайдеры кэшируют общий префикс автоматически
+EXPLICIT_PROMPT_CACHE_MODELS = ('anthropic/', 'google/gemini')
+
 class BriefManager:
     """Класс для управления брифом исследования"""
 
@@ -157,10 +246,12 @@ class BriefManager:
             'constraints': []
         }
         self.has_brief = False
+        self._context_cache = None
 
     def load_brief(self, content: str):
         """Загрузка и парсинг брифа"""
         self.has_brief = True
+        self._context_cache = None
 
         # Простой парсер для текстового брифа
         lines = content.strip().split('\n')
@@ -209,38 +300,46 @@ class BriefManager:
                             self.brief_data[current_section].append(line)
 
     def get_brief_context(self):
-        """Получение контекста брифа для промптов"""
+        """Получение контекста брифа для промптов
+
+        Контекст одинаков для всех промптов исследования, поэтому собирается
+        один раз (до следующего load_brief) и заканчивается PROMPT_CACHE_BREAK -
+        границей префикса, который провайдер может закэшировать.
+        """
         if not self.has_brief:
             return ""
+        if self._context_cache is not None:
+            return self._context_cache
 
-        context = "<research_context>\n"
-        context += "КРИТИЧЕСКИ ВАЖНО: Все выводы должны отвечать на вопросы и достигать целей из этого брифа!\n\n"
+        parts = [
+            "<research_context>\n",
+            "КРИТИЧЕСКИ ВАЖНО: Все выводы должны отвечать на вопросы и достигать целей из этого брифа!\n\n"
+        ]
 
         if self.brief_data['research_goals']:
-            context += f"ЦЕЛИ ИССЛЕДОВАНИЯ (ОБЯЗАТЕЛЬНО достичь каждую):\n"
-            for i, goal in enumerate(self.brief_data['research_goals'], 1):
-                context += f"{i}. {goal}\n"
+            parts.append("ЦЕЛИ ИССЛЕДОВАНИЯ (ОБЯЗАТЕЛЬНО достичь каждую):\n")
+            parts.extend(f"{i}. {goal}\n" for i, goal in enumerate(self.brief_data['research_goals'], 1))
 
         if self.brief_data['research_questions']:
-            context += f"\nИССЛЕДОВАТЕЛЬСКИЕ ВОПРОСЫ (ОБЯЗАТЕЛЬНО ответить на каждый):\n"
-            for i, question in enumerate(self.brief_data['research_questions'], 1):
-                context += f"{i}. {question}\n"
+            parts.append("\nИССЛЕДОВАТЕЛЬСКИЕ ВОПРОСЫ (ОБЯЗАТЕЛЬНО ответить на каждый):\n")
+            parts.extend(f"{i}. {question}\n" for i, question in enumerate(self.brief_data['research_questions'], 1))
 
         if self.brief_data['target_audience']:
-            context += f"\nЦЕЛЕВАЯ АУДИТОРИЯ:\n{self.brief_data['target_audience']}\n"
+            parts.append(f"\nЦЕЛЕВАЯ АУДИТОРИЯ:\n{self.brief_data['target_audience']}\n")
 
         if self.brief_data['business_context']:
-            context += f"\nБИЗНЕС-КОНТЕКСТ:\n{self.brief_data['business_context']}\n"
+            parts.append(f"\nБИЗНЕС-КОНТЕКСТ:\n{self.brief_data['business_context']}\n")
 
         if self.brief_data['success_metrics']:
-            context += f"\nМЕТРИКИ УСПЕХА (оценить влияние на каждую):\n"
-            for metric in self.brief_data['success_metrics']:
-                context += f"- {metric}\n"
+            parts.append("\nМЕТРИКИ УСПЕХА (оценить влияние на каждую):\n")
+            parts.extend(f"- {metric}\n" for metric in self.brief_data['success_metrics'])
 
-        context += "\nВАЖНО: Каждый вывод должен быть подкреплен ТОЧНЫМИ ЦИТАТАМИ из интервью!\n"
-        context += "</research_context>\n\n"
+        parts.append("\nВАЖНО: Каждый вывод должен быть подкреплен ТОЧНЫМИ ЦИТАТАМИ из интервью!\n")
+        parts.append("</research_context>\n\n")
+        parts.append(PROMPT_CACHE_BREAK)
 
-        return context
+        self._context_cache = ''.join(parts)
+        return self._context_cache
 
     def get_questions_for_analysis(self):
         """Получение вопросов для анализа"""
@@ -281,24 +380,1207 @@ def retry_on_overload(func):
 
     return wrapper
 
+# ========================================================================
+# УСТОЙЧИВОЕ ИЗВЛЕЧЕНИЕ JSON ИЗ ОТВЕТОВ LLM
+# ========================================================================
+# Строка (развернутый цикл без катастрофического бэктрекинга), структурный
+# символ, голый литерал/число или незакрытая кавычка (обрезанный ответ)
+_TOKEN_RE = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}\[\],:]|[^\s{}\[\],:"]+|"')
+_FENCE_RE = re.compile(r'```(?:json|JSON)?\s*')
+_OPENERS_RE = re.compile(r'[{\[]')
+_PARTIAL_ESCAPE_RE = re.compile(r'\\(?:u[0-9a-fA-F]{0,3})?$')
+_CLOSERS = {'{': '}', '[': ']'}
+
+# Модели часто оставляют переносы строк внутри строк - разрешаем их
+_loads = partial(json.loads, strict=False)
+
+# Сколько кандидатов пробуем, прежде чем сдаться
+MAX_CANDIDATES = 20
+
+STATUS_OK = 'ok'
+STATUS_REPAIRED = 'repaired'
+STATUS_TRUNCATED = 'truncated'
+STATUS_FAILED = 'failed'
+
+class _ScanResult:
+    """Результат однопроходного разбора одного JSON-кандидата"""
+
+    def __init__(self):
+        self.end = None              # конец значения, если оно закрыто
+        self.dangling_commas = []    # позиции висячих запятых перед } и ]
+        self.safe_end = None         # позиция, до которой можно обрезать
+        self.safe_stack = []         # открытые скобки в этой позиции
+        self.open_string = None      # начало обрезанной строки-значения
+        self.stack = []              # открытые скобки в конце текста
+        self.mismatch = False
+
+def _scan(text: str, start: int) -> _ScanResult:
+    """Разбор от открывающей скобки за один проход по токенам"""
+    result = _ScanResult()
+    stack = []
+    expect_key = []
+    prev_token = ''
+    prev_comma = -1
+
+    for match in _TOKEN_RE.finditer(text, start):
+        token = match.group()
+        first = token[0]
+
+        if first in '{[':
+            stack.append(first)
+            expect_key.append(first == '{')
+            result.safe_end, result.safe_stack = match.end(), list(stack)
+        elif first in '}]':
+            if not stack or _CLOSERS[stack[-1]] != first:
+                result.mismatch = True
+                return result
+            if prev_token == ',':
+                result.dangling_commas.append(prev_comma)
+            stack.pop()
+            expect_key.pop()
+            if not stack:
+                result.end = match.end()
+                return result
+            result.safe_end, result.safe_stack = match.end(), list(stack)
+        elif first == ',':
+            if stack[-1] == '{':
+                expect_key[-1] = True
+            prev_comma = match.start()
+        elif first == ':':
+            expect_key[-1] = False
+        elif first == '"':
+            is_key = stack[-1] == '{' and expect_key[-1]
+            if len(token) == 1:
+                # Незакрытая кавычка: ответ оборвался внутри строки
+                if not is_key:
+                    result.open_string = match.start()
+                break
+            if not is_key:
+                result.safe_end, result.safe_stack = match.end(), list(stack)
+        else:
+            # Число или литерал; на самом конце текста он мог быть обрезан
+            if match.end() < len(text):
+                result.safe_end, result.safe_stack = match.end(), list(stack)
+
+        prev_token = first
+
+    result.stack = stack
+    return result
+
+def _drop_positions(fragment: str, positions: List[int], offset: int) -> str:
+    """Удаление символов (висячих запятых) по абсолютным позициям"""
+    if not positions:
+        return fragment
+    chars = list(fragment)
+    for pos in reversed(positions):
+        if 0 <= pos - offset < len(chars):
+            del chars[pos - offset]
+    return ''.join(chars)
+
+def _closers(stack: List[str]) -> str:
+    return ''.join(_CLOSERS[bracket] for bracket in reversed(stack))
+
+def _parse_candidate(text: str, start: int) -> Tuple[Any, str, int]:
+    """Разбор кандидата, начинающегося с открывающей скобки; возвращает и его конец"""
+    scan = _scan(text, start)
+
+    if scan.mismatch:
+        return None, STATUS_FAILED, start + 1
+
+    if scan.end is not None:
+        fragment = text[start:scan.end]
+        try:
+            return _loads(fragment), STATUS_OK, scan.end
+        except ValueError:
+            pass
+        repaired = _drop_positions(fragment, scan.dangling_commas, start)
+        try:
+            return _loads(repaired), STATUS_REPAIRED, scan.end
+        except ValueError:
+            return None, STATUS_FAILED, start + 1
+
+    # Ответ оборван: закрываем строку и все открытые скобки
+    if scan.open_string is not None:
+        fragment = _PARTIAL_ESCAPE_RE.sub('', text[start:].rstrip()) + '"'
+        stack = scan.stack
+        commas = scan.dangling_commas
+    elif scan.safe_end is not None:
+        fragment = text[start:scan.safe_end]
+        stack = scan.safe_stack
+        commas = [pos for pos in scan.dangling_commas if pos < scan.safe_end]
+    else:
+        return None, STATUS_FAILED, start + 1
+
+    repaired = _drop_positions(fragment, commas, start) + _closers(stack)
+    try:
+        return _loads(repaired), STATUS_TRUNCATED, len(text)
+    except ValueError:
+        return None, STATUS_FAILED, start + 1
+
+def _find_best_candidate(text: str, begin: int, end: int) -> Tuple[Any, str]:
+    """Поиск самого крупного JSON-значения в text[begin:end]
+
+    Кандидаты не перекрываются: после успешного разбора поиск продолжается
+    с конца найденного значения, поэтому весь текст просматривается линейно.
+    Самый крупный кандидат выигрывает у случайных скобок в тексте вроде "[1]".
+    """
+    best, best_status, best_size = None, STATUS_FAILED, 0
+    failures = 0
+    pos = begin
+
+    while failures < MAX_CANDIDATES:
+        opener = _OPENERS_RE.search(text, pos, end)
+        if not opener:
+            break
+
+        data, status, candidate_end = _parse_candidate(text, opener.start())
+        if status == STATUS_FAILED:
+            failures += 1
+        elif candidate_end - opener.start() > best_size:
+            best, best_status, best_size = data, status, candidate_end - opener.start()
+        pos = candidate_end
+
+    return best, best_status
+
+def extract_json_with_status(text: str) -> Tuple[Any, str]:
+    """Извлечение JSON из ответа LLM с признаком того, как он был получен
+
+    Статусы: ok - валидный JSON, repaired - исправлены висячие запятые,
+    truncated - ответ был обрезан и достроен, failed - JSON не найден.
+    """
+    if not text:
+        return None, STATUS_FAILED
+
+    try:
+        return _loads(text), STATUS_OK
+    except ValueError:
+        pass
+
+    # Если есть блок ```json, сначала ищем в нем
+    fence = _FENCE_RE.search(text)
+    if fence:
+        data, status = _find_best_candidate(text, fence.end(), len(text))
+        if status != STATUS_FAILED:
+            return data, status
+
+    return _find_best_candidate(text, 0, len(text))
+
+# ========================================================================
+# ИНКРЕМЕНТАЛЬНЫЙ РАЗБОР ПОТОКОВОГО ОТВЕТА
+# ========================================================================
+_LEADING_JSON_RE = re.compile(r'\s*(?:```(?:json|JSON)?\s*)?([{\[])')
+
+class StreamingJSONParser:
+    """Инкрементальный разбор ответа, приходящего по частям
+
+    Следит за скобками JSON, которым начинается ответ, и сообщает, когда
+    значение полностью получено: дальше поток можно не дочитывать. Ответы,
+    начинающиеся с текста (например, саммари чанков), только накапливаются.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.value = None
+        self.status = None
+        self.complete = False
+        self._start = None
+        self._pos = 0
+        self._stack = []
+        self._disabled = False
+
+    def feed(self, chunk: str) -> bool:
+        """Добавить часть ответа; True, если JSON уже полностью получен"""
+        if not chunk:
+            return self.complete
+        self.text += chunk
+        if self.complete or self._disabled:
+            return self.complete
+
+        if self._start is None:
+            leading = _LEADING_JSON_RE.match(self.text)
+            if not leading:
+                # Ждем, пока станет понятно, начинается ли ответ с JSON
+                if self.text.strip() and not '```'.startswith(self.text.strip()[:3]):
+                    self._disabled = True
+                return False
+            self._start = self._pos = leading.start(1)
+
+        for match in _TOKEN_RE.finditer(self.text, self._pos):
+            token = match.group()
+            first = token[0]
+            if token == '"' or (first not in '{}[],:"' and match.end() == len(self.text)):
+                # Строка или литерал могут продолжиться в следующей части
+                break
+            self._pos = match.end()
+
+            if first in '{[':
+                self._stack.append(first)
+            elif first in '}]':
+                if not self._stack or _CLOSERS[self._stack.pop()] != first:
+                    self._disabled = True
+                    break
+                if not self._stack:
+                    data, status, _ = _parse_candidate(self.text, self._start)
+                    if status in (STATUS_OK, STATUS_REPAIRED):
+                        self.value, self.status = data, status
+                        self.complete = True
+                    else:
+                        self._disabled = True
+                    break
+
+        return self.complete
+
+    def result(self) -> Tuple[Any, str]:
+        """Итоговый JSON и статус разбора по всему полученному тексту"""
+        if self.complete:
+            return self.value, self.status
+        return extract_json_with_status(self.text)
+
+def iter_sse_deltas(response, usage: Dict = None, on_bytes=None):
+    """Разбор потока Server-Sent Events: (текст части, finish_reason)
+
+    Если передан usage, в него записывается статистика токенов из последнего события,
+    on_bytes(n) вызывается с размером каждой прочитанной строки.
+    """
+    # Строки читаем байтами и декодируем как UTF-8 сами: без charset в Content-Type
+    # requests выбрал бы latin-1, а str.splitlines режет по символам вроде \x85
+    for raw_line in response.iter_lines():
+        if on_bytes is not None:
+            on_bytes(len(raw_line) + 1)
+        line = raw_line.decode('utf-8')
+        # Пустые строки разделяют события, строки с ':' - служебные комментарии
+        if not line or line.startswith(':') or not line.startswith('data:'):
+            continue
+
+        payload = line[len('data:'):].strip()
+        if payload == '[DONE]':
+            return
+
+        event = json.loads(payload)
+        if 'error' in event:
+            raise Exception(f"OpenRouter API error: {event['error'].get('code', '')} - {event['error'].get('message', '')}")
+        if usage is not None and event.get('usage'):
+            usage.update(event['usage'])
+
+        for choice in event.get('choices', []):
+            delta = choice.get('delta', {}).get('content') or ''
+            yield delta, choice.get('finish_reason')
+
+# ========================================================================
+# ТРАССИРОВКА: ЗАПУСК, ИНТЕРВЬЮ, ЧАНКИ, ВЫЗОВЫ LLM, РАЗДЕЛЫ ОТЧЕТА
+# ========================================================================
+# Сколько завершенных span хранится в памяти (старые вытесняются)
+MAX_SPANS = 100000
+
+class Span:
+    """Интервал трассировки: имя, родитель, время и атрибуты"""
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'start', 'end', 'thread', 'attrs', 'status')
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attrs: Dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start = time.perf_counter()
+        self.end = None
+        self.thread = threading.current_thread().name
+        self.attrs = attrs
+        self.status = 'ok'
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def set(self, **attrs):
+        """Добавить атрибуты span"""
+        self.attrs.update(attrs)
+
+class Tracer:
+    """Сборщик span в стиле OpenTelemetry
+
+    Родитель span по умолчанию - текущий span этого потока. В пул потоков
+    родителя нужно передать явно (parent=tracer.current()), иначе задача
+    начнет новую трассу. Span корня задает trace_id всей трассы: по нему
+    выгружаются и очищаются span одного запуска.
+    """
+
+    def __init__(self, max_spans: int = MAX_SPANS):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._spans = deque(maxlen=max_spans)
+        # Смещение perf_counter относительно времени эпохи для меток в трассе
+        self._epoch = time.time() - time.perf_counter()
+
+    def _stack(self) -> List[Span]:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def current(self) -> Optional[Span]:
+        """Текущий span потока"""
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def annotate(self, **attrs):
+        """Добавить атрибуты текущему span, если он есть"""
+        span = self.current()
+        if span is not None:
+            span.set(**attrs)
+
+    @contextmanager
+    def span(self, name: str, parent: Span = None, **attrs):
+        """Открыть span; вложенные span этого потока становятся его детьми"""
+        stack = self._stack()
+        parent = parent or (stack[-1] if stack else None)
+        span = Span(name, parent.trace_id if parent else uuid.uuid4().hex, parent.span_id if parent else None, attrs)
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = 'error'
+            span.attrs['error'] = f"{type(e).__name__}: {e}"[:300]
+            raise
+        finally:
+            span.end = time.perf_counter()
+            stack.pop()
+            with self._lock:
+                self._spans.append(span)
+
+    def spans(self, trace_id: str = None) -> List[Span]:
+        """Завершенные span (все или одной трассы)"""
+        with self._lock:
+            return [span for span in self._spans if trace_id is None or span.trace_id == trace_id]
+
+    def clear(self, trace_id: str = None):
+        """Удалить span трассы (или все) после выгрузки"""
+        with self._lock:
+            kept = [span for span in self._spans if trace_id is not None and span.trace_id != trace_id]
+            self._spans.clear()
+            self._spans.extend(kept)
+
+    # ====================================================================
+    # ЭКСПОРТ
+    # ====================================================================
+    def to_chrome_trace(self, trace_id: str = None) -> Dict:
+        """Трасса в формате Chrome Trace Event (открывается в ui.perfetto.dev и chrome://tracing)"""
+        pid = os.getpid()
+        spans = self.spans(trace_id)
+        threads = {}
+        events = []
+        for span in spans:
+            tid = threads.setdefault(span.thread, len(threads) + 1)
+            events.append({
+                'name': span.name,
+                'cat': span.name.split('.')[0],
+                'ph': 'X',
+                'ts': round((span.start + self._epoch) * 1e6),
+                'dur': round(span.duration * 1e6),
+                'pid': pid,
+                'tid': tid,
+                'args': {**span.attrs, 'status': span.status, 'span_id': span.span_id,
+                         'parent_id': span.parent_id, 'trace_id': span.trace_id}
+            })
+        for thread_name, tid in threads.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread_name}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome_trace(self, path: str, trace_id: str = None):
+        """Сохранить трассу в JSON-файл"""
+        Path(path).write_text(json.dumps(self.to_chrome_trace(trace_id), ensure_ascii=False, default=str),
+                              encoding='utf-8')
+
+    def latency_report(self, trace_id: str = None, top: int = 3) -> Dict:
+        """Длительности по именам span: p50, p95, максимум и самые медленные экземпляры"""
+        by_name = defaultdict(list)
+        for span in self.spans(trace_id):
+            by_name[span.name].append(span)
+
+        report = {}
+        for name, spans in by_name.items():
+            spans.sort(key=lambda span: span.duration)
+            durations = [span.duration for span in spans]
+            report[name] = {
+                'count': len(spans),
+                'total': round(sum(durations), 3),
+                'p50': round(durations[len(durations) // 2], 3),
+                'p95': round(durations[min(int(len(durations) * 0.95), len(durations) - 1)], 3),
+                'max': round(durations[-1], 3),
+                'slowest': [{'duration': round(span.duration, 3), **span.attrs} for span in spans[-top:][::-1]]
+            }
+        return report
+
+_tracer = Tracer()
+
+def get_tracer() -> Tracer:
+    """Общий трассировщик процесса"""
+    return _tracer
+
+# ========================================================================
+# УЧЕТ ВРЕМЕНИ И ТОКЕНОВ ПО ЭТАПАМ
+# ========================================================================
+# Границы гистограммы длительности вызовов LLM, сек
+CALL_DURATION_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+
+# Счетчики вызова, которые суммируются по этапам. cost_usd - стоимость по
+# таблице цен, estimated_usage - запросы, токены которых оценены по длине
+# текста (при досрочной остановке потока провайдер не присылает usage),
+# hedges - дубли к резервной модели, fallback_wins - ответы от нее,
+# coalesced - вызовы, получившие ответ одинакового запроса другого потока
+CALL_COUNTERS = ('retries', 'requests', 'prompt_tokens', 'cached_prompt_tokens', 'completion_tokens',
+                 'request_bytes', 'response_bytes', 'queue_wait', 'cost_usd', 'estimated_usage',
+                 'hedges', 'fallback_wins', 'coalesced')
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(**labels) -> str:
+    return ','.join(f'{name}="{_escape_label(value)}"' for name, value in labels.items())
+
+class MetricsRecorder:
+    """Учет вызовов LLM и этапов анализа одного запуска
+
+    Этапы вкладываются друг в друга (stage), вызов LLM (call) помечается
+    ближайшим этапом и номером интервью. Стек этапов хранится отдельно для
+    каждого потока, поэтому параллельный анализ интервью размечается верно.
+    Этапы и вызовы одновременно пишутся span в общий трассировщик (ux_tracing).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.start_run()
+
+    def start_run(self, run_id: str = None):
+        """Начать новый запуск: прежние записи сбрасываются"""
+        with self._lock:
+            self.run_id = run_id
+            self.started_at = datetime.now().isoformat(timespec='seconds')
+            self._started = time.perf_counter()
+            self._finished = None
+            self.calls = []
+            self.stages = []
+
+    def finish_run(self):
+        self._finished = time.perf_counter()
+
+    def _stack(self) -> List[Dict]:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _tags(self) -> Dict:
+        """Этап и номер интервью для текущего потока"""
+        stack = self._stack()
+        interview_id = next((frame['interview_id'] for frame in reversed(stack)
+                             if frame['interview_id'] is not None), None)
+        return {'stage': stack[-1]['stage'] if stack else 'unknown', 'interview_id': interview_id}
+
+    def current_stage(self) -> str:
+        """Текущий этап потока ('unknown' вне этапов)"""
+        stack = self._stack()
+        return stack[-1]['stage'] if stack else 'unknown'
+
+    @contextmanager
+    def stage(self, name: str, interview_id: int = None, queued_at: float = None, trace_parent: Span = None):
+        """Этап анализа
+
+        queued_at - time.perf_counter() постановки задачи в пул, trace_parent -
+        span потока, поставившего задачу (в потоке пула своего span нет).
+        """
+        stack = self._stack()
+        if stack and stack[-1]['stage'] == name and interview_id in (None, stack[-1]['interview_id']):
+            # Повторный вход в тот же этап не создает вложенную запись
+            yield
+            return
+
+        started = time.perf_counter()
+        queue_wait = max(started - queued_at, 0.0) if queued_at is not None else 0.0
+        frame = {'stage': name, 'interview_id': interview_id, 'pending_queue_wait': queue_wait}
+        if interview_id is None and stack:
+            frame['interview_id'] = stack[-1]['interview_id']
+        stack.append(frame)
+        span_attrs = {'interview_id': frame['interview_id']} if frame['interview_id'] is not None else {}
+        if queue_wait:
+            span_attrs['queue_wait'] = round(queue_wait, 3)
+        status = 'ok'
+        try:
+            with get_tracer().span(name, parent=trace_parent, **span_attrs):
+                yield
+        except BaseException:
+            status = 'error'
+            raise
+        finally:
+            stack.pop()
+            record = {
+                'stage': name,
+                'parent': stack[-1]['stage'] if stack else None,
+                'interview_id': frame['interview_id'],
+                'started': round(started - self._started, 3),
+                'wall_time': round(time.perf_counter() - started, 3),
+                'queue_wait': round(queue_wait, 3),
+                'status': status
+            }
+            with self._lock:
+                self.stages.append(record)
+
+    @contextmanager
+    def call(self, model: str):
+        """Вызов LLM: счетчики внутри заполняются через add()
+
+        Если вызов повторяется целиком (например, при перегрузке API), каждая
+        попытка добавляет счетчик attempts - лишние попытки идут в retries.
+        """
+        started = time.perf_counter()
+        record = {**self._tags(), 'model': model, 'started': round(started - self._started, 3),
+                  'queue_wait': 0.0, 'status': 'ok'}
+        record.update({counter: 0 for counter in CALL_COUNTERS if counter != 'queue_wait'})
+
+        # Ожидание в очереди пула относим к первому вызову задачи
+        for frame in reversed(self._stack()):
+            if frame['pending_queue_wait']:
+                record['queue_wait'] = round(frame['pending_queue_wait'], 3)
+                frame['pending_queue_wait'] = 0.0
+                break
+
+        previous = getattr(self._local, 'call', None)
+        self._local.call = record
+        span_attrs = {'stage': record['stage'], 'model': model}
+        if record['interview_id'] is not None:
+            span_attrs['interview_id'] = record['interview_id']
+        with get_tracer().span('llm_call', **span_attrs) as span:
+            try:
+                yield record
+            except BaseException as e:
+                record['status'] = 'error'
+                record['error'] = type(e).__name__
+                raise
+            finally:
+                self._local.call = previous
+                record['retries'] += max(record.pop('attempts', 1) - 1, 0)
+                record['wall_time'] = round(time.perf_counter() - started, 3)
+                with self._lock:
+                    self.calls.append(record)
+                span.set(**{counter: record[counter] for counter in CALL_COUNTERS if record[counter]})
+
+    def add(self, counter: str, value=1):
+        """Увеличить счетчик текущего вызова LLM в этом потоке"""
+        record = getattr(self._local, 'call', None)
+        if record is not None:
+            with self._lock:
+                record[counter] = record.get(counter, 0) + value
+
+    def current_call(self) -> Optional[Dict]:
+        """Запись текущего вызова LLM в этом потоке"""
+        return getattr(self._local, 'call', None)
+
+    @contextmanager
+    def bind(self, record: Optional[Dict]):
+        """Считать add() в другом потоке в уже открытый вызов (запросы хеджирования)"""
+        previous = getattr(self._local, 'call', None)
+        self._local.call = record
+        try:
+            yield
+        finally:
+            self._local.call = previous
+
+    # ====================================================================
+    # ЭКСПОРТ
+    # ====================================================================
+    def summary(self) -> Dict:
+        """Сводка запуска: итоги, этапы, интервью и все вызовы LLM"""
+        with self._lock:
+            calls, stages = list(self.calls), list(self.stages)
+
+        def aggregate(records: List[Dict]) -> Dict:
+            totals = {'calls': len(records), 'errors': sum(1 for r in records if r['status'] != 'ok'),
+                      'wall_time': round(sum(r['wall_time'] for r in records), 3),
+                      'models': sorted({r['model'] for r in records})}
+            for counter in CALL_COUNTERS:
+                # Стоимость дешевых вызовов - доли цента, ее округляем точнее
+                totals[counter] = round(sum(r.get(counter, 0) for r in records), 6 if counter == 'cost_usd' else 3)
+            return totals
+
+        calls_by_stage, calls_by_interview = defaultdict(list), defaultdict(list)
+        for record in calls:
+            calls_by_stage[record['stage']].append(record)
+            if record['interview_id'] is not None:
+                calls_by_interview[record['interview_id']].append(record)
+
+        stage_summary = {}
+        for record in stages:
+            entry = stage_summary.setdefault(record['stage'], {'runs': 0, 'wall_time': 0.0, 'queue_wait': 0.0,
+                                                                'max_wall_time': 0.0})
+            entry['runs'] += 1
+            entry['wall_time'] = round(entry['wall_time'] + record['wall_time'], 3)
+            entry['queue_wait'] = round(entry['queue_wait'] + record['queue_wait'], 3)
+            entry['max_wall_time'] = max(entry['max_wall_time'], record['wall_time'])
+        for stage, records in calls_by_stage.items():
+            stage_summary.setdefault(stage, {'runs': 0, 'wall_time': 0.0, 'queue_wait': 0.0,
+                                             'max_wall_time': 0.0})['llm'] = aggregate(records)
+
+        finished = self._finished or time.perf_counter()
+        return {
+            'run_id': self.run_id,
+            'started_at': self.started_at,
+            'wall_time': round(finished - self._started, 3),
+            'totals': aggregate(calls),
+            'stages': stage_summary,
+            'interviews': {str(interview_id): aggregate(records)
+                           for interview_id, records in sorted(calls_by_interview.items())},
+            'calls': calls
+        }
+
+    def save_summary(self, path: str):
+        """Сохранить сводку запуска в JSON"""
+        Path(path).write_text(json.dumps(self.summary(), ensure_ascii=False, indent=2), encoding='utf-8')
+
+    def to_prometheus(self, prefix: str = 'ux_analyzer') -> str:
+        """Метрики запуска в текстовом формате Prometheus (exposition format 0.0.4)"""
+        with self._lock:
+            calls, stages = list(self.calls), list(self.stages)
+
+        lines = []
+
+        def family(name: str, kind: str, help_text: str, samples: Dict):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for (suffix, labels), value in samples.items():
+                lines.append(f"{prefix}_{name}{suffix}{{{labels}}} {value:g}")
+
+        call_counts, counters = defaultdict(int), defaultdict(float)
+        buckets, duration_sum, duration_count = defaultdict(int), defaultdict(float), defaultdict(int)
+        for record in calls:
+            stage, model = record['stage'], record['model']
+            call_counts[('', _labels(stage=stage, model=model, status=record['status']))] += 1
+            for counter in CALL_COUNTERS:
+                counters[(counter, stage, model)] += record.get(counter, 0)
+            for bound in CALL_DURATION_BUCKETS:
+                buckets[('_bucket', _labels(stage=stage, le=bound))] += record['wall_time'] <= bound
+            buckets[('_bucket', _labels(stage=stage, le='+Inf'))] += 1
+            duration_sum[('_sum', _labels(stage=stage))] += record['wall_time']
+            duration_count[('_count', _labels(stage=stage))] += 1
+
+        def counter_samples(counter: str, **extra) -> Dict:
+            return {('', _labels(stage=stage, model=model, **extra)): value
+                    for (name, stage, model), value in counters.items() if name == counter}
+
+        family('llm_calls_total', 'counter', 'LLM calls by stage, model and status', call_counts)
+        family('llm_call_duration_seconds', 'histogram', 'LLM call wall time',
+               {**buckets, **duration_sum, **duration_count})
+        family('llm_retries_total', 'counter', 'LLM call retries', counter_samples('retries'))
+        family('llm_requests_total', 'counter', 'HTTP requests incl. continuations and retries',
+               counter_samples('requests'))
+        family('llm_queue_wait_seconds_total', 'counter', 'Time LLM tasks waited in the worker pool',
+               counter_samples('queue_wait'))
+        family('llm_tokens_total', 'counter', 'Tokens reported by the provider', {
+            **counter_samples('prompt_tokens', kind='prompt'),
+            **counter_samples('cached_prompt_tokens', kind='cached_prompt'),
+            **counter_samples('completion_tokens', kind='completion')
+        })
+        family('llm_bytes_total', 'counter', 'Bytes sent to and received from the provider', {
+            **counter_samples('request_bytes', direction='sent'),
+            **counter_samples('response_bytes', direction='received')
+        })
+        family('llm_cost_usd_total', 'counter', 'LLM spend by price table (estimated when usage is missing)',
+               counter_samples('cost_usd'))
+        family('llm_hedges_total', 'counter', 'Duplicate requests sent to the fallback model', {
+            **counter_samples('hedges', outcome='sent'),
+            **counter_samples('fallback_wins', outcome='won')
+        })
+        family('llm_coalesced_total', 'counter', 'Calls served by an identical in-flight request',
+               counter_samples('coalesced'))
+
+        stage_time, stage_runs = defaultdict(float), defaultdict(int)
+        for record in stages:
+            stage_time[('', _labels(stage=record['stage']))] += record['wall_time']
+            stage_runs[('', _labels(stage=record['stage'], status=record['status']))] += 1
+        family('stage_duration_seconds_total', 'counter', 'Wall time spent in analysis stages', stage_time)
+        family('stage_runs_total', 'counter', 'Analysis stage runs', stage_runs)
+
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str):
+        """Запись метрик для textfile-коллектора node_exporter (атомарно)"""
+        target = Path(path)
+        tmp_file = target.with_suffix('.tmp')
+        tmp_file.write_text(self.to_prometheus(), encoding='utf-8')
+        tmp_file.replace(target)
+
+# ========================================================================
+# ВЫБОР МОДЕЛИ ПО ЭТАПУ И СТОИМОСТЬ ВЫЗОВОВ
+# ========================================================================
+# Символов на токен для оценки, когда провайдер не прислал usage
+# (смесь русского текста и JSON)
+CHARS_PER_TOKEN = 3
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов по длине текста"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN if text else 0
+
+def call_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_prompt_tokens: int = 0) -> float:
+    """Стоимость запроса в USD по config['api']['openrouter']['pricing']; 0 для модели без цены"""
+    price = config['api']['openrouter'].get('pricing', {}).get(model)
+    if not price:
+        return 0.0
+    prompt_price, completion_price = price[0], price[1]
+    cached_price = price[2] if len(price) > 2 else prompt_price
+    cached = min(cached_prompt_tokens, prompt_tokens)
+    return ((prompt_tokens - cached) * prompt_price + cached * cached_price
+            + completion_tokens * completion_price) / 1e6
+
+class ModelRouter:
+    """Выбор модели для этапа анализа по таблице config['routing']
+
+    Этап сопоставляется уровню (stages), уровень - модели (tiers).
+    Механические этапы (саммари чанков, сбор болей) идут на быструю дешевую
+    модель, синтез (находки, персоны) - на выбранную в интерфейсе. Модель
+    уровня не назначается, если она дороже выбранной.
+    """
+
+    def __init__(self, default_model: str):
+        self.default_model = default_model
+
+    def _blended_price(self, model: str) -> Optional[float]:
+        price = config['api']['openrouter'].get('pricing', {}).get(model)
+        return price[0] + price[1] if price else None
+
+    def model_for(self, stage: str) -> str:
+        """Модель для этапа"""
+        routing = config.get('routing', {})
+        if not routing.get('enabled', False):
+            return self.default_model
+        tier = routing.get('stages', {}).get(stage, 'premium')
+        model = routing.get('tiers', {}).get(tier) or self.default_model
+        if model != self.default_model:
+            price, default_price = self._blended_price(model), self._blended_price(self.default_model)
+            if price is not None and default_price is not None and price > default_price:
+                return self.default_model
+        return model
+
+    def fallback_for(self, model: str) -> Optional[str]:
+        """Резервная модель для хеджирования и разомкнутого выключателя"""
+        fallback = config.get('resilience', {}).get('fallback_models', {}).get(model)
+        return fallback if fallback != model else None
+
+    def policy(self) -> Dict[str, str]:
+        """Итоговая таблица этап -> модель"""
+        return {stage: self.model_for(stage) for stage in config.get('routing', {}).get('stages', {})}
+
+# ========================================================================
+# ХЕДЖИРОВАНИЕ ЗАПРОСОВ И ВЫКЛЮЧАТЕЛИ МОДЕЛЕЙ
+# ========================================================================
+LATENCY_WINDOW = 50          # последних длительностей на модель и этап
+LATENCY_MIN_SAMPLES = 5
+
+class HedgeCancelled(Exception):
+    """Запрос прерван: ответ уже получен от другой модели"""
+
+class CircuitBreaker:
+    """Автоматический выключатель одной модели: closed -> open -> half_open"""
+
+    def __init__(self, failure_threshold: int = None, reset_timeout: float = None):
+        resilience_config = config.get('resilience', {})
+        self.failure_threshold = failure_threshold or resilience_config.get('breaker_failures', 3)
+        self.reset_timeout = reset_timeout or resilience_config.get('breaker_reset', 60)
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return 'open'
+        return 'half_open'
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос; в half_open пропускается одна пробная попытка"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> bool:
+        """Учесть ошибку; True, если выключатель только что разомкнулся"""
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                was_closed = self.opened_at is None
+                self.opened_at = time.monotonic()
+                return was_closed
+            return False
+
+class LatencyTracker:
+    """Скользящее окно длительностей успешных вызовов по ключу (модель, этап)"""
+
+    def __init__(self, window: int = LATENCY_WINDOW, min_samples: int = LATENCY_MIN_SAMPLES):
+        self.min_samples = min_samples
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, key, seconds: float):
+        with self._lock:
+            self._samples[key].append(seconds)
+
+    def percentile(self, key, q: float) -> Optional[float]:
+        """Перцентиль длительности или None, если выборка мала"""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(int(len(samples) * q), len(samples) - 1)]
+
+    def hedge_delay(self, key) -> float:
+        """Через сколько секунд отправлять дубль запроса (config['resilience'])"""
+        resilience_config = config.get('resilience', {})
+        value = self.percentile(key, resilience_config.get('hedge_percentile', 0.95))
+        if value is None:
+            return resilience_config.get('hedge_initial_delay', 45)
+        return max(value, resilience_config.get('hedge_min_delay', 5))
+
+def run_hedged(executor: concurrent.futures.Executor, primary, fallback=None, hedge_after: float = None,
+               is_valid=bool, on_hedge=None) -> Tuple[Any, bool]:
+    """Вызов с хеджированием: (результат, получен ли он от fallback)
+
+    primary и fallback принимают событие abort: когда победитель определен,
+    проигравшему выставляется abort, и он прерывает чтение ответа. Дубль
+    отправляется через hedge_after секунд или сразу после ошибки основного
+    вызова. Без fallback вызов выполняется в текущем потоке.
+    """
+    if fallback is None:
+        return primary(threading.Event()), False
+
+    aborts = (threading.Event(), threading.Event())
+    pending = {executor.submit(primary, aborts[0]): 0}
+    hedged = False
+    errors = []
+    last_result = None, False
+
+    while pending:
+        done, _ = concurrent.futures.wait(pending, timeout=None if hedged else hedge_after,
+                                          return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            index = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                errors.append(e)
+                continue
+            if is_valid(result):
+                for other in pending.values():
+                    aborts[other].set()
+                return result, index == 1
+            last_result = result, index == 1
+
+        if not hedged:
+            hedged = True
+            if on_hedge is not None:
+                on_hedge()
+            pending[executor.submit(fallback, aborts[1])] = 1
+
+    if last_result[0] is None:
+        raise errors[0]
+    return last_result
+
+# Как часто ожидающий чужой вызов поток проверяет свою отмену, сек
+SINGLE_FLIGHT_POLL = 0.5
+
+class _Flight:
+    """Выполняющийся вызов: результат или ошибка для ожидающих"""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Объединение одинаковых одновременных вызовов
+
+    Первый вызов с ключом выполняется, остальные ждут его и получают тот же
+    результат. Если ведущий вызов упал (в том числе отменен своей сессией),
+    ожидающие не наследуют ошибку: один из них становится новым ведущим.
+    check (например, CancellationToken.raise_if_cancelled) вызывается, пока
+    поток ждет чужой вызов, и прерывает ожидание исключением.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key, func, check=None) -> Tuple[Any, bool]:
+        """Результат func() и признак, что вызов был выполнен этим потоком"""
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+
+            if leader:
+                try:
+                    flight.result = func()
+                    return flight.result, True
+                except BaseException as e:
+                    flight.error = e
+                    raise
+                finally:
+                    with self._lock:
+                        del self._flights[key]
+                    flight.done.set()
+
+            # Ожидающий проверяет свою отмену: ведущий может принадлежать другой сессии
+            while not flight.done.wait(SINGLE_FLIGHT_POLL):
+                if check is not None:
+                    check()
+            if flight.error is None:
+                return flight.result, False
+
+    def in_flight(self) -> int:
+        """Число выполняющихся уникальных вызовов"""
+        with self._lock:
+            return len(self._flights)
+
+# Одинаковые одновременные запросы всех оберток (параллельные интервью,
+# повторный запуск анализа) отправляются провайдеру один раз
+_in_flight_requests = SingleFlight()
+
 # ========================================================================
 # OPENROUTER API WRAPPER (ЗАМЕНА GEMINI)
 # ========================================================================
+def _rejects_json_mode(response) -> bool:
+    """400 из-за response_format: другие ошибки запроса (длина контекста,
+    валидация) JSON-режим для модели не отключают"""
+    if response.status_code != 400:
+        return False
+    body = response.text.lower()
+    return 'response_format' in body or 'json_schema' in body
+
 class GeminiAPIWrapper:
     """Обертка для безопасных вызовов OpenRouter API"""
 
-    def __init__(self, api_key: str, model: str = None):
+    def __init__(self, api_key: str, model: str = None, cancel_token: 'CancellationToken' = None):
         self.api_key = api_key
         self.model = model or config['api']['openrouter']['default_model']
-        self.base_url = "https://openrouter.ai/api/v1/chat/completions"
+        # OPENROUTER_BASE_URL позволяет направить запросы на локальный mock (benchmarks/mock_llm_server.py)
+        self.base_url = os.environ.get('OPENROUTER_BASE_URL', config['api']['openrouter']['base_url'])
+        self.cancel_token = cancel_token
+        # Статистика последнего вызова - своя у каждого потока
+        self._call_stats = threading.local()
+        self.json_mode_unsupported = set()
+        self.usage_totals = defaultdict(int)
+        self.metrics = MetricsRecorder()
+        self.router = ModelRouter(self.model)
+        self.breakers = defaultdict(CircuitBreaker)
+        self.latency = LatencyTracker()
+        self._hedge_executor = None
+        self._executor_lock = threading.Lock()
 
     def set_model(self, model: str):
         """Изменить модель"""
         self.model = model
+        self.router.default_model = model
+
+    @property
+    def last_call_stats(self) -> Dict:
+        """Статистика последнего вызова модели в текущем потоке"""
+        return getattr(self._call_stats, 'stats', {})
+
+    def generate_content(self, prompt: str, response_format: Dict = None) -> str:
+        """Генерация контента через OpenRouter
+
+        Ответ читается потоком и разбирается по мере поступления; при обрыве
+        по лимиту токенов (finish_reason=length) запрашивается продолжение.
+        response_format включает JSON-режим (см. stage_response_format).
+        Модель выбирается по текущему этапу метрик (self.router, config['routing']).
+        Вызов вместе с повторами при перегрузке учитывается в self.metrics.
+        Одинаковый запрос, который уже выполняется в другом потоке, повторно
+        не отправляется - ответ берется у него.
+        """
+        model = self.router.model_for(self.metrics.current_stage())
+        # Ключ включает хеш API-ключа: пользователи с разными ключами не делят
+        # вызов (и его оплату), а отозванный ключ не получает чужой ответ
+        api_key_hash = hashlib.sha256(self.api_key.encode('utf-8')).hexdigest()
+        request_key = hashlib.sha256(json.dumps(
+            [self.base_url, api_key_hash, model, config['api']['openrouter']['max_output_tokens'], response_format,
+             prompt],
+            ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+        check = self.cancel_token.raise_if_cancelled if self.cancel_token is not None else None
+        with self.metrics.call(model):
+            text, leader = _in_flight_requests.do(request_key, partial(self._generate, prompt, model, response_format),
+                                                  check)
+            if not leader:
+                self.metrics.add('coalesced')
+            return text
 
     @retry_on_overload
-    def generate_content(self, prompt: str) -> str:
-        """Генерация контента через OpenRouter"""
+    def _generate(self, prompt: str, model: str, response_format: Dict = None) -> str:
+        """Одна попытка генерации (повторяется декоратором при перегрузке)
+
+        Если модель отвечает дольше p95 своих прошлых вызовов на этом этапе
+        или падает, запрос дублируется на резервную модель и берется первый
+        ответ. После серии ошибок выключатель модели размыкается, и следующие
+        попытки сразу идут на резервную вместо ожидания той же модели.
+        """
+        self.metrics.add('attempts')
+        if self.cancel_token is not None:
+            self.cancel_token.raise_if_cancelled()
+
+        stage = self.metrics.current_stage()
+        fallback = self.router.fallback_for(model) if config.get('resilience', {}).get('hedging', False) else None
+        if fallback and not self.breakers[model].allow():
+            print(f"   ⚡ Модель {model} временно отключена после ошибок, использую {fallback}")
+            model, fallback = fallback, None
+        elif fallback and self.breakers[fallback].state == 'open':
+            fallback = None
+
+        record, parent = self.metrics.current_call(), get_tracer().current()
+        text, from_fallback = run_hedged(
+            self._executor(),
+            partial(self._attempt, prompt, model, response_format, stage, record, parent),
+            partial(self._attempt, prompt, fallback, response_format, stage, record, parent) if fallback else None,
+            hedge_after=self.latency.hedge_delay((model, stage)),
+            on_hedge=partial(self.metrics.add, 'hedges')
+        )
+        if from_fallback:
+            self.metrics.add('fallback_wins')
+        return text
+
+    def _executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        """Пул потоков для основного запроса и его дубля"""
+        with self._executor_lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = concurrent.futures.ThreadPoolExecutor(max_workers=16,
+                                                                             thread_name_prefix='llm-hedge')
+            return self._hedge_executor
+
+    def _attempt(self, prompt: str, model: str, response_format: Dict, stage: str, record: Dict, parent,
+                 abort: threading.Event) -> str:
+        """Запрос к одной модели: учет в вызове record, выключатель и статистика задержек"""
+        started = time.perf_counter()
+        with self.metrics.bind(record), get_tracer().span('llm_request', parent=parent, model=model):
+            try:
+                text = self._complete(prompt, model, response_format, abort)
+            except HedgeCancelled:
+                # Проигравший вызов прерван, но его длительность учитывается (как
+                # нижняя оценка задержки): иначе в выборку попадают только быстрые
+                # ответы, и порог хеджирования сползает к моменту отправки дубля
+                self.latency.record((model, stage), time.perf_counter() - started)
+                raise
+            except Exception:
+                if self.breakers[model].record_failure():
+                    print(f"   ⚡ Модель {model} отключена на {self.breakers[model].reset_timeout:.0f} с после серии ошибок")
+                raise
+        self.breakers[model].record_success()
+        self.latency.record((model, stage), time.perf_counter() - started)
+        return text
+
+    def _complete(self, prompt: str, model: str, response_format: Dict = None, abort: threading.Event = None) -> str:
+        """Ответ модели целиком: запрос и продолжения при обрыве по лимиту токенов"""
+        openrouter_config = config['api']['openrouter']
+        stream = openrouter_config.get('stream', True)
+        max_continuations = openrouter_config.get('max_continuations', 2)
+        if not openrouter_config.get('json_mode', True):
+            response_format = None
+
+        messages = [{"role": "user", "content": self._build_content(prompt, model)}]
+        parser = StreamingJSONParser()
+        started = time.time()
+        stats = {'continuations': 0, 'time_to_first_token': None, 'stopped_early': False}
+
+        for attempt in range(max_continuations + 1):
+            if parser.text:
+                # Префилл ассистента: модель продолжает с места обрыва
+                request_messages = messages + [{"role": "assistant", "content": parser.text}]
+            else:
+                request_messages = messages
+
+            usage = {}
+            received_from = len(parser.text)
+            if stream:
+                finish_reason = self._stream_completion(request_messages, model, parser, started, stats,
+                                                        response_format, usage, abort)
+            else:
+                text, finish_reason = self._post_completion(request_messages, model, response_format, usage)
+                parser.feed(text)
+            self._record_usage(request_messages, usage, model, parser.text[received_from:])
+
+            if finish_reason != 'length' or parser.complete:
+                break
+            if attempt < max_continuations:
+                print(f"   ✂️ Ответ обрезан по лимиту токенов, запрашиваю продолжение ({attempt + 1}/{max_continuations})...")
+                stats['continuations'] += 1
+            else:
+                logging.warning("Ответ обрезан по лимиту токенов и после всех продолжений")
+
+        stats['finish_reason'] = finish_reason
+        stats['total_time'] = round(time.time() - started, 3)
+        self._call_stats.stats = stats
+        self.usage_totals['completion_chars'] += len(parser.text)
+        return parser.text
+
+    def _record_usage(self, messages: List[Dict], usage: Dict, model: str, completion: str):
+        """Накопление статистики запросов; токены есть, только если их прислал провайдер
+
+        Без usage стоимость запроса считается по оценке токенов из длины текста.
+        """
+        self.usage_totals['calls'] += 1
+        prompt_chars = 0
+        for message in messages:
+            content = message['content']
+            parts = [content] if isinstance(content, str) else [part['text'] for part in content]
+            prompt_chars += sum(len(part) for part in parts)
+        self.usage_totals['prompt_chars'] += prompt_chars
+
+        prompt_tokens = usage.get('prompt_tokens', 0)
+        cached_prompt_tokens = (usage.get('prompt_tokens_details') or {}).get('cached_tokens', 0)
+        completion_tokens = usage.get('completion_tokens', 0)
+        self.usage_totals['prompt_tokens'] += prompt_tokens
+        self.usage_totals['cached_prompt_tokens'] += cached_prompt_tokens
+        self.usage_totals['completion_tokens'] += completion_tokens
+        self.metrics.add('prompt_tokens', prompt_tokens)
+        self.metrics.add('cached_prompt_tokens', cached_prompt_tokens)
+        self.metrics.add('completion_tokens', completion_tokens)
+
+        if not usage:
+            prompt_tokens = (prompt_chars + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+            completion_tokens = estimate_tokens(completion)
+            self.metrics.add('estimated_usage')
+        cost = call_cost(model, prompt_tokens, completion_tokens, cached_prompt_tokens)
+        self.usage_totals['cost_usd'] += cost
+        self.metrics.add('cost_usd', cost)
+
+    def _count_response_bytes(self, size: int):
+        self.metrics.add('response_bytes', size)
+
+    def _build_content(self, prompt: str, model: str):
+        """Текст промпта или части с cache_control по границам PROMPT_CACHE_BREAK"""
+        segments = [segment for segment in prompt.split(PROMPT_CACHE_BREAK) if segment]
+        if len(segments) < 2 or not model.startswith(EXPLICIT_PROMPT_CACHE_MODELS):
+            return ''.join(segments)
+
+        # Anthropic допускает не больше 4 точек кэширования - отмечаем последние
+        parts = [{"type": "text", "text": segment} for segment in segments]
+        for part in parts[:-1][-4:]:
+            part["cache_control"] = {"type": "ephemeral"}
+        return parts
+
+    def _request(self, messages: List[Dict], model: str, stream: bool, response_format: Dict = None):
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
@@ -307,26 +1589,82 @@ class GeminiAPIWrapper:
         }
 
         data = {
-            "model": self.model,
-            "messages": [
-                {"role": "user", "content": prompt}
-            ],
+            "model": model,
+            "messages": messages,
             "temperature": config['api']['openrouter']['temperature'],
             "max_tokens": config['api']['openrouter']['max_output_tokens']
         }
+        if stream:
+            data["stream"] = True
+            data["usage"] = {"include": True}
+        if response_format and model not in self.json_mode_unsupported:
+            data["response_format"] = response_format
+
+        # Тело сериализуем сами, чтобы учесть его размер без повторного json.dumps
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.metrics.add('requests')
+        self.metrics.add('request_bytes', len(body))
 
         response = requests.post(
             self.base_url,
             headers=headers,
-            json=data,
-            timeout=120
+            data=body,
+            timeout=120,
+            stream=stream
         )
 
+        if "response_format" in data and _rejects_json_mode(response):
+            # Модель не поддерживает JSON-режим - повторяем без него
+            logging.warning(f"Модель {model} не поддерживает JSON-режим, запрашиваю без него")
+            self.json_mode_unsupported.add(model)
+            self.metrics.add('retries')
+            response.close()
+            return self._request(messages, model, stream)
+
         if response.status_code != 200:
             raise Exception(f"OpenRouter API error: {response.status_code} - {response.text}")
 
+        return response
+
+    def _post_completion(self, messages: List[Dict], model: str, response_format: Dict = None, usage: Dict = None):
+        """Обычный запрос: возвращает текст и finish_reason"""
+        response = self._request(messages, model, False, response_format)
+        self.metrics.add('response_bytes', len(response.content))
         result = response.json()
-        return result['choices'][0]['message']['content']
+        if usage is not None:
+            usage.update(result.get('usage') or {})
+        choice = result['choices'][0]
+        return choice['message']['content'], choice.get('finish_reason')
+
+    def _stream_completion(self, messages: List[Dict], model: str, parser: StreamingJSONParser, started: float,
+                           stats: Dict, response_format: Dict = None, usage: Dict = None,
+                           abort: threading.Event = None) -> str:
+        """Потоковый запрос: части ответа сразу идут в инкрементальный парсер
+
+        stats - статистика текущего вызова (время до первого токена, досрочная остановка).
+        """
+        response = self._request(messages, model, True, response_format)
+        finish_reason = None
+
+        try:
+            for delta, chunk_finish_reason in iter_sse_deltas(response, usage, self._count_response_bytes):
+                if self.cancel_token is not None:
+                    self.cancel_token.raise_if_cancelled()
+                if abort is not None and abort.is_set():
+                    # Ответ уже получен от другой модели - соединение закрываем
+                    raise HedgeCancelled(model)
+                if delta and stats['time_to_first_token'] is None:
+                    stats['time_to_first_token'] = round(time.time() - started, 3)
+                finish_reason = chunk_finish_reason or finish_reason
+
+                if parser.feed(delta):
+                    # JSON получен полностью - остаток ответа не нужен
+                    stats['stopped_early'] = finish_reason is None
+                    return finish_reason or 'stop'
+        finally:
+            response.close()
+
+        return finish_reason
 
 # ========================================================================
 # ДАТАКЛАССЫ
@@ -397,115 +1735,862 @@ class CacheManager:
         with open(cache_file, 'wb') as f:
             pickle.dump(value, f)
 
+# ========================================================================
+# ОТМЕНА И ЧЕКПОИНТЫ ДОЛГИХ АНАЛИЗОВ
+# ========================================================================
+class AnalysisCancelled(Exception):
+    """Анализ был отменен пользователем"""
+
+class CancellationToken:
+    """Токен кооперативной отмены, проверяется между вызовами LLM"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        """Запросить отмену"""
+        self._event.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        """Прервать выполнение, если запрошена отмена"""
+        if self._event.is_set():
+            raise AnalysisCancelled("Анализ отменен")
+
+class CheckpointManager:
+    """Сохранение результатов этапов для возобновления прерванного анализа"""
+
+    def __init__(self, run_id: str, checkpoint_dir="checkpoints"):
+        self.run_dir = Path(checkpoint_dir) / run_id
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, stage: str) -> Path:
+        return self.run_dir / f"{stage}.pkl"
+
+    def has(self, stage: str) -> bool:
+        """Есть ли сохраненный результат этапа"""
+        return self._path(stage).exists()
+
+    def load(self, stage: str):
+        """Загрузить результат этапа"""
+        with open(self._path(stage), 'rb') as f:
+            return pickle.load(f)
+
+    def save(self, stage: str, value: Any):
+        """Сохранить результат этапа (атомарно, чтобы сбой не оставил битый файл)"""
+        tmp_file = self._path(stage).with_suffix('.tmp')
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(value, f)
+        tmp_file.replace(self._path(stage))
+
+    def completed_stages(self) -> List[str]:
+        """Список завершенных этапов"""
+        return sorted(p.stem for p in self.run_dir.glob('*.pkl'))
+
+    def clear(self):
+        """Удалить чекпоинты после успешного завершения"""
+        for checkpoint_file in self.run_dir.glob('*'):
+            checkpoint_file.unlink()
+        self.run_dir.rmdir()
+
+# ========================================================================
+# СХЕМЫ ОТВЕТОВ ЭТАПОВ АНАЛИЗА
+# ========================================================================
+# Каждый этап описан примером ответа; из примера строятся JSON Schema для
+# запроса в JSON-режиме, компактный шаблон для промпта и проверка ответа
+STAGE_TEMPLATES = {
+    "profile_and_themes": {
+        "respondent_profile": {
+            "demographics": "ТОЛЬКО то, что явно сказано в интервью",
+            "occupation": "ТОЛЬКО если упоминается профессия",
+            "experience_level": "ТОЛЬКО реальный опыт из интервью",
+            "context": "ТОЛЬКО реальный контекст из интервью",
+            "tech_literacy": "ТОЛЬКО если есть данные",
+            "motivations": "ТОЛЬКО явные мотивации из интервью",
+            "lifestyle": "ТОЛЬКО если упоминается",
+            "archetype": "На основе РЕАЛЬНЫХ данных",
+            "unique_traits": "ТОЛЬКО уникальные черты из интервью"
+        },
+        "key_themes": [
+            {
+                "theme": "Название темы",
+                "description": "Детальное описание темы",
+                "frequency": "Сколько раз упоминалась",
+                "importance": "Важность для респондента",
+                "quotes": ["ПОЛНАЯ цитата минимум 60 слов", "Еще одна ПОЛНАЯ цитата"],
+                "emotional_tone": "Эмоциональный окрас темы",
+                "relevance_to_brief": "Как связано с целями брифа"
+            }
+        ]
+    },
+    "pains_and_needs": {
+        "pain_points": [
+            {
+                "pain": "ТОЧНОЕ описание боли из интервью",
+                "pain_type": "functional/process/emotional/social/financial",
+                "root_cause": "Корневая причина из интервью",
+                "symptoms": ["Симптом из интервью", "Еще симптом"],
+                "context": "ТОЧНЫЙ контекст из интервью",
+                "severity": "critical/high/medium/low",
+                "frequency": "ТОЧНАЯ частота из интервью",
+                "impact": "ТОЧНОЕ влияние из слов респондента",
+                "current_solution": "Что ТОЧНО делает сейчас",
+                "ideal_solution": "Что ТОЧНО хочет",
+                "quotes": ["ПОЛНАЯ цитата о проблеме минимум 60 слов"],
+                "emotional_impact": "ТОЧНЫЕ эмоции из интервью",
+                "relevance_to_brief": "Как связано с вопросами брифа"
+            }
+        ],
+        "needs": [
+            {
+                "need": "ТОЧНАЯ формулировка потребности",
+                "need_type": "functional/emotional/social/self-actualization",
+                "job_to_be_done": "Что ТОЧНО пытается сделать",
+                "current_satisfaction": "Насколько удовлетворена по словам респондента",
+                "importance": "critical/high/medium/low",
+                "triggers": ["ТОЧНЫЙ триггер из интервью"],
+                "barriers": ["ТОЧНЫЙ барьер из интервью"],
+                "success_criteria": "Что будет успехом по словам респондента",
+                "quotes": ["ПОЛНАЯ цитата о потребности минимум 60 слов"],
+                "related_pains": ["Связанные боли"],
+                "relevance_to_brief": "Как отвечает на вопросы брифа"
+            }
+        ]
+    },
+    "emotions_and_insights": {
+        "emotional_journey": [
+            {
+                "moment": "ТОЧНОЕ описание момента из интервью",
+                "trigger": "Что ТОЧНО вызвало эмоцию",
+                "emotion": "ТОЧНОЕ название эмоции из контекста",
+                "emotion_family": "primary/secondary/social/cognitive",
+                "intensity": 8,
+                "valence": "positive/negative/mixed",
+                "duration": "Длительность если упоминается",
+                "body_language": "ТОЛЬКО если описано в интервью",
+                "quote": "ПОЛНАЯ цитата минимум 80 слов",
+                "coping": "Как справлялся ПО СЛОВАМ респондента",
+                "impact": "Влияние ПО СЛОВАМ респондента",
+                "underlying_need": "Потребность из контекста",
+                "relevance_to_brief": "Связь с целями исследования"
+            }
+        ],
+        "emotional_patterns": [
+            {
+                "pattern": "Название паттерна из данных",
+                "description": "Детальное описание на основе интервью",
+                "triggers": ["Триггер из интервью"],
+                "manifestation": "Как проявляется по данным",
+                "frequency": "Частота из интервью",
+                "coping_strategies": ["Стратегия из интервью"],
+                "design_implications": "Выводы для дизайна",
+                "quotes": ["Подтверждающая цитата минимум 60 слов"]
+            }
+        ],
+        "insights": [
+            {
+                "insight": "Глубокий инсайт основанный на данных (минимум 80 слов)",
+                "insight_type": "behavioral/emotional/cognitive/motivational",
+                "confidence": "high/medium/low",
+                "evidence": ["ТОЧНОЕ доказательство из интервью", "Еще доказательство", "Третье доказательство"],
+                "contradiction": "Противоречие если есть",
+                "hidden_motivation": "Скрытая мотивация из контекста",
+                "design_opportunity": "Возможность для дизайна",
+                "business_impact": "Влияние на бизнес",
+                "quotes": ["ПОЛНАЯ подтверждающая цитата минимум 80 слов", "Еще цитата"],
+                "relevance_to_brief": "Как помогает достичь целей исследования"
+            }
+        ],
+        "cognitive_biases": [
+            {
+                "bias": "Название искажения",
+                "manifestation": "Как проявляется В ДАННОМ интервью",
+                "impact": "Влияние по данным интервью",
+                "design_consideration": "Как учесть",
+                "quotes": ["Подтверждающая цитата"]
+            }
+        ]
+    },
+    "quotes_and_contradictions": {
+        "power_quotes": [
+            {
+                "quote_id": "Q1",
+                "text": "ПОЛНАЯ ДОСЛОВНАЯ цитата респондента (минимум 80 слов)",
+                "context": "Детальный контекст высказывания",
+                "significance": "Почему эта цитата критически важна для исследования",
+                "reveals": {
+                    "about_user": "Что ТОЧНО раскрывает о пользователе",
+                    "about_product": "Что ТОЧНО говорит о продукте",
+                    "about_market": "Что показывает о рынке"
+                },
+                "emotions": ["Эмоция из контекста"],
+                "keywords": ["Ключевое слово из цитаты"],
+                "metaphors": ["Метафора если есть в цитате"],
+                "quote_type": "pain/need/insight/emotion/solution",
+                "usability": "Как использовать для достижения целей брифа",
+                "relevance_to_questions": "К каким вопросам брифа относится"
+            }
+        ],
+        "contradictions": [
+            {
+                "contradiction_type": "logical/emotional/behavioral/temporal/value",
+                "severity": "high/medium/low",
+                "statement_1": {
+                    "text": "ТОЧНОЕ первое утверждение",
+                    "context": "Контекст утверждения",
+                    "emotional_state": "Эмоциональное состояние"
+                },
+                "statement_2": {
+                    "text": "ТОЧНОЕ противоречащее утверждение",
+                    "context": "Контекст",
+                    "emotional_state": "Эмоциональное состояние"
+                },
+                "analysis": {
+                    "nature": "В чем ТОЧНО суть противоречия",
+                    "possible_reasons": ["Возможная причина из контекста"],
+                    "underlying_conflict": "Глубинный конфликт",
+                    "resolution_attempts": "Попытки разрешения если есть"
+                },
+                "implications": {
+                    "for_design": "Что значит для дизайна",
+                    "for_research": "Что значит для целей исследования"
+                },
+                "full_quotes": ["Полная цитата с противоречием 1", "Полная цитата 2"]
+            }
+        ],
+        "language_patterns": [
+            {
+                "pattern": "Языковой паттерн из интервью",
+                "frequency": "Точная частота использования",
+                "meaning": "Что означает в контексте",
+                "emotional_load": "Эмоциональная нагрузка",
+                "examples": ["Пример использования из интервью"]
+            }
+        ]
+    },
+    "business_aspects": {
+        "business_pains": [
+            {
+                "pain": "Бизнес-проблема из данных интервью",
+                "source": "ТОЧНАЯ пользовательская проблема-источник",
+                "impact": {
+                    "revenue": "Влияние если упоминается",
+                    "costs": "Влияние если упоминается",
+                    "efficiency": "Влияние если упоминается",
+                    "reputation": "Влияние если упоминается"
+                },
+                "affected_metrics": ["Метрика из брифа если релевантна"],
+                "quantification": "Количественная оценка ЕСЛИ ЕСТЬ в интервью",
+                "urgency": "critical/high/medium/low",
+                "dependencies": ["Зависимость из интервью"],
+                "quotes": ["ПОЛНАЯ подтверждающая цитата минимум 60 слов"],
+                "relevance_to_success_metrics": "Связь с метриками успеха из брифа"
+            }
+        ],
+        "user_problems": [
+            {
+                "problem": "ТОЧНАЯ проблема пользователя",
+                "jobs_to_be_done": "Что ТОЧНО не может сделать",
+                "frequency": "ТОЧНАЯ частота из интервью",
+                "severity": "blocker/major/minor",
+                "workaround": "ТОЧНОЕ текущее решение",
+                "workaround_cost": "Цена решения если упоминается",
+                "segments_affected": ["Сегмент из данных"],
+                "competitive_advantage": "Преимущество если решить",
+                "solution_criteria": ["Критерий из интервью"],
+                "quotes": ["ПОЛНАЯ цитата о проблеме минимум 60 слов"],
+                "impact_on_goals": "Как влияет на достижение целей брифа"
+            }
+        ],
+        "opportunities": [
+            {
+                "opportunity": "Возможность ОСНОВАННАЯ на данных интервью",
+                "opportunity_type": "quick_win/strategic/innovation/optimization",
+                "based_on_problems": ["Проблема из интервью"],
+                "value_proposition": "Ценность из контекста интервью",
+                "target_segments": ["Сегмент из данных"],
+                "implementation": {
+                    "complexity": "low/medium/high",
+                    "timeline": "Оценка если возможна",
+                    "resources": "Ресурсы если обсуждались",
+                    "risks": ["Риск если упоминался"]
+                },
+                "expected_impact": {
+                    "user_value": "Ценность из слов пользователя",
+                    "business_value": "Ценность для бизнеса",
+                    "metrics": {
+                        "metric_name": "изменение если можно оценить"
+                    }
+                },
+                "success_criteria": ["Критерий из интервью"],
+                "quotes": ["ПОЛНАЯ поддерживающая цитата минимум 60 слов"],
+                "alignment_with_brief": "Как помогает достичь целей брифа"
+            }
+        ]
+    },
+    "brief_related": {
+        "goal_related_findings": [
+            {
+                "goal": "Цель из брифа",
+                "findings": [
+                    {
+                        "finding": "Что найдено в интервью",
+                        "quote": "ПОЛНАЯ цитата минимум 60 слов",
+                        "relevance": "Как относится к цели",
+                        "strength": "strong/moderate/weak"
+                    }
+                ]
+            }
+        ],
+        "question_related_findings": [
+            {
+                "question": "Вопрос из брифа",
+                "answers": [
+                    {
+                        "answer": "Ответ из интервью",
+                        "quote": "ПОЛНАЯ цитата минимум 60 слов",
+                        "confidence": "high/medium/low",
+                        "additional_context": "Дополнительный контекст"
+                    }
+                ]
+            }
+        ],
+        "metric_related_findings": [
+            {
+                "metric": "Метрика из брифа",
+                "current_state": "Текущее состояние по данным",
+                "user_perception": "Восприятие пользователя",
+                "improvement_suggestions": ["Предложение из интервью"],
+                "quotes": ["Подтверждающая цитата"]
+            }
+        ]
+    },
+    "segments": {
+        "segments": [
+            {
+                "segment_id": "SEG001",
+                "name": "Название основанное на данных",
+                "description": "Детальное описание из интервью",
+                "size": "30-40% (3-4 из 8-10 респондентов)",
+                "demographics": {
+                    "age_range": "Из данных интервью",
+                    "gender_distribution": "Из данных",
+                    "occupation_types": ["Из интервью"],
+                    "income_level": "Если упоминалось",
+                    "location": "Из данных"
+                },
+                "psychographics": {
+                    "values": ["Ценность из интервью"],
+                    "lifestyle": "Описание из данных",
+                    "motivations": ["Из слов респондентов"],
+                    "fears": ["Из интервью"]
+                },
+                "behavioral_traits": {
+                    "usage_patterns": ["Паттерн из данных"],
+                    "decision_making": "Из интервью",
+                    "technology_adoption": "Из поведения",
+                    "preferred_channels": ["Из упоминаний"]
+                },
+                "pain_points": ["Боль характерная для сегмента"],
+                "needs": ["Потребность сегмента"],
+                "opportunities": ["Возможность для сегмента"],
+                "interview_ids": [1, 3, 5],
+                "representative_quotes": ["ПОЛНАЯ характерная цитата сегмента 1 (60+ слов)", "ПОЛНАЯ цитата 2", "ПОЛНАЯ цитата 3"],
+                "alignment_with_brief": {
+                    "matches_target_audience": "yes/partially/no",
+                    "explanation": "Объяснение соответствия"
+                }
+            }
+        ]
+    },
+    "personas": {
+        "personas": [
+            {
+                "persona_id": "P001",
+                "name": "Имя отражающее характер (НЕ реальное имя)",
+                "based_on_interviews": [1, 3, 5],
+                "tagline": "РЕАЛЬНАЯ цитата характеризующая персону",
+                "description": "Детальное описание ТОЛЬКО из данных респондентов",
+                "demographics": {
+                    "age": "Реальный возраст респондентов",
+                    "gender": "Из данных",
+                    "occupation": "Реальные профессии",
+                    "location": "Реальные локации",
+                    "family_status": "Если упоминалось",
+                    "income": "Если упоминалось",
+                    "education": "Из интервью"
+                },
+                "real_life_context": {
+                    "living_situation": "Из рассказов",
+                    "work_environment": "Реальный контекст",
+                    "daily_challenges": "Из интервью",
+                    "social_circle": "Если упоминалось",
+                    "typical_day": "Из описаний респондентов"
+                },
+                "personality_traits": ["Черта выведенная из поведения", "Реальная характеристика"],
+                "goals": ["ТОЧНАЯ цель из интервью", "Конкретная потребность"],
+                "frustrations": ["ТОЧНАЯ фрустрация из данных", "Реальная боль"],
+                "needs": ["Специфическая потребность", "Реальная необходимость"],
+                "tech_behavior": {
+                    "devices": "Из упоминаний",
+                    "apps_tools": "Реально используемые",
+                    "tech_comfort": "На основе поведения",
+                    "learning_style": "Из наблюдений"
+                },
+                "real_quotes": ["ПОЛНАЯ ТОЧНАЯ цитата 1 (минимум 80 слов)", "ПОЛНАЯ цитата 2 из другого интервью той же персоны", "ПОЛНАЯ цитата 3", "Цитата 4", "Цитата 5"],
+                "typical_scenario": "РЕАЛЬНЫЙ сценарий из рассказов",
+                "day_in_life": "На основе РЕАЛЬНЫХ историй",
+                "decision_factors": ["Фактор из интервью", "Что действительно важно"],
+                "unique_details": ["Специфическая деталь 1", "Уникальная черта 2"],
+                "pain_point_quotes": ["Цитата о проблеме 1", "Цитата о проблеме 2"],
+                "solution_preferences": "Из слов респондентов",
+                "alignment_with_target": {
+                    "fits_brief_audience": "yes/partially/no",
+                    "explanation": "Почему да/нет"
+                }
+            }
+        ]
+    },
+    "findings": {
+        "executive_summary": "Исчерпывающее резюме (300-400 слов). Начни с достижения главной цели брифа, затем ключевые находки по каждому вопросу с точными числами, закончи критическими действиями.",
+        "key_insights": [
+            {
+                "insight_id": "KI001",
+                "problem_title": "Краткое название проблемы",
+                "problem_statement": "Когда [точная ситуация], пользователи [точная проблема], что приводит к [точное последствие]",
+                "problem_description": "Исчерпывающее описание на основе данных (мин. 200 слов)",
+                "severity": "critical/high/medium",
+                "affected_percentage": "75% (6 из 8)",
+                "business_impact": {
+                    "metric": "Конкретная метрика",
+                    "current_impact": "Точные текущие потери",
+                    "potential_impact": "Точный потенциал роста"
+                },
+                "root_cause": "Глубинная причина из анализа",
+                "evidence": ["Конкретное доказательство 1", "Доказательство 2", "Доказательство 3"],
+                "quotes": [
+                    {
+                        "text": "ПОЛНАЯ цитата (80+ слов)",
+                        "interview_id": 1,
+                        "context": "Контекст цитаты"
+                    }
+                ],
+                "opportunity": {
+                    "description": "Детальная возможность из данных (120+ слов)",
+                    "value_prop": "Конкретное ценностное предложение",
+                    "implementation": "Конкретный подход"
+                },
+                "relevance_to_brief": {
+                    "addresses_goal": "Какую цель помогает достичь",
+                    "answers_question": "На какой вопрос отвечает",
+                    "impacts_metric": "На какую метрику влияет"
+                },
+                "priority": "P0/P1/P2",
+                "effort": "S/M/L/XL"
+            }
+        ],
+        "brief_achievement": {
+            "goals_status": [
+                {
+                    "goal": "Цель из брифа",
+                    "achievement_level": "fully/partially/not achieved",
+                    "evidence": ["Доказательство 1", "Доказательство 2"],
+                    "key_findings": ["Находка 1", "Находка 2"],
+                    "gaps": ["Что не удалось если есть"]
+                }
+            ],
+            "questions_answers": [
+                {
+                    "question": "Вопрос из брифа",
+                    "answer": "Полный ответ на основе данных (100+ слов)",
+                    "confidence": "high/medium/low",
+                    "supporting_data": ["Данные 1", "Данные 2"],
+                    "quotes": ["Подтверждающая цитата 1", "Цитата 2"]
+                }
+            ],
+            "metrics_impact": [
+                {
+                    "metric": "Метрика из брифа",
+                    "current_state": "Текущее состояние",
+                    "projected_improvement": "Прогноз улучшения",
+                    "required_actions": ["Действие 1", "Действие 2"]
+                }
+            ]
+        },
+        "paradigm_shifts": [
+            {
+                "from": "Текущий подход из данных",
+                "to": "Необходимый подход из анализа",
+                "why": "Обоснование на данных",
+                "evidence": ["Доказательство из интервью"],
+                "implementation": "Конкретный путь",
+                "expected_results": "Конкретные результаты"
+            }
+        ],
+        "strategic_recommendations": [
+            {
+                "recommendation": "Конкретная рекомендация",
+                "rationale": "Детальное обоснование на данных",
+                "expected_outcome": "Конкретный результат",
+                "timeline": "Точные сроки",
+                "investment": "Конкретная оценка",
+                "risks": ["Риск 1", "Риск 2"],
+                "success_metrics": ["Метрика 1", "Метрика 2"]
+            }
+        ],
+        "critical_quotes": ["Самая важная цитата 1 (100+ слов) - Интервью X", "Критическая цитата 2 - Интервью Y", "Ключевая цитата 3 - Интервью Z"],
+        "next_research": ["Конкретный вопрос для изучения 1", "Вопрос 2 с обоснованием"]
+    }
+}
+
+# Разделы глубокого анализа интервью и объединенный этап для извлечения одним запросом
+INTERVIEW_SECTION_STAGES = [
+    'profile_and_themes', 'pains_and_needs', 'emotions_and_insights',
+    'quotes_and_contradictions', 'business_aspects', 'brief_related'
+]
+STAGE_TEMPLATES['interview_merged'] = {
+    field: example
+    for stage in INTERVIEW_SECTION_STAGES
+    for field, example in STAGE_TEMPLATES[stage].items()
+}
+
+# Диапазон в описании числового поля: "важность (1-10)", "сентимент (-10 до +10)"
+_NUMERIC_RANGE_PATTERN = re.compile(r'\(\s*([-+]?\d+)\s*(?:-|–|до)\s*([-+]?\d+)\s*\)')
+# Первое число в строковом ответе модели: "8", "8/10", "-3 (негативный)"
+_NUMBER_PATTERN = re.compile(r'[-+]?\d+(?:[.,]\d+)?')
+
+def _schema_from_example(example: Any) -> Dict:
+    """JSON Schema по примеру из шаблона: строки-примеры становятся описаниями
+    полей, а строки с диапазоном вида "(1-10)" - числами в этом диапазоне"""
+    if isinstance(example, dict):
+        return {
+            "type": "object",
+            "properties": {key: _schema_from_example(value) for key, value in example.items()}
+        }
+    if isinstance(example, list):
+        return {"type": "array", "items": _schema_from_example(example[0]) if example else {}}
+    if isinstance(example, bool):
+        return {"type": "boolean"}
+    if isinstance(example, (int, float)):
+        return {"type": "number"}
+    match = _NUMERIC_RANGE_PATTERN.search(str(example))
+    if match:
+        return {"type": "number", "minimum": int(match.group(1)), "maximum": int(match.group(2)),
+                "description": str(example)}
+    return {"type": "string", "description": str(example)}
+
+def _stage_template(stage: str, fields: List[str] = None) -> Dict:
+    template = STAGE_TEMPLATES[stage]
+    if fields:
+        return {key: template[key] for key in fields}
+    return template
+
+def get_stage_schema(stage: str, fields: List[str] = None) -> Dict:
+    """JSON Schema ответа этапа (или только его полей fields)"""
+    template = _stage_template(stage, fields)
+    schema = _schema_from_example(template)
+    schema["required"] = list(template)
+    return schema
+
+def render_stage_template(stage: str, fields: List[str] = None) -> str:
+    """Компактный шаблон ответа для промпта: одно поле верхнего уровня на строку"""
+    template = _stage_template(stage, fields)
+    lines = [
+        f'    {json.dumps(key, ensure_ascii=False)}: {json.dumps(value, ensure_ascii=False, separators=(", ", ": "))}'
+        for key, value in template.items()
+    ]
+    return "{\n" + ",\n".join(lines) + "\n}"
+
+def stage_response_format(stage: str, fields: List[str] = None) -> Dict:
+    """Параметр response_format для запроса в JSON-режиме"""
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": stage, "strict": False, "schema": get_stage_schema(stage, fields)}
+    }
+
+def empty_stage_value(stage: str, field: str) -> Any:
+    """Пустое значение поля того же типа, что и в шаблоне"""
+    example = STAGE_TEMPLATES[stage][field]
+    if isinstance(example, dict):
+        return {}
+    if isinstance(example, list):
+        return []
+    if _schema_from_example(example)["type"] == "number":
+        return 0
+    return ""
+
+def _clean_value(value: Any, schema: Dict) -> Tuple[Any, bool]:
+    """Структурная проверка значения: контейнеры должны совпадать по типу
+
+    Скаляры взаимозаменяемы (модель может вернуть "8" вместо 8 - для числовых
+    полей такая строка приводится к числу). Невалидные элементы массивов и
+    вложенные поля отбрасываются, поле целиком считается невалидным, только
+    если от непустого значения ничего не осталось.
+    """
+    expected = schema.get("type")
+
+    if expected == "object":
+        if not isinstance(value, dict):
+            return None, False
+        cleaned = {}
+        for key, item in value.items():
+            item_schema = schema["properties"].get(key)
+            if item_schema is None or item is None:
+                cleaned[key] = item
+                continue
+            item, ok = _clean_value(item, item_schema)
+            if ok:
+                cleaned[key] = item
+        return cleaned, True
+
+    if expected == "array":
+        items_schema = schema.get("items", {})
+        if not isinstance(value, list):
+            # Одиночная строка вместо списка строк - оборачиваем
+            if items_schema.get("type") not in ("object", "array") and not isinstance(value, dict):
+                return [value], True
+            return None, False
+        cleaned = []
+        for item in value:
+            item, ok = _clean_value(item, items_schema)
+            if ok:
+                cleaned.append(item)
+        return cleaned, bool(cleaned) or not value
+
+    if expected is None:
+        return value, True
+    if expected == "number" and isinstance(value, str):
+        # Число строкой ("8", "8/10") приводится к числу, иначе остается как есть
+        match = _NUMBER_PATTERN.search(value)
+        if match:
+            number = float(match.group().replace(',', '.'))
+            return int(number) if number.is_integer() else number, True
+    return value, not isinstance(value, (dict, list))
+
+def validate_stage_response(stage: str, data: Any, fields: List[str] = None) -> Tuple[Dict, List[str]]:
+    """Проверка ответа этапа по схеме
+
+    Возвращает очищенные данные и список полей верхнего уровня, которые
+    отсутствуют или не прошли проверку - только их нужно перезапросить.
+    """
+    template = _stage_template(stage, fields)
+    schema = _schema_from_example(template)
+
+    if isinstance(data, list) and len(template) == 1:
+        # Модель вернула голый массив вместо {"поле": [...]}
+        data = {next(iter(template)): data}
+    if not isinstance(data, dict):
+        return {}, list(template)
+
+    cleaned = dict(data)
+    failed = []
+    for name in template:
+        if name not in data or data[name] is None:
+            failed.append(name)
+            continue
+        value, ok = _clean_value(data[name], schema["properties"][name])
+        if ok:
+            cleaned[name] = value
+        else:
+            del cleaned[name]
+            failed.append(name)
+
+    return cleaned, failed
+
 # ========================================================================
 # УЛУЧШЕННЫЙ КЛАСС ДЛЯ АНАЛИЗА С GEMINI
 # ========================================================================
 class AdvancedGeminiAnalyzer:
-    def __init__(self, api_key: str, model: str = None):
-        self.api_wrapper = GeminiAPIWrapper(api_key, model)
+    def __init__(self, api_key: str, model: str = None, cancel_token: CancellationToken = None):
+        self.cancel_token = cancel_token or CancellationToken()
+        self.api_wrapper = GeminiAPIWrapper(api_key, model, self.cancel_token)
+        self.metrics = self.api_wrapper.metrics
         self.window_size = config['analysis']['window_size']
         self.overlap = config['analysis']['overlap']
         self.interview_summaries = []
+        # Номера интервью, для которых после ошибки подставлено пустое саммари
+        self.failed_interviews = []
         self.cache = CacheManager()
         self.brief_manager = BriefManager()
+        self.checkpoints = None
+        self.schema_failures = []
+        self.section_fallbacks = []
 
     def set_brief(self, brief_content: str):
         """Установка брифа исследования"""
         self.brief_manager.load_brief(brief_content)
 
-    def analyze_transcripts_parallel(self, transcripts: List[str]) -> Dict:
-        """Анализ с параллельной обработкой"""
-        print("🧠 Начинаю параллельный анализ...")
-
-        # Проверка количества интервью
-        if len(transcripts) < config['analysis']['min_interviews_recommended']:
-            print(f"⚠️  ВНИМАНИЕ: Рекомендуется минимум {config['analysis']['min_interviews_recommended']} интервью для качественного анализа!")
-            print(f"   У вас: {len(transcripts)} интервью")
-            print("   Результаты могут быть недостаточно репрезентативными\n")
+    def _start_checkpoints(self, transcripts: List[str]):
+        """Подключение чекпоинтов: одинаковые транскрипты, бриф и модель дают тот же запуск"""
+        brief = json.dumps(self.brief_manager.brief_data, ensure_ascii=False, sort_keys=True)
+        run_id = self.cache.get_hash(self.api_wrapper.model + brief + '\x00'.join(transcripts))
+        self.checkpoints = CheckpointManager(run_id)
+        self.metrics.start_run(run_id)
+        self.failed_interviews = []
+
+        completed = self.checkpoints.completed_stages()
+        if completed:
+            print(f"📦 Возобновляю анализ, завершенные этапы: {', '.join(completed)}")
+
+    def _run_stage(self, stage: str, func, *args, interview_id: int = None, queued_at: float = None,
+                   trace_parent: Span = None):
+        """Выполнение этапа с проверкой отмены и сохранением чекпоинта
+
+        Для интервью чекпоинт сохраняется как stage_<номер>, в метриках этап
+        один - с номером интервью в interview_id.
+        """
+        self.cancel_token.raise_if_cancelled()
+        checkpoint = f"{stage}_{interview_id}" if interview_id is not None else stage
+
+        if self.checkpoints is not None and self.checkpoints.has(checkpoint):
+            return self.checkpoints.load(checkpoint)
+
+        with self.metrics.stage(stage, interview_id=interview_id, queued_at=queued_at, trace_parent=trace_parent):
+            result = func(*args)
+
+        # Этапы после интервью с пустым саммари не сохраняются: при возобновлении
+        # интервью анализируется заново, и их нужно пересчитать
+        if self.checkpoints is not None and (interview_id is not None or not self.failed_interviews):
+            self.checkpoints.save(checkpoint, result)
+        return result
 
-        # Ограничиваем количество параллельных запросов
-        max_workers = min(3, len(transcripts))
+    def _run_interview(self, transcript: str, interview_num: int, queued_at: float = None,
+                       trace_parent: Span = None) -> InterviewSummary:
+        """Анализ интервью с чекпоинтом interview_<номер> и учетом в метриках
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_idx = {
-                executor.submit(self._deep_analyze_interview, transcript, i+1): i
-                for i, transcript in enumerate(transcripts)
-            }
+        queued_at - момент постановки в пул потоков, trace_parent - span запуска
+        (в потоке пула своего span нет). Ошибки не перехватываются: пустое
+        саммари подставляет _interview_fallback, и в чекпоинт оно не попадает.
+        """
+        return self._run_stage('interview', self._deep_analyze_interview, transcript, interview_num,
+                               interview_id=interview_num, queued_at=queued_at, trace_parent=trace_parent)
 
-            interview_summaries = [None] * len(transcripts)
+    def _interview_fallback(self, interview_num: int, error: Exception) -> InterviewSummary:
+        """Пустое саммари вместо интервью с ошибкой; при возобновлении интервью анализируется заново"""
+        print(f"❌ Ошибка при анализе интервью {interview_num}: {error}")
+        self.failed_interviews.append(interview_num)
+        return self._create_empty_summary(interview_num)
 
-            for future in tqdm(concurrent.futures.as_completed(future_to_idx),
-                              total=len(transcripts), desc="Анализ интервью"):
-                idx = future_to_idx[future]
-                try:
-                    interview_summaries[idx] = future.result()
-                except Exception as e:
-                    print(f"❌ Ошибка при анализе интервью {idx+1}: {e}")
-                    interview_summaries[idx] = self._create_empty_summary(idx+1)
+    def analyze_transcripts_parallel(self, transcripts: List[str]) -> Dict:
+        """Анализ с параллельной обработкой"""
+        with get_tracer().span('analysis', mode='parallel', interviews=len(transcripts), model=self.api_wrapper.model):
+            print("🧠 Начинаю параллельный анализ...")
+
+            # Проверка количества интервью
+            if len(transcripts) < config['analysis']['min_interviews_recommended']:
+                print(f"⚠️  ВНИМАНИЕ: Рекомендуется минимум {config['analysis']['min_interviews_recommended']} интервью для качественного анализа!")
+                print(f"   У вас: {len(transcripts)} интервью")
+                print("   Результаты могут быть недостаточно репрезентативными\n")
+
+            self._start_checkpoints(transcripts)
+
+            # Ограничиваем количество параллельных запросов
+            max_workers = min(3, len(transcripts))
+
+            # В потоках пула нет своего span - родителя передаем явно
+            trace_parent = get_tracer().current()
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                future_to_idx = {
+                    executor.submit(self._run_interview, transcript, i+1, time.perf_counter(), trace_parent): i
+                    for i, transcript in enumerate(transcripts)
+                }
+
+                interview_summaries = [None] * len(transcripts)
+
+                for future in tqdm(concurrent.futures.as_completed(future_to_idx),
+                                  total=len(transcripts), desc="Анализ интервью"):
+                    idx = future_to_idx[future]
+                    try:
+                        interview_summaries[idx] = future.result()
+                    except AnalysisCancelled:
+                        # Остальные потоки прервутся на следующем вызове LLM
+                        self.cancel_token.cancel()
+                        raise
+                    except Exception as e:
+                        interview_summaries[idx] = self._interview_fallback(idx+1, e)
 
-        interview_summaries = [s for s in interview_summaries if s is not None]
-        self.interview_summaries = interview_summaries
+            interview_summaries = [s for s in interview_summaries if s is not None]
+            self.interview_summaries = interview_summaries
 
-        return self._continue_analysis(interview_summaries, len(transcripts))
+            results = self._continue_analysis(interview_summaries, len(transcripts))
+            self.checkpoints.clear()
+            self.metrics.finish_run()
+            return results
 
     def analyze_transcripts(self, transcripts: List[str]) -> Dict:
         """Комплексный анализ транскриптов с прогресс-барами"""
-        print("🧠 Начинаю глубокий анализ...")
+        with get_tracer().span('analysis', mode='sequential', interviews=len(transcripts), model=self.api_wrapper.model):
+            print("🧠 Начинаю глубокий анализ...")
 
-        # Проверка количества интервью
-        if len(transcripts) < config['analysis']['min_interviews_recommended']:
-            print(f"⚠️  ВНИМАНИЕ: Рекомендуется минимум {config['analysis']['min_interviews_recommended']} интервью!")
-            print(f"   У вас: {len(transcripts)} интервью")
+            # Проверка количества интервью
+            if len(transcripts) < config['analysis']['min_interviews_recommended']:
+                print(f"⚠️  ВНИМАНИЕ: Рекомендуется минимум {config['analysis']['min_interviews_recommended']} интервью!")
+                print(f"   У вас: {len(transcripts)} интервью")
 
-        with tqdm(total=12, desc="Общий прогресс") as pbar:
-            pbar.set_description("Анализ интервью")
-            interview_summaries = []
+            self._start_checkpoints(transcripts)
 
-            for i, transcript in enumerate(tqdm(transcripts, desc="Интервью", leave=False)):
-                summary = self._deep_analyze_interview(transcript, i+1)
-                interview_summaries.append(summary)
+            with tqdm(total=12, desc="Общий прогресс") as pbar:
+                pbar.set_description("Анализ интервью")
+                interview_summaries = []
 
-            self.interview_summaries = interview_summaries
-            pbar.update(1)
+                for i, transcript in enumerate(tqdm(transcripts, desc="Интервью", leave=False)):
+                    try:
+                        summary = self._run_interview(transcript, i+1)
+                    except AnalysisCancelled:
+                        raise
+                    except Exception as e:
+                        summary = self._interview_fallback(i+1, e)
+                    interview_summaries.append(summary)
+
+                self.interview_summaries = interview_summaries
+                pbar.update(1)
 
-        return self._continue_analysis(interview_summaries, len(transcripts))
+            results = self._continue_analysis(interview_summaries, len(transcripts))
+            self.checkpoints.clear()
+            self.metrics.finish_run()
+            return results
 
     def _continue_analysis(self, interview_summaries: List[InterviewSummary], total_interviews: int) -> Dict:
         """Продолжение анализа после обработки интервью"""
         with tqdm(total=12, desc="Общий прогресс", initial=1) as pbar:
             # 2. Генерация текущих метрик
             pbar.set_description("Генерация метрик")
-            current_metrics = self._generate_current_metrics(interview_summaries)
+            current_metrics = self._run_stage('current_metrics', self._generate_current_metrics, interview_summaries)
             pbar.update(1)
 
             # 3. Кросс-анализ интервью
             pbar.set_description("Кросс-анализ")
-            cross_analysis = self._cross_analyze_interviews(interview_summaries)
+            cross_analysis = self._run_stage('cross_analysis', self._cross_analyze_interviews, interview_summaries)
             pbar.update(1)
 
             # 4. Дедупликация болей
             pbar.set_description("Дедупликация болей")
-            deduplicated_pains = self._deduplicate_pains(interview_summaries)
+            deduplicated_pains = self._run_stage('deduplicated_pains', self._deduplicate_pains, interview_summaries)
             pbar.update(1)
 
             # 5. Выявление поведенческих паттернов
             pbar.set_description("Поиск паттернов")
-            patterns = self._identify_behavioral_patterns(interview_summaries, cross_analysis)
+            patterns = self._run_stage('patterns', self._identify_behavioral_patterns, interview_summaries, cross_analysis)
             pbar.update(1)
 
             # 6. Сегментация аудитории
             pbar.set_description("Сегментация")
-            segments = self._segment_audience(interview_summaries, patterns)
+            segments = self._run_stage('segments', self._segment_audience, interview_summaries, patterns)
             pbar.update(1)
 
             # 7. Создание персон
             pbar.set_description("Создание персон")
-            personas = self._create_personas(segments, interview_summaries)
+            personas = self._run_stage('personas', self._create_personas, segments, interview_summaries)
             pbar.update(1)
 
             # 8. Генерация инсайтов и рекомендаций
             pbar.set_description("Генерация инсайтов")
-            findings = self._generate_final_findings(
+            findings = self._run_stage(
+                'findings', self._generate_final_findings,
                 interview_summaries, cross_analysis, patterns, segments, personas
             )
             pbar.update(1)
@@ -514,23 +2599,23 @@ class AdvancedGeminiAnalyzer:
 
             # 9. Генерация рекомендаций
             pbar.set_description("Генерация рекомендаций")
-            recommendations = self._generate_recommendations(findings.key_insights)
+            recommendations = self._run_stage('recommendations', self._generate_recommendations, findings.key_insights)
             pbar.update(1)
 
             # 10. Генерация материалов для защиты
             pbar.set_description("Материалы для защиты")
-            defense_materials = self._generate_defense_materials(findings, recommendations, total_interviews)
+            defense_materials = self._run_stage('defense_materials', self._generate_defense_materials, findings, recommendations, total_interviews)
             pbar.update(1)
 
             # 11. Ответы на вопросы брифа
             pbar.set_description("Ответы на вопросы брифа")
-            brief_answers = self._analyze_brief_questions(interview_summaries, findings)
+            brief_answers = self._run_stage('brief_answers', self._analyze_brief_questions, interview_summaries, findings)
             findings.brief_answers = brief_answers
             pbar.update(1)
 
             # 12. Оценка достижения целей
             pbar.set_description("Оценка достижения целей")
-            goal_achievement = self._assess_goal_achievement(findings, interview_summaries)
+            goal_achievement = self._run_stage('goal_achievement', self._assess_goal_achievement, findings, interview_summaries)
             findings.goal_achievement = goal_achievement
             pbar.update(1)
 
@@ -546,6 +2631,7 @@ class AdvancedGeminiAnalyzer:
             'interview_summaries': interview_summaries,
             'findings': findings,
             'total_interviews': total_interviews,
+            'failed_interviews': list(self.failed_interviews),
             'current_metrics': current_metrics,
             'personas': personas,
             'brief_data': self.brief_manager.brief_data if self.brief_manager.has_brief else None,
@@ -680,7 +2766,8 @@ class AdvancedGeminiAnalyzer:
 
     def _deep_analyze_interview(self, transcript: str, interview_num: int) -> InterviewSummary:
         """Глубокий анализ одного интервью"""
-        cache_key = f"interview_{interview_num}_{self.cache.get_hash(transcript[:1000])}"
+        extraction_mode = config['analysis'].get('extraction_mode', 'merged')
+        cache_key = f"interview_{interview_num}_{extraction_mode}_{self.cache.get_hash(transcript[:1000])}"
         cached = self.cache.get(cache_key)
         if cached:
             print(f"   📦 Используем кэшированный результат для интервью {interview_num}")
@@ -707,17 +2794,23 @@ class AdvancedGeminiAnalyzer:
 
         combined_summary = "\n\n".join(chunk_summaries)
 
-        # Разбиваем анализ на части
-        profile_and_themes = self._analyze_profile_and_themes(combined_summary, interview_num)
-        pains_and_needs = self._analyze_pains_and_needs(combined_summary, interview_num)
-        emotions_and_insights = self._analyze_emotions_and_insights(combined_summary, interview_num)
-        quotes_and_contradictions = self._analyze_quotes_and_contradictions(combined_summary, interview_num)
-        business_aspects = self._analyze_business_aspects(combined_summary, interview_num)
+        # Извлекаем разделы анализа одним запросом или по частям
+        if extraction_mode == 'merged':
+            sections = self._analyze_interview_merged(combined_summary, interview_num)
+        else:
+            sections = {
+                stage: method(combined_summary, interview_num)
+                for stage, method in self._interview_section_methods().items()
+            }
+
+        profile_and_themes = sections['profile_and_themes']
+        pains_and_needs = sections['pains_and_needs']
+        emotions_and_insights = sections['emotions_and_insights']
+        quotes_and_contradictions = sections['quotes_and_contradictions']
+        business_aspects = sections['business_aspects']
 
         # Анализ связанный с брифом
-        brief_findings = {}
-        if self.brief_manager.has_brief:
-            brief_findings = self._analyze_brief_related_content(combined_summary, interview_num)
+        brief_findings = sections.get('brief_related', {})
 
         # Объединяем результаты
         data = {
@@ -751,16 +2844,88 @@ class AdvancedGeminiAnalyzer:
 
         return result
 
+    def _interview_section_methods(self) -> Dict[str, Any]:
+        """Раздел анализа интервью -> метод его отдельного запроса"""
+        methods = {
+            'profile_and_themes': self._analyze_profile_and_themes,
+            'pains_and_needs': self._analyze_pains_and_needs,
+            'emotions_and_insights': self._analyze_emotions_and_insights,
+            'quotes_and_contradictions': self._analyze_quotes_and_contradictions,
+            'business_aspects': self._analyze_business_aspects
+        }
+        if self.brief_manager.has_brief:
+            methods['brief_related'] = self._analyze_brief_related_content
+        return methods
+
+    def _analyze_interview_merged(self, summary: str, interview_num: int) -> Dict[str, Dict]:
+        """Извлечение всех разделов анализа интервью одним структурированным запросом
+
+        Саммари и контекст брифа передаются один раз вместо шести. Разделы,
+        поля которых не прошли проверку схемы, запрашиваются отдельно прежними
+        методами _analyze_*.
+        """
+        context = self.brief_manager.get_brief_context()
+        section_methods = self._interview_section_methods()
+        fields = [field for stage in section_methods for field in STAGE_TEMPLATES[stage]]
+
+        brief_block = ""
+        if self.brief_manager.has_brief:
+            brief_block = f"""
+ЦЕЛИ ИССЛЕДОВАНИЯ:
+{json.dumps(self.brief_manager.get_goals_for_analysis(), ensure_ascii=False)}
+
+ВОПРОСЫ ИССЛЕДОВАНИЯ:
+{json.dumps(self.brief_manager.get_questions_for_analysis(), ensure_ascii=False)}
+"""
+
+        prompt = f"""{context}
+
+Ты — ведущий UX-исследователь с 20-летним опытом в качественном анализе данных.
+
+Проведи полный анализ интервью ниже: профиль респондента и ключевые темы, боли и потребности, эмоции и инсайты, цитаты и противоречия, бизнес-аспекты и возможности{", данные по целям и вопросам брифа" if self.brief_manager.has_brief else ""}.
+{brief_block}
+КРИТИЧЕСКИ ВАЖНО:
+1. Используй ТОЛЬКО информацию из интервью - НЕ придумывай данные
+2. Каждый вывод подкрепляй ПОЛНЫМИ ДОСЛОВНЫМИ цитатами (минимум 60 слов), НЕ сокращай и НЕ перефразируй
+3. Связывай находки с целями и вопросами брифа
+4. Если информация отсутствует, указывай "Не упоминается в интервью"
+
+Верни ТОЛЬКО валидный JSON:
+{render_stage_template('interview_merged', fields)}
+{PROMPT_CACHE_BREAK}
+ИНТЕРВЬЮ №{interview_num}
+
+СУММАРИ:
+{summary}"""
+
+        with self.metrics.stage('interview_merged'):
+            response = self.api_wrapper.generate_content(
+                prompt, response_format=stage_response_format('interview_merged', fields)
+            )
+        data, failed = validate_stage_response('interview_merged', self._extract_json(response), fields)
+
+        sections = {}
+        for stage, method in section_methods.items():
+            stage_fields = list(STAGE_TEMPLATES[stage])
+            if any(field in failed for field in stage_fields):
+                print(f"   🔁 Раздел {stage} не прошел проверку, запрашиваю отдельно...")
+                self.section_fallbacks.append({'interview_id': interview_num, 'stage': stage})
+                sections[stage] = method(summary, interview_num)
+            else:
+                sections[stage] = {field: data[field] for field in stage_fields}
+        return sections
+
     @retry_on_overload
     def _analyze_profile_and_themes(self, summary: str, interview_num: int) -> Dict:
         """Анализ профиля респондента и ключевых тем"""
         context = self.brief_manager.get_brief_context()
 
-        prompt = f"""{context}
+        def build_prompt(schema: str) -> str:
+            return f"""{context}
 
 Ты — ведущий UX-исследователь с 20-летним опытом в качественном анализе данных.
 
-Проанализируй интервью №{interview_num} и извлеки максимально детальную информацию о респонденте и ключевых темах.
+Проанализируй интервью ниже и извлеки максимально детальную информацию о респонденте и ключевых темах.
 
 КРИТИЧЕСКИ ВАЖНО:
 - Используй ТОЛЬКО информацию из интервью
@@ -769,47 +2934,26 @@ class AdvancedGeminiAnalyzer:
 - Если информация отсутствует, указывай "Не упоминается в интервью"
 
 Верни ТОЛЬКО валидный JSON в следующем формате:
-{{
-    "respondent_profile": {{
-        "demographics": "ТОЛЬКО то, что явно сказано в интервью",
-        "occupation": "ТОЛЬКО если упоминается профессия",
-        "experience_level": "ТОЛЬКО реальный опыт из интервью",
-        "context": "ТОЛЬКО реальный контекст из интервью",
-        "tech_literacy": "ТОЛЬКО если есть данные",
-        "motivations": "ТОЛЬКО явные мотивации из интервью",
-        "lifestyle": "ТОЛЬКО если упоминается",
-        "archetype": "На основе РЕАЛЬНЫХ данных",
-        "unique_traits": "ТОЛЬКО уникальные черты из интервью"
-    }},
-    "key_themes": [
-        {{
-            "theme": "Название темы",
-            "description": "Детальное описание темы",
-            "frequency": "Сколько раз упоминалась",
-            "importance": "Важность для респондента",
-            "quotes": ["ПОЛНАЯ цитата минимум 60 слов", "Еще одна ПОЛНАЯ цитата"],
-            "emotional_tone": "Эмоциональный окрас темы",
-            "relevance_to_brief": "Как связано с целями брифа"
-        }}
-    ]
-}}
+{schema}
+{PROMPT_CACHE_BREAK}
+ИНТЕРВЬЮ №{interview_num}
 
 СУММАРИ ИНТЕРВЬЮ:
 {summary[:4000]}"""
 
-        response = self.api_wrapper.generate_content(prompt)
-        return self._extract_json(response)
+        return self._generate_structured('profile_and_themes', build_prompt)
 
     @retry_on_overload
     def _analyze_pains_and_needs(self, summary: str, interview_num: int) -> Dict:
         """Анализ болей и потребностей"""
         context = self.brief_manager.get_brief_context()
 
-        prompt = f"""{context}
+        def build_prompt(schema: str) -> str:
+            return f"""{context}
 
 Ты — эксперт по выявлению пользовательских проблем и скрытых потребностей.
 
-Проанализируй интервью №{interview_num} и найди ВСЕ боли, проблемы и потребности респондента.
+Проанализируй интервью ниже и найди ВСЕ боли, проблемы и потребности респондента.
 
 КРИТИЧЕСКИ ВАЖНО:
 1. КАЖДАЯ боль должна быть подкреплена ТОЧНОЙ ЦИТАТОЙ (минимум 60 слов)
@@ -818,57 +2962,26 @@ class AdvancedGeminiAnalyzer:
 4. Приводи ВСЕ доказательства из интервью
 
 Верни ТОЛЬКО валидный JSON:
-{{
-    "pain_points": [
-        {{
-            "pain": "ТОЧНОЕ описание боли из интервью",
-            "pain_type": "functional/process/emotional/social/financial",
-            "root_cause": "Корневая причина из интервью",
-            "symptoms": ["Симптом из интервью", "Еще симптом"],
-            "context": "ТОЧНЫЙ контекст из интервью",
-            "severity": "critical/high/medium/low",
-            "frequency": "ТОЧНАЯ частота из интервью",
-            "impact": "ТОЧНОЕ влияние из слов респондента",
-            "current_solution": "Что ТОЧНО делает сейчас",
-            "ideal_solution": "Что ТОЧНО хочет",
-            "quotes": ["ПОЛНАЯ цитата о проблеме минимум 60 слов"],
-            "emotional_impact": "ТОЧНЫЕ эмоции из интервью",
-            "relevance_to_brief": "Как связано с вопросами брифа"
-        }}
-    ],
-    "needs": [
-        {{
-            "need": "ТОЧНАЯ формулировка потребности",
-            "need_type": "functional/emotional/social/self-actualization",
-            "job_to_be_done": "Что ТОЧНО пытается сделать",
-            "current_satisfaction": "Насколько удовлетворена по словам респондента",
-            "importance": "critical/high/medium/low",
-            "triggers": ["ТОЧНЫЙ триггер из интервью"],
-            "barriers": ["ТОЧНЫЙ барьер из интервью"],
-            "success_criteria": "Что будет успехом по словам респондента",
-            "quotes": ["ПОЛНАЯ цитата о потребности минимум 60 слов"],
-            "related_pains": ["Связанные боли"],
-            "relevance_to_brief": "Как отвечает на вопросы брифа"
-        }}
-    ]
-}}
+{schema}
+{PROMPT_CACHE_BREAK}
+ИНТЕРВЬЮ №{interview_num}
 
 СУММАРИ:
 {summary[:4000]}"""
 
-        response = self.api_wrapper.generate_content(prompt)
-        return self._extract_json(response)
+        return self._generate_structured('pains_and_needs', build_prompt)
 
     @retry_on_overload
     def _analyze_emotions_and_insights(self, summary: str, interview_num: int) -> Dict:
         """Глубокий анализ эмоций и инсайтов"""
         context = self.brief_manager.get_brief_context()
 
-        prompt = f"""{context}
+        def build_prompt(schema: str) -> str:
+            return f"""{context}
 
 Ты — эксперт по эмоциональному дизайну и поведенческой психологии.
 
-Проведи глубочайший анализ эмоционального опыта респондента в интервью №{interview_num}.
+Проведи глубочайший анализ эмоционального опыта респондента в интервью ниже.
 
 КРИТИЧЕСКИ ВАЖНО:
 1. КАЖДЫЙ инсайт должен быть основан на ТОЧНЫХ ЦИТАТАХ (минимум 80 слов)
@@ -877,81 +2990,26 @@ class AdvancedGeminiAnalyzer:
 4. Приводи ВСЕ доказательства и цитаты
 
 Верни ТОЛЬКО валидный JSON:
-{{
-    "emotional_journey": [
-        {{
-            "moment": "ТОЧНОЕ описание момента из интервью",
-            "trigger": "Что ТОЧНО вызвало эмоцию",
-            "emotion": "ТОЧНОЕ название эмоции из контекста",
-            "emotion_family": "primary/secondary/social/cognitive",
-            "intensity": 8,
-            "valence": "positive/negative/mixed",
-            "duration": "Длительность если упоминается",
-            "body_language": "ТОЛЬКО если описано в интервью",
-            "quote": "ПОЛНАЯ цитата минимум 80 слов",
-            "coping": "Как справлялся ПО СЛОВАМ респондента",
-            "impact": "Влияние ПО СЛОВАМ респондента",
-            "underlying_need": "Потребность из контекста",
-            "relevance_to_brief": "Связь с целями исследования"
-        }}
-    ],
-    "emotional_patterns": [
-        {{
-            "pattern": "Название паттерна из данных",
-            "description": "Детальное описание на основе интервью",
-            "triggers": ["Триггер из интервью"],
-            "manifestation": "Как проявляется по данным",
-            "frequency": "Частота из интервью",
-            "coping_strategies": ["Стратегия из интервью"],
-            "design_implications": "Выводы для дизайна",
-            "quotes": ["Подтверждающая цитата минимум 60 слов"]
-        }}
-    ],
-    "insights": [
-        {{
-            "insight": "Глубокий инсайт основанный на данных (минимум 80 слов)",
-            "insight_type": "behavioral/emotional/cognitive/motivational",
-            "confidence": "high/medium/low",
-            "evidence": [
-                "ТОЧНОЕ доказательство из интервью",
-                "Еще доказательство",
-                "Третье доказательство"
-            ],
-            "contradiction": "Противоречие если есть",
-            "hidden_motivation": "Скрытая мотивация из контекста",
-            "design_opportunity": "Возможность для дизайна",
-            "business_impact": "Влияние на бизнес",
-            "quotes": ["ПОЛНАЯ подтверждающая цитата минимум 80 слов", "Еще цитата"],
-            "relevance_to_brief": "Как помогает достичь целей исследования"
-        }}
-    ],
-    "cognitive_biases": [
-        {{
-            "bias": "Название искажения",
-            "manifestation": "Как проявляется В ДАННОМ интервью",
-            "impact": "Влияние по данным интервью",
-            "design_consideration": "Как учесть",
-            "quotes": ["Подтверждающая цитата"]
-        }}
-    ]
-}}
+{schema}
+{PROMPT_CACHE_BREAK}
+ИНТЕРВЬЮ №{interview_num}
 
 СУММАРИ:
 {summary}"""
 
-        response = self.api_wrapper.generate_content(prompt)
-        return self._extract_json(response)
+        return self._generate_structured('emotions_and_insights', build_prompt)
 
     @retry_on_overload
     def _analyze_quotes_and_contradictions(self, summary: str, interview_num: int) -> Dict:
         """Анализ важных цитат и противоречий"""
         context = self.brief_manager.get_brief_context()
 
-        prompt = f"""{context}
+        def build_prompt(schema: str) -> str:
+            return f"""{context}
 
 Ты — эксперт по дискурс-анализу и семантическому анализу текста.
 
-Найди самые важные цитаты и ВСЕ противоречия в интервью №{interview_num}.
+Найди самые важные цитаты и ВСЕ противоречия в интервью ниже.
 
 КРИТИЧЕСКИ ВАЖНО:
 1. Приводи ТОЛЬКО ПОЛНЫЕ ТОЧНЫЕ цитаты (минимум 80 слов)
@@ -960,80 +3018,26 @@ class AdvancedGeminiAnalyzer:
 4. Выбирай цитаты, которые отвечают на вопросы брифа
 
 Верни ТОЛЬКО валидный JSON:
-{{
-    "power_quotes": [
-        {{
-            "quote_id": "Q1",
-            "text": "ПОЛНАЯ ДОСЛОВНАЯ цитата респондента (минимум 80 слов)",
-            "context": "Детальный контекст высказывания",
-            "significance": "Почему эта цитата критически важна для исследования",
-            "reveals": {{
-                "about_user": "Что ТОЧНО раскрывает о пользователе",
-                "about_product": "Что ТОЧНО говорит о продукте",
-                "about_market": "Что показывает о рынке"
-            }},
-            "emotions": ["Эмоция из контекста"],
-            "keywords": ["Ключевое слово из цитаты"],
-            "metaphors": ["Метафора если есть в цитате"],
-            "quote_type": "pain/need/insight/emotion/solution",
-            "usability": "Как использовать для достижения целей брифа",
-            "relevance_to_questions": "К каким вопросам брифа относится"
-        }}
-    ],
-    "contradictions": [
-        {{
-            "contradiction_type": "logical/emotional/behavioral/temporal/value",
-            "severity": "high/medium/low",
-            "statement_1": {{
-                "text": "ТОЧНОЕ первое утверждение",
-                "context": "Контекст утверждения",
-                "emotional_state": "Эмоциональное состояние"
-            }},
-            "statement_2": {{
-                "text": "ТОЧНОЕ противоречащее утверждение",
-                "context": "Контекст",
-                "emotional_state": "Эмоциональное состояние"
-            }},
-            "analysis": {{
-                "nature": "В чем ТОЧНО суть противоречия",
-                "possible_reasons": ["Возможная причина из контекста"],
-                "underlying_conflict": "Глубинный конфликт",
-                "resolution_attempts": "Попытки разрешения если есть"
-            }},
-            "implications": {{
-                "for_design": "Что значит для дизайна",
-                "for_research": "Что значит для целей исследования"
-            }},
-            "full_quotes": ["Полная цитата с противоречием 1", "Полная цитата 2"]
-        }}
-    ],
-    "language_patterns": [
-        {{
-            "pattern": "Языковой паттерн из интервью",
-            "frequency": "Точная частота использования",
-            "meaning": "Что означает в контексте",
-            "emotional_load": "Эмоциональная нагрузка",
-            "examples": ["Пример использования из интервью"]
-        }}
-    ]
-}}
+{schema}
+{PROMPT_CACHE_BREAK}
+ИНТЕРВЬЮ №{interview_num}
 
 СУММАРИ:
 {summary}"""
 
-        response = self.api_wrapper.generate_content(prompt)
-        return self._extract_json(response)
+        return self._generate_structured('quotes_and_contradictions', build_prompt)
 
     @retry_on_overload
     def _analyze_business_aspects(self, summary: str, interview_num: int) -> Dict:
         """Анализ бизнес-аспектов и возможностей"""
         context = self.brief_manager.get_brief_context()
 
-        prompt = f"""{context}
+        def build_prompt(schema: str) -> str:
+            return f"""{context}
 
 Ты — стратегический консультант по продуктам с экспертизой в UX и бизнес-метриках.
 
-Проанализируй бизнес-влияние проблем из интервью №{interview_num} и найди возможности для роста.
+Проанализируй бизнес-влияние проблем из интервью ниже и найди возможности для роста.
 
 КРИТИЧЕСКИ ВАЖНО:
 1. Основывайся ТОЛЬКО на реальных данных из интервью
@@ -1042,72 +3046,14 @@ class AdvancedGeminiAnalyzer:
 4. НЕ придумывай возможности - только из данных
 
 Верни ТОЛЬКО валидный JSON:
-{{
-    "business_pains": [
-        {{
-            "pain": "Бизнес-проблема из данных интервью",
-            "source": "ТОЧНАЯ пользовательская проблема-источник",
-            "impact": {{
-                "revenue": "Влияние если упоминается",
-                "costs": "Влияние если упоминается",
-                "efficiency": "Влияние если упоминается",
-                "reputation": "Влияние если упоминается"
-            }},
-            "affected_metrics": ["Метрика из брифа если релевантна"],
-            "quantification": "Количественная оценка ЕСЛИ ЕСТЬ в интервью",
-            "urgency": "critical/high/medium/low",
-            "dependencies": ["Зависимость из интервью"],
-            "quotes": ["ПОЛНАЯ подтверждающая цитата минимум 60 слов"],
-            "relevance_to_success_metrics": "Связь с метриками успеха из брифа"
-        }}
-    ],
-    "user_problems": [
-        {{
-            "problem": "ТОЧНАЯ проблема пользователя",
-            "jobs_to_be_done": "Что ТОЧНО не может сделать",
-            "frequency": "ТОЧНАЯ частота из интервью",
-            "severity": "blocker/major/minor",
-            "workaround": "ТОЧНОЕ текущее решение",
-            "workaround_cost": "Цена решения если упоминается",
-            "segments_affected": ["Сегмент из данных"],
-            "competitive_advantage": "Преимущество если решить",
-            "solution_criteria": ["Критерий из интервью"],
-            "quotes": ["ПОЛНАЯ цитата о проблеме минимум 60 слов"],
-            "impact_on_goals": "Как влияет на достижение целей брифа"
-        }}
-    ],
-    "opportunities": [
-        {{
-            "opportunity": "Возможность ОСНОВАННАЯ на данных интервью",
-            "opportunity_type": "quick_win/strategic/innovation/optimization",
-            "based_on_problems": ["Проблема из интервью"],
-            "value_proposition": "Ценность из контекста интервью",
-            "target_segments": ["Сегмент из данных"],
-            "implementation": {{
-                "complexity": "low/medium/high",
-                "timeline": "Оценка если возможна",
-                "resources": "Ресурсы если обсуждались",
-                "risks": ["Риск если упоминался"]
-            }},
-            "expected_impact": {{
-                "user_value": "Ценность из слов пользователя",
-                "business_value": "Ценность для бизнеса",
-                "metrics": {{
-                    "metric_name": "изменение если можно оценить"
-                }}
-            }},
-            "success_criteria": ["Критерий из интервью"],
-            "quotes": ["ПОЛНАЯ поддерживающая цитата минимум 60 слов"],
-            "alignment_with_brief": "Как помогает достичь целей брифа"
-        }}
-    ]
-}}
+{schema}
+{PROMPT_CACHE_BREAK}
+ИНТЕРВЬЮ №{interview_num}
 
 СУММАРИ:
 {summary}"""
 
-        response = self.api_wrapper.generate_content(prompt)
-        return self._extract_json(response)
+        return self._generate_structured('business_aspects', build_prompt)
 
     @retry_on_overload
     def _analyze_brief_related_content(self, summary: str, interview_num: int) -> Dict:
@@ -1116,9 +3062,10 @@ class AdvancedGeminiAnalyzer:
         questions = self.brief_manager.get_questions_for_analysis()
         goals = self.brief_manager.get_goals_for_analysis()
 
-        prompt = f"""{context}
+        def build_prompt(schema: str) -> str:
+            return f"""{context}
 
-Найди в интервью №{interview_num} ВСЕ упоминания и данные, относящиеся к целям и вопросам брифа.
+Найди в интервью ниже ВСЕ упоминания и данные, относящиеся к целям и вопросам брифа.
 
 ЦЕЛИ ИССЛЕДОВАНИЯ:
 {json.dumps(goals, ensure_ascii=False)}
@@ -1132,49 +3079,14 @@ class AdvancedGeminiAnalyzer:
 3. ТОЧНЫЕ ЦИТАТЫ (минимум 60 слов)
 
 Верни JSON:
-{{
-    "goal_related_findings": [
-        {{
-            "goal": "Цель из брифа",
-            "findings": [
-                {{
-                    "finding": "Что найдено в интервью",
-                    "quote": "ПОЛНАЯ цитата минимум 60 слов",
-                    "relevance": "Как относится к цели",
-                    "strength": "strong/moderate/weak"
-                }}
-            ]
-        }}
-    ],
-    "question_related_findings": [
-        {{
-            "question": "Вопрос из брифа",
-            "answers": [
-                {{
-                    "answer": "Ответ из интервью",
-                    "quote": "ПОЛНАЯ цитата минимум 60 слов",
-                    "confidence": "high/medium/low",
-                    "additional_context": "Дополнительный контекст"
-                }}
-            ]
-        }}
-    ],
-    "metric_related_findings": [
-        {{
-            "metric": "Метрика из брифа",
-            "current_state": "Текущее состояние по данным",
-            "user_perception": "Восприятие пользователя",
-            "improvement_suggestions": ["Предложение из интервью"],
-            "quotes": ["Подтверждающая цитата"]
-        }}
-    ]
-}}
+{schema}
+{PROMPT_CACHE_BREAK}
+ИНТЕРВЬЮ №{interview_num}
 
 СУММАРИ:
 {summary}"""
 
-        response = self.api_wrapper.generate_content(prompt)
-        return self._extract_json(response)
+        return self._generate_structured('brief_related', build_prompt)
 
     def _create_empty_summary(self, interview_num: int) -> InterviewSummary:
         """Создание пустого саммари при ошибках"""
@@ -1256,11 +3168,13 @@ class AdvancedGeminiAnalyzer:
 - Ключевые инсайты: [С полными цитатами]
 - Противоречия: [ТОЧНЫЕ несоответствия]
 - Моменты озарения: [С контекстом]
-
+{PROMPT_CACHE_BREAK}
 ФРАГМЕНТ ИНТЕРВЬЮ:
 {chunk}"""
 
-        response = self.api_wrapper.generate_content(prompt)
+        with self.metrics.stage('summarize_chunk'):
+            get_tracer().annotate(chunk_chars=len(chunk))
+            response = self.api_wrapper.generate_content(prompt)
         return response
 
     @retry_on_overload
@@ -1609,7 +3523,8 @@ class AdvancedGeminiAnalyzer:
         """Сегментация аудитории"""
         context = self.brief_manager.get_brief_context()
 
-        prompt = f'''{context}
+        def build_prompt(schema: str) -> str:
+            return f'''{context}
 
     На основе {len(summaries)} интервью проведи ДЕТАЛЬНУЮ сегментацию аудитории.
 
@@ -1619,48 +3534,9 @@ class AdvancedGeminiAnalyzer:
     3. Связывай с целевой аудиторией из брифа
     4. Подкрепляй характеристики цитатами
 
-    Создай 3-5 четких сегментов и верни их в виде JSON массива:
+    Создай 3-5 четких сегментов и верни их в JSON:
 
-    [
-        {{
-            "segment_id": "SEG001",
-            "name": "Название основанное на данных",
-            "description": "Детальное описание из интервью",
-            "size": "30-40% (3-4 из 8-10 респондентов)",
-            "demographics": {{
-                "age_range": "Из данных интервью",
-                "gender_distribution": "Из данных",
-                "occupation_types": ["Из интервью"],
-                "income_level": "Если упоминалось",
-                "location": "Из данных"
-            }},
-            "psychographics": {{
-                "values": ["Ценность из интервью"],
-                "lifestyle": "Описание из данных",
-                "motivations": ["Из слов респондентов"],
-                "fears": ["Из интервью"]
-            }},
-            "behavioral_traits": {{
-                "usage_patterns": ["Паттерн из данных"],
-                "decision_making": "Из интервью",
-                "technology_adoption": "Из поведения",
-                "preferred_channels": ["Из упоминаний"]
-            }},
-            "pain_points": ["Боль характерная для сегмента"],
-            "needs": ["Потребность сегмента"],
-            "opportunities": ["Возможность для сегмента"],
-            "interview_ids": [1, 3, 5],
-            "representative_quotes": [
-                "ПОЛНАЯ характерная цитата сегмента 1 (60+ слов)",
-                "ПОЛНАЯ цитата 2",
-                "ПОЛНАЯ цитата 3"
-            ],
-            "alignment_with_brief": {{
-                "matches_target_audience": "yes/partially/no",
-                "explanation": "Объяснение соответствия"
-            }}
-        }}
-    ]
+    {schema}
 
     ДАННЫЕ РЕСПОНДЕНТОВ:
     {json.dumps([{
@@ -1672,18 +3548,11 @@ class AdvancedGeminiAnalyzer:
 
     ВЫЯВЛЕННЫЕ ПАТТЕРНЫ: {len(patterns)}'''
 
-        response = self.api_wrapper.generate_content(prompt)
-        result = self._extract_json(response)
+        result = self._generate_structured('segments', build_prompt)
 
-        # Убедимся, что возвращаем список словарей
-        if isinstance(result, list):
-            return result
-        elif isinstance(result, dict):
-            # Если вернулся словарь с ключом segments или подобным
-            if 'segments' in result:
-                return result['segments']
-            else:
-                return [result]  # Обернем в список
+        # Ответ уже проверен по схеме: segments - список словарей
+        if result['segments']:
+            return result['segments']
         else:
             # Fallback - создаем пустой сегмент
             return [{
@@ -1754,7 +3623,8 @@ class AdvancedGeminiAnalyzer:
                     'interview_ids': s.get('interview_ids', [])
                 })
 
-        prompt = f'''{context}
+        def build_prompt(schema: str) -> str:
+            return f'''{context}
 
     Создай 3-4 УНИКАЛЬНЫЕ персоны на основе РЕАЛЬНЫХ данных респондентов.
 
@@ -1765,80 +3635,8 @@ class AdvancedGeminiAnalyzer:
     4. Минимум 5 реальных цитат на персону
     5. Связывай с целевой аудиторией брифа
 
-    Верни JSON массив персон:
-    [
-        {{
-            "persona_id": "P001",
-            "name": "Имя отражающее характер (НЕ реальное имя)",
-            "based_on_interviews": [1, 3, 5],
-            "tagline": "РЕАЛЬНАЯ цитата характеризующая персону",
-            "description": "Детальное описание ТОЛЬКО из данных респондентов",
-            "demographics": {{
-                "age": "Реальный возраст респондентов",
-                "gender": "Из данных",
-                "occupation": "Реальные профессии",
-                "location": "Реальные локации",
-                "family_status": "Если упоминалось",
-                "income": "Если упоминалось",
-                "education": "Из интервью"
-            }},
-            "real_life_context": {{
-                "living_situation": "Из рассказов",
-                "work_environment": "Реальный контекст",
-                "daily_challenges": "Из интервью",
-                "social_circle": "Если упоминалось",
-                "typical_day": "Из описаний респондентов"
-            }},
-            "personality_traits": [
-                "Черта выведенная из поведения",
-                "Реальная характеристика"
-            ],
-            "goals": [
-                "ТОЧНАЯ цель из интервью",
-                "Конкретная потребность"
-            ],
-            "frustrations": [
-                "ТОЧНАЯ фрустрация из данных",
-                "Реальная боль"
-            ],
-            "needs": [
-                "Специфическая потребность",
-                "Реальная необходимость"
-            ],
-            "tech_behavior": {{
-                "devices": "Из упоминаний",
-                "apps_tools": "Реально используемые",
-                "tech_comfort": "На основе поведения",
-                "learning_style": "Из наблюдений"
-            }},
-            "real_quotes": [
-                "ПОЛНАЯ ТОЧНАЯ цитата 1 (минимум 80 слов)",
-                "ПОЛНАЯ цитата 2 из другого интервью той же персоны",
-                "ПОЛНАЯ цитата 3",
-                "Цитата 4",
-                "Цитата 5"
-            ],
-            "typical_scenario": "РЕАЛЬНЫЙ сценарий из рассказов",
-            "day_in_life": "На основе РЕАЛЬНЫХ историй",
-            "decision_factors": [
-                "Фактор из интервью",
-                "Что действительно важно"
-            ],
-            "unique_details": [
-                "Специфическая деталь 1",
-                "Уникальная черта 2"
-            ],
-            "pain_point_quotes": [
-                "Цитата о проблеме 1",
-                "Цитата о проблеме 2"
-            ],
-            "solution_preferences": "Из слов респондентов",
-            "alignment_with_target": {{
-                "fits_brief_audience": "yes/partially/no",
-                "explanation": "Почему да/нет"
-            }}
-        }}
-    ]
+    Верни JSON со списком персон:
+    {schema}
 
     РЕАЛЬНЫЕ ДАННЫЕ РЕСПОНДЕНТОВ:
     {json.dumps(respondent_profiles, ensure_ascii=False)}
@@ -1848,17 +3646,11 @@ class AdvancedGeminiAnalyzer:
 
     ИСПОЛЬЗУЙ ТОЛЬКО ЭТИ ДАННЫЕ! НЕ ВЫДУМЫВАЙ!'''
 
-        response = self.api_wrapper.generate_content(prompt)
-        result = self._extract_json(response)
+        result = self._generate_structured('personas', build_prompt)
 
-        # Убедимся, что возвращаем список
-        if isinstance(result, list):
-            return result
-        elif isinstance(result, dict):
-            if 'personas' in result:
-                return result['personas']
-            else:
-                return [result]
+        # Ответ уже проверен по схеме: personas - список словарей
+        if result['personas']:
+            return result['personas']
         else:
             # Fallback - пустая персона
             return [{
@@ -1890,7 +3682,8 @@ class AdvancedGeminiAnalyzer:
                     'relevance_to_brief': p.get('relevance_to_brief', '')
                 })
 
-        prompt = f'''{context}
+        def build_prompt(schema: str) -> str:
+            return f'''{context}
 
 Ты — стратегический директор по продуктам. Синтезируй ВСЕ данные в actionable выводы для C-level.
 
@@ -1901,109 +3694,7 @@ class AdvancedGeminiAnalyzer:
 4. НЕ обобщай - давай конкретику с числами
 
 Верни детальный JSON:
-{{
-    "executive_summary": "Исчерпывающее резюме (300-400 слов). Начни с достижения главной цели брифа, затем ключевые находки по каждому вопросу с точными числами, закончи критическими действиями.",
-
-    "key_insights": [
-        {{
-            "insight_id": "KI001",
-            "problem_title": "Краткое название проблемы",
-            "problem_statement": "Когда [точная ситуация], пользователи [точная проблема], что приводит к [точное последствие]",
-            "problem_description": "Исчерпывающее описание на основе данных (мин. 200 слов)",
-            "severity": "critical/high/medium",
-            "affected_percentage": "75% (6 из 8)",
-            "business_impact": {{
-                "metric": "Конкретная метрика",
-                "current_impact": "Точные текущие потери",
-                "potential_impact": "Точный потенциал роста"
-            }},
-            "root_cause": "Глубинная причина из анализа",
-            "evidence": ["Конкретное доказательство 1", "Доказательство 2", "Доказательство 3"],
-            "quotes": [
-                {{
-                    "text": "ПОЛНАЯ цитата (80+ слов)",
-                    "interview_id": 1,
-                    "context": "Контекст цитаты"
-                }}
-            ],
-            "opportunity": {{
-                "description": "Детальная возможность из данных (120+ слов)",
-                "value_prop": "Конкретное ценностное предложение",
-                "implementation": "Конкретный подход"
-            }},
-            "relevance_to_brief": {{
-                "addresses_goal": "Какую цель помогает достичь",
-                "answers_question": "На какой вопрос отвечает",
-                "impacts_metric": "На какую метрику влияет"
-            }},
-            "priority": "P0/P1/P2",
-            "effort": "S/M/L/XL"
-        }}
-    ],
-
-    "brief_achievement": {{
-        "goals_status": [
-            {{
-                "goal": "Цель из брифа",
-                "achievement_level": "fully/partially/not achieved",
-                "evidence": ["Доказательство 1", "Доказательство 2"],
-                "key_findings": ["Находка 1", "Находка 2"],
-                "gaps": ["Что не удалось если есть"]
-            }}
-        ],
-        "questions_answers": [
-            {{
-                "question": "Вопрос из брифа",
-                "answer": "Полный ответ на основе данных (100+ слов)",
-                "confidence": "high/medium/low",
-                "supporting_data": ["Данные 1", "Данные 2"],
-                "quotes": ["Подтверждающая цитата 1", "Цитата 2"]
-            }}
-        ],
-        "metrics_impact": [
-            {{
-                "metric": "Метрика из брифа",
-                "current_state": "Текущее состояние",
-                "projected_improvement": "Прогноз улучшения",
-                "required_actions": ["Действие 1", "Действие 2"]
-            }}
-        ]
-    }},
-
-    "paradigm_shifts": [
-        {{
-            "from": "Текущий подход из данных",
-            "to": "Необходимый подход из анализа",
-            "why": "Обоснование на данных",
-            "evidence": ["Доказательство из интервью"],
-            "implementation": "Конкретный путь",
-            "expected_results": "Конкретные результаты"
-        }}
-    ],
-
-    "strategic_recommendations": [
-        {{
-            "recommendation": "Конкретная рекомендация",
-            "rationale": "Детальное обоснование на данных",
-            "expected_outcome": "Конкретный результат",
-            "timeline": "Точные сроки",
-            "investment": "Конкретная оценка",
-            "risks": ["Риск 1", "Риск 2"],
-            "success_metrics": ["Метрика 1", "Метрика 2"]
-        }}
-    ],
-
-    "critical_quotes": [
-        "Самая важная цитата 1 (100+ слов) - Интервью X",
-        "Критическая цитата 2 - Интервью Y",
-        "Ключевая цитата 3 - Интервью Z"
-    ],
-
-    "next_research": [
-        "Конкретный вопрос для изучения 1",
-        "Вопрос 2 с обоснованием"
-    ]
-}}
+{schema}
 
 ДАННЫЕ АНАЛИЗА:
 - Интервью: {len(summaries)}
@@ -2017,8 +3708,7 @@ class AdvancedGeminiAnalyzer:
 ДОСТИЖЕНИЕ ЦЕЛЕЙ:
 {json.dumps(cross_analysis.get('brief_alignment', {}), ensure_ascii=False)}'''
 
-        response = self.api_wrapper.generate_content(prompt)
-        findings_data = self._extract_json(response)
+        findings_data = self._generate_structured('findings', build_prompt)
 
         return ResearchFindings(
             executive_summary=findings_data.get('executive_summary', ''),
@@ -2545,39 +4235,52 @@ class AdvancedGeminiAnalyzer:
 ВЫЯВЛЕННЫХ ПАТТЕРНОВ: {len(findings.behavioral_patterns)}
 СЕГМЕНТОВ: {len(findings.user_segments)}'''
 
-        response = self.api_wrapper.generate_content(prompt)
-        return self._extract_json(response)
-
-    def _extract_json(self, text: str) -> Union[Dict, List]:
-        """Извлечение JSON из ответа API"""
-        try:
-            # Попытка 1: весь ответ - JSON
-            try:
-                return json.loads(text)
-            except:
-                pass
+        response = self.api_wrapper.generate_content(prompt)
+        return self._extract_json(response)
 
-            # Попытка 2: JSON между ```json и ```
-            json_match = re.search(r'```json\s*(.*?)\s*```', text, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group(1))
+    def _generate_structured(self, stage: str, build_prompt) -> Dict:
+        """Запрос этапа в JSON-режиме с проверкой ответа по схеме из STAGE_TEMPLATES
+
+        build_prompt(schema) собирает промпт вокруг шаблона ответа. Поля, не
+        прошедшие проверку, перезапрашиваются отдельно - без повтора всего этапа.
+        """
+        with self.metrics.stage(stage):
+            response = self.api_wrapper.generate_content(
+                build_prompt(render_stage_template(stage)),
+                response_format=stage_response_format(stage)
+            )
+            data, failed = validate_stage_response(stage, self._extract_json(response))
 
-            # Попытка 3: JSON между { и }
-            json_match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', text, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group(0))
+            for _ in range(config['analysis']['max_field_retries']):
+                if not failed:
+                    break
+                print(f"   🔁 Этап {stage}: перезапрашиваю поля {', '.join(failed)}")
+                response = self.api_wrapper.generate_content(
+                    build_prompt(render_stage_template(stage, failed)),
+                    response_format=stage_response_format(stage, failed)
+                )
+                patch, still_failed = validate_stage_response(stage, self._extract_json(response), failed)
+                data.update({name: patch[name] for name in failed if name not in still_failed})
+                failed = still_failed
+
+            if failed:
+                logging.warning(f"Этап {stage}: поля не прошли проверку схемы: {', '.join(failed)}")
+                self.schema_failures.append({'stage': stage, 'fields': failed})
+                for name in failed:
+                    data[name] = empty_stage_value(stage, name)
+            return data
 
-            # Попытка 4: JSON массив между [ и ]
-            json_match = re.search(r'\[[^\[\]]*(?:\[[^\[\]]*\][^\[\]]*)*\]', text, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group(0))
+    def _extract_json(self, text: str) -> Union[Dict, List]:
+        data, status = extract_json_with_status(text)
 
-            logging.warning(f"Не удалось извлечь JSON из ответа. Первые 500 символов: {text[:500]}")
+        if status == STATUS_FAILED:
+            logging.warning(f"Не удалось извлечь JSON из ответа. Первые 500 символов: {text[:500] if text else ''}")
             return {}
 
-        except Exception as e:
-            logging.error(f"Ошибка при извлечении JSON: {e}")
-            return {}
+        if status == STATUS_TRUNCATED:
+            logging.warning("Ответ модели обрезан: JSON достроен до последнего полного значения")
+
+        return data
 
 # ========================================================================
 # ГЕНЕРАТОР ОТЧЕТОВ (БЕЗ ИЗМЕНЕНИЙ)
@@ -2585,9 +4288,445 @@ class AdvancedGeminiAnalyzer:
 # ========================================================================
 # ГЕНЕРАТОР ОТЧЕТОВ
 # ========================================================================
+# CSS отчета по палитре: (css, отпечаток). Строится один раз на палитру,
+# а не для каждого отчета
+_report_css_cache = {}
+_report_css_lock = threading.Lock()
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+def get_render_pool(workers: int = None) -> concurrent.futures.ProcessPoolExecutor:
+    """Общий пул процессов для рендеринга разделов отчета
+
+    Создается при первом обращении и живет до конца сессии: запуск процессов
+    дороже рендеринга отчета. В Colab процессы создаются через fork - классы
+    ноутбука определены в __main__ и недоступны процессам, запущенным через spawn.
+    """
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers or min(4, os.cpu_count() or 1))
+        return _render_pool
+
+def _render_timed(render, args) -> Tuple[str, float]:
+    """Рендеринг раздела в процессе пула: (HTML, время рендеринга, с)"""
+    started = time.perf_counter()
+    content = render(*args)
+    html = content if isinstance(content, str) else ''.join(content)
+    return html, time.perf_counter() - started
+
+# ========================================================================
+# ГРАФИКИ ОТЧЕТА: AGG В ОТДЕЛЬНЫХ ПРОЦЕССАХ И КЭШ ПО ДАННЫМ
+# ========================================================================
+# Версия оформления графиков входит в ключ кэша: после изменения
+# оформления старые картинки из кэша не используются
+CHART_RENDER_VERSION = 1
+
+# Из SVG matplotlib для вставки в HTML убираются пролог, DOCTYPE, метаданные
+# и общий для всех графиков <style> (он один раз задан в CSS отчета как .chart-svg *)
+_SVG_STRIP_PATTERN = re.compile(
+    r'<\?xml.*?\?>|<!DOCTYPE.*?>|<metadata>.*?</metadata>|<style type="text/css">.*?</style>', re.DOTALL
+)
+
+_chart_pool = None
+_chart_pool_lock = threading.Lock()
+_chart_cache = None
+
+def _chart_worker_init():
+    """Процесс отрисовки графиков: только Agg, без интерактивного pyplot"""
+    import matplotlib
+    import matplotlib.style
+    matplotlib.use('Agg', force=True)
+    matplotlib.style.use('seaborn-v0_8-whitegrid')
+    matplotlib.rcParams['font.family'] = 'DejaVu Sans'
+    matplotlib.rcParams['figure.facecolor'] = 'white'
+
+def get_chart_pool(workers: int = None) -> concurrent.futures.ProcessPoolExecutor:
+    """Общий пул процессов для графиков (создается при первом обращении)"""
+    global _chart_pool
+    with _chart_pool_lock:
+        if _chart_pool is None:
+            _chart_pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers or config['output'].get('chart_workers', 2),
+                initializer=_chart_worker_init
+            )
+        return _chart_pool
+
+def get_chart_cache() -> CacheManager:
+    """Постоянный кэш PNG графиков по хешу описания графика"""
+    global _chart_cache
+    if _chart_cache is None:
+        _chart_cache = CacheManager(config['output'].get('chart_cache_dir', 'chart_cache'))
+    return _chart_cache
+
+def chart_key(spec: Dict, salt: str = '') -> str:
+    """Ключ кэша: хеш данных, оформления и версии отрисовки графика
+
+    Для SVG в ключ входит salt (см. render_chart): у одинаковых описаний
+    разных графиков разные id clipPath, и в одном отчете они не совпадут.
+    """
+    salt = salt if spec.get('format') == 'svg' else ''
+    payload = json.dumps({**spec, 'version': CHART_RENDER_VERSION, 'salt': salt}, ensure_ascii=False,
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _inline_svg(svg: str) -> str:
+    """SVG от matplotlib в виде, пригодном для вставки в HTML отчета"""
+    svg = _SVG_STRIP_PATTERN.sub('', svg)
+    svg = re.sub(r'>\s+<', '><', svg).replace('<defs></defs>', '').strip()
+    # id групп (figure_1, axes_1, ...) повторяются в каждом графике, ссылок на них нет
+    svg = re.sub(r'<g id="[^"]*"', '<g', svg)
+    # Размер задает контейнер отчета: width/height в pt убираются, остается viewBox
+    return re.sub(r'^<svg([^>]*?) width="[^"]*" height="[^"]*"', r'<svg class="chart-svg"\1', svg, count=1)
+
+def render_chart(spec: Dict, salt: str = '') -> bytes:
+    """PNG или SVG графика по описанию (выполняется в процессе пула)
+
+    Используется объектный API matplotlib (Figure + FigureCanvasAgg), а не
+    глобальное состояние pyplot. salt делает id clipPath и маркеров SVG
+    уникальными в пределах отчета и одинаковыми от запуска к запуску.
+    """
+    import matplotlib
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=spec['figsize'])
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    if spec['kind'] == 'bar':
+        ax.bar(spec['labels'], spec['values'], color=spec['colors'])
+        ax.set_xlabel(spec['xlabel'], fontsize=12)
+        ax.set_ylabel(spec['ylabel'], fontsize=12)
+    elif spec['kind'] == 'pie':
+        colors = matplotlib.colormaps[spec['colormap']](range(len(spec['values'])))
+        ax.pie(spec['values'], labels=spec['labels'], autopct='%1.0f%%', colors=colors, startangle=90)
+    ax.set_title(spec['title'], fontsize=16, pad=20)
+    fig.tight_layout()
+
+    buffer = BytesIO()
+    if spec.get('format') == 'svg':
+        # Текст остается текстом со шрифтом отчета, а не контурами глифов,
+        # которые иначе повторялись бы в <defs> каждого графика
+        svg_rc = {'svg.fonttype': 'none', 'svg.hashsalt': salt, 'font.sans-serif': ['DejaVu Sans']}
+        with matplotlib.rc_context(svg_rc):
+            fig.savefig(buffer, format='svg', bbox_inches='tight', facecolor='white', metadata={'Date': None})
+        return _inline_svg(buffer.getvalue().decode('utf-8')).encode('utf-8')
+
+    fig.savefig(buffer, format='png', dpi=spec['dpi'], bbox_inches='tight', facecolor='white')
+    return buffer.getvalue()
+
+def render_charts(specs: Dict[str, Dict]) -> Dict[str, bytes]:
+    """Графики по описаниям: из кэша, недостающие - одновременно в пуле процессов"""
+    cache = get_chart_cache()
+    keys = {name: chart_key(spec, name) for name, spec in specs.items()}
+    images = {}
+    pending = {}
+    for name, spec in specs.items():
+        png = cache.get(keys[name])
+        if png is not None:
+            images[name] = png
+        else:
+            pending[name] = get_chart_pool().submit(render_chart, spec, name)
+
+    for name, future in pending.items():
+        images[name] = future.result()
+        cache.set(keys[name], images[name])
+
+    get_tracer().annotate(charts_cached=len(specs) - len(pending), charts_rendered=len(pending))
+    return images
+
+# ========================================================================
+# ЛЕНИВОЕ ПРИЛОЖЕНИЕ: ФРАГМЕНТЫ ИНТЕРВЬЮ И РЕНДЕРИНГ В БРАУЗЕРЕ
+# ========================================================================
+# Фрагменты - .js файлы (вызов uxAppendix.*), а не JSON: отчеты открывают
+# локально, а fetch() из file:// браузеры блокируют, <script src> - нет.
+# Основной документ содержит только этот скрипт и остров данных с
+# параметрами, поэтому его размер не зависит от числа интервью
+APPENDIX_LAZY_SCRIPT = """
+<script>
+(function () {
+  var root = document.getElementById('ux-appendix');
+  var manifest = JSON.parse(document.getElementById('ux-appendix-data').textContent);
+  var list = root.querySelector('.appendix-list');
+  var pageLabel = root.querySelector('.appendix-page');
+  var state = {index: null, page: 0, requested: {}};
+
+  function load(name) {
+    if (state.requested[name]) return;
+    state.requested[name] = true;
+    var script = document.createElement('script');
+    script.src = manifest.base + '/' + name + '?v=' + manifest.version;
+    document.head.appendChild(script);
+  }
+
+  function el(tag, text, className) {
+    var node = document.createElement(tag);
+    if (text !== undefined && text !== null) node.textContent = text;
+    if (className) node.className = className;
+    return node;
+  }
+
+  function addList(parent, heading, items) {
+    if (!items || !items.length) return;
+    parent.appendChild(el('h5', heading));
+    var ul = el('ul');
+    items.forEach(function (item) { ul.appendChild(el('li', item)); });
+    parent.appendChild(ul);
+  }
+
+  function renderPage() {
+    var pages = Math.max(1, Math.ceil(state.index.length / manifest.pageSize));
+    state.page = Math.min(Math.max(state.page, 0), pages - 1);
+    pageLabel.textContent = 'Страница ' + (state.page + 1) + ' из ' + pages;
+    list.textContent = '';
+    state.index.slice(state.page * manifest.pageSize, (state.page + 1) * manifest.pageSize).forEach(function (item) {
+      var details = el('details', null, 'appendix-item');
+      details.id = 'interview-' + item.id;
+      details.appendChild(el('summary', 'Интервью #' + item.id + (item.title ? ' - ' + item.title : '')));
+      details.appendChild(el('p', 'Загрузка...', 'appendix-loading'));
+      details.addEventListener('toggle', function () {
+        if (details.open) load('interview_' + item.id + '.js');
+      });
+      list.appendChild(details);
+    });
+  }
+
+  window.uxAppendix = {
+    index: function (items) { state.index = items; renderPage(); },
+    interview: function (record) {
+      var details = document.getElementById('interview-' + record.id);
+      if (!details) return;
+      var body = el('div', null, 'card');
+      var profile = record.profile || {};
+      [['Демография', profile.demographics], ['Профессия', profile.occupation],
+       ['Опыт', profile.experience_level], ['Контекст', profile.context]].forEach(function (row) {
+        var p = el('p');
+        p.appendChild(el('strong', row[0] + ': '));
+        p.appendChild(document.createTextNode(row[1] || 'Не указано'));
+        body.appendChild(p);
+      });
+      body.appendChild(el('p', 'Sentiment Score: ' + Number(record.sentiment_score || 0).toFixed(2)));
+      addList(body, 'Ключевые темы:', record.themes);
+      addList(body, 'Основные проблемы:', record.pains);
+      addList(body, 'Инсайты:', record.insights);
+      addList(body, 'Цитаты:', record.quotes);
+      details.replaceChild(body, details.querySelector('.appendix-loading'));
+    }
+  };
+
+  root.querySelectorAll('.appendix-pager button').forEach(function (button) {
+    button.addEventListener('click', function () {
+      if (!state.index) return;
+      state.page += Number(button.getAttribute('data-step'));
+      renderPage();
+    });
+  });
+
+  // Оглавление интервью загружается, когда приложение появляется на экране
+  if ('IntersectionObserver' in window) {
+    new IntersectionObserver(function (entries, observer) {
+      if (entries.some(function (entry) { return entry.isIntersecting; })) {
+        observer.disconnect();
+        load('index.js');
+      }
+    }, {rootMargin: '400px'}).observe(root);
+  } else {
+    load('index.js');
+  }
+})();
+</script>
+"""
+
+def _appendix_record(summary) -> Dict:
+    """Данные карточки интервью для фрагмента ленивого приложения"""
+    def texts(items, key):
+        return [item.get(key, '') if isinstance(item, dict) else str(item) for item in items or []]
+
+    return {
+        'id': summary.interview_id,
+        'profile': summary.respondent_profile,
+        'sentiment_score': summary.sentiment_score,
+        'themes': [f"{theme.get('theme', '')}: {theme.get('description', '')}" if isinstance(theme, dict) else str(theme)
+                   for theme in summary.key_themes or []],
+        'pains': texts(summary.pain_points, 'pain'),
+        'insights': texts(summary.insights, 'insight'),
+        'quotes': texts(summary.quotes, 'text')
+    }
+
+def _appendix_fragment(call: str, payload) -> str:
+    """Содержимое фрагмента: вызов uxAppendix.<call> с данными в JSON"""
+    return f"uxAppendix.{call}({json.dumps(payload, ensure_ascii=False, default=str)});\n"
+
+# ========================================================================
+# РАЗДЕЛЫ И МОДЕЛЬ ОТЧЕТА, ПАКЕТНАЯ ЗАПИСЬ DOCX
+# ========================================================================
+# Раздел -> (заголовок в оглавлении DOCX, метод HTML, метод DOCX, нужны ли
+# графики). Состав и порядок разделов задает _report_plan, одинаково для
+# HTML и DOCX; графики в формате экспорта передаются последним аргументом
+REPORT_SECTIONS = {
+    'cover_page': (None, '_generate_cover_page', '_docx_cover_page', False),
+    'table_of_contents': (None, '_generate_table_of_contents', '_docx_table_of_contents', False),
+    'brief': ('Контекст исследования', '_generate_brief_section', '_docx_brief', False),
+    'overview': ('Общий обзор исследования', '_generate_overview_section', '_docx_overview', True),
+    'goal_achievement': ('Достижение целей исследования', '_generate_goal_achievement_section', '_docx_goal_achievement', False),
+    'brief_answers': ('Ответы на исследовательские вопросы', '_generate_brief_answers_section', '_docx_brief_answers', False),
+    'current_state': ('Текущее состояние продукта', '_generate_current_state_section', '_docx_current_state', True),
+    'key_metrics': ('Ключевые находки исследования', '_generate_key_metrics_section', '_docx_key_metrics', True),
+    'user_segments': ('Сегменты пользователей', '_generate_user_segments_section', '_docx_user_segments', True),
+    'personas': ('Персоны пользователей', '_generate_personas_section', '_docx_personas', False),
+    'pain_points': ('Ключевые проблемы пользователей', '_generate_pain_points_section_full', '_docx_pain_points', True),
+    'behavioral_patterns': ('Поведенческие паттерны', '_generate_behavioral_patterns_section_full', '_docx_behavioral_patterns', False),
+    'emotional_journey': ('Эмоциональный опыт пользователей', '_generate_emotional_journey_section', '_docx_emotional_journey', False),
+    'insights': ('Ключевые инсайты', '_generate_insights_section_full', '_docx_insights', False),
+    'contradictions': ('Противоречия и неоднозначности', '_generate_contradictions_section', '_docx_contradictions', False),
+    'quotes': ('Важные цитаты респондентов', '_generate_quotes_section', '_docx_quotes', False),
+    'recommendations': ('Рекомендации', '_generate_recommendations_section_full', '_docx_recommendations', False),
+    'priority_matrix': ('Матрица приоритетов', '_generate_priority_matrix_section', '_docx_priority_matrix', False),
+    'roadmap': ('Дорожная карта внедрения', '_generate_roadmap_section', '_docx_roadmap', False),
+    'detailed_appendix': ('Приложение', '_generate_detailed_appendix', '_docx_appendix', False),
+}
+
+@dataclass
+class ReportDocument:
+    """Промежуточная модель отчета: строится один раз из результатов анализа
+    (build_document) и передается всем экспортерам - HTML, PDF (через HTML)
+    и DOCX. Содержит только данные, поэтому передается в процессы пула.
+    """
+    analysis_data: Dict
+    # Включенные разделы по порядку: (имя, аргументы...) без графиков
+    sections: List[Tuple]
+    # Графики в формате chart_format (для HTML) и в PNG (для DOCX); при
+    # chart_format png это одни и те же картинки
+    charts: Dict[str, bytes]
+    charts_png: Dict[str, bytes]
+
+def _render_docx_file(generator, document: ReportDocument, docx_path: str) -> str:
+    """DOCX отчета в процессе пула: объекты python-docx между процессами не
+    передаются, поэтому документ сохраняется в файл здесь же"""
+    generator.generate_docx(document).save(docx_path)
+    return docx_path
+
+DOCX_TABLE_STYLE = 'Light Grid Accent 1'
+# Символы, недопустимые в XML документа (встречаются в ответах LLM)
+_XML_INVALID_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+class DocxWriter:
+    """Пакетная запись в DOCX поверх python-docx
+
+    Абзацы и таблицы собираются строками WordprocessingML и вставляются в
+    документ одним разбором XML на пакет, а не вызовом add_paragraph /
+    cell.text на каждый элемент: накладные расходы python-docx на вызов
+    (поиск стиля по имени, перестроение сетки таблицы) на больших
+    исследованиях дороже самого содержимого. Идентификаторы стилей
+    разрешаются один раз на документ.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self._body = doc.element.body
+        self._style_ids = {}
+        self._pending = []
+
+    def style_id(self, name: str) -> str:
+        style_id = self._style_ids.get(name)
+        if style_id is None:
+            style_id = self._style_ids[name] = self.doc.styles[name].style_id
+        return style_id
+
+    @staticmethod
+    def _runs(text, bold: bool = False, italic: bool = False) -> str:
+        """Фрагменты <w:r> для текста; переводы строк - <w:br/>"""
+        props = ('<w:b/>' if bold else '') + ('<w:i/>' if italic else '')
+        props = f'<w:rPr>{props}</w:rPr>' if props else ''
+        lines = xml_escape(_XML_INVALID_CHARS.sub('', str(text))).split('\n')
+        return '<w:r>' + props + '<w:br/>'.join(f'<w:t xml:space="preserve">{line}</w:t>' for line in lines) + '</w:r>'
+
+    def _paragraph_xml(self, text, style: str = None, label: str = None, italic: bool = False) -> str:
+        style_xml = f'<w:pPr><w:pStyle w:val="{self.style_id(style)}"/></w:pPr>' if style else ''
+        label_xml = self._runs(f'{label}: ', bold=True) if label else ''
+        return f'<w:p>{style_xml}{label_xml}{self._runs(text, italic=italic)}</w:p>'
+
+    def heading(self, text, level: int = 1):
+        self._pending.append(self._paragraph_xml(text, 'Title' if level == 0 else f'Heading {level}'))
+
+    def paragraph(self, text, style: str = None, label: str = None, italic: bool = False):
+        """Абзац; пустой текст пропускается. label - жирный префикс «label: »"""
+        if text not in (None, ''):
+            self._pending.append(self._paragraph_xml(text, style, label, italic))
+
+    def bullets(self, items, numbered: bool = False):
+        style = 'List Number' if numbered else 'List Bullet'
+        self._pending.extend(self._paragraph_xml(item, style) for item in items if item not in (None, ''))
+
+    def quote(self, text, source: str = None):
+        if text:
+            self.paragraph(f'«{text}»' + (f' - {source}' if source else ''), 'Quote')
+
+    def page_break(self):
+        self._pending.append('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+
+    def table(self, header: List[str], rows, style: str = DOCX_TABLE_STYLE):
+        """Таблица с заголовком: вся таблица - одна строка XML и один разбор"""
+        rows = list(rows)
+        if not rows:
+            return
+        width = 9000 // len(header)
+        grid = f'<w:gridCol w:w="{width}"/>' * len(header)
+
+        def row_xml(cells, bold=False):
+            return '<w:tr>' + ''.join(
+                f'<w:tc><w:tcPr><w:tcW w:w="{width}" w:type="dxa"/></w:tcPr><w:p>{self._runs(cell, bold=bold)}</w:p></w:tc>'
+                for cell in cells
+            ) + '</w:tr>'
+
+        self._pending.append(
+            f'<w:tbl><w:tblPr><w:tblStyle w:val="{self.style_id(style)}"/><w:tblW w:w="0" w:type="auto"/>'
+            f'<w:tblLook w:val="04A0" w:firstRow="1" w:lastRow="0" w:firstColumn="1" w:lastColumn="0" w:noHBand="0" w:noVBand="1"/></w:tblPr>'
+            f'<w:tblGrid>{grid}</w:tblGrid>'
+            + row_xml(header, bold=True) + ''.join(row_xml(['' if cell is None else cell for cell in row]) for row in rows)
+            + '</w:tbl>'
+            # Абзац после таблицы: иначе соседние таблицы Word сливает в одну
+            + '<w:p/>'
+        )
+
+    def picture(self, image: bytes, width_inches: float = 6.0):
+        if image:
+            self.flush()
+            self.doc.add_picture(BytesIO(image), width=Inches(width_inches))
+
+    def flush(self):
+        """Вставить накопленные элементы перед свойствами раздела документа"""
+        if not self._pending:
+            return
+        fragment = parse_xml(f'<w:body {nsdecls("w")}>{"".join(self._pending)}</w:body>')
+        self._pending = []
+        # Фрагмент переносится в документ целиком и только затем разворачивается:
+        # перенос каждого элемента между деревьями lxml по отдельности в разы дольше
+        anchor = self._body.sectPr
+        if anchor is not None:
+            anchor.addprevious(fragment)
+        else:
+            self._body.append(fragment)
+        for element in list(fragment):
+            fragment.addprevious(element)
+        self._body.remove(fragment)
+
 class EnhancedReportGeneratorFixed:
-    def __init__(self, company_config):
+    def __init__(self, company_config, css_href: Optional[str] = None, appendix_href: Optional[str] = None):
+        """css_href - ссылка на внешний файл стилей (см. write_stylesheet) вместо
+        встроенного CSS: при пакетной генерации стили пишутся один раз, а
+        браузер кэширует их между отчетами. По умолчанию отчет самодостаточен.
+
+        appendix_href - каталог фрагментов ленивого приложения относительно
+        отчета (см. write_appendix): карточки интервью не попадают в отчет,
+        а подгружаются браузером постранично.
+        """
         self.config = company_config
+        self.css_href = css_href
+        self.appendix_href = appendix_href
+        # Карточек во встроенном приложении (None - все интервью)
+        self.inline_appendix_limit = 10
         self.colors = {
             'primary': '#18181b',      # Zinc 900 - почти черный
             'secondary': '#3f3f46',     # Zinc 700 - темно-серый
@@ -2603,8 +4742,87 @@ class EnhancedReportGeneratorFixed:
             'background': '#f4f4f5'
         }
 
-    def generate_html(self, analysis_data):
-        """Генерация HTML отчета с учетом брифа"""
+    def generate_html(self, analysis_data, executor: concurrent.futures.Executor = None,
+                      timings: Dict[str, float] = None):
+        """Генерация HTML отчета с учетом брифа одной строкой
+
+        analysis_data - результаты анализа или уже построенный ReportDocument
+        (см. build_document), как и в write_html, iter_html и generate_docx.
+        """
+        return ''.join(self.iter_html(analysis_data, executor, timings))
+
+    def write_html(self, analysis_data, out: Union[str, TextIO], executor: concurrent.futures.Executor = None,
+                   timings: Dict[str, float] = None) -> int:
+        """Запись отчета в файл (путь или открытый текстовый поток) по разделам
+
+        В памяти одновременно находится только текущий раздел (для приложения -
+        карточка одного интервью). Возвращает число записанных символов.
+        """
+        if isinstance(out, str):
+            with open(out, 'w', encoding='utf-8') as f:
+                return self.write_html(analysis_data, f, executor, timings)
+        written = 0
+        for chunk in self.iter_html(analysis_data, executor, timings):
+            out.write(chunk)
+            written += len(chunk)
+        return written
+
+    def iter_html(self, analysis_data, executor: concurrent.futures.Executor = None,
+                  timings: Dict[str, float] = None) -> Iterator[str]:
+        """HTML отчета фрагментами: каждый раздел отдается сразу после рендеринга
+
+        Фрагменты можно писать в файл или в ответ HTTP (после encode('utf-8')),
+        не дожидаясь конца рендеринга. С executor (например, get_render_pool())
+        разделы рендерятся одновременно и собираются в исходном порядке. В
+        timings записывается время рендеринга каждого раздела, с.
+        """
+        with get_tracer().span('report.html', generator='EnhancedReportGeneratorFixed', pooled=executor is not None):
+            yield from self._render_html(analysis_data, executor, timings)
+
+    def _render_html(self, analysis_data, executor: concurrent.futures.Executor = None,
+                     timings: Dict[str, float] = None):
+        document = self.build_document(analysis_data)
+        charts = self._chart_html(document.charts)
+
+        sections = [(name, getattr(self, REPORT_SECTIONS[name][1]), *args)
+                    for name, *args in self._section_args(document, charts)]
+        rendered = self._render_sections(sections, executor, timings)
+
+        yield f'''<!DOCTYPE html>
+<html lang="ru">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{self.config.report_title}</title>
+    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800;900&display=swap" rel="stylesheet">
+    {self._stylesheet_tag()}
+</head>
+<body>
+'''
+        yield from rendered
+        yield '''
+</body>
+</html>'''
+
+    def build_document(self, analysis_data) -> ReportDocument:
+        """Промежуточная модель отчета: план разделов и графики (все форматы
+        одним пакетом). Готовый ReportDocument возвращается как есть.
+        """
+        if isinstance(analysis_data, ReportDocument):
+            return analysis_data
+        with get_tracer().span('report.document'):
+            with get_tracer().span('report.charts'):
+                charts, charts_png = self._render_chart_images(analysis_data)
+            return ReportDocument(analysis_data, self._report_plan(analysis_data), charts, charts_png)
+
+    def _section_args(self, document: ReportDocument, charts: Dict) -> List[Tuple]:
+        """Разделы документа с аргументами для экспорта: charts - графики в
+        формате экспортера (HTML-фрагменты или PNG)"""
+        return [(name, *args, charts) if REPORT_SECTIONS[name][3] else (name, *args)
+                for name, *args in document.sections]
+
+    def _report_plan(self, analysis_data) -> List[Tuple]:
+        """Включенные разделы отчета по порядку: (имя, аргументы...), общий план HTML и DOCX"""
         # Извлекаем данные брифа
         brief_data = analysis_data.get('brief_data', None)
         brief_answers = analysis_data.get('brief_answers', {})
@@ -2620,9 +4838,6 @@ class EnhancedReportGeneratorFixed:
         current_metrics = analysis_data.get('current_metrics', {})
         personas = analysis_data.get('personas', [])
 
-        # Генерация статичных графиков
-        charts = self._generate_static_charts(analysis_data)
-
         # Проверяем наличие данных
         has_brief = brief_data is not None
         has_segments = len(base.get('segments', [])) > 0
@@ -2634,43 +4849,105 @@ class EnhancedReportGeneratorFixed:
         has_brief_answers = bool(brief_answers.get('answers', []))
         has_goal_achievement = bool(goal_achievement.get('goals', []))
 
-        # HTML со всеми разделами
-        html = f'''<!DOCTYPE html>
-<html lang="ru">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{self.config.report_title}</title>
-    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800;900&display=swap" rel="stylesheet">
-    <style>
-        {self._get_professional_css()}
-    </style>
-</head>
-<body>
-    {self._generate_cover_page()}
-    {self._generate_table_of_contents(analysis_data)}
-    {self._generate_brief_section(brief_data) if has_brief else ''}
-    {self._generate_overview_section(analysis_data, charts)}
-    {self._generate_goal_achievement_section(goal_achievement) if has_goal_achievement else ''}
-    {self._generate_brief_answers_section(brief_answers) if has_brief_answers else ''}
-    {self._generate_current_state_section(current_metrics, charts) if current_metrics.get('estimated_nps') != 'Недостаточно данных' else ''}
-    {self._generate_key_metrics_section(analysis_data, charts) if defense.get('key_findings', []) else ''}
-    {self._generate_user_segments_section(base.get('segments', []), charts) if has_segments else ''}
-    {self._generate_personas_section(personas) if has_personas else ''}
-    {self._generate_pain_points_section_full(base.get('problems', []), charts) if has_problems else ''}
-    {self._generate_behavioral_patterns_section_full(findings.behavioral_patterns if findings else []) if has_patterns else ''}
-    {self._generate_emotional_journey_section(summaries)}
-    {self._generate_insights_section_full(base.get('insights', [])) if has_insights else ''}
-    {self._generate_contradictions_section(summaries)}
-    {self._generate_quotes_section(summaries)}
-    {self._generate_recommendations_section_full(recs) if has_recommendations else ''}
-    {self._generate_priority_matrix_section(recs) if has_recommendations else ''}
-    {self._generate_roadmap_section(defense) if defense.get('next_steps', []) else ''}
-    {self._generate_detailed_appendix(summaries, analysis_data)}
-</body>
-</html>'''
-
-        return html
+        # Разделы отчета: (имя, аргументы) для включенных разделов
+        sections = [
+            ('cover_page',),
+            ('table_of_contents', analysis_data),
+            has_brief and ('brief', brief_data),
+            ('overview', analysis_data),
+            has_goal_achievement and ('goal_achievement', goal_achievement),
+            has_brief_answers and ('brief_answers', brief_answers),
+            current_metrics.get('estimated_nps') != 'Недостаточно данных' and ('current_state', current_metrics),
+            bool(defense.get('key_findings', [])) and ('key_metrics', analysis_data),
+            has_segments and ('user_segments', base.get('segments', [])),
+            has_personas and ('personas', personas),
+            has_problems and ('pain_points', base.get('problems', [])),
+            has_patterns and ('behavioral_patterns', findings.behavioral_patterns if findings else []),
+            ('emotional_journey', summaries),
+            has_insights and ('insights', base.get('insights', [])),
+            ('contradictions', summaries),
+            ('quotes', summaries),
+            has_recommendations and ('recommendations', recs),
+            has_recommendations and ('priority_matrix', recs),
+            bool(defense.get('next_steps', [])) and ('roadmap', defense),
+            ('detailed_appendix', summaries, analysis_data),
+        ]
+        return list(filter(None, sections))
+
+    def _stylesheet(self) -> Tuple[str, str, str]:
+        """CSS отчета, его отпечаток (sha256) и тег <style> из кэша по палитре"""
+        key = tuple(sorted(self.colors.items()))
+        with _report_css_lock:
+            cached = _report_css_cache.get(key)
+            if cached is None:
+                css = self._get_professional_css()
+                fingerprint = hashlib.sha256(css.encode('utf-8')).hexdigest()[:12]
+                cached = _report_css_cache[key] = (css, fingerprint,
+                                                   f'<style data-fingerprint="{fingerprint}">{css}</style>')
+        return cached
+
+    def _stylesheet_tag(self) -> str:
+        """Встроенный CSS с отпечатком или ссылка на внешний файл стилей"""
+        if self.css_href:
+            return f'<link rel="stylesheet" href="{self.css_href}">'
+        return self._stylesheet()[2]
+
+    def write_stylesheet(self, directory: str) -> str:
+        """Файл стилей с отпечатком в имени (если его еще нет); возвращает имя файла
+
+        При изменении CSS или палитры меняется и имя файла, поэтому старые
+        отчеты продолжают ссылаться на свои стили.
+        """
+        css, fingerprint, _ = self._stylesheet()
+        filename = f"ux_report.{fingerprint}.css"
+        path = os.path.join(directory, filename)
+        if not os.path.exists(path):
+            os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(css)
+            os.replace(tmp_path, path)
+        return filename
+
+    def _render_sections(self, sections: List, executor: concurrent.futures.Executor = None,
+                         timings: Dict[str, float] = None) -> Iterator[str]:
+        """HTML разделов по порядку; с executor все разделы сразу отправляются в пул"""
+        if executor is None:
+            return (chunk for name, render, *args in sections
+                    for chunk in self._section(name, render, *args, timings=timings))
+        futures = [(name, executor.submit(_render_timed, render, args)) for name, render, *args in sections]
+        return self._collect_sections(futures, timings)
+
+    def _collect_sections(self, futures: List, timings: Dict[str, float] = None) -> Iterator[str]:
+        """Результаты пула в порядке разделов; span раздела - ожидание результата"""
+        try:
+            for name, future in futures:
+                with get_tracer().span(f'report.{name}', pooled=True) as span:
+                    html, seconds = future.result()
+                    span.set(render_seconds=round(seconds, 4))
+                if timings is not None:
+                    timings[name] = seconds
+                yield html
+        finally:
+            # Отчет брошен на середине - оставшиеся разделы не нужны
+            for _, future in futures:
+                future.cancel()
+
+    def _section(self, name: str, render, *args, timings: Dict[str, float] = None) -> Iterator[str]:
+        """Раздел отчета в отдельном span трассировки
+
+        Функция раздела возвращает строку или итератор фрагментов (для
+        разделов, растущих с числом интервью).
+        """
+        with get_tracer().span(f'report.{name}'):
+            started = time.perf_counter()
+            content = render(*args)
+            if isinstance(content, str):
+                yield content
+            else:
+                yield from content
+        if timings is not None:
+            timings[name] = time.perf_counter() - started
 
     def _generate_brief_section(self, brief_data):
         """Генерация раздела с брифом исследования"""
@@ -3307,6 +5584,52 @@ class EnhancedReportGeneratorFixed:
             box-shadow: 0 1px 3px rgba(0, 0, 0, 0.1);
         }}
 
+        .appendix-item {{
+            margin-bottom: 12px;
+            border: 1px solid {self.colors['border']};
+            border-radius: 12px;
+            background: {self.colors['white']};
+        }}
+
+        .appendix-item summary {{
+            padding: 16px 20px;
+            cursor: pointer;
+            font-weight: 600;
+        }}
+
+        .appendix-item .card,
+        .appendix-item .appendix-loading {{
+            margin: 0 20px 20px;
+        }}
+
+        .appendix-pager {{
+            display: flex;
+            align-items: center;
+            justify-content: center;
+            gap: 16px;
+            margin-top: 20px;
+        }}
+
+        .appendix-pager button {{
+            padding: 6px 14px;
+            border: 1px solid {self.colors['border']};
+            border-radius: 8px;
+            background: {self.colors['white']};
+            cursor: pointer;
+        }}
+
+        .chart-svg {{
+            display: block;
+            width: 100%;
+            height: auto;
+            margin: 0 auto;
+        }}
+
+        .chart-svg * {{
+            stroke-linejoin: round;
+            stroke-linecap: butt;
+        }}
+
         .pain-point-card {{
             background: {self.colors['white']};
             border-radius: 12px;
@@ -3382,7 +5705,7 @@ class EnhancedReportGeneratorFixed:
 
     def _generate_cover_page(self):
         """Генерация титульной страницы"""
-        current_date = datetime.now().strftime("%d.%m.%Y")
+        current_date = report_date_html()
         return f'''
         <div class="cover-page">
             <div style="position: relative; z-index: 1;">
@@ -4572,11 +6895,20 @@ class EnhancedReportGeneratorFixed:
         </div>
         '''
 
-    def _generate_detailed_appendix(self, summaries, analysis_data):
-        """Генерация детального приложения"""
-        appendix_html = '<h3>Детальная информация по интервью</h3>'
+    def _generate_detailed_appendix(self, summaries, analysis_data) -> Iterator[str]:
+        """Генерация детального приложения: карточки интервью отдаются по одной"""
+        yield '''
+        <div class="page" id="appendix">
+            <div class="container">
+                <h2>Приложение</h2>
+
+                <h3>Детальная информация по интервью</h3>'''
 
-        for summary in summaries[:10]:  # Ограничиваем для читаемости
+        if self.appendix_href:
+            yield self._lazy_appendix(summaries)
+            summaries = []
+
+        for summary in summaries[:self.inline_appendix_limit]:  # Ограничиваем для читаемости
             profile = summary.respondent_profile
 
             # Ключевые темы
@@ -4606,7 +6938,7 @@ class EnhancedReportGeneratorFixed:
                         insights_html += f'<li>{insight[:150]}...</li>'
                 insights_html += '</ul>'
 
-            appendix_html += f'''
+            yield f'''
             <div class="card" style="margin-bottom: 30px;">
                 <h4>Интервью #{summary.interview_id}</h4>
 
@@ -4629,7 +6961,7 @@ class EnhancedReportGeneratorFixed:
             '''
 
         # Методология
-        methodology_html = f'''
+        yield f'''
         <h3 style="margin-top: 50px;">Методология исследования</h3>
         <div class="card">
             <h4>Сбор данных</h4>
@@ -4657,149 +6989,179 @@ class EnhancedReportGeneratorFixed:
         </div>
         '''
 
-        return f'''
-        <div class="page" id="appendix">
-            <div class="container">
-                <h2>Приложение</h2>
-
-                {appendix_html}
-                {methodology_html}
-
+        yield f'''
                 <div class="card" style="margin-top: 40px; background: {self.colors['background']};">
                     <h4>Контактная информация</h4>
                     <p><strong>Подготовлено:</strong> {self.config.author}</p>
                     <p><strong>Организация:</strong> {self.config.name}</p>
-                    <p><strong>Дата:</strong> {datetime.now().strftime("%d.%m.%Y")}</p>
+                    <p><strong>Дата:</strong> {report_date_html()}</p>
                 </div>
             </div>
         </div>
         '''
 
-    def _generate_static_charts(self, analysis_data):
-        """Генерация статичных графиков в base64"""
-        charts = {}
+    def _lazy_appendix(self, summaries) -> str:
+        """Каркас ленивого приложения: остров данных, постраничная навигация и скрипт"""
+        manifest = {
+            'base': self.appendix_href,
+            'count': len(summaries),
+            'pageSize': config['output'].get('appendix_page_size', 20),
+            # Отпечаток содержимого карточек: браузер не берет из кэша фрагменты другого
+            # отчета, даже если номера интервью совпадают
+            'version': self._appendix_version(summaries)
+        }
+        manifest_json = json.dumps(manifest, ensure_ascii=False).replace('</', '<\\/')
+        return f'''
+                <div id="ux-appendix" class="appendix-lazy">
+                    <p style="color: {self.colors['text_secondary']};">Интервью: {len(summaries)}. Нажмите на интервью, чтобы открыть карточку.</p>
+                    <noscript><p>Для просмотра карточек интервью включите JavaScript.</p></noscript>
+                    <div class="appendix-list"></div>
+                    <div class="appendix-pager">
+                        <button type="button" data-step="-1">&larr;</button>
+                        <span class="appendix-page"></span>
+                        <button type="button" data-step="1">&rarr;</button>
+                    </div>
+                </div>
+                <script type="application/json" id="ux-appendix-data">{manifest_json}</script>
+                {APPENDIX_LAZY_SCRIPT}'''
 
-        try:
-            # График распределения проблем по severity
-            problems = analysis_data.get('base_analysis', {}).get('problems', [])
-            if problems:
-                severity_counts = {}
-                for p in problems:
-                    sev = p.get('severity', 'medium')
-                    severity_counts[sev] = severity_counts.get(sev, 0) + 1
-
-                if severity_counts:
-                    plt.figure(figsize=(8, 6))
-                    colors_map = {
-                        'critical': self.colors['danger'],
-                        'high': self.colors['warning'],
-                        'medium': self.colors['primary'],
-                        'low': self.colors['success']
-                    }
+    @staticmethod
+    def _appendix_version(summaries) -> str:
+        """Хеш данных, которые write_appendix записывает во фрагменты интервью"""
+        digest = hashlib.sha256()
+        for summary in summaries:
+            digest.update(_appendix_fragment('interview', _appendix_record(summary)).encode('utf-8'))
+        return digest.hexdigest()[:8]
 
-                    severities = list(severity_counts.keys())
-                    counts = list(severity_counts.values())
-                    colors = [colors_map.get(s, self.colors['primary']) for s in severities]
+    def write_appendix(self, analysis_data, directory: str) -> int:
+        """Фрагменты ленивого приложения: оглавление и по файлу на интервью
 
-                    plt.bar(severities, counts, color=colors)
-                    plt.title('Распределение проблем по критичности', fontsize=16, pad=20)
-                    plt.xlabel('Критичность', fontsize=12)
-                    plt.ylabel('Количество проблем', fontsize=12)
+        Возвращает число записанных фрагментов интервью. Отчет с
+        appendix_href ссылается на этот каталог.
+        """
+        summaries = analysis_data.get('interview_summaries', [])
+        os.makedirs(directory, exist_ok=True)
+        index = [{'id': summary.interview_id,
+                  'title': str(summary.respondent_profile.get('demographics', ''))[:60]}
+                 for summary in summaries]
+        with open(os.path.join(directory, 'index.js'), 'w', encoding='utf-8') as f:
+            f.write(_appendix_fragment('index', index))
+        for summary in summaries:
+            with open(os.path.join(directory, f'interview_{summary.interview_id}.js'), 'w', encoding='utf-8') as f:
+                f.write(_appendix_fragment('interview', _appendix_record(summary)))
+        return len(summaries)
 
-                    buffer = BytesIO()
-                    plt.tight_layout()
-                    plt.savefig(buffer, format='png', dpi=150, bbox_inches='tight', facecolor='white')
-                    buffer.seek(0)
-                    image_base64 = base64.b64encode(buffer.getvalue()).decode()
-                    plt.close()
+    def _chart_specs(self, analysis_data) -> Dict[str, Dict]:
+        """Описания графиков отчета: данные и оформление, без отрисовки"""
+        specs = {}
+        dpi = config['output'].get('chart_dpi', 150)
+        chart_format = config['output'].get('chart_format', 'png')
 
-                    charts['problems_chart'] = f'''
-                    <div class="chart-container">
-                        <img src="data:image/png;base64,{image_base64}" style="width: 100%; max-width: 800px; margin: 0 auto; display: block;">
-                    </div>
-                    '''
+        # График распределения проблем по severity
+        problems = analysis_data.get('base_analysis', {}).get('problems', [])
+        severity_counts = {}
+        for p in problems:
+            sev = p.get('severity', 'medium')
+            severity_counts[sev] = severity_counts.get(sev, 0) + 1
+
+        if severity_counts:
+            colors_map = {
+                'critical': self.colors['danger'],
+                'high': self.colors['warning'],
+                'medium': self.colors['primary'],
+                'low': self.colors['success']
+            }
+            specs['problems_chart'] = {
+                'kind': 'bar',
+                'labels': list(severity_counts.keys()),
+                'values': list(severity_counts.values()),
+                'colors': [colors_map.get(s, self.colors['primary']) for s in severity_counts],
+                'title': 'Распределение проблем по критичности',
+                'xlabel': 'Критичность',
+                'ylabel': 'Количество проблем',
+                'figsize': [8, 6],
+                'dpi': dpi,
+                'format': chart_format
+            }
 
-            # График сегментов
-            segments = analysis_data.get('base_analysis', {}).get('segments', [])
-            if segments:
-                plt.figure(figsize=(10, 6))
-                segment_names = [s.get('name', f'Сегмент {i+1}')[:20] for i, s in enumerate(segments)]
-                segment_sizes = []
-
-                for s in segments:
-                    size_str = s.get('size', '0%')
-                    # Извлекаем число из строки типа "30-40%" или "3-4 из 8"
-                    import re
-                    match = re.search(r'(\d+)', size_str)
-                    if match:
-                        segment_sizes.append(int(match.group(1)))
-                    else:
-                        segment_sizes.append(20)  # default
+        # График сегментов
+        segments = analysis_data.get('base_analysis', {}).get('segments', [])
+        if segments:
+            segment_sizes = []
+            for s in segments:
+                # Извлекаем число из строки типа "30-40%" или "3-4 из 8"
+                match = re.search(r'(\d+)', s.get('size', '0%'))
+                segment_sizes.append(int(match.group(1)) if match else 20)
+
+            specs['segments_chart'] = {
+                'kind': 'pie',
+                'labels': [s.get('name', f'Сегмент {i+1}')[:20] for i, s in enumerate(segments)],
+                'values': segment_sizes,
+                'colormap': 'Set3',
+                'title': 'Распределение пользователей по сегментам',
+                'figsize': [10, 6],
+                'dpi': dpi,
+                'format': chart_format
+            }
+
+        return specs
 
-                if segment_sizes:
-                    colors = plt.cm.Set3(range(len(segments)))
-                    plt.pie(segment_sizes, labels=segment_names, autopct='%1.0f%%', colors=colors, startangle=90)
-                    plt.title('Распределение пользователей по сегментам', fontsize=16, pad=20)
+    def _render_chart_images(self, analysis_data, with_png: bool = True) -> Tuple[Dict[str, bytes], Dict[str, bytes]]:
+        """Картинки графиков в chart_format и в PNG (with_png - для DOCX): все
+        недостающие в кэше отрисовываются одним пакетом в пуле процессов"""
+        try:
+            specs = self._chart_specs(analysis_data)
+            batch = dict(specs)
+            if with_png:
+                batch.update({f'{name}.png': {**spec, 'format': 'png'}
+                              for name, spec in specs.items() if spec['format'] != 'png'})
+            images = render_charts(batch)
+        except Exception as e:
+            logging.error(f"Ошибка при генерации графиков: {e}")
+            return {}, {}
+        charts = {name: images[name] for name in specs}
+        charts_png = {name: images.get(f'{name}.png', image) for name, image in charts.items()} if with_png else {}
+        return charts, charts_png
 
-                    buffer = BytesIO()
-                    plt.tight_layout()
-                    plt.savefig(buffer, format='png', dpi=150, bbox_inches='tight', facecolor='white')
-                    buffer.seek(0)
-                    image_base64 = base64.b64encode(buffer.getvalue()).decode()
-                    plt.close()
+    def _chart_html(self, images: Dict[str, bytes]) -> Dict[str, str]:
+        """Графики для HTML: SVG встраивается как есть, PNG - в base64"""
+        charts = {}
+        max_widths = {'problems_chart': 800, 'segments_chart': 600}
+
+        for name, image in images.items():
+            if image.startswith(b'<svg'):
+                svg = image.decode('utf-8').replace(
+                    '<svg class="chart-svg"', f'<svg class="chart-svg" style="max-width: {max_widths[name]}px;"', 1
+                )
+                charts[name] = f'<div class="chart-container">{svg}</div>'
+                continue
 
-                    charts['segments_chart'] = f'''
+            image_base64 = base64.b64encode(image).decode()
+            charts[name] = f'''
                     <div class="chart-container">
-                        <img src="data:image/png;base64,{image_base64}" style="width: 100%; max-width: 600px; margin: 0 auto; display: block;">
+                        <img src="data:image/png;base64,{image_base64}" style="width: 100%; max-width: {max_widths[name]}px; margin: 0 auto; display: block;">
                     </div>
                     '''
 
-        except Exception as e:
-            logging.error(f"Ошибка при генерации графиков: {e}")
-
         return charts
 
+    def _generate_static_charts(self, analysis_data):
+        """Генерация статичных графиков (PNG в base64 или SVG): из кэша или в пуле процессов"""
+        return self._chart_html(self._render_chart_images(analysis_data, with_png=False)[0])
+
     def generate_docx(self, analysis_data):
-        """Генерация DOCX отчета"""
+        """Генерация DOCX отчета: те же разделы, что и в HTML (см. _report_plan)"""
+        document = self.build_document(analysis_data)
         doc = Document()
 
         # Настройка стилей
         self._setup_docx_styles(doc)
+        writer = DocxWriter(doc)
 
-        # Заголовок
-        doc.add_heading(self.config.report_title, 0)
-        doc.add_paragraph(f'{self.config.name}\n{datetime.now().strftime("%d.%m.%Y")}')
-        doc.add_page_break()
-
-        # Оглавление
-        doc.add_heading('Содержание', level=1)
-        doc.add_paragraph('1. Общий обзор')
-        doc.add_paragraph('2. Ключевые находки')
-        doc.add_paragraph('3. Сегменты пользователей')
-        doc.add_paragraph('4. Персоны')
-        doc.add_paragraph('5. Ключевые проблемы')
-        doc.add_paragraph('6. Рекомендации')
-        doc.add_paragraph('7. Дорожная карта')
-        doc.add_paragraph('8. Приложение')
-        doc.add_page_break()
-
-        # Общий обзор
-        self._add_overview_to_docx(doc, analysis_data)
-
-        # Ключевые находки
-        self._add_key_findings_to_docx(doc, analysis_data)
-
-        # Сегменты
-        self._add_segments_to_docx(doc, analysis_data)
-
-        # Персоны
-        self._add_personas_to_docx(doc, analysis_data)
-
-        # Проблемы
-        self._add_problems_to_docx(doc, analysis_data)
-
-        # Рекомендации
-        self._add_recommendations_to_docx(doc, analysis_data)
+        for name, *args in self._section_args(document, document.charts_png):
+            with get_tracer().span(f'report.docx.{name}'):
+                getattr(self, REPORT_SECTIONS[name][2])(writer, *args)
+        writer.flush()
 
         return doc
 
@@ -4820,100 +7182,949 @@ class EnhancedReportGeneratorFixed:
         heading2.font.size = Pt(18)
         heading2.font.color.rgb = RGBColor(37, 99, 235)
 
-    def _add_overview_to_docx(self, doc, analysis_data):
-        """Добавление обзора в DOCX"""
-        doc.add_heading('Общий обзор', level=1)
+    def _docx_cover_page(self, w: DocxWriter):
+        w.heading(self.config.report_title, 0)
+        w.paragraph(self.config.name)
+        w.paragraph(self.config.author, label='Автор')
+        w.paragraph(datetime.now().strftime("%d.%m.%Y"), label='Дата')
+        w.page_break()
+
+    def _docx_table_of_contents(self, w: DocxWriter, analysis_data):
+        # Оглавление строится по тому же плану, что и разделы документа
+        titles = [REPORT_SECTIONS[name][0] for name, *_ in self._report_plan(analysis_data)]
+        w.heading('Содержание', level=1)
+        w.bullets([title for title in titles if title], numbered=True)
+        w.page_break()
+
+    def _docx_brief(self, w: DocxWriter, brief_data):
+        w.heading('Контекст исследования', level=1)
+        for key, title in (('research_goals', 'Цели исследования'), ('research_questions', 'Исследовательские вопросы'),
+                           ('success_metrics', 'Метрики успеха'), ('constraints', 'Ограничения')):
+            if brief_data.get(key):
+                w.heading(title, level=2)
+                w.bullets(brief_data[key])
+        w.paragraph(brief_data.get('target_audience'), label='Целевая аудитория')
+        w.paragraph(brief_data.get('business_context'), label='Бизнес-контекст')
+
+    def _docx_overview(self, w: DocxWriter, analysis_data, charts):
+        w.heading('Общий обзор исследования', level=1)
+        w.paragraph(analysis_data.get('defense_materials', {}).get('executive_summary', ''))
+        w.table(['Интервью', 'Проблем', 'Сегментов', 'Quick Wins'], [[
+            analysis_data.get('total_interviews', 0),
+            len(analysis_data.get('base_analysis', {}).get('problems', [])),
+            len(analysis_data.get('base_analysis', {}).get('segments', [])),
+            len(analysis_data.get('recommendations', {}).get('quick_wins', []))
+        ]])
+        w.picture(charts.get('overview_chart'))
+
+    def _docx_goal_achievement(self, w: DocxWriter, goal_achievement):
+        w.heading('Достижение целей исследования', level=1)
+        overall = goal_achievement.get('overall_success', {})
+        w.paragraph(overall.get('success_rate', 'Не определен'), label='Общий прогресс')
+        if overall.get('key_achievements'):
+            w.paragraph('Ключевые достижения:', label=None)
+            w.bullets(overall['key_achievements'])
+        if overall.get('main_gaps'):
+            w.paragraph('Основные пробелы:')
+            w.bullets(overall['main_gaps'])
 
-        defense = analysis_data.get('defense_materials', {})
-        exec_summary = defense.get('executive_summary', '')
+        for goal_data in goal_achievement.get('goals', []):
+            w.heading(f"Цель: {goal_data.get('goal', '')}", level=2)
+            w.paragraph(f"{goal_data.get('achievement_level', 'not_achieved')} "
+                        f"({goal_data.get('achievement_percentage', 0)}%)", label='Достижение')
+            if goal_data.get('results'):
+                w.paragraph('Результаты:')
+                w.bullets(goal_data['results'])
+            w.table(['Доказательство', 'Сила'],
+                    [[e.get('content', ''), e.get('strength', 'moderate')]
+                     for e in goal_data.get('evidence', []) if isinstance(e, dict)])
+            for quote in goal_data.get('quotes', []):
+                w.quote(quote.get('quote', quote.get('text', '')) if isinstance(quote, dict) else quote)
+            if goal_data.get('gaps'):
+                w.paragraph('Что не удалось выяснить:')
+                w.bullets(goal_data['gaps'])
+            if goal_data.get('recommendations'):
+                w.paragraph('Рекомендации:')
+                w.bullets(goal_data['recommendations'])
+
+        metrics_progress = goal_achievement.get('metrics_progress', [])
+        if metrics_progress:
+            w.heading('Прогресс по метрикам успеха', level=2)
+            w.table(['Метрика', 'Базовое значение', 'Цель', 'Прогноз', 'Уверенность'], [
+                [m.get('metric', ''), m.get('baseline', 'Не определено'), m.get('target', 'Не определено'),
+                 m.get('projected_improvement', 'Не определено'), m.get('confidence', 'medium')]
+                for m in metrics_progress
+            ])
+
+    def _docx_brief_answers(self, w: DocxWriter, brief_answers):
+        w.heading('Ответы на исследовательские вопросы', level=1)
+        for i, answer_data in enumerate(brief_answers.get('answers', []), 1):
+            w.heading(f"Вопрос #{i}: {answer_data.get('question', '')}", level=2)
+            w.paragraph(answer_data.get('answer_summary'), label='Краткий ответ')
+            w.paragraph(answer_data.get('answer'), label='Полный ответ')
+            w.paragraph(answer_data.get('confidence', 'medium'), label='Уверенность')
+            w.table(['Тип', 'Доказательство', 'Источник'],
+                    [[e.get('type', ''), e.get('content', ''), e.get('source', '')]
+                     for e in answer_data.get('supporting_evidence', []) if isinstance(e, dict)])
+            for quote_data in answer_data.get('key_quotes', []):
+                w.quote(quote_data.get('quote', ''), f"Интервью {quote_data.get('interview_id', '')}")
+            if answer_data.get('data_gaps'):
+                w.paragraph('Пробелы в данных:')
+                w.bullets(answer_data['data_gaps'])
+            if answer_data.get('recommendations'):
+                w.paragraph('Рекомендации:')
+                w.bullets(answer_data['recommendations'])
+
+        cross_insights = brief_answers.get('cross_question_insights', [])
+        if cross_insights:
+            w.heading('Инсайты, связывающие несколько вопросов', level=2)
+            w.table(['Инсайт', 'Связанные вопросы', 'Импликация'],
+                    [[insight.get('insight', ''), ', '.join(map(str, insight.get('related_questions', []))),
+                      insight.get('implication', '')] for insight in cross_insights])
+
+        unexpected = brief_answers.get('unexpected_findings', [])
+        if unexpected:
+            w.heading('Неожиданные находки', level=2)
+            w.table(['Находка', 'Важность', 'Рекомендация'],
+                    [[f.get('finding', ''), f.get('importance', ''), f.get('recommendation', '')] for f in unexpected])
+
+    def _docx_current_state(self, w: DocxWriter, metrics, charts):
+        w.heading('Текущее состояние продукта', level=1)
+        negative_ratio = metrics.get('negative_emotion_ratio', 0)
+        w.table(['Показатель', 'Значение'], [
+            ['NPS (оценка)', metrics.get('estimated_nps', 'Н/Д')],
+            ['Риск оттока', metrics.get('churn_risk', 'Не определен')],
+            ['Среднее количество проблем', metrics.get('avg_pains_per_user', 0)],
+            ['Среднее количество потребностей', metrics.get('avg_needs_per_user', 0)],
+            ['Негативные эмоции', f"{negative_ratio:.0f}%" if isinstance(negative_ratio, (int, float)) else negative_ratio],
+        ])
+        w.paragraph(f"На основе анализа {metrics.get('sample_size', 0)} интервью и "
+                    f"{metrics.get('total_emotions_analyzed', 0)} эмоциональных моментов", italic=True)
+        w.picture(charts.get('metrics_chart'))
+
+    def _docx_key_metrics(self, w: DocxWriter, analysis_data, charts):
+        w.heading('Ключевые находки исследования', level=1)
+        for i, finding in enumerate(analysis_data.get('defense_materials', {}).get('key_findings', [])[:5], 1):
+            w.heading(f'Находка #{i}', level=2)
+            w.paragraph(finding)
+        w.picture(charts.get('findings_chart'))
+
+    def _docx_user_segments(self, w: DocxWriter, segments, charts):
+        w.heading('Сегменты пользователей', level=1)
+        w.picture(charts.get('segments_chart'))
+        for i, segment in enumerate(segments[:5]):
+            w.heading(segment.get('name', f'Сегмент {i+1}'), level=2)
+            w.paragraph(segment.get('size', 'Размер не определен'), label='Размер')
+            w.paragraph(segment.get('description', ''))
+            demographics = segment.get('demographics', {})
+            w.paragraph(demographics.get('age_range'), label='Возраст')
+            w.paragraph(', '.join(demographics.get('occupation_types', [])[:3]), label='Профессии')
+            w.paragraph(demographics.get('location'), label='Локация')
+            usage_patterns = segment.get('behavioral_traits', {}).get('usage_patterns', [])
+            if usage_patterns:
+                w.paragraph('Поведение:')
+                w.bullets(usage_patterns[:3])
+            if segment.get('pain_points'):
+                w.paragraph('Основные проблемы:')
+                w.bullets(segment['pain_points'][:3])
+            for quote in segment.get('representative_quotes', [])[:2]:
+                w.quote(quote.get('text', '') if isinstance(quote, dict) else quote)
+            w.paragraph(', '.join(map(str, segment.get('interview_ids', [])[:5])), label='Интервью')
+
+    def _docx_personas(self, w: DocxWriter, personas):
+        w.heading('Персоны пользователей', level=1)
+        for i, persona in enumerate(personas[:4]):
+            w.heading(persona.get('name', f'Персона {i+1}'), level=2)
+            w.paragraph(persona.get('tagline'), italic=True)
+            w.paragraph(persona.get('description', ''))
+            demo = persona.get('demographics', {})
+            w.table(['Возраст', 'Профессия', 'Локация'],
+                    [[demo.get('age', 'Н/Д'), demo.get('occupation', 'Н/Д'), demo.get('location', 'Н/Д')]])
+            if persona.get('goals'):
+                w.paragraph('Цели:')
+                w.bullets(persona['goals'][:3])
+            if persona.get('frustrations'):
+                w.paragraph('Фрустрации:')
+                w.bullets(persona['frustrations'][:3])
+            for quote in persona.get('real_quotes', [])[:3]:
+                w.quote(quote)
+            w.paragraph(persona.get('typical_scenario'), label='Типичный сценарий')
+            w.paragraph(', '.join(map(str, persona.get('based_on_interviews', [])[:3])), label='Основана на интервью')
+
+    def _docx_pain_points(self, w: DocxWriter, problems, charts):
+        w.heading('Ключевые проблемы пользователей', level=1)
+        w.picture(charts.get('problems_chart'))
+        w.table(['#', 'Проблема', 'Критичность', 'Затронуто', 'Приоритет', 'Усилия'], [
+            [i, problem.get('title', problem.get('problem_title', 'Проблема')), problem.get('severity', 'medium'),
+             problem.get('affected_percentage', 'Н/Д'), problem.get('priority', 'P2'), problem.get('effort', 'M')]
+            for i, problem in enumerate(problems[:10], 1)
+        ])
+        for i, problem in enumerate(problems[:10], 1):
+            w.heading(f"#{i}. {problem.get('title', problem.get('problem_title', 'Проблема'))}", level=2)
+            w.paragraph(problem.get('description', problem.get('problem_description', '')))
+            if problem.get('evidence'):
+                w.paragraph('Доказательства:')
+                w.bullets(problem['evidence'][:3])
+            for quote_data in problem.get('quotes', [])[:2]:
+                if isinstance(quote_data, dict):
+                    w.quote(quote_data.get('text', ''), f"Интервью {quote_data.get('interview_id', '')}")
+            opportunity = problem.get('opportunity', {})
+            if isinstance(opportunity, dict):
+                w.paragraph(opportunity.get('description'), label='Возможность')
+                w.paragraph(opportunity.get('value_prop'), label='Ценностное предложение')
 
-        doc.add_paragraph(exec_summary)
+    def _docx_behavioral_patterns(self, w: DocxWriter, patterns):
+        w.heading('Поведенческие паттерны', level=1)
+        for i, pattern in enumerate(patterns[:8], 1):
+            w.heading(pattern.get('pattern', f'Паттерн {i}'), level=2)
+            w.paragraph(f"{pattern.get('frequency', '')}; сила: {pattern.get('strength', 'moderate')}", label='Частота')
+            w.paragraph(pattern.get('description', ''))
+            w.table(['Доказательство', 'Интервью'],
+                    [[e.get('content', ''), ', '.join(map(str, e.get('interview_ids', [])))]
+                     for e in pattern.get('evidence', [])[:3] if isinstance(e, dict)])
+            w.table(['Триггер', 'Тип', 'Надежность'],
+                    [[t.get('trigger', ''), t.get('type', ''), t.get('reliability', '')]
+                     for t in pattern.get('triggers', [])[:3] if isinstance(t, dict)])
+            w.table(['Этап', 'Эмоция', 'Интенсивность'],
+                    [[stage.get('stage', ''), stage.get('emotion', ''), f"{stage.get('intensity', 0)}/10"]
+                     for stage in pattern.get('emotional_journey', [])[:4] if isinstance(stage, dict)])
+            design_impl = pattern.get('design_implications', {})
+            if isinstance(design_impl, dict):
+                w.paragraph(design_impl.get('support_pattern'), label='Поддержать паттерн')
+                w.paragraph(design_impl.get('break_pattern'), label='Изменить паттерн')
+                w.paragraph(', '.join(design_impl.get('intervention_points', [])), label='Точки вмешательства')
+            for quote in pattern.get('representative_quotes', [])[:2]:
+                w.quote(quote.get('text', quote.get('quote', '')) if isinstance(quote, dict) else quote)
+
+    def _docx_emotional_journey(self, w: DocxWriter, summaries):
+        w.heading('Эмоциональный опыт пользователей', level=1)
+        emotions = [
+            {'interview_id': summary.interview_id, **emotion}
+            for summary in summaries for emotion in summary.emotional_journey[:5] if isinstance(emotion, dict)
+        ]
+        if not emotions:
+            w.paragraph('Эмоциональные моменты в интервью не выделены.')
+            return
+        peaks = sorted(emotions, key=lambda e: e.get('intensity', 0) or 0, reverse=True)[:5]
+        w.heading('Эмоциональные пики', level=2)
+        w.table(['Момент', 'Эмоция', 'Интенсивность', 'Триггер', 'Интервью'],
+                [[e.get('moment', ''), e.get('emotion', ''), e.get('intensity', 0), e.get('trigger', ''),
+                  e['interview_id']] for e in peaks])
+        for e in peaks:
+            w.quote(e.get('quote'), f"Интервью {e['interview_id']}")
+
+        for title, markers in (('Позитивные моменты', ['радость', 'удовлетворение', 'восторг', 'счастье', 'довольство']),
+                               ('Негативные моменты', ['фрустрация', 'злость', 'разочарование', 'раздражение', 'страх'])):
+            selected = [e for e in emotions if any(m in str(e.get('emotion', '')).lower() for m in markers)][:3]
+            if selected:
+                w.heading(title, level=2)
+                w.table(['Момент', 'Эмоция', 'Интервью'],
+                        [[e.get('moment', ''), e.get('emotion', ''), e['interview_id']] for e in selected])
+
+    def _docx_insights(self, w: DocxWriter, insights):
+        w.heading('Ключевые инсайты', level=1)
+        for i, insight in enumerate(insights[:8], 1):
+            w.heading(f"Инсайт #{i}: {insight.get('title', '')}", level=2)
+            w.paragraph(insight.get('description', ''))
+            w.paragraph(f"{str(insight.get('severity', 'medium')).upper()}, приоритет {insight.get('priority', 'P2')}",
+                        label='Критичность')
+            if insight.get('evidence'):
+                w.paragraph('Основано на:')
+                w.bullets(insight['evidence'][:4])
+            opportunity = insight.get('opportunity')
+            w.paragraph(opportunity.get('description') if isinstance(opportunity, dict) else opportunity,
+                        label='Возможность')
+            for quote_data in insight.get('quotes', [])[:2]:
+                if isinstance(quote_data, dict):
+                    w.quote(quote_data.get('text', ''), f"Интервью {quote_data.get('interview_id', '')}")
+
+    def _docx_contradictions(self, w: DocxWriter, summaries):
+        w.heading('Противоречия и неоднозначности', level=1)
+        contradictions = [(summary.interview_id, contradiction) for summary in summaries
+                          for contradiction in summary.contradictions[:3] if isinstance(contradiction, str)]
+        if not contradictions:
+            w.paragraph('Значительных противоречий в ответах респондентов не выявлено, '
+                        'что говорит о консистентности пользовательского опыта.')
+            return
+        w.table(['#', 'Противоречие', 'Интервью'],
+                [[i, text, interview_id] for i, (interview_id, text) in enumerate(contradictions[:6], 1)])
+
+    def _docx_quotes(self, w: DocxWriter, summaries):
+        w.heading('Важные цитаты респондентов', level=1)
+        quotes = [{'interview_id': summary.interview_id, **quote}
+                  for summary in summaries for quote in summary.quotes[:5] if isinstance(quote, dict)]
+        for title, quote_type in (('Цитаты о проблемах', 'pain'), ('Цитаты о потребностях', 'need'),
+                                  ('Эмоциональные высказывания', 'emotion')):
+            selected = [q for q in quotes if q.get('quote_type', 'general') == quote_type][:3]
+            if selected:
+                w.heading(title, level=2)
+                for q in selected:
+                    w.quote(q.get('text', ''), f"Интервью {q['interview_id']}")
+        if quotes:
+            w.heading('Дополнительные важные высказывания', level=2)
+            w.table(['Цитата', 'Контекст', 'Интервью'],
+                    [[q.get('text', ''), q.get('context', '') or q.get('significance', ''), q['interview_id']]
+                     for q in quotes[:5]])
+
+    def _docx_recommendations(self, w: DocxWriter, recommendations):
+        w.heading('Рекомендации', level=1)
+        quick_wins = recommendations.get('quick_wins', [])[:5]
+        if quick_wins:
+            w.heading('Quick Wins (быстрые победы)', level=2)
+            w.table(['#', 'Рекомендация', 'Сроки', 'Ресурсы', 'Ожидаемый эффект'],
+                    [[i, rec.get('title', ''), rec.get('timeline', 'Не определено'),
+                      rec.get('resources_needed', 'Не определено'), rec.get('expected_impact', '')]
+                     for i, rec in enumerate(quick_wins, 1)])
+            for i, rec in enumerate(quick_wins, 1):
+                w.heading(f"#{i}. {rec.get('title', '')}", level=3)
+                w.paragraph(rec.get('description', ''))
+                if rec.get('implementation_steps'):
+                    w.paragraph('Шаги реализации:')
+                    w.bullets(rec['implementation_steps'], numbered=True)
+                if rec.get('affected_problems'):
+                    w.paragraph('Решает проблемы:')
+                    w.bullets(rec['affected_problems'][:3])
+                w.paragraph(', '.join(map(str, rec.get('success_metrics', [])[:2])), label='Метрики')
+                if rec.get('user_quotes_supporting'):
+                    w.quote(rec['user_quotes_supporting'][0])
+
+        initiatives = recommendations.get('strategic_initiatives', [])[:3]
+        if initiatives:
+            w.heading('Стратегические инициативы', level=2)
+            for init in initiatives:
+                w.heading(init.get('title', ''), level=3)
+                w.paragraph(init.get('description', ''))
+                w.paragraph(init.get('rationale'), label='Обоснование')
+                if init.get('implementation_phases'):
+                    w.paragraph('Фазы реализации:')
+                    w.bullets(init['implementation_phases'], numbered=True)
+                w.paragraph(init.get('expected_roi', 'Требует оценки'), label='ROI')
+
+        opportunities = recommendations.get('innovation_opportunities', [])[:2]
+        if opportunities:
+            w.heading('Инновационные возможности', level=2)
+            w.table(['Возможность', 'Описание', 'Потенциальное влияние', 'Требуется исследование'],
+                    [[opp.get('title', ''), opp.get('description', ''), opp.get('potential_impact', ''),
+                      opp.get('required_research', '')] for opp in opportunities])
+
+    def _docx_priority_matrix(self, w: DocxWriter, recommendations):
+        w.heading('Матрица приоритетов', level=1)
+        w.paragraph('Распределение рекомендаций по влиянию и сложности реализации', italic=True)
+        w.table(['Квадрант', 'Рекомендации'], [
+            ['Высокое влияние / Низкие усилия',
+             '\n'.join(rec.get('title', '') for rec in recommendations.get('quick_wins', [])[:3])],
+            ['Высокое влияние / Высокие усилия',
+             '\n'.join(init.get('title', '') for init in recommendations.get('strategic_initiatives', [])[:3])],
+        ])
+        w.paragraph('Рекомендуемый порядок действий:')
+        w.bullets(['Неделя 1-2: Запустить 2-3 quick wins для быстрых результатов',
+                   'Неделя 3-4: Провести детальное планирование стратегических инициатив',
+                   'Месяц 2: Начать реализацию первой стратегической инициативы',
+                   'Месяц 3: Оценить результаты и скорректировать план'], numbered=True)
+
+    def _docx_roadmap(self, w: DocxWriter, defense):
+        w.heading('Дорожная карта внедрения', level=1)
+        w.table(['#', 'Действие', 'Сроки', 'Ответственный', 'Ресурсы', 'Ожидаемый результат'],
+                [[i, step.get('action', ''), step.get('timeline', ''), step.get('responsible', ''),
+                  step.get('resources', ''), step.get('expected_result', '')]
+                 for i, step in enumerate(defense.get('next_steps', [])[:6], 1) if isinstance(step, dict)])
+        if defense.get('roi_calculation'):
+            w.heading('Расчет ROI', level=2)
+            w.paragraph(defense['roi_calculation'])
+        risks = [risk for risk in defense.get('risk_mitigation', []) if isinstance(risk, dict)]
+        if risks:
+            w.heading('Управление рисками', level=2)
+            w.table(['Риск', 'Митигация', 'Мониторинг'],
+                    [[risk.get('risk', ''), risk.get('mitigation', ''), risk.get('monitoring', '')] for risk in risks])
+        if defense.get('success_metrics'):
+            w.heading('Ключевые метрики для отслеживания', level=2)
+            w.bullets(defense['success_metrics'])
+
+    def _docx_appendix(self, w: DocxWriter, summaries, analysis_data):
+        # В DOCX приложение включает все интервью: одна таблица вместо карточек
+        w.page_break()
+        w.heading('Приложение', level=1)
+        w.heading('Детальная информация по интервью', level=2)
+        w.table(['#', 'Демография', 'Профессия', 'Контекст', 'Sentiment', 'Ключевые темы', 'Основные проблемы'], [
+            [summary.interview_id,
+             summary.respondent_profile.get('demographics', 'Не указано'),
+             summary.respondent_profile.get('occupation', 'Не указано'),
+             summary.respondent_profile.get('context', 'Не указано'),
+             f"{summary.sentiment_score:.2f}",
+             '\n'.join(theme.get('theme', '') for theme in summary.key_themes[:3] if isinstance(theme, dict)),
+             '\n'.join(pain.get('pain', '') for pain in summary.pain_points[:3] if isinstance(pain, dict))]
+            for summary in summaries
+        ])
 
-        # Добавляем таблицу с метриками
-        table = doc.add_table(rows=2, cols=4)
-        table.style = 'Light Grid Accent 1'
+        total_interviews = analysis_data.get('total_interviews', 0)
+        w.heading('Методология исследования', level=2)
+        w.bullets([f'Проведено {total_interviews} глубинных интервью', 'Использован полуструктурированный гайд',
+                   'AI-ассистированный тематический анализ',
+                   'Кодирование с фокусом на точные цитаты (минимум 50 слов)',
+                   'Кросс-валидация паттернов между интервью', 'Приоритизация по частоте и критичности'])
+        w.paragraph('Ограничения исследования:')
+        w.bullets([f'Размер выборки: {total_interviews} респондентов']
+                  + (['Выборка меньше рекомендуемой (8+ интервью)'] if total_interviews < 8 else [])
+                  + ['Качественный характер данных', 'Возможная субъективность интерпретаций'])
+
+        w.heading('Контактная информация', level=2)
+        w.paragraph(self.config.author, label='Подготовлено')
+        w.paragraph(self.config.name, label='Организация')
+        w.paragraph(datetime.now().strftime("%d.%m.%Y"), label='Дата')
+
+    def generate_pdf(self, html_content=None, html_path=None):
+        """Генерация PDF из HTML (строки или файла)"""
+        try:
+            # Конвертируем HTML в PDF
+            if html_path is not None:
+                pdf = WeasyHTML(filename=html_path, encoding='utf-8').write_pdf()
+            else:
+                pdf = WeasyHTML(string=html_content).write_pdf()
+            return pdf
+        except Exception as e:
+            logging.error(f"Ошибка при генерации PDF: {e}")
+            return None
 
-        # Заголовки
-        cells = table.rows[0].cells
-        cells[0].text = 'Интервью'
-        cells[1].text = 'Проблем'
-        cells[2].text = 'Сегментов'
-        cells[3].text = 'Quick Wins'
+# ========================================================================
+# ЭКСПОРТ PDF: ОЧЕРЕДЬ ЗАДАНИЙ, ПУЛ ПРОЦЕССОВ И КЭШ ПО ХЕШУ HTML
+# ========================================================================
+# Версия экспорта входит в ключ кэша: после изменения настроек WeasyPrint
+# старые PDF из кэша не используются
+PDF_RENDER_VERSION = 1
+
+# Дата формирования в HTML отчета: при хешировании для кэша PDF не учитывается,
+# иначе отчет по тем же данным на следующий день не совпал бы с кэшем
+_REPORT_DATE_PATTERN = re.compile(rb'<span class="report-date">[^<]*</span>')
+
+def report_date_html() -> str:
+    """Дата формирования отчета для HTML (см. _REPORT_DATE_PATTERN)"""
+    return f'<span class="report-date">{datetime.now().strftime("%d.%m.%Y")}</span>'
+
+_pdf_queue = None
+_pdf_queue_lock = threading.Lock()
+
+def _render_pdf_file(html_path: str, pdf_path: str) -> str:
+    """PDF из HTML файла (выполняется в процессе пула); запись атомарная"""
+    tmp_path = f"{pdf_path}.{os.getpid()}.tmp"
+    WeasyHTML(filename=html_path, encoding='utf-8').write_pdf(tmp_path)
+    os.replace(tmp_path, pdf_path)
+    return pdf_path
+
+class PDFExportQueue:
+    """Очередь экспорта PDF: WeasyPrint в пуле процессов, кэш по хешу HTML
+
+    submit() сразу возвращает Future и не блокирует вызывающий поток.
+    Одинаковый HTML рендерится один раз: одновременные задания с ним ждут
+    одного рендеринга, готовые PDF берутся из кэша. Разные задания
+    выполняются параллельно, по одному на процесс пула. В кэше хранится не
+    больше max_entries PDF, вытесняются давно не использованные.
+    """
+
+    def __init__(self, workers: int = 2, cache_dir: str = "pdf_cache", max_entries: int = 200):
+        self.workers = workers
+        self.max_entries = max_entries
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(exist_ok=True)
+        self.stats = {'submitted': 0, 'cached': 0, 'coalesced': 0, 'rendered': 0, 'failed': 0}
+        self._pool = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def html_hash(html_path: str) -> str:
+        """Хеш HTML файла без даты формирования и версии экспорта"""
+        with open(html_path, 'rb') as f:
+            html = _REPORT_DATE_PATTERN.sub(b'', f.read())
+        return hashlib.sha256(f"pdf-v{PDF_RENDER_VERSION}\x00".encode('utf-8') + html).hexdigest()
+
+    def submit(self, html_path: str, pdf_path: str) -> concurrent.futures.Future:
+        """Поставить HTML в очередь; Future вернет pdf_path, когда PDF будет записан"""
+        key = self.html_hash(html_path)
+        cached_path = self.cache_dir / f"{key}.pdf"
+        result = concurrent.futures.Future()
+
+        new_job = False
+        with self._lock:
+            self.stats['submitted'] += 1
+            job = self._jobs.get(key)
+            if job is not None:
+                self.stats['coalesced'] += 1
+            elif not cached_path.exists():
+                self.stats['rendered'] += 1
+                if self._pool is None:
+                    self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers)
+                job = self._jobs[key] = self._pool.submit(_render_pdf_file, html_path, str(cached_path))
+                new_job = True
+            else:
+                self.stats['cached'] += 1
+                # Время изменения - время последнего использования для вытеснения
+                os.utime(cached_path)
+
+        # Колбэки - вне блокировки: у завершенного Future они вызываются сразу
+        if new_job:
+            job.add_done_callback(partial(self._finish_job, key))
+        if job is None:
+            self._deliver(result, cached_path, pdf_path)
+        else:
+            job.add_done_callback(lambda job: self._deliver(result, cached_path, pdf_path, job))
+        return result
 
-        # Данные
-        cells = table.rows[1].cells
-        cells[0].text = str(analysis_data.get('total_interviews', 0))
-        cells[1].text = str(len(analysis_data.get('base_analysis', {}).get('problems', [])))
-        cells[2].text = str(len(analysis_data.get('base_analysis', {}).get('segments', [])))
-        cells[3].text = str(len(analysis_data.get('recommendations', {}).get('quick_wins', [])))
+    def _finish_job(self, key: str, job: concurrent.futures.Future):
+        with self._lock:
+            self._jobs.pop(key, None)
+            if job.exception() is not None:
+                self.stats['failed'] += 1
+            else:
+                self._evict()
 
-        doc.add_page_break()
+    def _evict(self):
+        """Удаление давно не использованных PDF сверх max_entries (под self._lock)"""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.pdf') and entry.name[:-4] not in self._jobs:
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    pass
+        entries.sort()
+        for _, path in entries[:max(len(entries) - self.max_entries, 0)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
 
-    def _add_key_findings_to_docx(self, doc, analysis_data):
-        """Добавление ключевых находок в DOCX"""
-        doc.add_heading('Ключевые находки', level=1)
+    def _deliver(self, result: concurrent.futures.Future, cached_path: Path, pdf_path: str,
+                 job: concurrent.futures.Future = None):
+        """Копия PDF из кэша в pdf_path и результат задания"""
+        try:
+            if job is not None:
+                job.result()
+            shutil.copyfile(cached_path, pdf_path)
+            result.set_result(pdf_path)
+        except Exception as e:
+            result.set_exception(e)
+
+    def pending(self) -> int:
+        """Число PDF, которые сейчас рендерятся или ждут процесса"""
+        with self._lock:
+            return len(self._jobs)
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+def get_pdf_queue() -> PDFExportQueue:
+    """Общая очередь экспорта PDF (создается при первом обращении)"""
+    global _pdf_queue
+    with _pdf_queue_lock:
+        if _pdf_queue is None:
+            _pdf_queue = PDFExportQueue(
+                workers=config['output'].get('pdf_workers', 2),
+                cache_dir=config['output'].get('pdf_cache_dir', 'pdf_cache'),
+                max_entries=config['output'].get('pdf_cache_max_entries', 200)
+            )
+        return _pdf_queue
 
-        defense = analysis_data.get('defense_materials', {})
-        key_findings = defense.get('key_findings', [])
+# ========================================================================
+# БЕНЧМАРК РЕЖИМОВ ИЗВЛЕЧЕНИЯ ИНТЕРВЬЮ
+# ========================================================================
+def benchmark_extraction_modes(api_key: str, transcripts: List[str], brief_content: str = None,
+                               model: str = None, output_path: str = None) -> Dict:
+    """Сравнение режимов extraction_mode: per_section (шесть запросов) и merged (один)
+
+    Каждый режим запускается с пустым кэшем на одних и тех же транскриптах.
+    Суммаризация чанков одинакова в обоих режимах и входит в замер. Токены
+    учитываются, если их присылает провайдер, символы промптов - всегда.
+    """
+    original_mode = config['analysis'].get('extraction_mode', 'merged')
+    results = {'interviews': len(transcripts), 'modes': {}}
+
+    try:
+        for mode in ('per_section', 'merged'):
+            config['analysis']['extraction_mode'] = mode
+            analyzer = AdvancedGeminiAnalyzer(api_key, model)
+            analyzer.cache = CacheManager(tempfile.mkdtemp(prefix=f"bench_{mode}_"))
+            if brief_content:
+                analyzer.set_brief(brief_content)
+
+            print(f"⏱️ Режим {mode}...")
+            timings = []
+            for i, transcript in enumerate(transcripts, 1):
+                started = time.time()
+                analyzer._deep_analyze_interview(transcript, i)
+                timings.append(time.time() - started)
+
+            results['modes'][mode] = {
+                **analyzer.api_wrapper.usage_totals,
+                'cost_usd': round(analyzer.api_wrapper.usage_totals['cost_usd'], 6),
+                'total_time': round(sum(timings), 2),
+                'avg_interview_time': round(sum(timings) / max(len(timings), 1), 2),
+                'section_fallbacks': len(analyzer.section_fallbacks),
+                'schema_failures': len(analyzer.schema_failures)
+            }
+    finally:
+        config['analysis']['extraction_mode'] = original_mode
 
-        for i, finding in enumerate(key_findings[:5], 1):
-            doc.add_heading(f'Находка #{i}', level=2)
-            doc.add_paragraph(finding)
+    per_section, merged = results['modes']['per_section'], results['modes']['merged']
+    results['savings'] = {
+        metric: round(1 - merged.get(metric, 0) / per_section[metric], 3)
+        for metric in ('calls', 'prompt_chars', 'prompt_tokens', 'completion_tokens', 'cost_usd', 'total_time')
+        if per_section.get(metric)
+    }
 
-    def _add_segments_to_docx(self, doc, analysis_data):
-        """Добавление сегментов в DOCX"""
-        doc.add_heading('Сегменты пользователей', level=1)
+    print(f"\n{'Метрика':<20} {'per_section':>14} {'merged':>14} {'экономия':>10}")
+    for metric in ('calls', 'prompt_chars', 'prompt_tokens', 'completion_tokens', 'cost_usd', 'total_time',
+                   'avg_interview_time', 'section_fallbacks'):
+        saving = results['savings'].get(metric)
+        saving_cell = f"{saving * 100:.0f}%" if saving is not None else "-"
+        print(f"{metric:<20} {per_section.get(metric, 0):>14} {merged.get(metric, 0):>14} {saving_cell:>10}")
 
-        segments = analysis_data.get('base_analysis', {}).get('segments', [])
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
 
-        for i, segment in enumerate(segments, 1):
-            doc.add_heading(f'{segment.get("name", f"Сегмент {i}")}', level=2)
-            doc.add_paragraph(f'Размер: {segment.get("size", "Не определен")}')
-            doc.add_paragraph(segment.get('description', ''))
+    return results
 
-    def _add_personas_to_docx(self, doc, analysis_data):
-        """Добавление персон в DOCX"""
-        doc.add_heading('Персоны', level=1)
+# ========================================================================
+# БЕНЧМАРК ФОРМАТОВ ГРАФИКОВ
+# ========================================================================
+def benchmark_chart_formats(analysis_data: Dict, company_config: CompanyConfig = None, rounds: int = 5,
+                            output_path: str = None) -> Dict:
+    """Сравнение chart_format: png и svg - время отрисовки графиков и размер отчета
+
+    Отрисовка замеряется с пустым кэшем графиков (cold) и с заполненным
+    (warm). Размер отчета - HTML целиком, как он уходит в файл и в WeasyPrint.
+    """
+    global _chart_cache
+    original_format = config['output'].get('chart_format', 'png')
+    original_cache = _chart_cache
+    generator = EnhancedReportGeneratorFixed(company_config or CompanyConfig())
+    results = {'rounds': rounds, 'formats': {}}
+
+    try:
+        for chart_format in ('png', 'svg'):
+            config['output']['chart_format'] = chart_format
+            print(f"⏱️ Формат {chart_format}...")
+            cold, warm = [], []
+            for _ in range(rounds):
+                _chart_cache = CacheManager(tempfile.mkdtemp(prefix=f"bench_charts_{chart_format}_"))
+                started = time.perf_counter()
+                charts = generator._generate_static_charts(analysis_data)
+                cold.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                generator._generate_static_charts(analysis_data)
+                warm.append(time.perf_counter() - started)
+
+            with redirect_stdout(StringIO()):
+                html = generator.generate_html(analysis_data)
+            results['formats'][chart_format] = {
+                'charts': len(charts),
+                'charts_bytes': sum(len(chart.encode('utf-8')) for chart in charts.values()),
+                'report_bytes': len(html.encode('utf-8')),
+                'cold_ms': round(statistics.median(cold) * 1000, 1),
+                'warm_ms': round(statistics.median(warm) * 1000, 2)
+            }
+    finally:
+        config['output']['chart_format'] = original_format
+        _chart_cache = original_cache
 
-        personas = analysis_data.get('personas', [])
+    png, svg = results['formats']['png'], results['formats']['svg']
+    print(f"\n{'Метрика':<14} {'png':>12} {'svg':>12} {'svg/png':>9}")
+    for metric in ('charts_bytes', 'report_bytes', 'cold_ms', 'warm_ms'):
+        ratio = f"{svg[metric] / png[metric]:.2f}" if png[metric] else "-"
+        print(f"{metric:<14} {png[metric]:>12} {svg[metric]:>12} {ratio:>9}")
 
-        for persona in personas:
-            doc.add_heading(persona.get('name', 'Персона'), level=2)
-            doc.add_paragraph(f'Основана на интервью: {", ".join(map(str, persona.get("based_on_interviews", [])))}')
-            doc.add_paragraph(persona.get('description', ''))
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
 
-    def _add_problems_to_docx(self, doc, analysis_data):
-        """Добавление проблем в DOCX"""
-        doc.add_heading('Ключевые проблемы', level=1)
+    return results
 
-        problems = analysis_data.get('base_analysis', {}).get('problems', [])
+# ========================================================================
+# БЕНЧМАРК ЭКСПОРТА PDF
+# ========================================================================
+def benchmark_pdf_export(html_paths: List[str], users: int = 4, workers: int = None,
+                         output_path: str = None) -> Dict:
+    """Экспорт PDF несколькими пользователями одновременно: generate_pdf по
+    очереди против PDFExportQueue с пустым (cold) и заполненным (warm) кэшем
+
+    Каждый из users пользователей экспортирует все html_paths. blocked_ms -
+    сколько держится поток интерфейса (для generate_pdf - весь экспорт),
+    latency - время от постановки задания до готового файла.
+    """
+    workers = workers or config['output'].get('pdf_workers', 2)
+    output_dir = tempfile.mkdtemp(prefix="bench_pdf_")
+    jobs = [(user, i, path) for user in range(users) for i, path in enumerate(html_paths)]
+    generator = EnhancedReportGeneratorFixed(CompanyConfig())
+    results = {'users': users, 'reports': len(html_paths), 'workers': workers, 'modes': {}}
+
+    print(f"⏱️ generate_pdf по очереди ({len(jobs)} экспортов)...")
+    latencies = []
+    started = time.perf_counter()
+    for user, i, path in jobs:
+        pdf = generator.generate_pdf(html_path=path)
+        with open(os.path.join(output_dir, f"sync_{user}_{i}.pdf"), 'wb') as f:
+            f.write(pdf or b'')
+        # Пользователи ждут друг друга: задержка считается от начала серии
+        latencies.append(time.perf_counter() - started)
+    total = time.perf_counter() - started
+    results['modes']['sync'] = {'total_s': total, 'blocked_ms': total * 1000, 'latencies': latencies}
+
+    queue = PDFExportQueue(workers=workers, cache_dir=tempfile.mkdtemp(prefix="bench_pdf_cache_"))
+    try:
+        for mode in ('cold', 'warm'):
+            print(f"⏱️ PDFExportQueue, кэш {mode}...")
+            latencies = []
+            blocked = 0.0
+            futures = []
+            started = time.perf_counter()
+            for user, i, path in jobs:
+                submit_started = time.perf_counter()
+                future = queue.submit(path, os.path.join(output_dir, f"{mode}_{user}_{i}.pdf"))
+                blocked += time.perf_counter() - submit_started
+                future.add_done_callback(lambda _, t=submit_started: latencies.append(time.perf_counter() - t))
+                futures.append(future)
+            concurrent.futures.wait(futures)
+            total = time.perf_counter() - started
+            results['modes'][mode] = {'total_s': total, 'blocked_ms': blocked * 1000, 'latencies': latencies,
+                                      'errors': sum(1 for future in futures if future.exception() is not None)}
+        results['queue_stats'] = dict(queue.stats)
+    finally:
+        queue.shutdown()
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    print(f"\n{'Режим':<8} {'Всего, с':>10} {'Блокировка, мс':>16} {'p50, с':>8} {'p95, с':>8}")
+    for mode, run in results['modes'].items():
+        latencies = sorted(run.pop('latencies'))
+        run['p50_s'] = round(latencies[len(latencies) // 2], 3) if latencies else None
+        run['p95_s'] = round(latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)], 3) if latencies else None
+        run['total_s'] = round(run['total_s'], 3)
+        run['blocked_ms'] = round(run['blocked_ms'], 1)
+        print(f"{mode:<8} {run['total_s']:>10} {run['blocked_ms']:>16} {run['p50_s']:>8} {run['p95_s']:>8}")
+    print(f"Очередь: {results['queue_stats']}")
+
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    return results
 
-        for i, problem in enumerate(problems[:10], 1):
-            doc.add_heading(f'Проблема #{i}: {problem.get("problem_title", "")}', level=2)
-            doc.add_paragraph(problem.get('problem_description', ''))
-            doc.add_paragraph(f'Критичность: {problem.get("severity", "medium")}')
+# ========================================================================
+# БЕНЧМАРК РЕЖИМОВ ПРИЛОЖЕНИЯ
+# ========================================================================
+def benchmark_appendix_modes(analysis_data: Dict, counts: Tuple[int, ...] = (10, 50, 200, 500),
+                             company_config: CompanyConfig = None, output_path: str = None) -> Dict:
+    """appendix_mode inline и lazy на растущем числе интервью: размер раздела
+    приложения и время его рендеринга (то, что браузер загружает сразу), а для
+    lazy - объем фрагментов, которые подгружаются по требованию
+
+    Интервью для больших выборок получаются повторением summaries из
+    analysis_data с новыми номерами. Встроенное приложение по умолчанию
+    ограничено 10 карточками, поэтому inline_all - тот же режим без
+    ограничения: с ним lazy сравнивается на одинаковом числе карточек.
+    """
+    company_config = company_config or CompanyConfig()
+    base = analysis_data.get('interview_summaries', [])
+    if not base:
+        raise ValueError("В analysis_data нет interview_summaries")
+    results = {'runs': []}
+
+    for count in counts:
+        summaries = [replace(base[i % len(base)], interview_id=i + 1) for i in range(count)]
+        data = {**analysis_data, 'interview_summaries': summaries, 'total_interviews': count}
+        appendix_dir = tempfile.mkdtemp(prefix="bench_appendix_")
+        for mode in ('inline', 'inline_all', 'lazy'):
+            generator = EnhancedReportGeneratorFixed(
+                company_config, appendix_href=appendix_dir if mode == 'lazy' else None
+            )
+            if mode == 'inline_all':
+                generator.inline_appendix_limit = None
+            started = time.perf_counter()
+            appendix = ''.join(generator._generate_detailed_appendix(summaries, data))
+            elapsed = time.perf_counter() - started
+            run = {'mode': mode, 'interviews': count, 'appendix_bytes': len(appendix.encode('utf-8')),
+                   'render_ms': round(elapsed * 1000, 2), 'fragments_bytes': 0}
+            if mode == 'lazy':
+                generator.write_appendix(data, appendix_dir)
+                run['fragments_bytes'] = sum(entry.stat().st_size for entry in os.scandir(appendix_dir))
+            results['runs'].append(run)
+        shutil.rmtree(appendix_dir, ignore_errors=True)
+
+    print(f"{'Режим':<11} {'Интервью':>9} {'Приложение, КБ':>15} {'Рендеринг, мс':>14} {'Фрагменты, КБ':>14}")
+    for run in results['runs']:
+        print(f"{run['mode']:<11} {run['interviews']:>9} {run['appendix_bytes'] / 1024:>15.1f} "
+              f"{run['render_ms']:>14} {run['fragments_bytes'] / 1024:>14.1f}")
+    print("inline - не больше 10 карточек (как в отчете), inline_all - все интервью")
+
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    return results
 
-    def _add_recommendations_to_docx(self, doc, analysis_data):
-        """Добавление рекомендаций в DOCX"""
-        doc.add_heading('Рекомендации', level=1)
+# ========================================================================
+# БЕНЧМАРК ЭКСПОРТА DOCX
+# ========================================================================
+class _PerCallDocxWriter(DocxWriter):
+    """Запись вызовами python-docx на каждый элемент (add_paragraph, add_table,
+    cell.text) - прежний способ генерации DOCX, точка отсчета для бенчмарка"""
 
-        recs = analysis_data.get('recommendations', {})
-        quick_wins = recs.get('quick_wins', [])
+    def heading(self, text, level: int = 1):
+        self.doc.add_heading(str(text), level)
 
-        for i, rec in enumerate(quick_wins[:5], 1):
-            doc.add_heading(f'Quick Win #{i}: {rec.get("title", "")}', level=2)
-            doc.add_paragraph(rec.get('description', ''))
-            doc.add_paragraph(f'Сроки: {rec.get("timeline", "Не определено")}')
+    def paragraph(self, text, style: str = None, label: str = None, italic: bool = False):
+        if text in (None, ''):
+            return
+        p = self.doc.add_paragraph(style=style)
+        if label:
+            p.add_run(f'{label}: ').bold = True
+        p.add_run(str(text)).italic = italic
+
+    def bullets(self, items, numbered: bool = False):
+        for item in items:
+            if item not in (None, ''):
+                self.doc.add_paragraph(str(item), style='List Number' if numbered else 'List Bullet')
+
+    def page_break(self):
+        self.doc.add_page_break()
+
+    def table(self, header: List[str], rows, style: str = DOCX_TABLE_STYLE):
+        rows = list(rows)
+        if not rows:
+            return
+        table = self.doc.add_table(rows=1, cols=len(header))
+        table.style = style
+        for cell, text in zip(table.rows[0].cells, header):
+            cell.text = str(text)
+        for row in rows:
+            for cell, text in zip(table.add_row().cells, row):
+                cell.text = '' if text is None else str(text)
+        self.doc.add_paragraph()
+
+    def flush(self):
+        pass
+
+
+def benchmark_docx_export(analysis_data: Dict, counts: Tuple[int, ...] = (10, 100, 500),
+                          company_config: CompanyConfig = None, rounds: int = 3,
+                          output_path: str = None) -> Dict:
+    """Запись разделов DOCX пакетами (DocxWriter) и вызовами python-docx на
+    каждый элемент (_PerCallDocxWriter) на растущем числе интервью
+
+    Графики в замер не входят (одинаковы для обоих способов и кэшируются).
+    Интервью для больших выборок получаются повторением summaries из
+    analysis_data с новыми номерами. Время - медиана из rounds прогонов.
+    """
+    company_config = company_config or CompanyConfig()
+    base = analysis_data.get('interview_summaries', [])
+    if not base:
+        raise ValueError("В analysis_data нет interview_summaries")
+    generator = EnhancedReportGeneratorFixed(company_config)
+    results = {'runs': []}
+
+    for count in counts:
+        summaries = [replace(base[i % len(base)], interview_id=i + 1) for i in range(count)]
+        data = {**analysis_data, 'interview_summaries': summaries, 'total_interviews': count}
+        plan = generator._section_args(ReportDocument(data, generator._report_plan(data), {}, {}), {})
+        for mode, writer_cls in (('per_call', _PerCallDocxWriter), ('batched', DocxWriter)):
+            timings = []
+            for _ in range(rounds):
+                doc = Document()
+                generator._setup_docx_styles(doc)
+                started = time.perf_counter()
+                writer = writer_cls(doc)
+                for name, *args in plan:
+                    getattr(generator, REPORT_SECTIONS[name][2])(writer, *args)
+                writer.flush()
+                timings.append(time.perf_counter() - started)
+            buffer = BytesIO()
+            doc.save(buffer)
+            results['runs'].append({'mode': mode, 'interviews': count,
+                                    'write_ms': round(statistics.median(timings) * 1000, 1),
+                                    'docx_bytes': buffer.tell(), 'tables': len(doc.tables)})
+
+    print(f"{'Режим':<10} {'Интервью':>9} {'Запись, мс':>11} {'Таблиц':>7} {'DOCX, КБ':>9}")
+    for run in results['runs']:
+        print(f"{run['mode']:<10} {run['interviews']:>9} {run['write_ms']:>11} {run['tables']:>7} "
+              f"{run['docx_bytes'] / 1024:>9.1f}")
+
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    return results
 
-    def generate_pdf(self, html_content):
-        """Генерация PDF из HTML"""
-        try:
-            # Конвертируем HTML в PDF
-            pdf = WeasyHTML(string=html_content).write_pdf()
-            return pdf
-        except Exception as e:
-            logging.error(f"Ошибка при генерации PDF: {e}")
-            return None
+# ========================================================================
+# БЕНЧМАРК ЭКСПОРТА В HTML, PDF И DOCX
+# ========================================================================
+def benchmark_report_export(analysis_data: Dict, company_config: CompanyConfig = None, rounds: int = 3,
+                            workers: int = None, output_path: str = None) -> Dict:
+    """Экспорт в три формата: каждый экспортер сам обходит analysis_data и
+    форматы строятся по очереди (sequential) против одной ReportDocument и
+    одновременного экспорта (pipeline), как в _generate_reports
+
+    Для sequential замеряется и каждый формат отдельно: время pipeline
+    сравнивается с самым медленным из них. Графики берутся из прогретого
+    кэша, PDF - с пустым кэшем PDFExportQueue в каждом прогоне. Время -
+    медиана из rounds прогонов.
+    """
+    generator = EnhancedReportGeneratorFixed(company_config or CompanyConfig())
+    output_dir = tempfile.mkdtemp(prefix="bench_export_")
+    html_path = os.path.join(output_dir, 'report.html')
+    pdf_path = os.path.join(output_dir, 'report.pdf')
+    docx_path = os.path.join(output_dir, 'report.docx')
+    pool = get_render_pool(workers)
+    timings = defaultdict(list)
+
+    def timed(name, export, *args):
+        started = time.perf_counter()
+        export(*args)
+        timings[name].append(time.perf_counter() - started)
+
+    try:
+        with redirect_stdout(StringIO()):
+            # Прогрев: кэш графиков и процессы пула в замер не входят
+            generator.build_document(analysis_data)
+            pool.submit(_render_docx_file, generator, generator.build_document(analysis_data), docx_path).result()
+
+            for _ in range(rounds):
+                started = time.perf_counter()
+                timed('html', generator.write_html, analysis_data, html_path)
+                timed('pdf', _render_pdf_file, html_path, pdf_path)
+                timed('docx', lambda: generator.generate_docx(analysis_data).save(docx_path))
+                timings['sequential'].append(time.perf_counter() - started)
+
+                queue = PDFExportQueue(workers=1, cache_dir=tempfile.mkdtemp(prefix="bench_export_pdf_", dir=output_dir))
+                try:
+                    started = time.perf_counter()
+                    document = generator.build_document(analysis_data)
+                    docx_job = pool.submit(_render_docx_file, generator, document, docx_path)
+                    generator.write_html(document, html_path)
+                    pdf_job = queue.submit(html_path, pdf_path)
+                    docx_job.result()
+                    pdf_job.result()
+                    timings['pipeline'].append(time.perf_counter() - started)
+                finally:
+                    queue.shutdown()
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    results = {name: round(statistics.median(values), 3) for name, values in timings.items()}
+    results['slowest_format'] = max(('html', 'pdf', 'docx'), key=results.get)
+
+    print(f"{'Этап':<12} {'Медиана, с':>11}")
+    for name in ('html', 'pdf', 'docx', 'sequential', 'pipeline'):
+        print(f"{name:<12} {results[name]:>11}")
+    print(f"pipeline / самый медленный формат ({results['slowest_format']}): "
+          f"{results['pipeline'] / results[results['slowest_format']]:.2f}")
+
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    return results
 
 # ========================================================================
 # ОСНОВНОЙ ИНТЕРФЕЙС
@@ -5111,24 +8322,27 @@ class UXAnalyzerInterface:
         self.analyze_btn.disabled = True
         self.analyze_btn.description = '⏳ Анализ...'
 
+        # Один запуск - одна трасса: анализ и все форматы отчета
+        run_span = None
         try:
-            # Создаем анализатор с выбранной моделью
-            self.analyzer = AdvancedGeminiAnalyzer(
-                self.api_key_input.value,
-                self.model_dropdown.value
-            )
+            with get_tracer().span('run', interviews=len(self.transcripts), model=self.model_dropdown.value) as run_span:
+                # Создаем анализатор с выбранной моделью
+                self.analyzer = AdvancedGeminiAnalyzer(
+                    self.api_key_input.value,
+                    self.model_dropdown.value
+                )
 
-            # Устанавливаем бриф если есть
-            if self.brief_content:
-                self.analyzer.set_brief(self.brief_content)
+                # Устанавливаем бриф если есть
+                if self.brief_content:
+                    self.analyzer.set_brief(self.brief_content)
 
-            with self.progress_output:
-                clear_output()
-                # Запускаем анализ
-                results = self.analyzer.analyze_transcripts_parallel(self.transcripts)
+                with self.progress_output:
+                    clear_output()
+                    # Запускаем анализ
+                    results = self.analyzer.analyze_transcripts_parallel(self.transcripts)
 
-            # Генерируем отчеты
-            self._generate_reports(results)
+                # Генерируем отчеты
+                self._generate_reports(results)
 
         except Exception as e:
             with self.output_widget:
@@ -5137,6 +8351,22 @@ class UXAnalyzerInterface:
         finally:
             self.analyze_btn.disabled = False
             self.analyze_btn.description = '🚀 Начать анализ'
+            if run_span is not None:
+                self._save_trace(run_span)
+
+    def _save_trace(self, run_span: Span):
+        """Трасса запуска для ui.perfetto.dev / chrome://tracing и самые медленные span"""
+        tracer = get_tracer()
+        trace_filename = f'ux_trace_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
+        tracer.export_chrome_trace(trace_filename, run_span.trace_id)
+        slowest = sorted(tracer.latency_report(run_span.trace_id).items(), key=lambda item: -item[1]['max'])[:5]
+        tracer.clear(run_span.trace_id)
+
+        with self.output_widget:
+            print(f"\n🧭 Трасса запуска ({run_span.duration:.1f} с): {trace_filename}")
+            for name, stats in slowest:
+                print(f"   {name}: {stats['count']} шт., p95 {stats['p95']:.2f} с, максимум {stats['max']:.2f} с")
+            display(FileLink(trace_filename))
 
     def _generate_reports(self, results):
         """Генерация отчетов"""
@@ -5148,61 +8378,127 @@ class UXAnalyzerInterface:
 
         # Определяем timestamp в начале
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        html_content = None
+        html_filename = None
+
+        # Сводка запуска: время, токены и повторы по этапам и вызовам LLM
+        if self.analyzer is not None:
+            metrics_filename = f'ux_run_metrics_{timestamp}.json'
+            self.analyzer.metrics.save_summary(metrics_filename)
+            totals = self.analyzer.metrics.summary()['totals']
+            with self.output_widget:
+                print(f"📈 Сводка запуска: {metrics_filename}")
+                print(f"💵 Стоимость вызовов LLM: ${totals['cost_usd']:.4f} ({', '.join(totals['models'])})")
+                display(FileLink(metrics_filename))
+
+        # Модель отчета строится один раз (план разделов и графики всех
+        # форматов) и передается всем экспортерам
+        export_started = time.perf_counter()
+        document = generator.build_document(results)
+        render_workers = config['output'].get('render_workers', 0)
+
+        # DOCX - в процессе пула одновременно с HTML и PDF
+        docx_filename = f'ux_report_{timestamp}.docx'
+        try:
+            docx_job = get_render_pool(render_workers or None).submit(
+                _render_docx_file, generator, document, docx_filename
+            )
+        except Exception as e:
+            docx_job = None
+            with self.output_widget:
+                print(f"⚠️ Не удалось создать DOCX: {e}")
 
         # HTML
+        pdf_source = None
         try:
-            html_content = generator.generate_html(results)
+            # Отчет пишется в файл по разделам, без сборки всей строки в памяти
             html_filename = f'ux_report_{timestamp}.html'
-
-            with open(html_filename, 'w', encoding='utf-8') as f:
-                f.write(html_content)
+            executor = get_render_pool(render_workers) if render_workers else None
+            section_timings = {}
+            lazy_appendix = config['output'].get('appendix_mode', 'inline') == 'lazy'
+            if lazy_appendix:
+                # Карточки интервью - во фрагментах рядом с отчетом
+                appendix_dir = f'ux_report_{timestamp}_appendix'
+                html_generator = EnhancedReportGeneratorFixed(self.company_config, appendix_href=appendix_dir)
+                fragments = html_generator.write_appendix(results, appendix_dir)
+            else:
+                html_generator = generator
+            html_generator.write_html(document, html_filename, executor=executor, timings=section_timings)
+            pdf_source = html_filename
 
             with self.output_widget:
                 print(f"✅ HTML отчет создан: {html_filename}")
+                slowest = sorted(section_timings.items(), key=lambda item: item[1], reverse=True)[:3]
+                print(f"⏱️ Разделы отчета: {sum(section_timings.values()):.2f} с, дольше всего: "
+                      + ", ".join(f"{name} {seconds:.2f} с" for name, seconds in slowest))
                 display(FileLink(html_filename))
+
+            if lazy_appendix:
+                # Отчет и фрагменты передаются вместе; PDF (без JavaScript) -
+                # из версии для печати с приложением внутри
+                archive_filename = f'ux_report_{timestamp}.zip'
+                with zipfile.ZipFile(archive_filename, 'w', zipfile.ZIP_DEFLATED) as archive:
+                    archive.write(html_filename)
+                    for fragment in sorted(os.listdir(appendix_dir)):
+                        archive.write(os.path.join(appendix_dir, fragment))
+                pdf_source = f'ux_report_{timestamp}_print.html'
+                generator.write_html(document, pdf_source, executor=executor)
+                with self.output_widget:
+                    print(f"✅ Приложение: {fragments} интервью в {appendix_dir}, отчет с приложением: {archive_filename}")
+                    display(FileLink(archive_filename))
         except Exception as e:
+            html_filename = pdf_source = None
             with self.output_widget:
                 print(f"❌ Ошибка при создании HTML: {e}")
                 import traceback
                 traceback.print_exc()
 
-        # PDF - только если есть html_content
-        if html_content:
+        # PDF - только если HTML создан; формируется в фоне
+        if pdf_source:
             try:
-                pdf_content = generator.generate_pdf(html_content)
-                if pdf_content:
-                    pdf_filename = f'ux_report_{timestamp}.pdf'
-                    with open(pdf_filename, 'wb') as f:
-                        f.write(pdf_content)
-
+                pdf_filename = f'ux_report_{timestamp}.pdf'
+                with get_tracer().span('report.pdf.submit'):
+                    pdf_job = get_pdf_queue().submit(pdf_source, pdf_filename)
+                pdf_job.add_done_callback(self._on_pdf_ready)
+                if not pdf_job.done():
                     with self.output_widget:
-                        print(f"✅ PDF отчет создан: {pdf_filename}")
-                        display(FileLink(pdf_filename))
+                        print(f"⏳ PDF отчет формируется в фоне (в очереди: {get_pdf_queue().pending()})")
             except Exception as e:
                 with self.output_widget:
                     print(f"⚠️ Не удалось создать PDF: {e}")
 
-        # DOCX
-        try:
-            doc = generator.generate_docx(results)
-            docx_filename = f'ux_report_{timestamp}.docx'
-            doc.save(docx_filename)
+        # DOCX - ожидание результата из пула
+        if docx_job is not None:
+            try:
+                with get_tracer().span('report.docx'):
+                    docx_job.result()
 
-            with self.output_widget:
-                print(f"✅ DOCX отчет создан: {docx_filename}")
-                display(FileLink(docx_filename))
-        except Exception as e:
-            with self.output_widget:
-                print(f"⚠️ Не удалось создать DOCX: {e}")
+                with self.output_widget:
+                    print(f"✅ DOCX отчет создан: {docx_filename}")
+                    display(FileLink(docx_filename))
+            except Exception as e:
+                with self.output_widget:
+                    print(f"⚠️ Не удалось создать DOCX: {e}")
 
         with self.output_widget:
+            print(f"⏱️ Экспорт HTML и DOCX: {time.perf_counter() - export_started:.2f} с")
             print("\n🎉 Анализ завершен!")
             print(f"📊 Проанализировано интервью: {results.get('total_interviews', 0)}")
             print(f"🔍 Выявлено ключевых проблем: {len(results.get('base_analysis', {}).get('problems', []))}")
             print(f"👥 Сегментов пользователей: {len(results.get('base_analysis', {}).get('segments', []))}")
             print(f"💡 Рекомендаций: {len(results.get('recommendations', {}).get('quick_wins', []))}")
 
+    def _on_pdf_ready(self, pdf_job: concurrent.futures.Future):
+        """Результат фонового экспорта PDF (вызывается из потока очереди)"""
+        # Контекст `with output_widget` привязан к потоку ячейки - из потока
+        # очереди вывод добавляется в виджет напрямую
+        try:
+            pdf_filename = pdf_job.result()
+        except Exception as e:
+            self.output_widget.append_stdout(f"⚠️ Не удалось создать PDF: {e}\n")
+            return
+        self.output_widget.append_stdout(f"✅ PDF отчет создан: {pdf_filename}\n")
+        self.output_widget.append_display_data(FileLink(pdf_filename))
+
 # ========================================================================
 # ЗАПУСК ИНТЕРФЕЙСА
 # ========================================================================
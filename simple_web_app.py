@@ -6,7 +6,6 @@
 
 from flask import Flask, render_template, request, jsonify, send_file
 import os
-import json
 import traceback
 from pathlib import Path
 import sys
@@ -16,24 +15,12 @@ sys.path.append('.')
 
 app = Flask(__name__)
 
-# Импортируем классы из ноутбука
+# Импортируем классы анализатора: в модулях ux_* анализатор ведет метрики
+# запуска (MetricsRecorder), которые отдают /api/run_summary и /metrics
 try:
-    # Читаем ноутбук
-    with open('ux_analyzer_core_ebicya.ipynb', 'r', encoding='utf-8') as f:
-        notebook = json.load(f)
-    
-    # Извлекаем код из ячеек
-    code_cells = []
-    for cell in notebook['cells']:
-        if cell['cell_type'] == 'code':
-            code_cells.extend(cell['source'])
-    
-    # Объединяем код
-    full_code = ''.join(code_cells)
-    
-    # Выполняем код
-    exec(full_code, globals())
-    
+    from ux_analyzer_classes import CompanyConfig
+    from ux_analyzer_core import AdvancedUXAnalyzer
+
     print("✅ Анализатор загружен успешно")
     
 except Exception as e:
@@ -43,6 +30,7 @@ except Exception as e:
 # Глобальные переменные для хранения состояния
 analyzer_instance = None
 analysis_results = None
+company_config = None
 
 @app.route('/')
 def index():
@@ -52,7 +40,7 @@ def index():
 @app.route('/api/analyze', methods=['POST'])
 def analyze():
     """API для анализа транскриптов"""
-    global analyzer_instance, analysis_results
+    global analyzer_instance, analysis_results, company_config
     
     try:
         data = request.get_json()
@@ -72,16 +60,14 @@ def analyze():
             return jsonify({'error': 'Транскрипты не предоставлены'}), 400
         
         # Создаем анализатор
-        analyzer_instance = AdvancedGeminiAnalyzer(api_key)
+        analyzer_instance = AdvancedUXAnalyzer(api_key)
         
         # Устанавливаем бриф если есть
         if brief_content:
             analyzer_instance.set_brief(brief_content)
         
         # Обновляем конфигурацию
-        analyzer_instance.company_config.name = company_name
-        analyzer_instance.company_config.report_title = report_title
-        analyzer_instance.company_config.author = author
+        company_config = CompanyConfig(name=company_name, report_title=report_title, author=author)
         
         # Запускаем анализ
         analysis_results = analyzer_instance.analyze_transcripts_parallel(transcripts)
@@ -99,6 +85,21 @@ def analyze():
             'traceback': traceback.format_exc()
         }), 500
 
+@app.route('/api/run_summary')
+def run_summary():
+    """Сводка последнего запуска: время, токены и повторы по этапам и вызовам LLM"""
+    metrics = getattr(analyzer_instance, 'metrics', None)
+    if metrics is None:
+        return jsonify({'error': 'Анализ еще не запускался'}), 404
+    return jsonify(metrics.summary())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Метрики последнего запуска в формате Prometheus"""
+    metrics = getattr(analyzer_instance, 'metrics', None)
+    body = metrics.to_prometheus() if metrics is not None else ''
+    return body, 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
 @app.route('/api/status')
 def status():
     """Проверка статуса анализатора"""
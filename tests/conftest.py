@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""Модули проекта лежат в корне репозитория - добавляем его в путь импорта"""
+
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Тесты AdvancedUXAnalyzer: в чекпоинты попадают только полноценные результаты этапов"""
+
+import pytest
+
+from ux_analyzer_classes import AnalysisCancelled, CheckpointManager
+from ux_analyzer_core import AdvancedUXAnalyzer
+
+TRANSCRIPTS = ['первое интервью', 'второе интервью', 'третье интервью']
+
+
+@pytest.fixture
+def analyzer(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    analyzer = AdvancedUXAnalyzer('sk-or-v1-test', checkpoint_dir=str(tmp_path / 'checkpoints'))
+    analyzer._deep_analyze_interview = lambda transcript, interview_id: analyzer._create_empty_summary(interview_id)
+    analyzer._generate_recommendations = lambda insights: {"quick_wins": [{"title": "x"}], "strategic_initiatives": []}
+    return analyzer
+
+
+def interrupted_run(analyzer):
+    """Запуск, прерванный на последнем этапе: чекпоинты остаются на диске"""
+    def cancel(*args):
+        raise AnalysisCancelled("Анализ отменен")
+
+    analyzer._assess_goal_achievement = cancel
+    with pytest.raises(AnalysisCancelled):
+        analyzer.analyze_transcripts(TRANSCRIPTS)
+    return CheckpointManager(analyzer._get_run_id(TRANSCRIPTS), analyzer.checkpoint_dir).completed_stages()
+
+
+def test_successful_stages_are_checkpointed(analyzer):
+    stages = interrupted_run(analyzer)
+
+    assert {'interview_1', 'interview_2', 'interview_3', 'findings', 'recommendations'} <= set(stages)
+
+
+def test_failed_interview_is_not_checkpointed(analyzer):
+    create_empty = analyzer._create_empty_summary
+
+    def deep_analyze(transcript, interview_id):
+        if interview_id == 2:
+            raise RuntimeError("OpenRouter API error: 500")
+        return create_empty(interview_id)
+
+    analyzer._deep_analyze_interview = deep_analyze
+    stages = interrupted_run(analyzer)
+
+    assert analyzer.failed_interviews == [2]
+    assert {'interview_1', 'interview_3'} <= set(stages)
+    # Этапы после пустого саммари пересчитываются при возобновлении
+    assert 'interview_2' not in stages
+    assert 'findings' not in stages
+
+
+def test_stage_fallback_is_returned_but_not_checkpointed(analyzer):
+    def fail(insights):
+        raise RuntimeError("OpenRouter API error: 503")
+
+    analyzer._generate_recommendations = fail
+    analyzer._assess_goal_achievement = lambda findings, summaries: {}
+    results = analyzer.analyze_transcripts(TRANSCRIPTS)
+
+    assert results['recommendations'] == {"quick_wins": [], "strategic_initiatives": []}
+    assert results['fallback_stages'] == ['recommendations']
+
+    analyzer._generate_recommendations = fail
+    stages = interrupted_run(analyzer)
+    assert 'findings' in stages
+    assert 'recommendations' not in stages
+    assert 'brief_answers' not in stages
+
+
+def test_cancellation_is_not_replaced_by_fallback(analyzer):
+    def cancel(insights):
+        raise AnalysisCancelled("Анализ отменен")
+
+    analyzer._generate_recommendations = cancel
+    with pytest.raises(AnalysisCancelled):
+        analyzer.analyze_transcripts(TRANSCRIPTS)
+    assert analyzer.fallback_stages == []
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Тесты OpenRouterAPIWrapper: объединение одинаковых запросов и отмена"""
+
+import threading
+import time
+
+import pytest
+
+import ux_resilience
+from ux_analyzer_classes import AnalysisCancelled, CancellationToken, OpenRouterAPIWrapper
+
+
+@pytest.fixture
+def blocking_wrapper(monkeypatch):
+    """Обертка, чей запрос висит до release: вызов другого потока становится ожидающим"""
+    monkeypatch.setattr(ux_resilience, 'SINGLE_FLIGHT_POLL', 0.01)
+    wrapper = OpenRouterAPIWrapper('sk-or-v1-test')
+    started = threading.Event()
+    release = threading.Event()
+
+    def hedged_request(prompt, model, max_tokens, response_format, stage, record):
+        started.set()
+        release.wait(5)
+        return 'ответ', False
+
+    wrapper._hedged_request = hedged_request
+    yield wrapper, started, release
+    release.set()
+
+
+def test_waiter_gets_leader_response(blocking_wrapper):
+    wrapper, started, release = blocking_wrapper
+    results = []
+    leader = threading.Thread(target=lambda: results.append(wrapper.generate_content('промпт', model='m')))
+    leader.start()
+    started.wait(5)
+
+    waiter = wrapper.fork(CancellationToken())
+    waiter_thread = threading.Thread(target=lambda: results.append(waiter.generate_content('промпт', model='m')))
+    waiter_thread.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join(5)
+    waiter_thread.join(5)
+
+    assert results == ['ответ', 'ответ']
+
+
+def test_cancelled_waiter_raises_analysis_cancelled(blocking_wrapper):
+    wrapper, started, release = blocking_wrapper
+    leader = threading.Thread(target=lambda: wrapper.generate_content('промпт', model='m'))
+    leader.start()
+    started.wait(5)
+
+    token = CancellationToken()
+    token.cancel()
+    waiter = wrapper.fork(token)
+    try:
+        # Отмена не заворачивается в "OpenRouter API error": ее ловят этапы анализа
+        with pytest.raises(AnalysisCancelled):
+            waiter.generate_content('промпт', model='m')
+    finally:
+        release.set()
+        leader.join(5)
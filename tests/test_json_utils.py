@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Тесты ux_json_utils: статусы извлечения JSON и потоковый разбор"""
+
+import pytest
+
+from ux_json_utils import (
+    STATUS_FAILED, STATUS_OK, STATUS_REPAIRED, STATUS_TRUNCATED,
+    StreamingJSONParser, extract_json, extract_json_with_status
+)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('{"a": 1, "b": [1, 2]}', {'a': 1, 'b': [1, 2]}),
+    ('Вот результат:\n```json\n{"a": 1}\n```\nГотово', {'a': 1}),
+    ('Ответ: {"text": "строка\nс переносом"} конец', {'text': 'строка\nс переносом'}),
+])
+def test_valid_json_is_ok(text, expected):
+    assert extract_json_with_status(text) == (expected, STATUS_OK)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('{"a": 1,}', {'a': 1}),
+    ('Ответ: {"items": [1, 2, 3,], "b": {"c": 2,},}', {'items': [1, 2, 3], 'b': {'c': 2}}),
+])
+def test_dangling_commas_are_repaired(text, expected):
+    assert extract_json_with_status(text) == (expected, STATUS_REPAIRED)
+
+
+@pytest.mark.parametrize('text, expected', [
+    # Последнее число могло оборваться ("2" из "25") - оно отбрасывается
+    ('{"a": 1, "items": [1, 2', {'a': 1, 'items': [1]}),
+    ('{"a": 1, "quote": "оборванная стро', {'a': 1, 'quote': 'оборванная стро'}),
+    ('{"a": {"b": [{"c": 1},', {'a': {'b': [{'c': 1}]}}),
+])
+def test_truncated_response_is_completed(text, expected):
+    assert extract_json_with_status(text) == (expected, STATUS_TRUNCATED)
+
+
+@pytest.mark.parametrize('text', ['', 'Просто текст без JSON', '{"a": }', '{]'])
+def test_no_json_is_failed(text):
+    assert extract_json_with_status(text) == (None, STATUS_FAILED)
+
+
+def test_largest_candidate_wins_over_stray_brackets():
+    text = 'Пункт [1] и {"key_themes": [{"theme": "цена"}], "quotes": []}'
+    data, status = extract_json_with_status(text)
+    assert status == STATUS_OK
+    assert data == {'key_themes': [{'theme': 'цена'}], 'quotes': []}
+
+
+def test_extract_json_default_on_failure():
+    assert extract_json('нет JSON') == {}
+    assert extract_json('нет JSON', default=[]) == []
+    assert extract_json('[1, 2]') == [1, 2]
+
+
+def test_streaming_parser_completes_on_closing_bracket():
+    parser = StreamingJSONParser()
+    chunks = ['```json\n{"a": ', '"зна', 'чение", "b": [1,', ' 2]}', '\n```']
+
+    completed = [parser.feed(chunk) for chunk in chunks]
+
+    assert completed == [False, False, False, True, True]
+    assert parser.result() == ({'a': 'значение', 'b': [1, 2]}, STATUS_OK)
+
+
+def test_streaming_parser_repairs_dangling_comma():
+    parser = StreamingJSONParser()
+    assert parser.feed('{"a": [1, 2,],}') is True
+    assert parser.result() == ({'a': [1, 2]}, STATUS_REPAIRED)
+
+
+def test_streaming_parser_falls_back_for_text_responses():
+    parser = StreamingJSONParser()
+    assert parser.feed('Краткое саммари: ') is False
+    assert parser.feed('{"a": 1}') is False
+    assert parser.result() == ({'a': 1}, STATUS_OK)
+
+
+def test_streaming_parser_truncated_stream():
+    parser = StreamingJSONParser()
+    parser.feed('{"a": 1, "b": [1, 2]')
+    assert parser.complete is False
+    assert parser.result() == ({'a': 1, 'b': [1, 2]}, STATUS_TRUNCATED)
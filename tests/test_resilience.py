@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""Тесты ux_resilience: объединение вызовов, выключатель моделей, хеджирование"""
+
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+import ux_resilience
+from ux_resilience import CircuitBreaker, HedgeCancelled, SingleFlight, run_hedged
+
+
+class FakeClock:
+    """Подменяет time в ux_resilience: время выключателя двигается вручную"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(ux_resilience, 'time', fake)
+    return fake
+
+
+@pytest.fixture
+def executor():
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+        yield pool
+
+
+# ========================================================================
+# SINGLEFLIGHT
+# ========================================================================
+def test_single_flight_shares_result_between_waiters():
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'ответ'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do('key', slow)))
+    leader.start()
+    started.wait(5)
+    waiter = threading.Thread(target=lambda: results.append(flights.do('key', slow)))
+    waiter.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+
+    assert len(calls) == 1
+    assert sorted(results, key=lambda item: item[1]) == [('ответ', False), ('ответ', True)]
+    assert flights.in_flight() == 0
+
+
+def test_single_flight_reelects_leader_after_failure(monkeypatch):
+    monkeypatch.setattr(ux_resilience, 'SINGLE_FLIGHT_POLL', 0.01)
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("ведущий упал")
+
+    errors = []
+
+    def run_leader():
+        try:
+            flights.do('key', failing)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=run_leader)
+    leader.start()
+    started.wait(5)
+
+    waiter_result = []
+    waiter = threading.Thread(target=lambda: waiter_result.append(flights.do('key', lambda: 'свой ответ')))
+    waiter.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+
+    # Ожидающий не наследует ошибку ведущего, а выполняет вызов сам
+    assert len(errors) == 1
+    assert waiter_result == [('свой ответ', True)]
+    assert flights.in_flight() == 0
+
+
+def test_single_flight_waiter_checks_own_cancellation(monkeypatch):
+    monkeypatch.setattr(ux_resilience, 'SINGLE_FLIGHT_POLL', 0.01)
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return 'ответ'
+
+    leader = threading.Thread(target=lambda: flights.do('key', slow))
+    leader.start()
+    started.wait(5)
+
+    class Cancelled(Exception):
+        pass
+
+    def check():
+        raise Cancelled()
+
+    try:
+        with pytest.raises(Cancelled):
+            flights.do('key', slow, check=check)
+    finally:
+        release.set()
+        leader.join(5)
+
+
+# ========================================================================
+# CIRCUIT BREAKER
+# ========================================================================
+def test_circuit_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+
+    assert breaker.state == 'closed'
+    assert breaker.record_failure() is False
+    assert breaker.record_failure() is False
+    assert breaker.record_failure() is True
+    assert breaker.state == 'open'
+    assert breaker.allow() is False
+
+
+def test_circuit_breaker_half_open_allows_single_trial(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+
+    clock.now += 61
+    assert breaker.state == 'half_open'
+    assert breaker.allow() is True
+    assert breaker.allow() is False
+
+
+def test_circuit_breaker_trial_success_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    clock.now += 61
+    breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.failures == 0
+    assert breaker.allow() is True
+
+
+def test_circuit_breaker_trial_failure_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    clock.now += 61
+    breaker.allow()
+
+    # Повторное размыкание не считается новым: True только при переходе из closed
+    assert breaker.record_failure() is False
+    assert breaker.state == 'open'
+    clock.now += 30
+    assert breaker.allow() is False
+
+
+# ========================================================================
+# RUN_HEDGED
+# ========================================================================
+def test_run_hedged_without_fallback_runs_primary_inline(executor):
+    caller = threading.current_thread()
+    threads = []
+
+    def primary(abort):
+        threads.append(threading.current_thread())
+        return 'основной'
+
+    assert run_hedged(executor, primary) == ('основной', False)
+    assert threads == [caller]
+
+
+def test_run_hedged_fast_primary_skips_fallback(executor):
+    hedges = []
+
+    def fallback(abort):
+        raise AssertionError("дубль не должен отправляться")
+
+    result = run_hedged(executor, lambda abort: 'основной', fallback, hedge_after=5,
+                        on_hedge=lambda: hedges.append(1))
+    assert result == ('основной', False)
+    assert hedges == []
+
+
+def test_run_hedged_slow_primary_loses_and_is_aborted(executor):
+    aborted = threading.Event()
+
+    def primary(abort):
+        if abort.wait(5):
+            aborted.set()
+            raise HedgeCancelled('primary')
+        return 'основной'
+
+    hedges = []
+    result = run_hedged(executor, primary, lambda abort: 'резервный', hedge_after=0.01,
+                        on_hedge=lambda: hedges.append(1))
+
+    assert result == ('резервный', True)
+    assert hedges == [1]
+    assert aborted.wait(5)
+
+
+def test_run_hedged_primary_error_sends_fallback_immediately(executor):
+    def primary(abort):
+        raise RuntimeError("основная модель недоступна")
+
+    started = time.perf_counter()
+    result = run_hedged(executor, primary, lambda abort: 'резервный', hedge_after=5)
+
+    assert result == ('резервный', True)
+    assert time.perf_counter() - started < 1
+
+
+def test_run_hedged_invalid_results_return_last(executor):
+    result = run_hedged(executor, lambda abort: '', lambda abort: '', hedge_after=5)
+    assert result[0] == ''
+
+
+def test_run_hedged_raises_when_both_fail(executor):
+    def primary(abort):
+        raise RuntimeError("первая ошибка")
+
+    def fallback(abort):
+        raise ValueError("вторая ошибка")
+
+    with pytest.raises(RuntimeError, match="первая ошибка"):
+        run_hedged(executor, primary, fallback, hedge_after=5)
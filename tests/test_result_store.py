@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Тесты ux_result_store: ключ результата, сохранение, чтение и история"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import ux_result_store
+from ux_analyzer_classes import InterviewSummary
+from ux_result_store import ResultStore
+
+
+class FakeDatetime:
+    """Подменяет datetime в ux_result_store: каждая запись на минуту позже предыдущей"""
+
+    current = datetime(2025, 1, 1, 12, 0, 0)
+
+    @classmethod
+    def now(cls):
+        cls.current += timedelta(minutes=1)
+        return cls.current
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ResultStore(str(tmp_path / 'results'))
+
+
+def make_summary(interview_id: int) -> InterviewSummary:
+    return InterviewSummary(
+        interview_id=interview_id, respondent_profile={'demographics': 'менеджер'},
+        key_themes=[{'theme': 'цена'}], pain_points=[], needs=[], insights=[], emotional_journey=[],
+        contradictions=[], quotes=[{'text': 'дорого'}], business_pains=[], user_problems=[],
+        opportunities=[], sentiment_score=0.4, brief_related_findings={}
+    )
+
+
+def test_make_key_depends_on_transcripts_order_and_settings():
+    key, transcripts_hash = ResultStore.make_key(['a', 'b'], {'model': 'm1'})
+
+    assert ResultStore.make_key(['a', 'b'], {'model': 'm1'}) == (key, transcripts_hash)
+    assert ResultStore.make_key(['b', 'a'], {'model': 'm1'})[0] != key
+    other_key, other_hash = ResultStore.make_key(['a', 'b'], {'model': 'm2'})
+    assert other_key != key
+    assert other_hash == transcripts_hash
+
+
+def test_put_and_get_round_trip(store):
+    key, transcripts_hash = ResultStore.make_key(['интервью'], {'model': 'm'})
+    results = {'interview_summaries': [make_summary(1)], 'total_interviews': 1}
+
+    assert store.get(key) is None
+    assert not store.has(key)
+    store.put(key, transcripts_hash, {'model': 'm'}, results, label='t.txt', interviews=1)
+
+    assert store.has(key)
+    loaded = store.get(key)
+    assert loaded == results
+    assert isinstance(loaded['interview_summaries'][0], InterviewSummary)
+
+
+def test_put_replaces_existing_result(store):
+    key, transcripts_hash = ResultStore.make_key(['интервью'], {})
+    store.put(key, transcripts_hash, {}, {'version': 1})
+    store.put(key, transcripts_hash, {}, {'version': 2})
+
+    assert store.get(key) == {'version': 2}
+    assert len(store.history()) == 1
+
+
+def test_get_unreadable_blob_returns_none(store):
+    key, transcripts_hash = ResultStore.make_key(['интервью'], {})
+    store.put(key, transcripts_hash, {}, {'a': 1})
+    store._blob_path(key).write_bytes(b'not gzip')
+
+    assert store.get(key) is None
+
+
+def test_history_newest_first_and_filtered(store, monkeypatch):
+    monkeypatch.setattr(ux_result_store, 'datetime', FakeDatetime)
+    entries = []
+    for transcripts, model in ((['a'], 'm1'), (['b'], 'm1'), (['a'], 'm2')):
+        key, transcripts_hash = ResultStore.make_key(transcripts, {'model': model})
+        store.put(key, transcripts_hash, {'model': model}, {}, label=transcripts[0], interviews=len(transcripts))
+        entries.append((key, transcripts_hash))
+
+    history = store.history()
+    assert [entry['key'] for entry in history] == [key for key, _ in reversed(entries)]
+    assert history[0]['settings'] == {'model': 'm2'}
+    assert history[0]['label'] == 'a'
+    assert history[0]['interviews'] == 1
+
+    assert [entry['key'] for entry in store.history(limit=1)] == [entries[2][0]]
+    filtered = store.history(transcripts_hash=entries[0][1])
+    assert [entry['key'] for entry in filtered] == [entries[2][0], entries[0][0]]
+
+
+def test_delete_removes_record_and_blob(store):
+    key, transcripts_hash = ResultStore.make_key(['интервью'], {})
+    store.put(key, transcripts_hash, {}, {'a': 1})
+    store.delete(key)
+
+    assert store.get(key) is None
+    assert not store._blob_path(key).exists()
+    assert store.history() == []
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Тесты simple_web_app: метрики запуска настоящего анализатора через /api/run_summary и /metrics"""
+
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('flask')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from mock_llm_server import MockLLMConfig, MockLLMServer  # noqa: E402
+from bench_pipeline import generate_transcripts  # noqa: E402
+
+import simple_web_app  # noqa: E402
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # Чекпоинты и кэш анализатора пишутся в рабочий каталог
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(simple_web_app, 'analyzer_instance', None)
+    return simple_web_app.app.test_client()
+
+
+@pytest.fixture
+def llm_server(monkeypatch):
+    with MockLLMServer(MockLLMConfig()) as server:
+        monkeypatch.setenv('OPENROUTER_BASE_URL', server.url)
+        yield server
+
+
+def test_run_summary_before_analysis(client):
+    assert client.get('/api/run_summary').status_code == 404
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.get_data(as_text=True) == ''
+
+
+def test_metrics_after_analysis(client, llm_server):
+    response = client.post('/api/analyze', json={
+        'api_key': 'sk-or-v1-test',
+        'transcripts': generate_transcripts(3, 6, 1)
+    })
+    assert response.status_code == 200, response.get_json()
+    assert isinstance(simple_web_app.analyzer_instance, simple_web_app.AdvancedUXAnalyzer)
+
+    summary = client.get('/api/run_summary')
+    assert summary.status_code == 200
+    data = summary.get_json()
+    assert data['totals']['calls'] > 0
+    assert 'interview' in data['stages']
+
+    metrics = client.get('/metrics')
+    assert metrics.headers['Content-Type'].startswith('text/plain')
+    assert 'ux_analyzer_llm_calls_total{' in metrics.get_data(as_text=True)
+    assert llm_server.config.stats['requests'] > 0
@@ -1,16 +1,25 @@
 # -*- coding: utf-8 -*-
 """UX Analyzer Classes - Основные классы для анализа"""
 
+import copy
 import json
-import re
+import os
 import time
 import hashlib
 import pickle
+import threading
+import concurrent.futures
+from functools import partial
 from pathlib import Path
 from dataclasses import dataclass, field
 from typing import Dict, List, Optional, Any
 from collections import defaultdict
 import requests
+from ux_json_utils import extract_json_with_status, StreamingJSONParser, STATUS_FAILED
+from ux_metrics import MetricsRecorder
+from ux_routing import ModelRouter, call_cost, estimate_tokens
+from ux_resilience import CircuitBreaker, HedgeCancelled, LatencyTracker, SingleFlight, run_hedged
+from ux_tracing import get_tracer
 
 # ========================================================================
 # ДАТАКЛАССЫ
@@ -58,6 +67,15 @@ class ResearchFindings:
 # ========================================================================
 # КЛАСС ДЛЯ УПРАВЛЕНИЯ БРИФОМ
 # ========================================================================
+# Граница кэшируемого префикса промпта: все до нее одинаково для многих
+# запросов (бриф, инструкции этапа), после - данные конкретного запроса.
+# Обертка API удаляет маркер перед отправкой.
+PROMPT_CACHE_BREAK = "\x1e"
+
+# Модели, которым кэшируемые части нужно отметить явно (cache_control);
+# остальные провайдеры кэшируют общий префикс автоматически
+EXPLICIT_PROMPT_CACHE_MODELS = ('anthropic/', 'google/gemini')
+
 class BriefManager:
     """Класс для управления брифом исследования"""
 
@@ -71,10 +89,12 @@ class BriefManager:
             'constraints': []
         }
         self.has_brief = False
+        self._context_cache = None
 
     def load_brief(self, content: str):
         """Загрузка и парсинг брифа"""
         self.has_brief = True
+        self._context_cache = None
 
         # Простой парсер для текстового брифа
         lines = content.strip().split('\n')
@@ -123,38 +143,46 @@ class BriefManager:
                             self.brief_data[current_section].append(line)
 
     def get_brief_context(self):
-        """Получение контекста брифа для промптов"""
+        """Получение контекста брифа для промптов
+
+        Контекст одинаков для всех промптов исследования, поэтому собирается
+        один раз (до следующего load_brief) и заканчивается PROMPT_CACHE_BREAK -
+        границей префикса, который провайдер может закэшировать.
+        """
         if not self.has_brief:
             return ""
+        if self._context_cache is not None:
+            return self._context_cache
 
-        context = "<research_context>\n"
-        context += "КРИТИЧЕСКИ ВАЖНО: Все выводы должны отвечать на вопросы и достигать целей из этого брифа!\n\n"
+        parts = [
+            "<research_context>\n",
+            "КРИТИЧЕСКИ ВАЖНО: Все выводы должны отвечать на вопросы и достигать целей из этого брифа!\n\n"
+        ]
 
         if self.brief_data['research_goals']:
-            context += f"ЦЕЛИ ИССЛЕДОВАНИЯ (ОБЯЗАТЕЛЬНО достичь каждую):\n"
-            for i, goal in enumerate(self.brief_data['research_goals'], 1):
-                context += f"{i}. {goal}\n"
+            parts.append("ЦЕЛИ ИССЛЕДОВАНИЯ (ОБЯЗАТЕЛЬНО достичь каждую):\n")
+            parts.extend(f"{i}. {goal}\n" for i, goal in enumerate(self.brief_data['research_goals'], 1))
 
         if self.brief_data['research_questions']:
-            context += f"\nИССЛЕДОВАТЕЛЬСКИЕ ВОПРОСЫ (ОБЯЗАТЕЛЬНО ответить на каждый):\n"
-            for i, question in enumerate(self.brief_data['research_questions'], 1):
-                context += f"{i}. {question}\n"
+            parts.append("\nИССЛЕДОВАТЕЛЬСКИЕ ВОПРОСЫ (ОБЯЗАТЕЛЬНО ответить на каждый):\n")
+            parts.extend(f"{i}. {question}\n" for i, question in enumerate(self.brief_data['research_questions'], 1))
 
         if self.brief_data['target_audience']:
-            context += f"\nЦЕЛЕВАЯ АУДИТОРИЯ:\n{self.brief_data['target_audience']}\n"
+            parts.append(f"\nЦЕЛЕВАЯ АУДИТОРИЯ:\n{self.brief_data['target_audience']}\n")
 
         if self.brief_data['business_context']:
-            context += f"\nБИЗНЕС-КОНТЕКСТ:\n{self.brief_data['business_context']}\n"
+            parts.append(f"\nБИЗНЕС-КОНТЕКСТ:\n{self.brief_data['business_context']}\n")
 
         if self.brief_data['success_metrics']:
-            context += f"\nМЕТРИКИ УСПЕХА (оценить влияние на каждую):\n"
-            for metric in self.brief_data['success_metrics']:
-                context += f"- {metric}\n"
+            parts.append("\nМЕТРИКИ УСПЕХА (оценить влияние на каждую):\n")
+            parts.extend(f"- {metric}\n" for metric in self.brief_data['success_metrics'])
 
-        context += "\nВАЖНО: Каждый вывод должен быть подкреплен ТОЧНЫМИ ЦИТАТАМИ из интервью!\n"
-        context += "</research_context>\n\n"
+        parts.append("\nВАЖНО: Каждый вывод должен быть подкреплен ТОЧНЫМИ ЦИТАТАМИ из интервью!\n")
+        parts.append("</research_context>\n\n")
+        parts.append(PROMPT_CACHE_BREAK)
 
-        return context
+        self._context_cache = ''.join(parts)
+        return self._context_cache
 
     def get_questions_for_analysis(self):
         """Получение вопросов для анализа"""
@@ -167,15 +195,237 @@ class BriefManager:
 # ========================================================================
 # OPENROUTER API WRAPPER
 # ========================================================================
+def iter_sse_deltas(response, usage: Dict = None, on_bytes=None):
+    """Разбор потока Server-Sent Events: (текст части, finish_reason)
+
+    Если передан usage, в него записывается статистика токенов из последнего события,
+    on_bytes(n) вызывается с размером каждой прочитанной строки.
+    """
+    # Строки читаем байтами и декодируем как UTF-8 сами: без charset в Content-Type
+    # requests выбрал бы latin-1, а str.splitlines режет по символам вроде \x85
+    for raw_line in response.iter_lines():
+        if on_bytes is not None:
+            on_bytes(len(raw_line) + 1)
+        line = raw_line.decode('utf-8')
+        # Пустые строки разделяют события, строки с ':' - служебные комментарии
+        if not line or line.startswith(':') or not line.startswith('data:'):
+            continue
+
+        payload = line[len('data:'):].strip()
+        if payload == '[DONE]':
+            return
+
+        event = json.loads(payload)
+        if 'error' in event:
+            raise Exception(f"{event['error'].get('code', '')} - {event['error'].get('message', '')}")
+        if usage is not None and event.get('usage'):
+            usage.update(event['usage'])
+
+        for choice in event.get('choices', []):
+            delta = choice.get('delta', {}).get('content') or ''
+            yield delta, choice.get('finish_reason')
+
+def _message_text(message: Dict) -> str:
+    """Текст сообщения чата (строка или части с cache_control)"""
+    content = message['content']
+    return content if isinstance(content, str) else ''.join(part['text'] for part in content)
+
+def _rejects_json_mode(response) -> bool:
+    """400 из-за response_format: другие ошибки запроса (длина контекста,
+    валидация) JSON-режим для модели не отключают"""
+    if response.status_code != 400:
+        return False
+    body = response.text.lower()
+    return 'response_format' in body or 'json_schema' in body
+
+# Одинаковые одновременные запросы всех оберток процесса (сессии Streamlit,
+# повторные нажатия кнопки) отправляются провайдеру один раз
+_in_flight_requests = SingleFlight()
+
 class OpenRouterAPIWrapper:
     """Обертка для безопасных вызовов OpenRouter API"""
 
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, stream: bool = True, max_continuations: int = 2, base_url: str = None,
+                 router: ModelRouter = None, hedging: bool = False, cancel_token: 'CancellationToken' = None):
         self.api_key = api_key
-        self.base_url = "https://openrouter.ai/api/v1/chat/completions"
+        # Отмена анализа прерывает ожидание одинакового запроса другой сессии
+        self.cancel_token = cancel_token
+        # OPENROUTER_BASE_URL позволяет направить запросы на локальный mock (benchmarks/mock_llm_server.py)
+        self.base_url = base_url or os.environ.get('OPENROUTER_BASE_URL', "https://openrouter.ai/api/v1/chat/completions")
+        self.stream = stream
+        self.max_continuations = max_continuations
+        # Статистика последнего вызова - своя у каждого потока
+        self._call_stats = threading.local()
+        self.json_mode_unsupported = set()
+        self.metrics = MetricsRecorder()
+        self.router = router or ModelRouter()
+        self.hedging = hedging
+        self.breakers = defaultdict(CircuitBreaker)
+        self.latency = LatencyTracker()
+        self._hedge_executor = None
+        self._executor_lock = threading.Lock()
+        # Пул keep-alive соединений: хватает на основной запрос и дубль в каждом потоке хеджирования
+        self.session = requests.Session()
+        self.session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=32))
+        self.session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=32))
+
+    def fork(self, cancel_token: 'CancellationToken' = None) -> 'OpenRouterAPIWrapper':
+        """Обертка для одного запуска анализа с общими ресурсами процесса
+
+        Пул соединений, выключатели, статистика задержек, пул потоков и
+        маршрутизатор общие, метрики и токен отмены - свои: параллельные
+        сессии не смешивают сводки запусков.
+        """
+        forked = copy.copy(self)
+        forked.cancel_token = cancel_token
+        forked.metrics = MetricsRecorder()
+        forked._call_stats = threading.local()
+        return forked
+
+    @property
+    def last_call_stats(self) -> Dict:
+        """Статистика последнего вызова модели в текущем потоке"""
+        return getattr(self._call_stats, 'stats', {})
+
+    def generate_content(self, prompt: str, model: str = None, max_tokens: int = 6000,
+                         response_format: Dict = None) -> str:
+        """Генерация контента через OpenRouter API
+
+        При обрыве по лимиту токенов (finish_reason=length) запрашивается
+        продолжение уже полученного текста вместо повторного запроса целиком.
+        response_format включает JSON-режим (см. ux_schemas.stage_response_format).
+        Без явной модели она выбирается по текущему этапу метрик (self.router).
+
+        С hedging=True (по умолчанию выключено), если модель отвечает дольше
+        p95 своих прошлых вызовов на этом этапе или падает, запрос дублируется
+        на резервную модель и берется первый ответ. После серии ошибок выключатель модели размыкается, и вызовы
+        сразу идут на резервную. Одинаковый запрос, который уже выполняется
+        в другом потоке, не отправляется повторно - ответ берется у него.
+        """
+        stage = self.metrics.current_stage()
+        model = model or self.router.model_for(stage)
+        # Ключ включает хеш API-ключа: пользователи с разными ключами не делят
+        # вызов (и его оплату), а отозванный ключ не получает чужой ответ
+        api_key_hash = hashlib.sha256(self.api_key.encode('utf-8')).hexdigest()
+        request_key = hashlib.sha256(json.dumps([self.base_url, api_key_hash, model, max_tokens, response_format, prompt],
+                                                ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+        check = self.cancel_token.raise_if_cancelled if self.cancel_token is not None else None
+
+        try:
+            with self.metrics.call(model) as record:
+                (content, from_fallback), leader = _in_flight_requests.do(request_key, partial(
+                    self._hedged_request, prompt, model, max_tokens, response_format, stage, record
+                ), check)
+                if not leader:
+                    self.metrics.add('coalesced')
+                elif from_fallback:
+                    self.metrics.add('fallback_wins')
+        except AnalysisCancelled:
+            # Отмена - не ошибка API: вызывающий код должен ее увидеть как есть
+            raise
+        except Exception as e:
+            raise Exception(f"OpenRouter API error: {str(e)}")
+        return content
+
+    def _hedged_request(self, prompt: str, model: str, max_tokens: int, response_format: Dict, stage: str,
+                        record: Dict):
+        """Запрос с учетом выключателей и дублем к резервной модели: (текст, ответила ли резервная)"""
+        fallback = self.router.fallback_for(model) if self.hedging else None
+        if fallback and not self.breakers[model].allow():
+            print(f"⚡ Модель {model} временно отключена после ошибок, использую {fallback}")
+            model, fallback = fallback, None
+        elif fallback and self.breakers[fallback].state == 'open':
+            fallback = None
+
+        parent = get_tracer().current()
+        return run_hedged(
+            self._executor(),
+            partial(self._attempt, prompt, model, max_tokens, response_format, stage, record, parent),
+            partial(self._attempt, prompt, fallback, max_tokens, response_format, stage, record, parent)
+            if fallback else None,
+            hedge_after=self.latency.hedge_delay((model, stage)),
+            on_hedge=partial(self.metrics.add, 'hedges')
+        )
+
+    def _executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        """Пул потоков для основного запроса и его дубля"""
+        with self._executor_lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = concurrent.futures.ThreadPoolExecutor(max_workers=16,
+                                                                             thread_name_prefix='llm-hedge')
+            return self._hedge_executor
+
+    def _attempt(self, prompt: str, model: str, max_tokens: int, response_format: Dict, stage: str,
+                 record: Dict, parent, abort: threading.Event) -> str:
+        """Запрос к одной модели: учет в вызове record, выключатель и статистика задержек"""
+        started = time.perf_counter()
+        with self.metrics.bind(record), get_tracer().span('llm_request', parent=parent, model=model):
+            try:
+                content = self._complete(prompt, model, max_tokens, response_format, abort)
+            except HedgeCancelled:
+                # Проигравший вызов прерван, но его длительность учитывается (как
+                # нижняя оценка задержки): иначе в выборку попадают только быстрые
+                # ответы, и порог хеджирования сползает к моменту отправки дубля
+                self.latency.record((model, stage), time.perf_counter() - started)
+                raise
+            except Exception:
+                if self.breakers[model].record_failure():
+                    print(f"⚡ Модель {model} отключена на {self.breakers[model].reset_timeout:.0f} с после серии ошибок")
+                raise
+        self.breakers[model].record_success()
+        self.latency.record((model, stage), time.perf_counter() - started)
+        return content
+
+    def _complete(self, prompt: str, model: str, max_tokens: int, response_format: Dict = None,
+                  abort: threading.Event = None) -> str:
+        """Ответ модели целиком: запрос и продолжения при обрыве по лимиту токенов"""
+        messages = [{"role": "user", "content": self._build_content(prompt, model)}]
+        parser = StreamingJSONParser()
+        content = ""
+        started = time.time()
+        stats = {'continuations': 0, 'time_to_first_token': None, 'stopped_early': False}
+
+        for attempt in range(self.max_continuations + 1):
+            if content:
+                # Префилл ассистента: модель продолжает с места обрыва
+                request_messages = messages + [{"role": "assistant", "content": content}]
+            else:
+                request_messages = messages
 
-    def generate_content(self, prompt: str, model: str = "anthropic/claude-3.5-sonnet", max_tokens: int = 6000) -> str:
-        """Генерация контента через OpenRouter API"""
+            if self.stream:
+                finish_reason = self._stream_completion(request_messages, model, max_tokens, parser,
+                                                        started, stats, response_format, abort)
+            else:
+                text, finish_reason = self._post_completion(request_messages, model, max_tokens,
+                                                            response_format)
+                parser.feed(text)
+            content = parser.text
+
+            if finish_reason != 'length' or parser.complete:
+                break
+            if attempt < self.max_continuations:
+                print(f"✂️ Ответ обрезан по лимиту токенов, запрашиваю продолжение ({attempt + 1}/{self.max_continuations})...")
+                stats['continuations'] += 1
+
+        stats['finish_reason'] = finish_reason
+        stats['total_time'] = round(time.time() - started, 3)
+        self._call_stats.stats = stats
+        return content
+
+    def _build_content(self, prompt: str, model: str):
+        """Текст промпта или части с cache_control по границам PROMPT_CACHE_BREAK"""
+        segments = [segment for segment in prompt.split(PROMPT_CACHE_BREAK) if segment]
+        if len(segments) < 2 or not model.startswith(EXPLICIT_PROMPT_CACHE_MODELS):
+            return ''.join(segments)
+
+        # Anthropic допускает не больше 4 точек кэширования - отмечаем последние
+        parts = [{"type": "text", "text": segment} for segment in segments]
+        for part in parts[:-1][-4:]:
+            part["cache_control"] = {"type": "ephemeral"}
+        return parts
+
+    def _request(self, messages: List[Dict], model: str, max_tokens: int, stream: bool,
+                 response_format: Dict = None):
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
@@ -183,34 +433,128 @@ class OpenRouterAPIWrapper:
 
         data = {
             "model": model,
-            "messages": [
-                {"role": "user", "content": prompt}
-            ],
+            "messages": messages,
             "max_tokens": max_tokens,
             "temperature": 0.7
         }
+        if stream:
+            data["stream"] = True
+            data["usage"] = {"include": True}
+        if response_format and model not in self.json_mode_unsupported:
+            data["response_format"] = response_format
+
+        # Тело сериализуем сами, чтобы учесть его размер без повторного json.dumps
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.metrics.add('requests')
+        self.metrics.add('request_bytes', len(body))
+
+        response = self.session.post(self.base_url, headers=headers, data=body, timeout=60, stream=stream)
+        if "response_format" in data and _rejects_json_mode(response):
+            # Модель не поддерживает JSON-режим - повторяем без него
+            print(f"⚠️ Модель {model} не поддерживает JSON-режим, запрашиваю без него")
+            self.json_mode_unsupported.add(model)
+            self.metrics.add('retries')
+            response.close()
+            return self._request(messages, model, max_tokens, stream)
+        response.raise_for_status()
+        return response
+
+    def _post_completion(self, messages: List[Dict], model: str, max_tokens: int, response_format: Dict = None):
+        """Обычный запрос: возвращает текст и finish_reason"""
+        response = self._request(messages, model, max_tokens, False, response_format)
+        self.metrics.add('response_bytes', len(response.content))
+        result = response.json()
+        choice = result["choices"][0]
+        self._record_usage(result.get('usage') or {}, model, messages, choice["message"]["content"])
+        return choice["message"]["content"], choice.get("finish_reason")
+
+    def _stream_completion(self, messages: List[Dict], model: str, max_tokens: int,
+                           parser: StreamingJSONParser, started: float, stats: Dict,
+                           response_format: Dict = None, abort: threading.Event = None) -> str:
+        """Потоковый запрос: части ответа сразу идут в инкрементальный парсер
+
+        stats - статистика текущего вызова (время до первого токена, досрочная остановка).
+        """
+        response = self._request(messages, model, max_tokens, True, response_format)
+        finish_reason = None
+        usage = {}
+        received_from = len(parser.text)
 
         try:
-            response = requests.post(self.base_url, headers=headers, json=data, timeout=60)
-            response.raise_for_status()
-            
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
-        except Exception as e:
-            raise Exception(f"OpenRouter API error: {str(e)}")
+            for delta, chunk_finish_reason in iter_sse_deltas(response, usage, self._count_response_bytes):
+                if abort is not None and abort.is_set():
+                    # Ответ уже получен от другой модели - соединение закрываем
+                    raise HedgeCancelled(model)
+                if delta and stats['time_to_first_token'] is None:
+                    stats['time_to_first_token'] = round(time.time() - started, 3)
+                finish_reason = chunk_finish_reason or finish_reason
+
+                if parser.feed(delta):
+                    # JSON получен полностью - остаток ответа не нужен
+                    stats['stopped_early'] = finish_reason is None
+                    return finish_reason or 'stop'
+        finally:
+            # При досрочной остановке провайдер не успевает прислать usage - токены оцениваются
+            self._record_usage(usage, model, messages, parser.text[received_from:])
+            response.close()
+
+        return finish_reason
+
+    def _count_response_bytes(self, size: int):
+        self.metrics.add('response_bytes', size)
+
+    def _record_usage(self, usage: Dict, model: str, messages: List[Dict], completion: str):
+        """Токены и стоимость запроса в метрики вызова
+
+        Токены в метриках - только присланные провайдером; если usage нет,
+        стоимость считается по оценке токенов из длины промпта и ответа.
+        """
+        prompt_tokens = usage.get('prompt_tokens', 0)
+        cached_prompt_tokens = (usage.get('prompt_tokens_details') or {}).get('cached_tokens', 0)
+        completion_tokens = usage.get('completion_tokens', 0)
+        self.metrics.add('prompt_tokens', prompt_tokens)
+        self.metrics.add('cached_prompt_tokens', cached_prompt_tokens)
+        self.metrics.add('completion_tokens', completion_tokens)
+
+        if not usage:
+            prompt_tokens = sum(estimate_tokens(_message_text(message)) for message in messages)
+            completion_tokens = estimate_tokens(completion)
+            self.metrics.add('estimated_usage')
+        self.metrics.add('cost_usd', call_cost(model, prompt_tokens, completion_tokens, cached_prompt_tokens,
+                                               self.router.prices))
 
     def extract_json(self, text: str) -> Dict:
         """Извлечение JSON из текста ответа"""
-        try:
-            # Ищем JSON в тексте
-            json_match = re.search(r'\{.*\}', text, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group())
-            else:
-                # Если JSON не найден, возвращаем структурированный ответ
-                return {"content": text}
-        except Exception:
+        data, status = extract_json_with_status(text)
+        if status == STATUS_FAILED or not isinstance(data, dict):
+            # Если JSON-объект не найден (или в ответе массив/скаляр), возвращаем структурированный ответ
             return {"content": text}
+        return data
+
+# ========================================================================
+# ОТМЕНА ДОЛГИХ АНАЛИЗОВ
+# ========================================================================
+class AnalysisCancelled(Exception):
+    """Анализ был отменен пользователем"""
+
+class CancellationToken:
+    """Токен кооперативной отмены, проверяется между вызовами LLM"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        """Запросить отмену"""
+        self._event.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        """Прервать выполнение, если запрошена отмена"""
+        if self._event.is_set():
+            raise AnalysisCancelled("Анализ отменен")
 
 # ========================================================================
 # КЛАСС ДЛЯ КЭШИРОВАНИЯ
@@ -237,3 +581,42 @@ class CacheManager:
         cache_file = self.cache_dir / f"{key}.pkl"
         with open(cache_file, 'wb') as f:
             pickle.dump(value, f)
+
+# ========================================================================
+# ЧЕКПОИНТЫ ЭТАПОВ АНАЛИЗА
+# ========================================================================
+class CheckpointManager:
+    """Сохранение результатов этапов для возобновления прерванного анализа"""
+
+    def __init__(self, run_id: str, checkpoint_dir="checkpoints"):
+        self.run_dir = Path(checkpoint_dir) / run_id
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, stage: str) -> Path:
+        return self.run_dir / f"{stage}.pkl"
+
+    def has(self, stage: str) -> bool:
+        """Есть ли сохраненный результат этапа"""
+        return self._path(stage).exists()
+
+    def load(self, stage: str):
+        """Загрузить результат этапа"""
+        with open(self._path(stage), 'rb') as f:
+            return pickle.load(f)
+
+    def save(self, stage: str, value: Any):
+        """Сохранить результат этапа (атомарно, чтобы сбой не оставил битый файл)"""
+        tmp_file = self._path(stage).with_suffix('.tmp')
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(value, f)
+        tmp_file.replace(self._path(stage))
+
+    def completed_stages(self) -> List[str]:
+        """Список завершенных этапов"""
+        return sorted(p.stem for p in self.run_dir.glob('*.pkl'))
+
+    def clear(self):
+        """Удалить чекпоинты после успешного завершения"""
+        for checkpoint_file in self.run_dir.glob('*'):
+            checkpoint_file.unlink()
+        self.run_dir.rmdir()
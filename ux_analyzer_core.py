@@ -4,22 +4,41 @@
 import json
 import re
 import time
+import concurrent.futures
 from typing import Dict, List, Any
 from collections import defaultdict
 from ux_analyzer_classes import (
     OpenRouterAPIWrapper, BriefManager, InterviewSummary, 
-    ResearchFindings, CacheManager
+    ResearchFindings, CacheManager, CancellationToken, AnalysisCancelled,
+    CheckpointManager, PROMPT_CACHE_BREAK
+)
+from ux_tracing import get_tracer
+from ux_schemas import (
+    render_stage_template, stage_response_format, validate_stage_response, empty_stage_value
 )
 
 # ========================================================================
 # ОСНОВНОЙ КЛАСС АНАЛИЗАТОРА
 # ========================================================================
 class AdvancedUXAnalyzer:
-    def __init__(self, api_key: str):
-        self.api_wrapper = OpenRouterAPIWrapper(api_key)
+    def __init__(self, api_key: str, cancel_token: CancellationToken = None,
+                 checkpoint_dir: str = "checkpoints", api_wrapper: OpenRouterAPIWrapper = None,
+                 cache: CacheManager = None):
+        """api_wrapper и cache можно передать общими для процесса (см. OpenRouterAPIWrapper.fork)"""
+        self.cancel_token = cancel_token or CancellationToken()
+        self.api_wrapper = api_wrapper or OpenRouterAPIWrapper(api_key, cancel_token=self.cancel_token)
+        self.metrics = self.api_wrapper.metrics
         self.brief_manager = BriefManager()
-        self.cache = CacheManager()
+        self.cache = cache or CacheManager()
         self.interview_summaries = []
+        # Номера интервью, для которых после ошибки подставлено пустое саммари
+        self.failed_interviews = []
+        # Этапы, вместо результата которых после ошибки подставлено значение по умолчанию
+        self.fallback_stages = []
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoints = None
+        self.max_field_retries = 1
+        self.schema_failures = []
 
     def set_brief(self, brief_content: str):
         """Установка брифа исследования"""
@@ -27,121 +46,179 @@ class AdvancedUXAnalyzer:
 
     def analyze_transcripts(self, transcripts: List[str]) -> Dict:
         """Комплексный анализ транскриптов"""
-        print("🧠 Начинаю глубокий анализ...")
-
-        # Проверка количества интервью
-        if len(transcripts) < 3:
-            print(f"⚠️  ВНИМАНИЕ: Рекомендуется минимум 3 интервью для качественного анализа!")
-            print(f"   У вас: {len(transcripts)} интервью")
-
-        # Анализ каждого интервью
-        interview_summaries = []
-        for i, transcript in enumerate(transcripts):
-            summary = self._deep_analyze_interview(transcript, i+1)
-            interview_summaries.append(summary)
+        with get_tracer().span('analysis', mode='sequential', interviews=len(transcripts)):
+            print("🧠 Начинаю глубокий анализ...")
+
+            # Проверка количества интервью
+            if len(transcripts) < 3:
+                print("⚠️  ВНИМАНИЕ: Рекомендуется минимум 3 интервью для качественного анализа!")
+                print(f"   У вас: {len(transcripts)} интервью")
+
+            run_id = self._get_run_id(transcripts)
+            self.metrics.start_run(run_id)
+            self.checkpoints = CheckpointManager(run_id, self.checkpoint_dir)
+            self.failed_interviews = []
+            self.fallback_stages = []
+            if self.checkpoints.completed_stages():
+                print(f"📦 Возобновляю анализ, завершенные этапы: {', '.join(self.checkpoints.completed_stages())}")
+
+            # Анализ каждого интервью
+            interview_summaries = []
+            for i, transcript in enumerate(transcripts):
+                try:
+                    summary = self._run_stage('interview', self._deep_analyze_interview, transcript, i+1,
+                                              interview_id=i+1)
+                except AnalysisCancelled:
+                    raise
+                except Exception as e:
+                    summary = self._interview_fallback(i+1, e)
+                interview_summaries.append(summary)
+
+            self.interview_summaries = interview_summaries
+
+            # Продолжение анализа
+            results = self._continue_analysis(interview_summaries, len(transcripts))
+            self.checkpoints.clear()
+            self.metrics.finish_run()
+            return results
+
+    def analyze_transcripts_parallel(self, transcripts: List[str], max_workers: int = 3) -> Dict:
+        """Анализ с параллельной обработкой интервью"""
+        with get_tracer().span('analysis', mode='parallel', interviews=len(transcripts)):
+            print("🧠 Начинаю параллельный анализ...")
+
+            if len(transcripts) < 3:
+                print("⚠️  ВНИМАНИЕ: Рекомендуется минимум 3 интервью для качественного анализа!")
+                print(f"   У вас: {len(transcripts)} интервью")
+
+            run_id = self._get_run_id(transcripts)
+            self.metrics.start_run(run_id)
+            self.checkpoints = CheckpointManager(run_id, self.checkpoint_dir)
+            self.failed_interviews = []
+            self.fallback_stages = []
+            if self.checkpoints.completed_stages():
+                print(f"📦 Возобновляю анализ, завершенные этапы: {', '.join(self.checkpoints.completed_stages())}")
+
+            # Ограничиваем количество параллельных запросов
+            max_workers = max(1, min(max_workers, len(transcripts)))
+            interview_summaries = [None] * len(transcripts)
+
+            # В потоках пула нет своего span - родителя передаем явно
+            trace_parent = get_tracer().current()
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                future_to_idx = {
+                    executor.submit(self._run_stage, 'interview', self._deep_analyze_interview, transcript, i+1,
+                                    interview_id=i+1, queued_at=time.perf_counter(), trace_parent=trace_parent): i
+                    for i, transcript in enumerate(transcripts)
+                }
 
-        self.interview_summaries = interview_summaries
+                for future in concurrent.futures.as_completed(future_to_idx):
+                    idx = future_to_idx[future]
+                    try:
+                        interview_summaries[idx] = future.result()
+                    except AnalysisCancelled:
+                        # Остальные потоки прервутся на следующем вызове LLM
+                        self.cancel_token.cancel()
+                        raise
+                    except Exception as e:
+                        interview_summaries[idx] = self._interview_fallback(idx+1, e)
+
+            self.interview_summaries = interview_summaries
+
+            results = self._continue_analysis(interview_summaries, len(transcripts))
+            self.checkpoints.clear()
+            self.metrics.finish_run()
+            return results
+
+    def _get_run_id(self, transcripts: List[str]) -> str:
+        """Идентификатор запуска: одинаковые транскрипты и бриф дают тот же id"""
+        brief = json.dumps(self.brief_manager.brief_data, ensure_ascii=False, sort_keys=True)
+        return self.cache.get_hash(brief + '\x00'.join(transcripts))
+
+    def _run_stage(self, stage: str, func, *args, interview_id: int = None, queued_at: float = None,
+                   trace_parent=None, fallback: Any = None):
+        """Выполнение этапа с проверкой отмены, сохранением чекпоинта и учетом в метриках
+
+        Для интервью чекпоинт сохраняется как stage_<номер>, а в метриках этап
+        один - с номером интервью в interview_id. queued_at - момент постановки
+        в пул потоков (time.perf_counter()) для учета ожидания в очереди,
+        trace_parent - span, к которому относится этап из потока пула.
+
+        fallback - результат этапа при ошибке (кроме отмены). Он не сохраняется
+        в чекпоинт, и этап попадает в fallback_stages: при возобновлении этап
+        выполняется заново. Без fallback ошибка передается вызывающему коду.
+        """
+        self.cancel_token.raise_if_cancelled()
+        checkpoint = f"{stage}_{interview_id}" if interview_id is not None else stage
+
+        if self.checkpoints is not None and self.checkpoints.has(checkpoint):
+            return self.checkpoints.load(checkpoint)
 
-        # Продолжение анализа
-        return self._continue_analysis(interview_summaries, len(transcripts))
+        try:
+            with self.metrics.stage(stage, interview_id=interview_id, queued_at=queued_at, trace_parent=trace_parent):
+                result = func(*args)
+        except AnalysisCancelled:
+            raise
+        except Exception as e:
+            if fallback is None:
+                raise
+            print(f"❌ Ошибка на этапе {stage}: {e}")
+            self.fallback_stages.append(stage)
+            return fallback
+
+        # Этапы после интервью с пустым саммари или этапа с fallback не сохраняются:
+        # при возобновлении те выполняются заново, и последующие нужно пересчитать
+        degraded = self.failed_interviews or self.fallback_stages
+        if self.checkpoints is not None and (interview_id is not None or not degraded):
+            self.checkpoints.save(checkpoint, result)
+        return result
+
+    def _generate(self, prompt: str, max_tokens: int, response_format: Dict = None) -> str:
+        """Вызов LLM с проверкой отмены перед запросом"""
+        self.cancel_token.raise_if_cancelled()
+        return self.api_wrapper.generate_content(prompt, max_tokens=max_tokens, response_format=response_format)
+
+    def _generate_structured(self, stage: str, build_prompt, max_tokens: int) -> Dict:
+        """Запрос этапа в JSON-режиме с проверкой ответа по схеме из ux_schemas
+
+        build_prompt(schema) собирает промпт вокруг шаблона ответа. Поля, не
+        прошедшие проверку, перезапрашиваются отдельно - без повтора всего этапа.
+        """
+        response = self._generate(build_prompt(render_stage_template(stage)), max_tokens,
+                                  stage_response_format(stage))
+        data, failed = validate_stage_response(stage, self.api_wrapper.extract_json(response))
+
+        for _ in range(self.max_field_retries):
+            if not failed:
+                break
+            print(f"🔁 Этап {stage}: перезапрашиваю поля {', '.join(failed)}")
+            response = self._generate(build_prompt(render_stage_template(stage, failed)), max_tokens,
+                                      stage_response_format(stage, failed))
+            patch, still_failed = validate_stage_response(stage, self.api_wrapper.extract_json(response), failed)
+            data.update({field: patch[field] for field in failed if field not in still_failed})
+            failed = still_failed
+
+        if failed:
+            print(f"⚠️ Этап {stage}: поля не прошли проверку схемы: {', '.join(failed)}")
+            self.schema_failures.append({'stage': stage, 'fields': failed})
+            for field in failed:
+                data[field] = empty_stage_value(stage, field)
+        return data
 
     def _deep_analyze_interview(self, transcript: str, interview_id: int) -> InterviewSummary:
         """Глубокий анализ одного интервью"""
         context = self.brief_manager.get_brief_context()
-        
-        prompt = f"""{context}
 
-ПРОАНАЛИЗИРУЙ ЭТО ИНТЕРВЬЮ #{interview_id} И СОЗДАЙ ДЕТАЛЬНОЕ САММАРИ.
+        # Инструкции и шаблон одинаковы для всех интервью и идут в кэшируемом
+        # префиксе, транскрипт - после PROMPT_CACHE_BREAK
+        def build_prompt(schema: str) -> str:
+            return f"""{context}
 
-ТРАНСКРИПТ ИНТЕРВЬЮ:
-{transcript[:8000]}
+ПРОАНАЛИЗИРУЙ ИНТЕРВЬЮ НИЖЕ И СОЗДАЙ ДЕТАЛЬНОЕ САММАРИ.
 
 СОЗДАЙ JSON СТРУКТУРУ:
-{{
-    "respondent_profile": {{
-        "age_range": "возрастная группа",
-        "profession": "профессия",
-        "tech_literacy": "уровень технической грамотности",
-        "experience_level": "опыт использования продукта",
-        "main_goals": ["цель 1", "цель 2"],
-        "pain_level": "уровень фрустрации (1-10)"
-    }},
-    "key_themes": [
-        {{
-            "theme": "название темы",
-            "description": "описание",
-            "quotes": ["цитата 1", "цитата 2"],
-            "importance": "важность (1-10)"
-        }}
-    ],
-    "pain_points": [
-        {{
-            "pain": "описание проблемы",
-            "severity": "серьезность (1-10)",
-            "frequency": "частота упоминаний",
-            "quotes": ["цитата 1", "цитата 2"],
-            "impact": "влияние на пользователя"
-        }}
-    ],
-    "needs": [
-        {{
-            "need": "потребность",
-            "type": "явная/скрытая",
-            "priority": "приоритет (1-10)",
-            "quotes": ["цитата 1", "цитата 2"]
-        }}
-    ],
-    "insights": [
-        "инсайт 1",
-        "инсайт 2",
-        "инсайт 3"
-    ],
-    "emotional_journey": [
-        {{
-            "moment": "момент в путешествии",
-            "emotion": "эмоция",
-            "trigger": "триггер",
-            "intensity": "интенсивность (1-10)",
-            "quote": "цитата"
-        }}
-    ],
-    "contradictions": [
-        "противоречие 1",
-        "противоречие 2"
-    ],
-    "quotes": [
-        {{
-            "text": "полная цитата (минимум 50 слов)",
-            "context": "контекст",
-            "importance": "важность (1-10)",
-            "theme": "к какой теме относится"
-        }}
-    ],
-    "business_pains": [
-        {{
-            "pain": "бизнес-проблема",
-            "impact": "влияние на бизнес",
-            "quotes": ["цитата 1", "цитата 2"]
-        }}
-    ],
-    "user_problems": [
-        {{
-            "problem": "пользовательская проблема",
-            "severity": "серьезность (1-10)",
-            "quotes": ["цитата 1", "цитата 2"]
-        }}
-    ],
-    "opportunities": [
-        "возможность 1",
-        "возможность 2"
-    ],
-    "sentiment_score": "общий сентимент (-10 до +10)",
-    "brief_related_findings": {{
-        "goals_mentioned": ["цель 1", "цель 2"],
-        "questions_answered": ["вопрос 1", "вопрос 2"],
-        "metrics_impact": ["метрика 1", "метрика 2"]
-    }}
-}}
+{schema}
 
 КРИТИЧЕСКИ ВАЖНО:
 - Используй ТОЛЬКО факты из интервью
@@ -152,36 +229,50 @@ class AdvancedUXAnalyzer:
 - Для каждой проблемы укажи конкретные цитаты из интервью
 - Для каждой персоны создай детальное описание на основе реальных данных
 - Все инсайты должны быть подкреплены цитатами из интервью
-- ОБЯЗАТЕЛЬНО верни валидный JSON без дополнительного текста"""
+- ОБЯЗАТЕЛЬНО верни валидный JSON без дополнительного текста
+{PROMPT_CACHE_BREAK}
+ИНТЕРВЬЮ #{interview_id}
 
-        try:
-            response = self.api_wrapper.generate_content(prompt, max_tokens=4000)
-            print(f"🔍 DEBUG: API response length: {len(response)}")
-            print(f"🔍 DEBUG: API response preview: {response[:200]}...")
-            
-            data = self.api_wrapper.extract_json(response)
-            print(f"🔍 DEBUG: Extracted data keys: {list(data.keys()) if isinstance(data, dict) else 'Not a dict'}")
-            
-            # Создаем InterviewSummary
-            return InterviewSummary(
-                interview_id=interview_id,
-                respondent_profile=data.get('respondent_profile', {}),
-                key_themes=data.get('key_themes', []),
-                pain_points=data.get('pain_points', []),
-                needs=data.get('needs', []),
-                insights=data.get('insights', []),
-                emotional_journey=data.get('emotional_journey', []),
-                contradictions=data.get('contradictions', []),
-                quotes=data.get('quotes', []),
-                business_pains=data.get('business_pains', []),
-                user_problems=data.get('user_problems', []),
-                opportunities=data.get('opportunities', []),
-                sentiment_score=float(data.get('sentiment_score', 0)),
-                brief_related_findings=data.get('brief_related_findings', {})
-            )
-        except Exception as e:
-            print(f"❌ Ошибка при анализе интервью {interview_id}: {e}")
-            return self._create_empty_summary(interview_id)
+ТРАНСКРИПТ ИНТЕРВЬЮ:
+{transcript[:8000]}"""
+
+        # Ошибки не перехватываются: пустое саммари подставляет _interview_fallback
+        data = self._generate_structured('interview_summary', build_prompt, max_tokens=4000)
+        print(f"🔍 DEBUG: Extracted data keys: {list(data.keys())}")
+        get_tracer().annotate(extracted_keys=len(data), transcript_chars=len(transcript))
+
+        # Создаем InterviewSummary
+        return InterviewSummary(
+            interview_id=interview_id,
+            respondent_profile=data.get('respondent_profile', {}),
+            key_themes=data.get('key_themes', []),
+            pain_points=data.get('pain_points', []),
+            needs=data.get('needs', []),
+            insights=data.get('insights', []),
+            emotional_journey=data.get('emotional_journey', []),
+            contradictions=data.get('contradictions', []),
+            quotes=data.get('quotes', []),
+            business_pains=data.get('business_pains', []),
+            user_problems=data.get('user_problems', []),
+            opportunities=data.get('opportunities', []),
+            sentiment_score=self._parse_score(data.get('sentiment_score')),
+            brief_related_findings=data.get('brief_related_findings', {})
+        )
+
+    def _interview_fallback(self, interview_id: int, error: Exception) -> InterviewSummary:
+        """Пустое саммари вместо интервью с ошибкой
+
+        Подставляется вне _run_stage, поэтому в чекпоинт не попадает: при
+        возобновлении анализа интервью запрашивается заново.
+        """
+        print(f"❌ Ошибка при анализе интервью {interview_id}: {error}")
+        self.failed_interviews.append(interview_id)
+        return self._create_empty_summary(interview_id)
+
+    def _parse_score(self, value: Any) -> float:
+        """Числовая оценка из ответа модели: 7, "7", "-3 (негативный)"; иначе 0"""
+        match = re.search(r'[-+]?\d+(?:[.,]\d+)?', str(value or ''))
+        return float(match.group().replace(',', '.')) if match else 0.0
 
     def _create_empty_summary(self, interview_id: int) -> InterviewSummary:
         """Создание пустого саммари при ошибке"""
@@ -207,36 +298,39 @@ class AdvancedUXAnalyzer:
         print("🔄 Продолжаю анализ...")
 
         # Генерация текущих метрик
-        current_metrics = self._generate_current_metrics(interview_summaries)
+        current_metrics = self._run_stage('current_metrics', self._generate_current_metrics, interview_summaries)
 
         # Кросс-анализ интервью
-        cross_analysis = self._cross_analyze_interviews(interview_summaries)
+        cross_analysis = self._run_stage('cross_analysis', self._cross_analyze_interviews, interview_summaries)
 
         # Выявление поведенческих паттернов
-        patterns = self._identify_behavioral_patterns(interview_summaries, cross_analysis)
+        patterns = self._run_stage('patterns', self._identify_behavioral_patterns, interview_summaries, cross_analysis)
 
         # Сегментация аудитории
-        segments = self._segment_audience(interview_summaries, patterns)
+        segments = self._run_stage('segments', self._segment_audience, interview_summaries, patterns)
 
         # Создание персон
-        personas = self._create_personas(segments, interview_summaries)
+        personas = self._run_stage('personas', self._create_personas, segments, interview_summaries)
 
         # Генерация финальных находок
-        findings = self._generate_final_findings(
+        findings = self._run_stage(
+            'findings', self._generate_final_findings,
             interview_summaries, cross_analysis, patterns, segments, personas
         )
 
         findings.current_metrics = current_metrics
 
         # Генерация рекомендаций
-        recommendations = self._generate_recommendations(findings.key_insights)
+        recommendations = self._run_stage('recommendations', self._generate_recommendations, findings.key_insights,
+                                          fallback={"quick_wins": [], "strategic_initiatives": []})
 
         # Ответы на вопросы брифа
-        brief_answers = self._analyze_brief_questions(interview_summaries, findings)
+        brief_answers = self._run_stage('brief_answers', self._analyze_brief_questions, interview_summaries, findings,
+                                        fallback={"answers": []})
         findings.brief_answers = brief_answers
 
         # Оценка достижения целей
-        goal_achievement = self._assess_goal_achievement(findings, interview_summaries)
+        goal_achievement = self._run_stage('goal_achievement', self._assess_goal_achievement, findings, interview_summaries)
         findings.goal_achievement = goal_achievement
 
         return {
@@ -250,6 +344,8 @@ class AdvancedUXAnalyzer:
             'interview_summaries': interview_summaries,
             'findings': findings,
             'total_interviews': total_interviews,
+            'failed_interviews': list(self.failed_interviews),
+            'fallback_stages': list(self.fallback_stages),
             'current_metrics': current_metrics,
             'personas': personas,
             'brief_data': self.brief_manager.brief_data if self.brief_manager.has_brief else None,
@@ -526,7 +622,8 @@ class AdvancedUXAnalyzer:
         """Генерация рекомендаций"""
         context = self.brief_manager.get_brief_context()
         
-        prompt = f"""{context}
+        def build_prompt(schema: str) -> str:
+            return f"""{context}
 
 На основе выявленных проблем создай КОНКРЕТНЫЕ рекомендации.
 
@@ -534,32 +631,10 @@ class AdvancedUXAnalyzer:
 {json.dumps(insights[:5], ensure_ascii=False, indent=2)}
 
 Верни JSON:
-{{
-    "quick_wins": [
-        {{
-            "title": "Конкретное решение",
-            "description": "Что именно сделать",
-            "implementation_steps": ["Шаг 1", "Шаг 2", "Шаг 3"],
-            "expected_impact": "Ожидаемый эффект",
-            "timeline": "Срок реализации"
-        }}
-    ],
-    "strategic_initiatives": [
-        {{
-            "title": "Стратегическая инициатива",
-            "description": "Детальное описание",
-            "expected_roi": "Ожидаемая отдача",
-            "implementation_phases": ["Фаза 1", "Фаза 2"]
-        }}
-    ]
-}}"""
+{schema}"""
 
-        try:
-            response = self.api_wrapper.generate_content(prompt, max_tokens=3000)
-            return self.api_wrapper.extract_json(response)
-        except Exception as e:
-            print(f"❌ Ошибка при генерации рекомендаций: {e}")
-            return {"quick_wins": [], "strategic_initiatives": []}
+        # Ошибки не перехватываются: пустые рекомендации подставляет _run_stage
+        return self._generate_structured('recommendations', build_prompt, max_tokens=3000)
 
     def _analyze_brief_questions(self, summaries: List[InterviewSummary], findings: ResearchFindings) -> Dict:
         """Анализ ответов на вопросы брифа"""
@@ -577,7 +652,8 @@ class AdvancedUXAnalyzer:
                 if isinstance(quote, dict) and quote.get('text'):
                     all_quotes.append(f"Интервью {summary.interview_id}: {quote['text']}")
 
-        prompt = f"""Ответь на каждый вопрос из брифа на основе анализа интервью.
+        def build_prompt(schema: str) -> str:
+            return f"""Ответь на каждый вопрос из брифа на основе анализа интервью.
 
 ВОПРОСЫ БРИФА:
 {chr(10).join(f"{i+1}. {q}" for i, q in enumerate(questions))}
@@ -586,23 +662,10 @@ class AdvancedUXAnalyzer:
 {chr(10).join(all_quotes[:10])}
 
 Верни JSON:
-{{
-    "answers": [
-        {{
-            "question": "Вопрос из брифа",
-            "answer": "Подробный ответ с цитатами",
-            "supporting_quotes": ["цитата 1", "цитата 2"],
-            "confidence": "уровень уверенности (1-10)"
-        }}
-    ]
-}}"""
+{schema}"""
 
-        try:
-            response = self.api_wrapper.generate_content(prompt, max_tokens=4000)
-            return self.api_wrapper.extract_json(response)
-        except Exception as e:
-            print(f"❌ Ошибка при анализе вопросов брифа: {e}")
-            return {"answers": []}
+        # Ошибки не перехватываются: пустые ответы подставляет _run_stage
+        return self._generate_structured('brief_answers', build_prompt, max_tokens=4000)
 
     def _assess_goal_achievement(self, findings: ResearchFindings, summaries: List[InterviewSummary]) -> Dict:
         """Оценка достижения целей"""
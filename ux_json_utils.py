@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""UX JSON Utils - Устойчивое извлечение JSON из ответов LLM"""
+
+import json
+import re
+from functools import partial
+from typing import Any, List, Tuple
+
+# ========================================================================
+# ТОКЕНИЗАЦИЯ
+# ========================================================================
+# Строка (развернутый цикл без катастрофического бэктрекинга), структурный
+# символ, голый литерал/число или незакрытая кавычка (обрезанный ответ)
+_TOKEN_RE = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}\[\],:]|[^\s{}\[\],:"]+|"')
+_FENCE_RE = re.compile(r'```(?:json|JSON)?\s*')
+_OPENERS_RE = re.compile(r'[{\[]')
+_PARTIAL_ESCAPE_RE = re.compile(r'\\(?:u[0-9a-fA-F]{0,3})?$')
+_CLOSERS = {'{': '}', '[': ']'}
+
+# Модели часто оставляют переносы строк внутри строк - разрешаем их
+_loads = partial(json.loads, strict=False)
+
+# Сколько кандидатов пробуем, прежде чем сдаться
+MAX_CANDIDATES = 20
+
+STATUS_OK = 'ok'
+STATUS_REPAIRED = 'repaired'
+STATUS_TRUNCATED = 'truncated'
+STATUS_FAILED = 'failed'
+
+
+class _ScanResult:
+    """Результат однопроходного разбора одного JSON-кандидата"""
+
+    def __init__(self):
+        self.end = None              # конец значения, если оно закрыто
+        self.dangling_commas = []    # позиции висячих запятых перед } и ]
+        self.safe_end = None         # позиция, до которой можно обрезать
+        self.safe_stack = []         # открытые скобки в этой позиции
+        self.open_string = None      # начало обрезанной строки-значения
+        self.stack = []              # открытые скобки в конце текста
+        self.mismatch = False
+
+
+def _scan(text: str, start: int) -> _ScanResult:
+    """Разбор от открывающей скобки за один проход по токенам"""
+    result = _ScanResult()
+    stack = []
+    expect_key = []
+    prev_token = ''
+    prev_comma = -1
+
+    for match in _TOKEN_RE.finditer(text, start):
+        token = match.group()
+        first = token[0]
+
+        if first in '{[':
+            stack.append(first)
+            expect_key.append(first == '{')
+            result.safe_end, result.safe_stack = match.end(), list(stack)
+        elif first in '}]':
+            if not stack or _CLOSERS[stack[-1]] != first:
+                result.mismatch = True
+                return result
+            if prev_token == ',':
+                result.dangling_commas.append(prev_comma)
+            stack.pop()
+            expect_key.pop()
+            if not stack:
+                result.end = match.end()
+                return result
+            result.safe_end, result.safe_stack = match.end(), list(stack)
+        elif first == ',':
+            if stack[-1] == '{':
+                expect_key[-1] = True
+            prev_comma = match.start()
+        elif first == ':':
+            expect_key[-1] = False
+        elif first == '"':
+            is_key = stack[-1] == '{' and expect_key[-1]
+            if len(token) == 1:
+                # Незакрытая кавычка: ответ оборвался внутри строки
+                if not is_key:
+                    result.open_string = match.start()
+                break
+            if not is_key:
+                result.safe_end, result.safe_stack = match.end(), list(stack)
+        else:
+            # Число или литерал; на самом конце текста он мог быть обрезан
+            if match.end() < len(text):
+                result.safe_end, result.safe_stack = match.end(), list(stack)
+
+        prev_token = first
+
+    result.stack = stack
+    return result
+
+
+def _drop_positions(fragment: str, positions: List[int], offset: int) -> str:
+    """Удаление символов (висячих запятых) по абсолютным позициям"""
+    if not positions:
+        return fragment
+    chars = list(fragment)
+    for pos in reversed(positions):
+        if 0 <= pos - offset < len(chars):
+            del chars[pos - offset]
+    return ''.join(chars)
+
+
+def _closers(stack: List[str]) -> str:
+    return ''.join(_CLOSERS[bracket] for bracket in reversed(stack))
+
+
+def _parse_candidate(text: str, start: int) -> Tuple[Any, str, int]:
+    """Разбор кандидата, начинающегося с открывающей скобки; возвращает и его конец"""
+    scan = _scan(text, start)
+
+    if scan.mismatch:
+        return None, STATUS_FAILED, start + 1
+
+    if scan.end is not None:
+        fragment = text[start:scan.end]
+        try:
+            return _loads(fragment), STATUS_OK, scan.end
+        except ValueError:
+            pass
+        repaired = _drop_positions(fragment, scan.dangling_commas, start)
+        try:
+            return _loads(repaired), STATUS_REPAIRED, scan.end
+        except ValueError:
+            return None, STATUS_FAILED, start + 1
+
+    # Ответ оборван: закрываем строку и все открытые скобки
+    if scan.open_string is not None:
+        fragment = _PARTIAL_ESCAPE_RE.sub('', text[start:].rstrip()) + '"'
+        stack = scan.stack
+        commas = scan.dangling_commas
+    elif scan.safe_end is not None:
+        fragment = text[start:scan.safe_end]
+        stack = scan.safe_stack
+        commas = [pos for pos in scan.dangling_commas if pos < scan.safe_end]
+    else:
+        return None, STATUS_FAILED, start + 1
+
+    repaired = _drop_positions(fragment, commas, start) + _closers(stack)
+    try:
+        return _loads(repaired), STATUS_TRUNCATED, len(text)
+    except ValueError:
+        return None, STATUS_FAILED, start + 1
+
+
+def _find_best_candidate(text: str, begin: int, end: int) -> Tuple[Any, str]:
+    """Поиск самого крупного JSON-значения в text[begin:end]
+
+    Кандидаты не перекрываются: после успешного разбора поиск продолжается
+    с конца найденного значения, поэтому весь текст просматривается линейно.
+    Самый крупный кандидат выигрывает у случайных скобок в тексте вроде "[1]".
+    """
+    best, best_status, best_size = None, STATUS_FAILED, 0
+    failures = 0
+    pos = begin
+
+    while failures < MAX_CANDIDATES:
+        opener = _OPENERS_RE.search(text, pos, end)
+        if not opener:
+            break
+
+        data, status, candidate_end = _parse_candidate(text, opener.start())
+        if status == STATUS_FAILED:
+            failures += 1
+        elif candidate_end - opener.start() > best_size:
+            best, best_status, best_size = data, status, candidate_end - opener.start()
+        pos = candidate_end
+
+    return best, best_status
+
+
+def extract_json_with_status(text: str) -> Tuple[Any, str]:
+    """Извлечение JSON из ответа LLM с признаком того, как он был получен
+
+    Статусы: ok - валидный JSON, repaired - исправлены висячие запятые,
+    truncated - ответ был обрезан и достроен, failed - JSON не найден.
+    """
+    if not text:
+        return None, STATUS_FAILED
+
+    try:
+        return _loads(text), STATUS_OK
+    except ValueError:
+        pass
+
+    # Если есть блок ```json, сначала ищем в нем
+    fence = _FENCE_RE.search(text)
+    if fence:
+        data, status = _find_best_candidate(text, fence.end(), len(text))
+        if status != STATUS_FAILED:
+            return data, status
+
+    return _find_best_candidate(text, 0, len(text))
+
+
+def extract_json(text: str, default: Any = None) -> Any:
+    """Извлечение JSON из ответа LLM; при неудаче возвращает default ({} по умолчанию)"""
+    data, status = extract_json_with_status(text)
+    if status == STATUS_FAILED:
+        return {} if default is None else default
+    return data
+
+
+# ========================================================================
+# ИНКРЕМЕНТАЛЬНЫЙ РАЗБОР ПОТОКОВОГО ОТВЕТА
+# ========================================================================
+_LEADING_JSON_RE = re.compile(r'\s*(?:```(?:json|JSON)?\s*)?([{\[])')
+
+
+class StreamingJSONParser:
+    """Инкрементальный разбор ответа, приходящего по частям
+
+    Следит за скобками JSON, которым начинается ответ, и сообщает, когда
+    значение полностью получено: дальше поток можно не дочитывать. Ответы,
+    начинающиеся с текста (например, саммари чанков), только накапливаются.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.value = None
+        self.status = None
+        self.complete = False
+        self._start = None
+        self._pos = 0
+        self._stack = []
+        self._disabled = False
+
+    def feed(self, chunk: str) -> bool:
+        """Добавить часть ответа; True, если JSON уже полностью получен"""
+        if not chunk:
+            return self.complete
+        self.text += chunk
+        if self.complete or self._disabled:
+            return self.complete
+
+        if self._start is None:
+            leading = _LEADING_JSON_RE.match(self.text)
+            if not leading:
+                # Ждем, пока станет понятно, начинается ли ответ с JSON
+                if self.text.strip() and not '```'.startswith(self.text.strip()[:3]):
+                    self._disabled = True
+                return False
+            self._start = self._pos = leading.start(1)
+
+        for match in _TOKEN_RE.finditer(self.text, self._pos):
+            token = match.group()
+            first = token[0]
+            if token == '"' or (first not in '{}[],:"' and match.end() == len(self.text)):
+                # Строка или литерал могут продолжиться в следующей части
+                break
+            self._pos = match.end()
+
+            if first in '{[':
+                self._stack.append(first)
+            elif first in '}]':
+                if not self._stack or _CLOSERS[self._stack.pop()] != first:
+                    self._disabled = True
+                    break
+                if not self._stack:
+                    data, status, _ = _parse_candidate(self.text, self._start)
+                    if status in (STATUS_OK, STATUS_REPAIRED):
+                        self.value, self.status = data, status
+                        self.complete = True
+                    else:
+                        self._disabled = True
+                    break
+
+        return self.complete
+
+    def result(self) -> Tuple[Any, str]:
+        """Итоговый JSON и статус разбора по всему полученному тексту"""
+        if self.complete:
+            return self.value, self.status
+        return extract_json_with_status(self.text)
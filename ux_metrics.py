@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+"""UX Metrics - Учет времени и токенов по этапам анализа и вызовам LLM"""
+
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+from ux_tracing import Span, get_tracer
+
+# Границы гистограммы длительности вызовов LLM, сек
+CALL_DURATION_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+
+# Счетчики вызова, которые суммируются по этапам. cost_usd - стоимость по
+# таблице цен, estimated_usage - запросы, токены которых оценены по длине
+# текста (при досрочной остановке потока провайдер не присылает usage),
+# hedges - дубли к резервной модели, fallback_wins - ответы от нее,
+# coalesced - вызовы, получившие ответ одинакового запроса другого потока
+CALL_COUNTERS = ('retries', 'requests', 'prompt_tokens', 'cached_prompt_tokens', 'completion_tokens',
+                 'request_bytes', 'response_bytes', 'queue_wait', 'cost_usd', 'estimated_usage',
+                 'hedges', 'fallback_wins', 'coalesced')
+
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels) -> str:
+    return ','.join(f'{name}="{_escape_label(value)}"' for name, value in labels.items())
+
+
+class MetricsRecorder:
+    """Учет вызовов LLM и этапов анализа одного запуска
+
+    Этапы вкладываются друг в друга (stage), вызов LLM (call) помечается
+    ближайшим этапом и номером интервью. Стек этапов хранится отдельно для
+    каждого потока, поэтому параллельный анализ интервью размечается верно.
+    Этапы и вызовы одновременно пишутся span в общий трассировщик (ux_tracing).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.start_run()
+
+    def start_run(self, run_id: str = None):
+        """Начать новый запуск: прежние записи сбрасываются"""
+        with self._lock:
+            self.run_id = run_id
+            self.started_at = datetime.now().isoformat(timespec='seconds')
+            self._started = time.perf_counter()
+            self._finished = None
+            self.calls = []
+            self.stages = []
+
+    def finish_run(self):
+        self._finished = time.perf_counter()
+
+    def _stack(self) -> List[Dict]:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _tags(self) -> Dict:
+        """Этап и номер интервью для текущего потока"""
+        stack = self._stack()
+        interview_id = next((frame['interview_id'] for frame in reversed(stack)
+                             if frame['interview_id'] is not None), None)
+        return {'stage': stack[-1]['stage'] if stack else 'unknown', 'interview_id': interview_id}
+
+    def current_stage(self) -> str:
+        """Текущий этап потока ('unknown' вне этапов)"""
+        stack = self._stack()
+        return stack[-1]['stage'] if stack else 'unknown'
+
+    @contextmanager
+    def stage(self, name: str, interview_id: int = None, queued_at: float = None, trace_parent: Span = None):
+        """Этап анализа
+
+        queued_at - time.perf_counter() постановки задачи в пул, trace_parent -
+        span потока, поставившего задачу (в потоке пула своего span нет).
+        """
+        stack = self._stack()
+        if stack and stack[-1]['stage'] == name and interview_id in (None, stack[-1]['interview_id']):
+            # Повторный вход в тот же этап не создает вложенную запись
+            yield
+            return
+
+        started = time.perf_counter()
+        queue_wait = max(started - queued_at, 0.0) if queued_at is not None else 0.0
+        frame = {'stage': name, 'interview_id': interview_id, 'pending_queue_wait': queue_wait}
+        if interview_id is None and stack:
+            frame['interview_id'] = stack[-1]['interview_id']
+        stack.append(frame)
+        span_attrs = {'interview_id': frame['interview_id']} if frame['interview_id'] is not None else {}
+        if queue_wait:
+            span_attrs['queue_wait'] = round(queue_wait, 3)
+        status = 'ok'
+        try:
+            with get_tracer().span(name, parent=trace_parent, **span_attrs):
+                yield
+        except BaseException:
+            status = 'error'
+            raise
+        finally:
+            stack.pop()
+            record = {
+                'stage': name,
+                'parent': stack[-1]['stage'] if stack else None,
+                'interview_id': frame['interview_id'],
+                'started': round(started - self._started, 3),
+                'wall_time': round(time.perf_counter() - started, 3),
+                'queue_wait': round(queue_wait, 3),
+                'status': status
+            }
+            with self._lock:
+                self.stages.append(record)
+
+    @contextmanager
+    def call(self, model: str):
+        """Вызов LLM: счетчики внутри заполняются через add()
+
+        Если вызов повторяется целиком (например, при перегрузке API), каждая
+        попытка добавляет счетчик attempts - лишние попытки идут в retries.
+        """
+        started = time.perf_counter()
+        record = {**self._tags(), 'model': model, 'started': round(started - self._started, 3),
+                  'queue_wait': 0.0, 'status': 'ok'}
+        record.update({counter: 0 for counter in CALL_COUNTERS if counter != 'queue_wait'})
+
+        # Ожидание в очереди пула относим к первому вызову задачи
+        for frame in reversed(self._stack()):
+            if frame['pending_queue_wait']:
+                record['queue_wait'] = round(frame['pending_queue_wait'], 3)
+                frame['pending_queue_wait'] = 0.0
+                break
+
+        previous = getattr(self._local, 'call', None)
+        self._local.call = record
+        span_attrs = {'stage': record['stage'], 'model': model}
+        if record['interview_id'] is not None:
+            span_attrs['interview_id'] = record['interview_id']
+        with get_tracer().span('llm_call', **span_attrs) as span:
+            try:
+                yield record
+            except BaseException as e:
+                record['status'] = 'error'
+                record['error'] = type(e).__name__
+                raise
+            finally:
+                self._local.call = previous
+                record['retries'] += max(record.pop('attempts', 1) - 1, 0)
+                record['wall_time'] = round(time.perf_counter() - started, 3)
+                with self._lock:
+                    self.calls.append(record)
+                span.set(**{counter: record[counter] for counter in CALL_COUNTERS if record[counter]})
+
+    def add(self, counter: str, value=1):
+        """Увеличить счетчик текущего вызова LLM в этом потоке"""
+        record = getattr(self._local, 'call', None)
+        if record is not None:
+            with self._lock:
+                record[counter] = record.get(counter, 0) + value
+
+    def current_call(self) -> Optional[Dict]:
+        """Запись текущего вызова LLM в этом потоке"""
+        return getattr(self._local, 'call', None)
+
+    @contextmanager
+    def bind(self, record: Optional[Dict]):
+        """Считать add() в другом потоке в уже открытый вызов (запросы хеджирования)"""
+        previous = getattr(self._local, 'call', None)
+        self._local.call = record
+        try:
+            yield
+        finally:
+            self._local.call = previous
+
+    # ====================================================================
+    # ЭКСПОРТ
+    # ====================================================================
+    def summary(self) -> Dict:
+        """Сводка запуска: итоги, этапы, интервью и все вызовы LLM"""
+        with self._lock:
+            calls, stages = list(self.calls), list(self.stages)
+
+        def aggregate(records: List[Dict]) -> Dict:
+            totals = {'calls': len(records), 'errors': sum(1 for r in records if r['status'] != 'ok'),
+                      'wall_time': round(sum(r['wall_time'] for r in records), 3),
+                      'models': sorted({r['model'] for r in records})}
+            for counter in CALL_COUNTERS:
+                # Стоимость дешевых вызовов - доли цента, ее округляем точнее
+                totals[counter] = round(sum(r.get(counter, 0) for r in records), 6 if counter == 'cost_usd' else 3)
+            return totals
+
+        calls_by_stage, calls_by_interview = defaultdict(list), defaultdict(list)
+        for record in calls:
+            calls_by_stage[record['stage']].append(record)
+            if record['interview_id'] is not None:
+                calls_by_interview[record['interview_id']].append(record)
+
+        stage_summary = {}
+        for record in stages:
+            entry = stage_summary.setdefault(record['stage'], {'runs': 0, 'wall_time': 0.0, 'queue_wait': 0.0,
+                                                                'max_wall_time': 0.0})
+            entry['runs'] += 1
+            entry['wall_time'] = round(entry['wall_time'] + record['wall_time'], 3)
+            entry['queue_wait'] = round(entry['queue_wait'] + record['queue_wait'], 3)
+            entry['max_wall_time'] = max(entry['max_wall_time'], record['wall_time'])
+        for stage, records in calls_by_stage.items():
+            stage_summary.setdefault(stage, {'runs': 0, 'wall_time': 0.0, 'queue_wait': 0.0,
+                                             'max_wall_time': 0.0})['llm'] = aggregate(records)
+
+        finished = self._finished or time.perf_counter()
+        return {
+            'run_id': self.run_id,
+            'started_at': self.started_at,
+            'wall_time': round(finished - self._started, 3),
+            'totals': aggregate(calls),
+            'stages': stage_summary,
+            'interviews': {str(interview_id): aggregate(records)
+                           for interview_id, records in sorted(calls_by_interview.items())},
+            'calls': calls
+        }
+
+    def save_summary(self, path: str):
+        """Сохранить сводку запуска в JSON"""
+        Path(path).write_text(json.dumps(self.summary(), ensure_ascii=False, indent=2), encoding='utf-8')
+
+    def to_prometheus(self, prefix: str = 'ux_analyzer') -> str:
+        """Метрики запуска в текстовом формате Prometheus (exposition format 0.0.4)"""
+        with self._lock:
+            calls, stages = list(self.calls), list(self.stages)
+
+        lines = []
+
+        def family(name: str, kind: str, help_text: str, samples: Dict):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for (suffix, labels), value in samples.items():
+                lines.append(f"{prefix}_{name}{suffix}{{{labels}}} {value:g}")
+
+        call_counts, counters = defaultdict(int), defaultdict(float)
+        buckets, duration_sum, duration_count = defaultdict(int), defaultdict(float), defaultdict(int)
+        for record in calls:
+            stage, model = record['stage'], record['model']
+            call_counts[('', _labels(stage=stage, model=model, status=record['status']))] += 1
+            for counter in CALL_COUNTERS:
+                counters[(counter, stage, model)] += record.get(counter, 0)
+            for bound in CALL_DURATION_BUCKETS:
+                buckets[('_bucket', _labels(stage=stage, le=bound))] += record['wall_time'] <= bound
+            buckets[('_bucket', _labels(stage=stage, le='+Inf'))] += 1
+            duration_sum[('_sum', _labels(stage=stage))] += record['wall_time']
+            duration_count[('_count', _labels(stage=stage))] += 1
+
+        def counter_samples(counter: str, **extra) -> Dict:
+            return {('', _labels(stage=stage, model=model, **extra)): value
+                    for (name, stage, model), value in counters.items() if name == counter}
+
+        family('llm_calls_total', 'counter', 'LLM calls by stage, model and status', call_counts)
+        family('llm_call_duration_seconds', 'histogram', 'LLM call wall time',
+               {**buckets, **duration_sum, **duration_count})
+        family('llm_retries_total', 'counter', 'LLM call retries', counter_samples('retries'))
+        family('llm_requests_total', 'counter', 'HTTP requests incl. continuations and retries',
+               counter_samples('requests'))
+        family('llm_queue_wait_seconds_total', 'counter', 'Time LLM tasks waited in the worker pool',
+               counter_samples('queue_wait'))
+        family('llm_tokens_total', 'counter', 'Tokens reported by the provider', {
+            **counter_samples('prompt_tokens', kind='prompt'),
+            **counter_samples('cached_prompt_tokens', kind='cached_prompt'),
+            **counter_samples('completion_tokens', kind='completion')
+        })
+        family('llm_bytes_total', 'counter', 'Bytes sent to and received from the provider', {
+            **counter_samples('request_bytes', direction='sent'),
+            **counter_samples('response_bytes', direction='received')
+        })
+        family('llm_cost_usd_total', 'counter', 'LLM spend by price table (estimated when usage is missing)',
+               counter_samples('cost_usd'))
+        family('llm_hedges_total', 'counter', 'Duplicate requests sent to the fallback model', {
+            **counter_samples('hedges', outcome='sent'),
+            **counter_samples('fallback_wins', outcome='won')
+        })
+        family('llm_coalesced_total', 'counter', 'Calls served by an identical in-flight request',
+               counter_samples('coalesced'))
+
+        stage_time, stage_runs = defaultdict(float), defaultdict(int)
+        for record in stages:
+            stage_time[('', _labels(stage=record['stage']))] += record['wall_time']
+            stage_runs[('', _labels(stage=record['stage'], status=record['status']))] += 1
+        family('stage_duration_seconds_total', 'counter', 'Wall time spent in analysis stages', stage_time)
+        family('stage_runs_total', 'counter', 'Analysis stage runs', stage_runs)
+
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str):
+        """Запись метрик для textfile-коллектора node_exporter (атомарно)"""
+        target = Path(path)
+        tmp_file = target.with_suffix('.tmp')
+        tmp_file.write_text(self.to_prometheus(), encoding='utf-8')
+        tmp_file.replace(target)
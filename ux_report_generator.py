@@ -1,166 +1,25 @@
 # -*- coding: utf-8 -*-
 """UX Report Generator - Генератор HTML отчетов"""
 
+import concurrent.futures
+import hashlib
+import multiprocessing
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterator, Optional, TextIO, Tuple, Union
 from ux_analyzer_classes import CompanyConfig
+from ux_tracing import get_tracer
 
 # ========================================================================
-# ГЕНЕРАТОР HTML ОТЧЕТОВ
+# СТИЛИ ОТЧЕТА
 # ========================================================================
-class EnhancedReportGenerator:
-    def __init__(self, company_config: CompanyConfig):
-        self.config = company_config
-        self.colors = {
-            'primary': '#1f2937',
-            'secondary': '#6b7280',
-            'accent': '#3b82f6',
-            'success': '#10b981',
-            'warning': '#f59e0b',
-            'danger': '#ef4444',
-            'text_primary': '#111827',
-            'text_secondary': '#6b7280',
-            'background': '#ffffff',
-            'surface': '#f9fafb',
-            'border': '#e5e7eb'
-        }
-
-    def generate_html(self, analysis_data: Dict) -> str:
-        """Генерация полного HTML отчета"""
-        print(f"🔍 DEBUG: analysis_data keys: {list(analysis_data.keys())}")
-        
-        findings = analysis_data.get('findings', {})
-        personas = analysis_data.get('personas', [])
-        recommendations = analysis_data.get('recommendations', {})
-        brief_answers = analysis_data.get('brief_answers', {})
-        current_metrics = analysis_data.get('current_metrics', {})
-        interview_summaries = analysis_data.get('interview_summaries', [])
-        total_interviews = analysis_data.get('total_interviews', len(interview_summaries))
-        
-        print(f"🔍 DEBUG: findings type: {type(findings)}")
-        print(f"🔍 DEBUG: personas count: {len(personas)}")
-        print(f"🔍 DEBUG: interview_summaries count: {len(interview_summaries)}")
-        
-        # Если findings - это объект ResearchFindings, извлекаем данные
-        if hasattr(findings, 'key_insights'):
-            print(f"🔍 DEBUG: findings is ResearchFindings object")
-            findings_data = {
-                'executive_summary': getattr(findings, 'executive_summary', 'Анализ пользовательских интервью выявил ключевые проблемы и возможности для улучшения продукта.'),
-                'key_insights': getattr(findings, 'key_insights', []),
-                'behavioral_patterns': getattr(findings, 'behavioral_patterns', []),
-                'user_segments': getattr(findings, 'user_segments', []),
-                'pain_points_map': getattr(findings, 'pain_points_map', {}),
-                'opportunities': getattr(findings, 'opportunities', []),
-                'recommendations': getattr(findings, 'recommendations', []),
-                'risks': getattr(findings, 'risks', []),
-                'personas': getattr(findings, 'personas', []),
-                'current_metrics': getattr(findings, 'current_metrics', {}),
-                'brief_answers': getattr(findings, 'brief_answers', {}),
-                'goal_achievement': getattr(findings, 'goal_achievement', {})
-            }
-            print(f"🔍 DEBUG: extracted key_insights: {len(findings_data.get('key_insights', []))}")
-        else:
-            print(f"🔍 DEBUG: findings is not ResearchFindings object, type: {type(findings)}")
-            findings_data = findings if findings else {
-                'executive_summary': 'Анализ пользовательских интервью выявил ключевые проблемы и возможности для улучшения продукта.',
-                'key_insights': [],
-                'behavioral_patterns': [],
-                'user_segments': [],
-                'pain_points_map': {},
-                'opportunities': [],
-                'recommendations': [],
-                'risks': [],
-                'personas': [],
-                'current_metrics': {},
-                'brief_answers': {},
-                'goal_achievement': {}
-            }
-            print(f"🔍 DEBUG: findings_data key_insights: {len(findings_data.get('key_insights', []))}")
-        
-        html_content = f"""
-<!DOCTYPE html>
-<html lang="ru">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{self.config.report_title} - {self.config.name}</title>
-    <style>
-        {self._get_css_styles()}
-    </style>
-</head>
-<body>
-    {self._generate_header()}
-    {self._generate_table_of_contents()}
-                   {self._generate_executive_summary(findings_data)}
-                   {self._generate_data_warnings(total_interviews, findings_data, personas, interview_summaries)}
-                   {self._generate_brief_section(analysis_data.get('brief_data', {}))}
-                   {self._generate_brief_answers(brief_answers)}
-                   {self._generate_personas_section(personas)}
-                   {self._generate_insights_section(findings_data.get('key_insights', []))}
-                   {self._generate_pain_points_section(findings_data.get('key_insights', []))}
-                   {self._generate_user_needs_section(findings_data)}
-                   {self._generate_behavioral_patterns_section(findings_data.get('behavioral_patterns', []))}
-                   {self._generate_emotional_journey_section(interview_summaries)}
-                   {self._generate_contradictions_section(interview_summaries)}
-                   {self._generate_quotes_section(interview_summaries)}
-                   {self._generate_recommendations_section(recommendations)}
-                   {self._generate_appendix_section(analysis_data)}
-    {self._generate_footer()}
-</body>
-</html>
-"""
-        return html_content
-
-    def _generate_data_warnings(self, total_interviews: int, findings_data: Dict, personas: List, interview_summaries: List) -> str:
-        """Генерация предупреждений о недостатке данных"""
-        warnings = []
-        
-        # Проверка количества интервью
-        if total_interviews < 5:
-            warnings.append(f"⚠️ <strong>Ограниченная выборка:</strong> Анализ основан на {total_interviews} интервью. Для качественного анализа рекомендуется минимум 5-8 интервью.")
-        
-        # Проверка персон
-        if len(personas) < 2:
-            warnings.append("⚠️ <strong>Недостаточно персон:</strong> Создано менее 2 персон. Для качественной сегментации рекомендуется больше интервью.")
-        
-        # Проверка инсайтов
-        key_insights = findings_data.get('key_insights', [])
-        if len(key_insights) < 3:
-            warnings.append("⚠️ <strong>Ограниченные инсайты:</strong> Выявлено менее 3 ключевых инсайтов. Рекомендуется расширить выборку интервью.")
-        
-        # Проверка цитат
-        total_quotes = 0
-        for summary in interview_summaries:
-            if hasattr(summary, 'quotes'):
-                total_quotes += len(summary.quotes)
-        
-        if total_quotes < 5:
-            warnings.append("⚠️ <strong>Недостаточно цитат:</strong> Собрано менее 5 значимых цитат. Рекомендуется более детальные интервью.")
-        
-        if not warnings:
-            return ""
-        
-        warnings_html = ""
-        for warning in warnings:
-            warnings_html += f'<div class="warning-card">{warning}</div>'
-        
-        return f"""
-        <div class="page" id="data-warnings">
-            <div class="container">
-                <h2>⚠️ Ограничения анализа</h2>
-                <div class="card">
-                    <p style="font-size: 1.1rem; color: #6b7280; margin-bottom: 20px;">
-                        Следующие ограничения могут повлиять на качество и надежность анализа:
-                    </p>
-                    {warnings_html}
-                </div>
-            </div>
-        </div>
-        """
-
-    def _get_css_styles(self) -> str:
-        """CSS стили для отчета"""
-        return """
+# CSS не зависит от данных: строится один раз при импорте, отпечаток
+# (sha256 содержимого) входит в имя внешнего файла стилей
+REPORT_CSS = """
         * {
             margin: 0;
             padding: 0;
@@ -491,15 +350,427 @@ class EnhancedReportGenerator:
             }
         }
         """
+REPORT_CSS_FINGERPRINT = hashlib.sha256(REPORT_CSS.encode('utf-8')).hexdigest()[:12]
+REPORT_STYLE_TAG = f'<style data-fingerprint="{REPORT_CSS_FINGERPRINT}">{REPORT_CSS}</style>'
+
+
+def stylesheet_filename() -> str:
+    """Имя файла стилей с отпечатком: при изменении CSS меняется и имя"""
+    return f"ux_report.{REPORT_CSS_FINGERPRINT}.css"
+
+
+def write_stylesheet(directory: str) -> str:
+    """Файл стилей отчета в каталоге (если его еще нет); возвращает имя файла"""
+    filename = stylesheet_filename()
+    path = os.path.join(directory, filename)
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(REPORT_CSS)
+        os.replace(tmp_path, path)
+    return filename
 
-    def _generate_header(self) -> str:
+
+# ========================================================================
+# ПАРАЛЛЕЛЬНЫЙ РЕНДЕРИНГ РАЗДЕЛОВ
+# ========================================================================
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def get_render_pool(workers: int = None) -> concurrent.futures.ProcessPoolExecutor:
+    """Общий пул процессов для рендеринга разделов отчета
+
+    Создается при первом обращении и живет до конца процесса: запуск
+    процессов дороже рендеринга отчета. Процессы запускаются через spawn -
+    fork многопоточного процесса (Streamlit) небезопасен.
+    """
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers or min(4, os.cpu_count() or 1),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _render_pool
+
+
+def _render_timed(render, args) -> Tuple[str, float]:
+    """Рендеринг раздела в процессе пула: (HTML, время рендеринга, с)"""
+    started = time.perf_counter()
+    html = render(*args)
+    return html, time.perf_counter() - started
+
+
+# ========================================================================
+# ПАМЯТЬ ОТРЕНДЕРЕННЫХ РАЗДЕЛОВ
+# ========================================================================
+# Поля CompanyConfig, которые читает раздел. Остальные разделы от реквизитов
+# компании не зависят: при смене названия отчета берутся из SectionCache
+SECTION_CONFIG_FIELDS = {
+    'header': ('report_title', 'name', 'author'),
+    'footer': ('author', 'name'),
+}
+# Сколько последних объектов данных помнит SectionCache вместе с их хешами
+SECTION_DIGEST_MEMO = 128
+
+
+class SectionCache:
+    """HTML разделов отчета по ключу: раздел, хеш его данных и поля CompanyConfig
+
+    Один кэш можно отдавать генераторам с разными реквизитами компании:
+    при правке названия, компании или автора заново рендерятся только
+    шапка и подвал. Хранится не больше max_entries разделов, вытесняются
+    давно не использованные.
+
+    Результаты анализа после построения не изменяются, поэтому хеш объекта
+    данных запоминается по id вместе с самим объектом (пока объект в памяти,
+    его id не достанется другому). Разделы одного отчета и повторные отчеты
+    по тем же данным не хешируют, например, interview_summaries заново -
+    это дороже рендеринга самих разделов.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._digests = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _digest(self, obj: Any) -> bytes:
+        """Хеш объекта данных раздела (из памяти, если объект уже встречался)"""
+        with self._lock:
+            memo = self._digests.get(id(obj))
+            if memo is not None and memo[0] is obj:
+                self._digests.move_to_end(id(obj))
+                return memo[1]
+        digest = hashlib.blake2b(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL), digest_size=16).digest()
+        with self._lock:
+            self._digests[id(obj)] = (obj, digest)
+            while len(self._digests) > SECTION_DIGEST_MEMO:
+                self._digests.popitem(last=False)
+        return digest
+
+    def make_key(self, name: str, args: Tuple, config: CompanyConfig) -> str:
+        """Ключ раздела: имя, хеши аргументов и поля CompanyConfig, которые он читает"""
+        key = hashlib.blake2b(name.encode('utf-8'), digest_size=16)
+        for arg in args:
+            key.update(self._digest(arg))
+        for field in SECTION_CONFIG_FIELDS.get(name, ()):
+            key.update(f"\x00{field}={getattr(config, field, '')}".encode('utf-8'))
+        return key.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            html = self._entries.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def put(self, key: str, html: str):
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# ========================================================================
+# ГЕНЕРАТОР HTML ОТЧЕТОВ
+# ========================================================================
+class EnhancedReportGenerator:
+    def __init__(self, company_config: CompanyConfig, css_href: Optional[str] = None,
+                 section_cache: Optional[SectionCache] = None):
+        """css_href - ссылка на внешний файл стилей (см. write_stylesheet) вместо
+        встроенного CSS: при пакетной генерации стили пишутся один раз, а
+        браузер кэширует их между отчетами. По умолчанию отчет самодостаточен.
+
+        section_cache - память разделов (SectionCache): разделы, данные и
+        реквизиты которых не изменились, не рендерятся заново.
+        """
+        self.config = company_config
+        self.css_href = css_href
+        self.section_cache = section_cache
+        self.colors = {
+            'primary': '#1f2937',
+            'secondary': '#6b7280',
+            'accent': '#3b82f6',
+            'success': '#10b981',
+            'warning': '#f59e0b',
+            'danger': '#ef4444',
+            'text_primary': '#111827',
+            'text_secondary': '#6b7280',
+            'background': '#ffffff',
+            'surface': '#f9fafb',
+            'border': '#e5e7eb'
+        }
+
+    def __getstate__(self) -> Dict:
+        # В процессы пула генератор передается без памяти разделов: она
+        # нужна только в основном процессе и держит блокировку
+        state = self.__dict__.copy()
+        state['section_cache'] = None
+        return state
+
+    def generate_html(self, analysis_data: Dict, executor: concurrent.futures.Executor = None,
+                      timings: Dict[str, float] = None) -> str:
+        """Генерация полного HTML отчета одной строкой"""
+        return ''.join(self.iter_html(analysis_data, executor, timings))
+
+    def write_html(self, analysis_data: Dict, out: Union[str, TextIO], executor: concurrent.futures.Executor = None,
+                   timings: Dict[str, float] = None) -> int:
+        """Запись отчета в файл (путь или открытый текстовый поток) по разделам
+
+        В памяти одновременно находится только текущий раздел. Возвращает
+        число записанных символов.
+        """
+        if isinstance(out, str):
+            with open(out, 'w', encoding='utf-8') as f:
+                return self.write_html(analysis_data, f, executor, timings)
+        written = 0
+        for chunk in self.iter_html(analysis_data, executor, timings):
+            out.write(chunk)
+            written += len(chunk)
+        return written
+
+    def iter_html(self, analysis_data: Dict, executor: concurrent.futures.Executor = None,
+                  timings: Dict[str, float] = None) -> Iterator[str]:
+        """HTML отчета фрагментами: каждый раздел отдается сразу после рендеринга
+
+        Фрагменты можно писать в файл или в ответ HTTP (после encode('utf-8')),
+        не дожидаясь конца рендеринга. С executor (например, get_render_pool())
+        разделы рендерятся одновременно и собираются в исходном порядке. В
+        timings записывается время рендеринга каждого раздела, с.
+        """
+        with get_tracer().span('report.html', generator='EnhancedReportGenerator', pooled=executor is not None):
+            yield from self._render_html(analysis_data, executor, timings)
+
+    def _render_html(self, analysis_data: Dict, executor: concurrent.futures.Executor = None,
+                     timings: Dict[str, float] = None) -> Iterator[str]:
+        print(f"🔍 DEBUG: analysis_data keys: {list(analysis_data.keys())}")
+        
+        findings = analysis_data.get('findings', {})
+        personas = analysis_data.get('personas', [])
+        recommendations = analysis_data.get('recommendations', {})
+        brief_answers = analysis_data.get('brief_answers', {})
+        current_metrics = analysis_data.get('current_metrics', {})
+        interview_summaries = analysis_data.get('interview_summaries', [])
+        total_interviews = analysis_data.get('total_interviews', len(interview_summaries))
+        
+        print(f"🔍 DEBUG: findings type: {type(findings)}")
+        print(f"🔍 DEBUG: personas count: {len(personas)}")
+        print(f"🔍 DEBUG: interview_summaries count: {len(interview_summaries)}")
+        get_tracer().annotate(personas=len(personas), interviews=len(interview_summaries))
+        
+        # Если findings - это объект ResearchFindings, извлекаем данные
+        if hasattr(findings, 'key_insights'):
+            print(f"🔍 DEBUG: findings is ResearchFindings object")
+            findings_data = {
+                'executive_summary': getattr(findings, 'executive_summary', 'Анализ пользовательских интервью выявил ключевые проблемы и возможности для улучшения продукта.'),
+                'key_insights': getattr(findings, 'key_insights', []),
+                'behavioral_patterns': getattr(findings, 'behavioral_patterns', []),
+                'user_segments': getattr(findings, 'user_segments', []),
+                'pain_points_map': getattr(findings, 'pain_points_map', {}),
+                'opportunities': getattr(findings, 'opportunities', []),
+                'recommendations': getattr(findings, 'recommendations', []),
+                'risks': getattr(findings, 'risks', []),
+                'personas': getattr(findings, 'personas', []),
+                'current_metrics': getattr(findings, 'current_metrics', {}),
+                'brief_answers': getattr(findings, 'brief_answers', {}),
+                'goal_achievement': getattr(findings, 'goal_achievement', {})
+            }
+            print(f"🔍 DEBUG: extracted key_insights: {len(findings_data.get('key_insights', []))}")
+        else:
+            print(f"🔍 DEBUG: findings is not ResearchFindings object, type: {type(findings)}")
+            findings_data = findings if findings else {
+                'executive_summary': 'Анализ пользовательских интервью выявил ключевые проблемы и возможности для улучшения продукта.',
+                'key_insights': [],
+                'behavioral_patterns': [],
+                'user_segments': [],
+                'pain_points_map': {},
+                'opportunities': [],
+                'recommendations': [],
+                'risks': [],
+                'personas': [],
+                'current_metrics': {},
+                'brief_answers': {},
+                'goal_achievement': {}
+            }
+            print(f"🔍 DEBUG: findings_data key_insights: {len(findings_data.get('key_insights', []))}")
+        
+        key_insights = findings_data.get('key_insights', [])
+        # Время создания - аргумент шапки и подвала: оно входит в ключ памяти разделов
+        now = datetime.now()
+        sections = [
+            ('header', self._generate_header, now.strftime('%d.%m.%Y')),
+            ('table_of_contents', self._generate_table_of_contents),
+            ('executive_summary', self._generate_executive_summary, findings_data),
+            ('data_warnings', self._generate_data_warnings, total_interviews, findings_data, personas, interview_summaries),
+            ('brief', self._generate_brief_section, analysis_data.get('brief_data', {})),
+            ('brief_answers', self._generate_brief_answers, brief_answers),
+            ('personas', self._generate_personas_section, personas),
+            ('insights', self._generate_insights_section, key_insights),
+            ('pain_points', self._generate_pain_points_section, key_insights),
+            ('user_needs', self._generate_user_needs_section, findings_data),
+            ('behavioral_patterns', self._generate_behavioral_patterns_section, findings_data.get('behavioral_patterns', [])),
+            ('emotional_journey', self._generate_emotional_journey_section, interview_summaries),
+            ('contradictions', self._generate_contradictions_section, interview_summaries),
+            ('quotes', self._generate_quotes_section, interview_summaries),
+            ('recommendations', self._generate_recommendations_section, recommendations),
+            ('appendix', self._generate_appendix_section, current_metrics),
+            ('footer', self._generate_footer, now.strftime('%d.%m.%Y %H:%M')),
+        ]
+        rendered = self._render_sections(sections, executor, timings)
+
+        yield f"""<!DOCTYPE html>
+<html lang="ru">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{self.config.report_title} - {self.config.name}</title>
+    {self._stylesheet_tag()}
+</head>
+<body>
+"""
+        yield from rendered
+        yield """
+</body>
+</html>
+"""
+
+    def _stylesheet_tag(self) -> str:
+        """Встроенный CSS с отпечатком или ссылка на внешний файл стилей"""
+        if self.css_href:
+            return f'<link rel="stylesheet" href="{self.css_href}">'
+        return REPORT_STYLE_TAG
+
+    def _render_sections(self, sections: List, executor: concurrent.futures.Executor = None,
+                         timings: Dict[str, float] = None) -> Iterator[str]:
+        """HTML разделов по порядку; с executor все разделы сразу отправляются в пул
+
+        С section_cache разделы из памяти не рендерятся (и в timings не попадают).
+        """
+        if executor is None:
+            return (self._section(name, render, *args, timings=timings) for name, render, *args in sections)
+        futures = []
+        for name, render, *args in sections:
+            key = self._section_key(name, args)
+            html = self.section_cache.get(key) if key else None
+            futures.append((name, key, html if html is not None else executor.submit(_render_timed, render, args)))
+        return self._collect_sections(futures, timings)
+
+    def _collect_sections(self, futures: List, timings: Dict[str, float] = None) -> Iterator[str]:
+        """Результаты пула в порядке разделов; span раздела - ожидание результата"""
+        try:
+            for name, key, future in futures:
+                if isinstance(future, str):
+                    with get_tracer().span(f'report.{name}', cached=True):
+                        yield future
+                    continue
+                with get_tracer().span(f'report.{name}', pooled=True) as span:
+                    html, seconds = future.result()
+                    span.set(render_seconds=round(seconds, 4))
+                if timings is not None:
+                    timings[name] = seconds
+                if key:
+                    self.section_cache.put(key, html)
+                yield html
+        finally:
+            # Отчет брошен на середине - оставшиеся разделы не нужны
+            for _, _, future in futures:
+                if not isinstance(future, str):
+                    future.cancel()
+
+    def _section_key(self, name: str, args: Tuple) -> Optional[str]:
+        """Ключ раздела в section_cache или None, если память разделов не задана"""
+        if self.section_cache is None:
+            return None
+        return self.section_cache.make_key(name, args, self.config)
+
+    def _section(self, name: str, render, *args, timings: Dict[str, float] = None) -> str:
+        """Раздел отчета в отдельном span трассировки (из section_cache, если он там есть)"""
+        with get_tracer().span(f'report.{name}') as span:
+            key = self._section_key(name, args)
+            html = self.section_cache.get(key) if key else None
+            if html is not None:
+                span.set(cached=True)
+                return html
+            started = time.perf_counter()
+            html = render(*args)
+        if timings is not None:
+            timings[name] = time.perf_counter() - started
+        if key:
+            self.section_cache.put(key, html)
+        return html
+
+    @staticmethod
+    def _html_list(heading: str, items, tag: str = 'ul') -> str:
+        """Заголовок и список <ul>/<ol>; пустая строка, если элементов нет"""
+        if not items:
+            return ""
+        return f"{heading}<{tag}>{''.join(f'<li>{item}</li>' for item in items)}</{tag}>"
+
+    def _generate_data_warnings(self, total_interviews: int, findings_data: Dict, personas: List, interview_summaries: List) -> str:
+        """Генерация предупреждений о недостатке данных"""
+        warnings = []
+        
+        # Проверка количества интервью
+        if total_interviews < 5:
+            warnings.append(f"⚠️ <strong>Ограниченная выборка:</strong> Анализ основан на {total_interviews} интервью. Для качественного анализа рекомендуется минимум 5-8 интервью.")
+        
+        # Проверка персон
+        if len(personas) < 2:
+            warnings.append("⚠️ <strong>Недостаточно персон:</strong> Создано менее 2 персон. Для качественной сегментации рекомендуется больше интервью.")
+        
+        # Проверка инсайтов
+        key_insights = findings_data.get('key_insights', [])
+        if len(key_insights) < 3:
+            warnings.append("⚠️ <strong>Ограниченные инсайты:</strong> Выявлено менее 3 ключевых инсайтов. Рекомендуется расширить выборку интервью.")
+        
+        # Проверка цитат
+        total_quotes = 0
+        for summary in interview_summaries:
+            if hasattr(summary, 'quotes'):
+                total_quotes += len(summary.quotes)
+        
+        if total_quotes < 5:
+            warnings.append("⚠️ <strong>Недостаточно цитат:</strong> Собрано менее 5 значимых цитат. Рекомендуется более детальные интервью.")
+        
+        if not warnings:
+            return ""
+        
+        warnings_html = ''.join(f'<div class="warning-card">{warning}</div>' for warning in warnings)
+        
+        return f"""
+        <div class="page" id="data-warnings">
+            <div class="container">
+                <h2>⚠️ Ограничения анализа</h2>
+                <div class="card">
+                    <p style="font-size: 1.1rem; color: #6b7280; margin-bottom: 20px;">
+                        Следующие ограничения могут повлиять на качество и надежность анализа:
+                    </p>
+                    {warnings_html}
+                </div>
+            </div>
+        </div>
+        """
+
+    def _generate_header(self, date: str) -> str:
         """Генерация заголовка"""
         return f"""
         <div class="header">
             <div class="container">
                 <h1>{self.config.report_title}</h1>
                 <p class="subtitle">{self.config.name}</p>
-                <p class="meta">Автор: {self.config.author} | Дата: {datetime.now().strftime('%d.%m.%Y')}</p>
+                <p class="meta">Автор: {self.config.author} | Дата: {date}</p>
             </div>
         </div>
         """
@@ -593,19 +864,8 @@ class EnhancedReportGenerator:
         if not brief_data:
             return ""
 
-        goals_html = ""
-        if brief_data.get('research_goals'):
-            goals_html = "<h4>Цели исследования:</h4><ul>"
-            for goal in brief_data['research_goals']:
-                goals_html += f"<li>{goal}</li>"
-            goals_html += "</ul>"
-
-        questions_html = ""
-        if brief_data.get('research_questions'):
-            questions_html = "<h4>Исследовательские вопросы:</h4><ul>"
-            for question in brief_data['research_questions']:
-                questions_html += f"<li>{question}</li>"
-            questions_html += "</ul>"
+        goals_html = self._html_list("<h4>Цели исследования:</h4>", brief_data.get('research_goals'))
+        questions_html = self._html_list("<h4>Исследовательские вопросы:</h4>", brief_data.get('research_questions'))
 
         return f"""
         <div class="page" id="brief">
@@ -626,16 +886,12 @@ class EnhancedReportGenerator:
         if not brief_answers or not brief_answers.get('answers'):
             return ""
 
-        answers_html = ""
+        answers_html = []
         for answer in brief_answers['answers']:
-            quotes_html = ""
-            if answer.get('supporting_quotes'):
-                quotes_html = "<h5>Поддерживающие цитаты:</h5><ul>"
-                for quote in answer['supporting_quotes']:
-                    quotes_html += f"<li>\"{quote}\"</li>"
-                quotes_html += "</ul>"
+            quotes_html = self._html_list("<h5>Поддерживающие цитаты:</h5>",
+                                          [f'"{quote}"' for quote in answer.get('supporting_quotes') or []])
 
-            answers_html += f"""
+            answers_html.append(f"""
             <div class="card">
                 <h4>{answer.get('question', '')}</h4>
                 <p style="font-size: 1.1rem; line-height: 1.7; margin: 15px 0;">
@@ -646,7 +902,7 @@ class EnhancedReportGenerator:
                     <span class="tag">Уверенность: {answer.get('confidence', 'N/A')}/10</span>
                 </div>
             </div>
-            """
+            """)
 
         return f"""
         <div class="page" id="brief-answers">
@@ -655,7 +911,7 @@ class EnhancedReportGenerator:
                 <p style="font-size: 1.1rem; color: #6b7280; margin-bottom: 30px;">
                     Детальные ответы на исследовательские вопросы с подкреплением цитатами
                 </p>
-                {answers_html}
+                {''.join(answers_html)}
             </div>
         </div>
         """
@@ -676,44 +932,23 @@ class EnhancedReportGenerator:
             </div>
             """
 
-        personas_html = ""
+        personas_html = []
         for persona in personas:
-            demographics_html = ""
-            if persona.get('demographics'):
-                demographics_html = "<h5>Демография:</h5><ul>"
-                for key, value in persona['demographics'].items():
-                    demographics_html += f"<li><strong>{key}:</strong> {value}</li>"
-                demographics_html += "</ul>"
-
-            goals_html = ""
-            if persona.get('goals'):
-                goals_html = "<h5>Цели:</h5><ul>"
-                for goal in persona['goals']:
-                    goals_html += f"<li>{goal}</li>"
-                goals_html += "</ul>"
-
-            frustrations_html = ""
-            if persona.get('frustrations'):
-                frustrations_html = "<h5>Фрустрации:</h5><ul>"
-                for frustration in persona['frustrations']:
-                    frustrations_html += f"<li>{frustration}</li>"
-                frustrations_html += "</ul>"
-
-            needs_html = ""
-            if persona.get('needs'):
-                needs_html = "<h5>Потребности:</h5><ul>"
-                for need in persona['needs']:
-                    needs_html += f"<li>{need}</li>"
-                needs_html += "</ul>"
+            demographics_html = self._html_list("<h5>Демография:</h5>", [
+                f"<strong>{key}:</strong> {value}" for key, value in (persona.get('demographics') or {}).items()
+            ])
+            goals_html = self._html_list("<h5>Цели:</h5>", persona.get('goals'))
+            frustrations_html = self._html_list("<h5>Фрустрации:</h5>", persona.get('frustrations'))
+            needs_html = self._html_list("<h5>Потребности:</h5>", persona.get('needs'))
 
             quotes_html = ""
             if persona.get('real_quotes'):
-                quotes_html = "<h5>Ключевые цитаты:</h5>"
-                for quote in persona['real_quotes']:
-                    if quote:
-                        quotes_html += f'<div class="quote-card"><p class="quote-text">"{quote}"</p></div>'
+                quotes_html = "<h5>Ключевые цитаты:</h5>" + ''.join(
+                    f'<div class="quote-card"><p class="quote-text">"{quote}"</p></div>'
+                    for quote in persona['real_quotes'] if quote
+                )
 
-            personas_html += f"""
+            personas_html.append(f"""
             <div class="persona-card">
                 <div class="persona-header">
                     <div>
@@ -740,7 +975,7 @@ class EnhancedReportGenerator:
                     <p>{persona.get('typical_scenario', '')}</p>
                 </div>
             </div>
-            """
+            """)
 
         return f"""
         <div class="page" id="personas">
@@ -749,7 +984,7 @@ class EnhancedReportGenerator:
                 <p style="font-size: 1.1rem; color: #6b7280; margin-bottom: 30px;">
                     Детальные профили пользователей, созданные на основе реальных интервью
                 </p>
-                {personas_html}
+                {''.join(personas_html)}
             </div>
         </div>
         """
@@ -770,19 +1005,18 @@ class EnhancedReportGenerator:
             </div>
             """
 
-        insights_html = ""
+        insights_html = []
         for i, insight in enumerate(insights[:8], 1):
             quotes_html = ""
             if insight.get('quotes'):
-                quotes_html = "<div style='margin-top: 20px;'><h5>Поддерживающие цитаты:</h5>"
-                for quote in insight['quotes'][:2]:
-                    if isinstance(quote, dict):
-                        quotes_html += f'<div class="quote-card"><p class="quote-text">{quote.get("text", "")}</p></div>'
-                    else:
-                        quotes_html += f'<div class="quote-card"><p class="quote-text">"{quote}"</p></div>'
-                quotes_html += "</div>"
-
-            insights_html += f"""
+                quotes_html = "<div style='margin-top: 20px;'><h5>Поддерживающие цитаты:</h5>" + ''.join(
+                    f'<div class="quote-card"><p class="quote-text">{quote.get("text", "")}</p></div>'
+                    if isinstance(quote, dict) else
+                    f'<div class="quote-card"><p class="quote-text">"{quote}"</p></div>'
+                    for quote in insight['quotes'][:2]
+                ) + "</div>"
+
+            insights_html.append(f"""
             <div class="insight-card">
                 <h3>Инсайт #{i}: {insight.get('problem_title', insight.get('title', ''))}</h3>
                 <p style="font-size: 1.2rem; line-height: 1.8; margin: 20px 0; font-weight: 500;">
@@ -796,7 +1030,7 @@ class EnhancedReportGenerator:
                     {f'<span class="tag">Затронуто: {insight.get("affected_percentage", "")}</span>' if insight.get('affected_percentage') else ''}
                 </div>
             </div>
-            """
+            """)
 
         return f"""
         <div class="page" id="insights">
@@ -805,7 +1039,7 @@ class EnhancedReportGenerator:
                 <p style="font-size: 1.1rem; color: #6b7280; margin-bottom: 30px;">
                     Глубокие выводы, основанные на кросс-анализе всех интервью
                 </p>
-                {insights_html}
+                {''.join(insights_html)}
             </div>
         </div>
         """
@@ -848,9 +1082,9 @@ class EnhancedReportGenerator:
         if not patterns or not isinstance(patterns, list):
             return ""
 
-        patterns_html = ""
+        patterns_html = []
         for pattern in patterns:
-            patterns_html += f"""
+            patterns_html.append(f"""
             <div class="card">
                 <h4>{pattern.get('pattern', '')}</h4>
                 <p>{pattern.get('description', '')}</p>
@@ -859,7 +1093,7 @@ class EnhancedReportGenerator:
                     <span class="tag">Серьезность: {str(pattern.get('severity', 0))}/10</span>
                 </div>
             </div>
-            """
+            """)
 
         return f"""
         <div class="page" id="patterns">
@@ -868,7 +1102,7 @@ class EnhancedReportGenerator:
                 <p style="font-size: 1.1rem; color: #6b7280; margin-bottom: 30px;">
                     Устойчивые модели поведения, выявленные в процессе анализа
                 </p>
-                {patterns_html}
+                {''.join(patterns_html)}
             </div>
         </div>
         """
@@ -932,14 +1166,12 @@ class EnhancedReportGenerator:
         # Сортируем по важности
         all_quotes.sort(key=lambda x: int(x.get('importance', 0)) if isinstance(x.get('importance', 0), (int, float)) else 0, reverse=True)
 
-        quotes_html = ""
-        for quote in all_quotes[:10]:
-            quotes_html += f"""
+        quotes_html = ''.join(f"""
             <div class="quote-card">
                 <p class="quote-text">"{quote['text']}"</p>
                 <span class="quote-author">Интервью {quote['interview_id']}</span>
             </div>
-            """
+            """ for quote in all_quotes[:10])
 
         return f"""
         <div class="page" id="quotes">
@@ -958,17 +1190,12 @@ class EnhancedReportGenerator:
         if not recommendations:
             return ""
 
-        quick_wins_html = ""
+        quick_wins_html = []
         if recommendations.get('quick_wins'):
             for win in recommendations['quick_wins']:
-                steps_html = ""
-                if win.get('implementation_steps'):
-                    steps_html = "<h5>Шаги реализации:</h5><ol>"
-                    for step in win['implementation_steps']:
-                        steps_html += f"<li>{step}</li>"
-                    steps_html += "</ol>"
-
-                quick_wins_html += f"""
+                steps_html = self._html_list("<h5>Шаги реализации:</h5>", win.get('implementation_steps'), 'ol')
+
+                quick_wins_html.append(f"""
                 <div class="card">
                     <h4>{win.get('title', '')}</h4>
                     <p style="font-size: 1.1rem; line-height: 1.7; margin: 15px 0;">
@@ -980,19 +1207,14 @@ class EnhancedReportGenerator:
                         <span class="tag">Эффект: {win.get('expected_impact', 'Не указан')}</span>
                     </div>
                 </div>
-                """
+                """)
 
-        strategic_html = ""
+        strategic_html = []
         if recommendations.get('strategic_initiatives'):
             for initiative in recommendations['strategic_initiatives']:
-                phases_html = ""
-                if initiative.get('implementation_phases'):
-                    phases_html = "<h5>Фазы реализации:</h5><ol>"
-                    for phase in initiative['implementation_phases']:
-                        phases_html += f"<li>{phase}</li>"
-                    phases_html += "</ol>"
-
-                strategic_html += f"""
+                phases_html = self._html_list("<h5>Фазы реализации:</h5>", initiative.get('implementation_phases'), 'ol')
+
+                strategic_html.append(f"""
                 <div class="card">
                     <h4>{initiative.get('title', '')}</h4>
                     <p style="font-size: 1.1rem; line-height: 1.7; margin: 15px 0;">
@@ -1003,7 +1225,7 @@ class EnhancedReportGenerator:
                         <span class="tag">ROI: {initiative.get('expected_roi', 'Не указан')}</span>
                     </div>
                 </div>
-                """
+                """)
 
         return f"""
         <div class="page" id="recommendations">
@@ -1014,30 +1236,24 @@ class EnhancedReportGenerator:
                 </p>
                 
                 <h3>Быстрые победы</h3>
-                {quick_wins_html}
+                {''.join(quick_wins_html)}
                 
                 <h3>Стратегические инициативы</h3>
-                {strategic_html}
+                {''.join(strategic_html)}
             </div>
         </div>
         """
 
-    def _generate_appendix_section(self, analysis_data: Dict) -> str:
+    def _generate_appendix_section(self, metrics: Dict) -> str:
         """Генерация приложения"""
-        metrics = analysis_data.get('current_metrics', {})
-        
         metrics_html = ""
         if metrics:
-            metrics_html = "<h3>Ключевые метрики</h3><div class='metrics-grid'>"
-            for key, value in metrics.items():
-                if isinstance(value, (int, float)):
-                    metrics_html += f"""
+            metrics_html = "<h3>Ключевые метрики</h3><div class='metrics-grid'>" + ''.join(f"""
                     <div class="metric-card">
                         <div class="metric-value">{value}</div>
                         <div class="metric-label">{key.replace('_', ' ').title()}</div>
                     </div>
-                    """
-            metrics_html += "</div>"
+                    """ for key, value in metrics.items() if isinstance(value, (int, float))) + "</div>"
 
         return f"""
         <div class="page" id="appendix">
@@ -1051,12 +1267,12 @@ class EnhancedReportGenerator:
         </div>
         """
 
-    def _generate_footer(self) -> str:
+    def _generate_footer(self, generated_at: str) -> str:
         """Генерация подвала"""
         return f"""
         <div class="footer">
             <div class="container">
-                <p>Отчет сгенерирован: {datetime.now().strftime('%d.%m.%Y %H:%M')}</p>
+                <p>Отчет сгенерирован: {generated_at}</p>
                 <p>Автор: {self.config.author}</p>
                 <p>Компания: {self.config.name}</p>
             </div>
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""UX Resilience - Хеджирование медленных вызовов LLM и автоматические выключатели моделей"""
+
+import concurrent.futures
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Callable, Optional, Tuple
+
+# Хеджирование: дубль запроса к резервной модели, если основная отвечает
+# дольше заданного перцентиля своих прошлых вызовов этого этапа
+HEDGE_PERCENTILE = 0.95
+HEDGE_MIN_DELAY = 5.0        # сек: быстрые вызовы не дублируем
+HEDGE_INITIAL_DELAY = 45.0   # сек: порог, пока по модели и этапу мало статистики
+LATENCY_WINDOW = 50          # последних длительностей на модель и этап
+LATENCY_MIN_SAMPLES = 5
+
+# Выключатель: после BREAKER_FAILURES ошибок подряд модель исключается на
+# BREAKER_RESET_TIMEOUT секунд, затем пропускается одна пробная попытка
+BREAKER_FAILURES = 3
+BREAKER_RESET_TIMEOUT = 60.0
+
+# Как часто ожидающий чужой вызов поток проверяет свою отмену, сек
+SINGLE_FLIGHT_POLL = 0.5
+
+
+class HedgeCancelled(Exception):
+    """Запрос прерван: ответ уже получен от другой модели"""
+
+
+class CircuitBreaker:
+    """Автоматический выключатель одной модели: closed -> open -> half_open"""
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURES, reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return 'open'
+        return 'half_open'
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос; в half_open пропускается одна пробная попытка"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> bool:
+        """Учесть ошибку; True, если выключатель только что разомкнулся"""
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                was_closed = self.opened_at is None
+                self.opened_at = time.monotonic()
+                return was_closed
+            return False
+
+
+class LatencyTracker:
+    """Скользящее окно длительностей успешных вызовов по ключу (модель, этап)"""
+
+    def __init__(self, window: int = LATENCY_WINDOW, min_samples: int = LATENCY_MIN_SAMPLES):
+        self.min_samples = min_samples
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, key, seconds: float):
+        with self._lock:
+            self._samples[key].append(seconds)
+
+    def percentile(self, key, q: float = HEDGE_PERCENTILE) -> Optional[float]:
+        """Перцентиль длительности или None, если выборка мала"""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(int(len(samples) * q), len(samples) - 1)]
+
+    def hedge_delay(self, key, q: float = HEDGE_PERCENTILE, min_delay: float = HEDGE_MIN_DELAY,
+                    initial_delay: float = HEDGE_INITIAL_DELAY) -> float:
+        """Через сколько секунд отправлять дубль запроса"""
+        value = self.percentile(key, q)
+        return initial_delay if value is None else max(value, min_delay)
+
+
+def run_hedged(executor: concurrent.futures.Executor, primary: Callable[[threading.Event], Any],
+               fallback: Callable[[threading.Event], Any] = None, hedge_after: float = None,
+               is_valid: Callable[[Any], bool] = bool, on_hedge: Callable[[], None] = None) -> Tuple[Any, bool]:
+    """Вызов с хеджированием: (результат, получен ли он от fallback)
+
+    primary и fallback принимают событие abort: когда победитель определен,
+    проигравшему выставляется abort, и он прерывает чтение ответа. Дубль
+    отправляется через hedge_after секунд или сразу после ошибки основного
+    вызова. Без fallback вызов выполняется в текущем потоке.
+    """
+    if fallback is None:
+        return primary(threading.Event()), False
+
+    aborts = (threading.Event(), threading.Event())
+    pending = {executor.submit(primary, aborts[0]): 0}
+    hedged = False
+    errors = []
+    last_result = None, False
+
+    while pending:
+        done, _ = concurrent.futures.wait(pending, timeout=None if hedged else hedge_after,
+                                          return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            index = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                errors.append(e)
+                continue
+            if is_valid(result):
+                for other in pending.values():
+                    aborts[other].set()
+                return result, index == 1
+            last_result = result, index == 1
+
+        if not hedged:
+            hedged = True
+            if on_hedge is not None:
+                on_hedge()
+            pending[executor.submit(fallback, aborts[1])] = 1
+
+    if last_result[0] is None:
+        raise errors[0]
+    return last_result
+
+
+class _Flight:
+    """Выполняющийся вызов: результат или ошибка для ожидающих"""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Объединение одинаковых одновременных вызовов
+
+    Первый вызов с ключом выполняется, остальные ждут его и получают тот же
+    результат. Если ведущий вызов упал (в том числе отменен своей сессией),
+    ожидающие не наследуют ошибку: один из них становится новым ведущим.
+    check (например, CancellationToken.raise_if_cancelled) вызывается, пока
+    поток ждет чужой вызов, и прерывает ожидание исключением.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key, func: Callable[[], Any], check: Callable[[], None] = None) -> Tuple[Any, bool]:
+        """Результат func() и признак, что вызов был выполнен этим потоком"""
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+
+            if leader:
+                try:
+                    flight.result = func()
+                    return flight.result, True
+                except BaseException as e:
+                    flight.error = e
+                    raise
+                finally:
+                    with self._lock:
+                        del self._flights[key]
+                    flight.done.set()
+
+            # Ожидающий проверяет свою отмену: ведущий может принадлежать другой сессии
+            while not flight.done.wait(SINGLE_FLIGHT_POLL):
+                if check is not None:
+                    check()
+            if flight.error is None:
+                return flight.result, False
+
+    def in_flight(self) -> int:
+        """Число выполняющихся уникальных вызовов"""
+        with self._lock:
+            return len(self._flights)
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""UX Result Store - Постоянное хранилище результатов анализа (SQLite + файлы)"""
+
+import gzip
+import hashlib
+import json
+import pickle
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Версия формата результатов: при изменении структуры InterviewSummary /
+# ResearchFindings старые записи перестают совпадать по ключу
+RESULT_FORMAT_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    transcripts_hash TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    label TEXT,
+    interviews INTEGER NOT NULL,
+    blob TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_results_transcripts ON results (transcripts_hash);
+CREATE INDEX IF NOT EXISTS idx_results_created ON results (created_at);
+"""
+
+
+class ResultStore:
+    """Результаты анализа по ключу набора транскриптов и настроек
+
+    Индекс (ключ, настройки, дата) хранится в SQLite, сами результаты -
+    сжатым pickle в отдельных файлах: InterviewSummary и ResearchFindings
+    восстанавливаются как есть, и отчет строится заново без вызовов LLM.
+    """
+
+    def __init__(self, root: str = "results"):
+        self.root = Path(root)
+        self.blob_dir = self.root / "blobs"
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.root / "index.sqlite3"
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Соединение на операцию: хранилище используют потоки разных сессий
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def make_key(transcripts: List[str], settings: Dict) -> Tuple[str, str]:
+        """Ключ результата и хеш набора транскриптов (порядок транскриптов важен)"""
+        transcripts_hash = hashlib.sha256('\x00'.join(transcripts).encode('utf-8')).hexdigest()
+        settings_json = json.dumps({**settings, 'format': RESULT_FORMAT_VERSION}, ensure_ascii=False,
+                                   sort_keys=True, default=str)
+        key = hashlib.sha256(f"{transcripts_hash}\x00{settings_json}".encode('utf-8')).hexdigest()
+        return key, transcripts_hash
+
+    def _blob_path(self, key: str) -> Path:
+        return self.blob_dir / f"{key}.pkl.gz"
+
+    def has(self, key: str) -> bool:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT blob FROM results WHERE key = ?", (key,)).fetchone()
+        return row is not None and (self.blob_dir / row['blob']).exists()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Сохраненные результаты или None"""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT blob FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        try:
+            with gzip.open(self.blob_dir / row['blob'], 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            print(f"⚠️ Не удалось прочитать сохраненный результат {key[:12]}: {e}")
+            return None
+
+    def put(self, key: str, transcripts_hash: str, settings: Dict, results: Any, label: str = None,
+            interviews: int = 0):
+        """Сохранить результаты: сначала файл (атомарно), затем запись в индексе"""
+        blob_path = self._blob_path(key)
+        tmp_file = blob_path.with_suffix('.tmp')
+        with gzip.open(tmp_file, 'wb', compresslevel=5) as f:
+            pickle.dump(results, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_file.replace(blob_path)
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results "
+                "(key, transcripts_hash, settings, label, interviews, blob, size, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, transcripts_hash, json.dumps(settings, ensure_ascii=False, sort_keys=True, default=str),
+                 label, interviews, blob_path.name, blob_path.stat().st_size,
+                 datetime.now().isoformat(timespec='seconds'))
+            )
+
+    def history(self, limit: int = 20, transcripts_hash: str = None) -> List[Dict]:
+        """Последние сохраненные результаты (без самих данных)"""
+        query = "SELECT key, transcripts_hash, settings, label, interviews, size, created_at FROM results"
+        params = []
+        if transcripts_hash:
+            query += " WHERE transcripts_hash = ?"
+            params.append(transcripts_hash)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [{**dict(row), 'settings': json.loads(row['settings'])} for row in rows]
+
+    def delete(self, key: str):
+        """Удалить результат и его файл"""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM results WHERE key = ?", (key,))
+        self._blob_path(key).unlink(missing_ok=True)
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""UX Routing - Выбор модели по этапу анализа и стоимость вызовов LLM"""
+
+from typing import Dict, Optional
+
+DEFAULT_MODEL = "anthropic/claude-3.5-sonnet"
+
+# Цены OpenRouter, USD за 1M токенов: промпт, ответ, промпт из кэша
+MODEL_PRICES = {
+    "anthropic/claude-3.5-sonnet": (3.0, 15.0, 0.3),
+    "anthropic/claude-3-haiku": (0.25, 1.25, 0.03),
+    "anthropic/claude-3-opus": (15.0, 75.0, 1.5),
+    "openai/gpt-4-turbo-preview": (10.0, 30.0, 10.0),
+    "openai/gpt-4o-mini": (0.15, 0.6, 0.075),
+    "google/gemini-pro-1.5": (1.25, 5.0, 0.3125),
+}
+
+# Модели по уровням; None - основная модель обертки
+MODEL_TIERS = {
+    'fast': "anthropic/claude-3-haiku",
+    'premium': None,
+}
+
+# Резервная модель другого провайдера: на нее уходят дубли медленных
+# запросов и вызовы, пока выключатель основной модели разомкнут
+FALLBACK_MODELS = {
+    "anthropic/claude-3.5-sonnet": "google/gemini-pro-1.5",
+    "anthropic/claude-3-haiku": "openai/gpt-4o-mini",
+    "anthropic/claude-3-opus": "anthropic/claude-3.5-sonnet",
+    "openai/gpt-4-turbo-preview": "anthropic/claude-3.5-sonnet",
+    "openai/gpt-4o-mini": "anthropic/claude-3-haiku",
+    "google/gemini-pro-1.5": "anthropic/claude-3.5-sonnet",
+}
+
+# Уровень модели для этапов анализа; этапы без записи идут на premium.
+# Дешевые модели - для механических шагов, синтез остается на основной модели.
+# summarize_chunk и deduplicated_pains выполняет только ноутбук (fux_ipynb_.py):
+# в ux_analyzer_core с LLM работают interview, recommendations и brief_answers,
+# и все они идут на основную модель.
+STAGE_TIERS = {
+    'summarize_chunk': 'fast',
+    'deduplicated_pains': 'fast',
+    'interview': 'premium',
+    'findings': 'premium',
+    'personas': 'premium',
+    'recommendations': 'premium',
+    'brief_answers': 'premium',
+}
+
+# Символов на токен для оценки, когда провайдер не прислал usage
+# (смесь русского текста и JSON)
+CHARS_PER_TOKEN = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов по длине текста"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN if text else 0
+
+
+def call_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_prompt_tokens: int = 0,
+              prices: Dict = None) -> float:
+    """Стоимость запроса в USD; 0 для модели без цены"""
+    price = (prices or MODEL_PRICES).get(model)
+    if not price:
+        return 0.0
+    prompt_price, completion_price = price[0], price[1]
+    cached_price = price[2] if len(price) > 2 else prompt_price
+    cached = min(cached_prompt_tokens, prompt_tokens)
+    return ((prompt_tokens - cached) * prompt_price + cached * cached_price
+            + completion_tokens * completion_price) / 1e6
+
+
+class ModelRouter:
+    """Выбор модели для этапа анализа по таблице политик
+
+    Этап сопоставляется уровню (STAGE_TIERS), уровень - модели (MODEL_TIERS).
+    Модель уровня не назначается, если она дороже основной: выбор более
+    дешевой основной модели в интерфейсе не должен удорожать запуск.
+    """
+
+    def __init__(self, default_model: str = DEFAULT_MODEL, tiers: Dict[str, Optional[str]] = None,
+                 stages: Dict[str, str] = None, prices: Dict = None, enabled: bool = True,
+                 fallbacks: Dict[str, str] = None):
+        self.default_model = default_model
+        self.tiers = dict(MODEL_TIERS if tiers is None else tiers)
+        self.stages = dict(STAGE_TIERS if stages is None else stages)
+        self.prices = MODEL_PRICES if prices is None else prices
+        self.enabled = enabled
+        self.fallbacks = dict(FALLBACK_MODELS if fallbacks is None else fallbacks)
+
+    def _blended_price(self, model: str) -> Optional[float]:
+        price = self.prices.get(model)
+        return price[0] + price[1] if price else None
+
+    def model_for(self, stage: str) -> str:
+        """Модель для этапа"""
+        if not self.enabled:
+            return self.default_model
+        model = self.tiers.get(self.stages.get(stage, 'premium')) or self.default_model
+        if model != self.default_model:
+            price, default_price = self._blended_price(model), self._blended_price(self.default_model)
+            if price is not None and default_price is not None and price > default_price:
+                return self.default_model
+        return model
+
+    def fallback_for(self, model: str) -> Optional[str]:
+        """Резервная модель для хеджирования и разомкнутого выключателя"""
+        fallback = self.fallbacks.get(model)
+        return fallback if fallback != model else None
+
+    def policy(self) -> Dict[str, str]:
+        """Итоговая таблица этап -> модель (для отчета о запуске)"""
+        return {stage: self.model_for(stage) for stage in self.stages}
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""UX Schemas - Реестр схем ответов этапов анализа
+
+Каждый этап описан примером ответа (тем же шаблоном, что раньше был вписан
+в промпт). Из примера строятся JSON Schema для запроса в JSON-режиме,
+компактный шаблон для промпта и структурная проверка ответа.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Tuple
+
+# ========================================================================
+# ШАБЛОНЫ ОТВЕТОВ ЭТАПОВ
+# ========================================================================
+STAGE_TEMPLATES = {
+    "interview_summary": {
+        "respondent_profile": {
+            "age_range": "возрастная группа",
+            "profession": "профессия",
+            "tech_literacy": "уровень технической грамотности",
+            "experience_level": "опыт использования продукта",
+            "main_goals": ["цель 1", "цель 2"],
+            "pain_level": "уровень фрустрации (1-10)"
+        },
+        "key_themes": [
+            {
+                "theme": "название темы",
+                "description": "описание",
+                "quotes": ["цитата 1", "цитата 2"],
+                "importance": "важность (1-10)"
+            }
+        ],
+        "pain_points": [
+            {
+                "pain": "описание проблемы",
+                "severity": "серьезность (1-10)",
+                "frequency": "частота упоминаний",
+                "quotes": ["цитата 1", "цитата 2"],
+                "impact": "влияние на пользователя"
+            }
+        ],
+        "needs": [
+            {
+                "need": "потребность",
+                "type": "явная/скрытая",
+                "priority": "приоритет (1-10)",
+                "quotes": ["цитата 1", "цитата 2"]
+            }
+        ],
+        "insights": ["инсайт 1", "инсайт 2", "инсайт 3"],
+        "emotional_journey": [
+            {
+                "moment": "момент в путешествии",
+                "emotion": "эмоция",
+                "trigger": "триггер",
+                "intensity": "интенсивность (1-10)",
+                "quote": "цитата"
+            }
+        ],
+        "contradictions": ["противоречие 1", "противоречие 2"],
+        "quotes": [
+            {
+                "text": "полная цитата (минимум 50 слов)",
+                "context": "контекст",
+                "importance": "важность (1-10)",
+                "theme": "к какой теме относится"
+            }
+        ],
+        "business_pains": [
+            {
+                "pain": "бизнес-проблема",
+                "impact": "влияние на бизнес",
+                "quotes": ["цитата 1", "цитата 2"]
+            }
+        ],
+        "user_problems": [
+            {
+                "problem": "пользовательская проблема",
+                "severity": "серьезность (1-10)",
+                "quotes": ["цитата 1", "цитата 2"]
+            }
+        ],
+        "opportunities": ["возможность 1", "возможность 2"],
+        "sentiment_score": "общий сентимент (-10 до +10)",
+        "brief_related_findings": {
+            "goals_mentioned": ["цель 1", "цель 2"],
+            "questions_answered": ["вопрос 1", "вопрос 2"],
+            "metrics_impact": ["метрика 1", "метрика 2"]
+        }
+    },
+    "recommendations": {
+        "quick_wins": [
+            {
+                "title": "Конкретное решение",
+                "description": "Что именно сделать",
+                "implementation_steps": ["Шаг 1", "Шаг 2", "Шаг 3"],
+                "expected_impact": "Ожидаемый эффект",
+                "timeline": "Срок реализации"
+            }
+        ],
+        "strategic_initiatives": [
+            {
+                "title": "Стратегическая инициатива",
+                "description": "Детальное описание",
+                "expected_roi": "Ожидаемая отдача",
+                "implementation_phases": ["Фаза 1", "Фаза 2"]
+            }
+        ]
+    },
+    "brief_answers": {
+        "answers": [
+            {
+                "question": "Вопрос из брифа",
+                "answer": "Подробный ответ с цитатами",
+                "supporting_quotes": ["цитата 1", "цитата 2"],
+                "confidence": "уровень уверенности (1-10)"
+            }
+        ]
+    }
+}
+
+
+# ========================================================================
+# СХЕМЫ, ШАБЛОНЫ ДЛЯ ПРОМПТОВ И ПРОВЕРКА ОТВЕТОВ
+# ========================================================================
+# Диапазон в описании числового поля: "важность (1-10)", "сентимент (-10 до +10)"
+_NUMERIC_RANGE_PATTERN = re.compile(r'\(\s*([-+]?\d+)\s*(?:-|–|до)\s*([-+]?\d+)\s*\)')
+# Первое число в строковом ответе модели: "8", "8/10", "-3 (негативный)"
+_NUMBER_PATTERN = re.compile(r'[-+]?\d+(?:[.,]\d+)?')
+
+
+def _schema_from_example(example: Any) -> Dict:
+    """JSON Schema по примеру из шаблона: строки-примеры становятся описаниями
+    полей, а строки с диапазоном вида "(1-10)" - числами в этом диапазоне"""
+    if isinstance(example, dict):
+        return {
+            "type": "object",
+            "properties": {key: _schema_from_example(value) for key, value in example.items()}
+        }
+    if isinstance(example, list):
+        return {"type": "array", "items": _schema_from_example(example[0]) if example else {}}
+    if isinstance(example, bool):
+        return {"type": "boolean"}
+    if isinstance(example, (int, float)):
+        return {"type": "number"}
+    match = _NUMERIC_RANGE_PATTERN.search(str(example))
+    if match:
+        return {"type": "number", "minimum": int(match.group(1)), "maximum": int(match.group(2)),
+                "description": str(example)}
+    return {"type": "string", "description": str(example)}
+
+
+def _stage_template(stage: str, fields: List[str] = None) -> Dict:
+    template = STAGE_TEMPLATES[stage]
+    if fields:
+        return {key: template[key] for key in fields}
+    return template
+
+
+def get_stage_schema(stage: str, fields: List[str] = None) -> Dict:
+    """JSON Schema ответа этапа (или только его полей fields)"""
+    template = _stage_template(stage, fields)
+    schema = _schema_from_example(template)
+    schema["required"] = list(template)
+    return schema
+
+
+def render_stage_template(stage: str, fields: List[str] = None) -> str:
+    """Компактный шаблон ответа для промпта: одно поле верхнего уровня на строку"""
+    template = _stage_template(stage, fields)
+    lines = [
+        f'    {json.dumps(key, ensure_ascii=False)}: {json.dumps(value, ensure_ascii=False, separators=(", ", ": "))}'
+        for key, value in template.items()
+    ]
+    return "{\n" + ",\n".join(lines) + "\n}"
+
+
+def stage_response_format(stage: str, fields: List[str] = None) -> Dict:
+    """Параметр response_format для запроса в JSON-режиме"""
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": stage, "strict": False, "schema": get_stage_schema(stage, fields)}
+    }
+
+
+def empty_stage_value(stage: str, field: str) -> Any:
+    """Пустое значение поля того же типа, что и в шаблоне"""
+    example = STAGE_TEMPLATES[stage][field]
+    if isinstance(example, dict):
+        return {}
+    if isinstance(example, list):
+        return []
+    if _schema_from_example(example)["type"] == "number":
+        return 0
+    return ""
+
+
+def _clean_value(value: Any, schema: Dict) -> Tuple[Any, bool]:
+    """Структурная проверка значения: контейнеры должны совпадать по типу
+
+    Скаляры взаимозаменяемы (модель может вернуть "8" вместо 8 - для числовых
+    полей такая строка приводится к числу). Невалидные элементы массивов и
+    вложенные поля отбрасываются, поле целиком считается невалидным, только
+    если от непустого значения ничего не осталось.
+    """
+    expected = schema.get("type")
+
+    if expected == "object":
+        if not isinstance(value, dict):
+            return None, False
+        cleaned = {}
+        for key, item in value.items():
+            item_schema = schema["properties"].get(key)
+            if item_schema is None or item is None:
+                cleaned[key] = item
+                continue
+            item, ok = _clean_value(item, item_schema)
+            if ok:
+                cleaned[key] = item
+        return cleaned, True
+
+    if expected == "array":
+        items_schema = schema.get("items", {})
+        if not isinstance(value, list):
+            # Одиночная строка вместо списка строк - оборачиваем
+            if items_schema.get("type") not in ("object", "array") and not isinstance(value, dict):
+                return [value], True
+            return None, False
+        cleaned = []
+        for item in value:
+            item, ok = _clean_value(item, items_schema)
+            if ok:
+                cleaned.append(item)
+        return cleaned, bool(cleaned) or not value
+
+    if expected is None:
+        return value, True
+    if expected == "number" and isinstance(value, str):
+        # Число строкой ("8", "8/10") приводится к числу, иначе остается как есть
+        match = _NUMBER_PATTERN.search(value)
+        if match:
+            number = float(match.group().replace(',', '.'))
+            return int(number) if number.is_integer() else number, True
+    return value, not isinstance(value, (dict, list))
+
+
+def validate_stage_response(stage: str, data: Any, fields: List[str] = None) -> Tuple[Dict, List[str]]:
+    """Проверка ответа этапа по схеме
+
+    Возвращает очищенные данные и список полей верхнего уровня, которые
+    отсутствуют или не прошли проверку - только их нужно перезапросить.
+    """
+    template = _stage_template(stage, fields)
+    schema = _schema_from_example(template)
+
+    if isinstance(data, list) and len(template) == 1:
+        # Модель вернула голый массив вместо {"поле": [...]}
+        data = {next(iter(template)): data}
+    if not isinstance(data, dict):
+        return {}, list(template)
+
+    cleaned = dict(data)
+    failed = []
+    for field in template:
+        if field not in data or data[field] is None:
+            failed.append(field)
+            continue
+        value, ok = _clean_value(data[field], schema["properties"][field])
+        if ok:
+            cleaned[field] = value
+        else:
+            del cleaned[field]
+            failed.append(field)
+
+    return cleaned, failed
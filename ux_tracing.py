@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""UX Tracing - Иерархическая трассировка запуска: загрузка, анализ, отчет"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Сколько завершенных span хранится в памяти (старые вытесняются)
+MAX_SPANS = 100000
+
+
+class Span:
+    """Интервал трассировки: имя, родитель, время и атрибуты"""
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'start', 'end', 'thread', 'attrs', 'status')
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attrs: Dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start = time.perf_counter()
+        self.end = None
+        self.thread = threading.current_thread().name
+        self.attrs = attrs
+        self.status = 'ok'
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def set(self, **attrs):
+        """Добавить атрибуты span"""
+        self.attrs.update(attrs)
+
+
+class Tracer:
+    """Сборщик span в стиле OpenTelemetry
+
+    Родитель span по умолчанию - текущий span этого потока. В пул потоков
+    родителя нужно передать явно (parent=tracer.current()), иначе задача
+    начнет новую трассу. Span корня задает trace_id всей трассы: по нему
+    выгружаются и очищаются span одного запуска.
+    """
+
+    def __init__(self, max_spans: int = MAX_SPANS):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._spans = deque(maxlen=max_spans)
+        # Смещение perf_counter относительно времени эпохи для меток в трассе
+        self._epoch = time.time() - time.perf_counter()
+
+    def _stack(self) -> List[Span]:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def current(self) -> Optional[Span]:
+        """Текущий span потока"""
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def annotate(self, **attrs):
+        """Добавить атрибуты текущему span, если он есть"""
+        span = self.current()
+        if span is not None:
+            span.set(**attrs)
+
+    @contextmanager
+    def span(self, name: str, parent: Span = None, **attrs):
+        """Открыть span; вложенные span этого потока становятся его детьми"""
+        stack = self._stack()
+        parent = parent or (stack[-1] if stack else None)
+        span = Span(name, parent.trace_id if parent else uuid.uuid4().hex, parent.span_id if parent else None, attrs)
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = 'error'
+            span.attrs['error'] = f"{type(e).__name__}: {e}"[:300]
+            raise
+        finally:
+            span.end = time.perf_counter()
+            stack.pop()
+            with self._lock:
+                self._spans.append(span)
+
+    def spans(self, trace_id: str = None) -> List[Span]:
+        """Завершенные span (все или одной трассы)"""
+        with self._lock:
+            return [span for span in self._spans if trace_id is None or span.trace_id == trace_id]
+
+    def clear(self, trace_id: str = None):
+        """Удалить span трассы (или все) после выгрузки"""
+        with self._lock:
+            kept = [span for span in self._spans if trace_id is not None and span.trace_id != trace_id]
+            self._spans.clear()
+            self._spans.extend(kept)
+
+    # ====================================================================
+    # ЭКСПОРТ
+    # ====================================================================
+    def to_chrome_trace(self, trace_id: str = None) -> Dict:
+        """Трасса в формате Chrome Trace Event (открывается в ui.perfetto.dev и chrome://tracing)"""
+        pid = os.getpid()
+        spans = self.spans(trace_id)
+        threads = {}
+        events = []
+        for span in spans:
+            tid = threads.setdefault(span.thread, len(threads) + 1)
+            events.append({
+                'name': span.name,
+                'cat': span.name.split('.')[0],
+                'ph': 'X',
+                'ts': round((span.start + self._epoch) * 1e6),
+                'dur': round(span.duration * 1e6),
+                'pid': pid,
+                'tid': tid,
+                'args': {**span.attrs, 'status': span.status, 'span_id': span.span_id,
+                         'parent_id': span.parent_id, 'trace_id': span.trace_id}
+            })
+        for thread_name, tid in threads.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread_name}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome_trace(self, path: str, trace_id: str = None):
+        """Сохранить трассу в JSON-файл"""
+        Path(path).write_text(json.dumps(self.to_chrome_trace(trace_id), ensure_ascii=False, default=str),
+                              encoding='utf-8')
+
+    def latency_report(self, trace_id: str = None, top: int = 3) -> Dict:
+        """Длительности по именам span: p50, p95, максимум и самые медленные экземпляры"""
+        by_name = defaultdict(list)
+        for span in self.spans(trace_id):
+            by_name[span.name].append(span)
+
+        report = {}
+        for name, spans in by_name.items():
+            spans.sort(key=lambda span: span.duration)
+            durations = [span.duration for span in spans]
+            report[name] = {
+                'count': len(spans),
+                'total': round(sum(durations), 3),
+                'p50': round(durations[len(durations) // 2], 3),
+                'p95': round(durations[min(int(len(durations) * 0.95), len(durations) - 1)], 3),
+                'max': round(durations[-1], 3),
+                'slowest': [{'duration': round(span.duration, 3), **span.attrs} for span in spans[-top:][::-1]]
+            }
+        return report
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    """Общий трассировщик процесса"""
+    return _tracer
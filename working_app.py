@@ -6,6 +6,11 @@ from datetime import datetime
 import streamlit.components.v1 as components
 import sys
 import os
+import json
+import hashlib
+import tempfile
+import time
+import concurrent.futures
 
 # Добавляем текущую директорию в путь для импорта модулей
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -20,11 +25,16 @@ if parent_dir not in sys.path:
 # Импорты наших классов
 try:
     import ux_analyzer_classes
-    from ux_analyzer_classes import CompanyConfig, BriefManager
+    from ux_analyzer_classes import (
+        CompanyConfig, BriefManager, CancellationToken, AnalysisCancelled, OpenRouterAPIWrapper, CacheManager
+    )
     import ux_analyzer_core
     from ux_analyzer_core import AdvancedUXAnalyzer
     import ux_report_generator
-    from ux_report_generator import EnhancedReportGenerator
+    from ux_report_generator import EnhancedReportGenerator, SectionCache, get_render_pool
+    from ux_routing import ModelRouter, MODEL_PRICES, DEFAULT_MODEL
+    from ux_result_store import ResultStore
+    from ux_tracing import get_tracer
     st.success("✅ Все модули успешно загружены")
 except ImportError as e:
     st.error(f"❌ Ошибка импорта модулей: {e}")
@@ -33,6 +43,146 @@ except ImportError as e:
     st.error("Попробуйте перезагрузить страницу")
     st.stop()
 
+# ========================================================================
+# ОБЩИЕ РЕСУРСЫ ПРОЦЕССА
+# ========================================================================
+# Создаются один раз и переживают перезапуски скрипта: на каждое нажатие
+# кнопки создаются только анализатор запуска и его метрики
+@st.cache_resource(show_spinner=False, max_entries=32)
+def get_api_client(api_key: str, model: str) -> OpenRouterAPIWrapper:
+    """Клиент OpenRouter: пул соединений, выключатели моделей, статистика задержек"""
+    return OpenRouterAPIWrapper(api_key, router=ModelRouter(model))
+
+@st.cache_resource(show_spinner=False)
+def get_cache_manager() -> CacheManager:
+    """Файловый кэш, общий для всех сессий"""
+    return CacheManager()
+
+@st.cache_resource(show_spinner=False)
+def get_result_store() -> ResultStore:
+    """Сохраненные результаты анализа: переживают перезапуск процесса и сброс сессии"""
+    return ResultStore(os.environ.get('UX_RESULTS_DIR', 'results'))
+
+@st.cache_resource(show_spinner=False)
+def get_section_cache() -> SectionCache:
+    """Память разделов отчета, общая для всех сессий и реквизитов компании
+
+    Ключ раздела - хеш его данных, поэтому сессии с разными результатами
+    анализа друг другу не мешают, а одинаковые разделы переиспользуются.
+    """
+    return SectionCache(max_entries=512)
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def get_report_generator(company_name: str, report_title: str, author: str) -> EnhancedReportGenerator:
+    """Генератор отчета для реквизитов компании; разделы, не зависящие от
+    реквизитов, при их правке берутся из общей памяти разделов"""
+    return EnhancedReportGenerator(CompanyConfig(name=company_name, report_title=report_title, author=author),
+                                   section_cache=get_section_cache())
+
+# Файлы отчетов старше суток считаются брошенными: сессия закрыта без очистки
+REPORT_MAX_AGE = 24 * 3600
+
+def remove_stale_reports(report_dir: str, max_age: float = REPORT_MAX_AGE):
+    """Удаление файлов отчетов, не изменявшихся дольше max_age секунд"""
+    cutoff = time.time() - max_age
+    for entry in os.scandir(report_dir):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            # Файл уже удалил другой процесс
+            pass
+
+@st.cache_resource(show_spinner=False)
+def get_report_dir() -> str:
+    """Каталог HTML отчетов сессий; при запуске процесса из него удаляются старые отчеты
+
+    UX_REPORTS_DIR задает каталог, по умолчанию - ux_reports во временном каталоге системы.
+    """
+    report_dir = os.environ.get('UX_REPORTS_DIR') or os.path.join(tempfile.gettempdir(), 'ux_reports')
+    os.makedirs(report_dir, exist_ok=True)
+    remove_stale_reports(report_dir)
+    return report_dir
+
+def write_html_report(generator: EnhancedReportGenerator, report_data) -> str:
+    """HTML отчет во временный файл сессии
+
+    Отчет пишется по разделам, целиком в памяти не собирается; в session_state
+    хранится только путь. Файл предыдущего отчета сессии удаляется, отчеты
+    закрытых сессий - по возрасту (REPORT_MAX_AGE).
+    """
+    # UX_REPORT_WORKERS - рендеринг разделов в пуле процессов (для тяжелых отчетов)
+    workers = int(os.environ.get('UX_REPORT_WORKERS') or 0)
+    timings = {}
+    report_dir = get_report_dir()
+    remove_stale_reports(report_dir)
+    fd, report_path = tempfile.mkstemp(prefix='ux_report_', suffix='.html', dir=report_dir)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        generator.write_html(report_data, f, executor=get_render_pool(workers) if workers else None, timings=timings)
+    remove_html_report()
+    st.session_state['html_report_path'] = report_path
+    st.session_state['report_timings'] = timings
+    st.session_state['report_requisites'] = (generator.config.name, generator.config.report_title, generator.config.author)
+    return report_path
+
+def remove_html_report():
+    """Удаление файла отчета сессии"""
+    report_path = st.session_state.pop('html_report_path', None)
+    if report_path and os.path.exists(report_path):
+        os.remove(report_path)
+
+def session_report_path():
+    """Путь к файлу отчета сессии или None, если отчета нет или файл уже удален по возрасту"""
+    report_path = st.session_state.get('html_report_path')
+    if report_path and not os.path.exists(report_path):
+        st.session_state.pop('html_report_path', None)
+        st.warning("⚠️ Файл отчета устарел и удален - постройте отчет заново")
+        return None
+    return report_path
+
+def html_report_download(label: str, file_name: str, **kwargs):
+    """Кнопка скачивания отчета сессии из файла и время рендеринга разделов"""
+    with open(st.session_state['html_report_path'], 'rb') as f:
+        st.download_button(label=label, data=f, file_name=file_name, mime="text/html", **kwargs)
+    timings = st.session_state.get('report_timings')
+    if timings:
+        slowest = sorted(timings.items(), key=lambda item: item[1], reverse=True)[:3]
+        st.caption(f"⏱️ Рендеринг разделов: {sum(timings.values()) * 1000:.1f} мс; дольше всего: "
+                   + ", ".join(f"{name} {seconds * 1000:.1f} мс" for name, seconds in slowest))
+
+# Как часто прогон скрипта проверяет анализ, выполняющийся в отдельном потоке, сек
+ANALYSIS_POLL_INTERVAL = 0.5
+
+def cancel_running_analysis():
+    """Отмена анализа сессии: дальнейшие вызовы LLM не выполняются"""
+    cancel_token = st.session_state.get('cancel_token')
+    if cancel_token is not None:
+        cancel_token.cancel()
+
+def run_cancellable(func, cancel_token: CancellationToken, on_wait, *args):
+    """func(*args) в отдельном потоке, пока прогон скрипта ждет результат
+
+    Streamlit прерывает прогон скрипта (нажатие "Очистить все", закрытие
+    вкладки) только на вызове st.*, а колбэки кнопок выполняет уже в
+    следующем прогоне - анализ в потоке скрипта нельзя остановить до его
+    конца. Здесь прогон ждет результат, вызывая on_wait (обновление статуса
+    через st.*), а если прогон прерван, отменяет токен анализа.
+    """
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='ux_analysis')
+    future = executor.submit(func, *args)
+    executor.shutdown(wait=False)
+    started = time.time()
+    try:
+        while True:
+            try:
+                return future.result(timeout=ANALYSIS_POLL_INTERVAL)
+            except concurrent.futures.TimeoutError:
+                on_wait(time.time() - started)
+    finally:
+        if not future.done():
+            # Прогон прерван - анализ останавливается на следующем вызове LLM
+            cancel_token.cancel()
+
 def read_docx(file):
     """Читает содержимое .docx файла"""
     try:
@@ -1978,6 +2128,14 @@ with col1_1:
         placeholder="Название компании"
     )
 
+    model = st.selectbox(
+        "🤖 Основная модель",
+        options=list(MODEL_PRICES),
+        index=list(MODEL_PRICES).index(DEFAULT_MODEL),
+        help="Модель для всех этапов анализа. Более дешевую модель для механических этапов "
+             "(саммари частей, сбор болей) использует только ноутбук - в этом приложении таких этапов нет"
+    )
+
 with col1_2:
     report_title = st.text_input(
         "📋 Название отчета",
@@ -2030,6 +2188,224 @@ with col2_2:
     if uploaded_brief:
         st.success("✅ Бриф загружен")
 
+force_reanalysis = st.checkbox(
+    "🔁 Анализировать заново, даже если результат уже сохранен",
+    help="Сохраненный результат ищется по набору транскриптов, брифу и модели"
+)
+
+def run_report_generation():
+    """Один запуск: чтение файлов, анализ (или сохраненный результат) и отчет"""
+    tracer = get_tracer()
+
+    # Показываем прогресс
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+
+    # Читаем транскрипты
+    status_text.text("📖 Чтение файлов...")
+    progress_bar.progress(20)
+
+    transcripts = []
+    for file in uploaded_files:
+        with tracer.span('ingest.read_file', file=file.name, size=file.size) as read_span:
+            content = read_file_content(file)
+            read_span.set(chars=len(content))
+        transcripts.append(content)
+
+    # Реальный анализ через новые классы
+    status_text.text("🤖 Анализ данных...")
+    progress_bar.progress(40)
+
+    # Отменяем предыдущий незавершенный запуск этой сессии
+    cancel_running_analysis()
+    cancel_token = CancellationToken()
+    st.session_state['cancel_token'] = cancel_token
+
+    # Бриф читаем до анализа: он входит в ключ сохраненного результата
+    brief_text = None
+    if uploaded_brief:
+        with tracer.span('ingest.read_file', file=uploaded_brief.name, size=uploaded_brief.size, brief=True):
+            brief_text = read_file_content(uploaded_brief)
+
+    api_client = get_api_client(api_key, model)
+    result_store = get_result_store()
+    result_settings = {
+        'model': model,
+        'routing': api_client.router.policy(),
+        'brief': hashlib.sha256((brief_text or '').encode('utf-8')).hexdigest()
+    }
+    result_key, transcripts_hash = result_store.make_key(transcripts, result_settings)
+
+    try:
+        stored_results = None if force_reanalysis else result_store.get(result_key)
+        if stored_results is not None:
+            st.info("📦 Этот набор транскриптов уже анализировался с теми же настройками - отчет построен из сохраненного результата")
+            analysis_results = stored_results
+            # Метрики прошлого запуска к этому отчету не относятся
+            st.session_state.pop('run_metrics', None)
+            st.session_state.pop('run_metrics_prometheus', None)
+        else:
+            # Анализатор запуска поверх общего для процесса клиента API и кэша
+            analyzer = AdvancedUXAnalyzer(api_key, cancel_token=cancel_token,
+                                          api_wrapper=api_client.fork(cancel_token),
+                                          cache=get_cache_manager())
+            if brief_text:
+                analyzer.set_brief(brief_text)
+
+            # Запускаем анализ
+            status_text.text("🔄 Запуск комплексного анализа...")
+            progress_bar.progress(60)
+
+            def analyze(parent):
+                # В потоке анализа своего span нет - родителем будет span запуска
+                with tracer.span('analysis.worker', parent=parent):
+                    return analyzer.analyze_transcripts(transcripts)
+
+            try:
+                analysis_results = run_cancellable(
+                    analyze, cancel_token,
+                    lambda elapsed: status_text.text(f"🔄 Комплексный анализ... {elapsed:.0f} с"),
+                    tracer.current()
+                )
+            finally:
+                # Метрики сохраняем и для прерванного запуска - по ним видно, где он застрял
+                st.session_state['run_metrics'] = analyzer.metrics.summary()
+                st.session_state['run_metrics_prometheus'] = analyzer.metrics.to_prometheus()
+                if os.environ.get('UX_METRICS_TEXTFILE'):
+                    analyzer.metrics.write_prometheus(os.environ['UX_METRICS_TEXTFILE'])
+
+            failed_interviews = analysis_results.get('failed_interviews', [])
+            fallback_stages = analysis_results.get('fallback_stages', [])
+            if failed_interviews:
+                # Результат с пустыми саммари не сохраняем: повторный запуск должен проанализировать интервью заново
+                st.warning(f"⚠️ Интервью {', '.join(map(str, failed_interviews))} не проанализированы - "
+                           "результат не сохранен, повторный запуск проанализирует их заново")
+            elif fallback_stages:
+                st.warning(f"⚠️ Этапы {', '.join(fallback_stages)} завершились ошибкой - "
+                           "результат не сохранен, повторный запуск выполнит их заново")
+            else:
+                with tracer.span('store.put'):
+                    result_store.put(result_key, transcripts_hash, result_settings, analysis_results,
+                                     label=', '.join(file.name for file in uploaded_files),
+                                     interviews=len(transcripts))
+    
+        # Отладочная информация
+        st.write("🔍 Отладка анализа:")
+        st.write(f"Тип результата: {type(analysis_results)}")
+        st.write(f"Ключи результата: {list(analysis_results.keys()) if isinstance(analysis_results, dict) else 'Не словарь'}")
+    
+        # Детальная отладка
+        if isinstance(analysis_results, dict):
+            st.write("🔍 Детальная отладка:")
+            st.write(f"findings: {type(analysis_results.get('findings'))}")
+            st.write(f"personas: {len(analysis_results.get('personas', []))}")
+            st.write(f"interview_summaries: {len(analysis_results.get('interview_summaries', []))}")
+        
+            # Проверяем findings
+            findings = analysis_results.get('findings')
+            if hasattr(findings, 'key_insights'):
+                st.write(f"key_insights: {len(getattr(findings, 'key_insights', []))}")
+            elif isinstance(findings, dict):
+                st.write(f"key_insights (dict): {len(findings.get('key_insights', []))}")
+            else:
+                st.write(f"findings type: {type(findings)}")
+    
+        status_text.text("✅ Анализ завершен!")
+        progress_bar.progress(80)
+    
+        # Извлекаем результаты
+        report_data = analysis_results
+    
+    except AnalysisCancelled:
+        st.warning("⏹️ Анализ отменен. Завершенные этапы сохранены и будут использованы при повторном запуске.")
+        st.stop()
+    except Exception as e:
+        st.error(f"❌ Ошибка: {e}")
+        report_data = None
+
+    # Создаем структурированные данные для отчета
+    status_text.text("📋 Генерация отчета...")
+    progress_bar.progress(90)
+
+    if report_data:
+        # Генерируем полный HTML отчет
+        generator = get_report_generator(company_name, report_title, author)
+        write_html_report(generator, report_data)
+    else:
+        st.error("❌ Не удалось сгенерировать отчет")
+
+    # Завершаем прогресс
+    status_text.text("🎉 Готово!")
+    progress_bar.progress(100)
+
+    st.success("🎉 Анализ успешно завершен!")
+
+    # Сохраняем данные отчета в session_state
+    if report_data:
+        st.session_state['report_data'] = report_data
+
+    # Показываем результаты
+    st.markdown("## 📊 Результаты анализа")
+
+    # Кнопка скачивания полного отчета
+    col_download_1, col_download_2, col_download_3 = st.columns([1, 2, 1])
+
+    with col_download_2:
+        report_path = session_report_path()
+        if report_path:
+            html_report_download(
+                "📥 Скачать полный отчет",
+                f"ux_report_full_{company_name}_{datetime.now().strftime('%Y%m%d_%H%M')}.html",
+                use_container_width=True,
+                type="primary"
+            )
+        else:
+            st.button("📥 Скачать полный отчет", disabled=True, use_container_width=True)
+            st.warning("⚠️ Отчет еще не сгенерирован. Запустите анализ сначала.")
+
+    # Метрики запуска: время и токены по этапам
+    if st.session_state.get('run_metrics'):
+        run_metrics = st.session_state['run_metrics']
+        with st.expander("📈 Метрики запуска"):
+            totals = run_metrics['totals']
+            st.write(f"Время: {run_metrics['wall_time']:.1f} с, вызовов LLM: {totals['calls']}, "
+                     f"повторов: {totals['retries']}, токенов: {totals['prompt_tokens']} + {totals['completion_tokens']}, "
+                     f"стоимость: ${totals['cost_usd']:.4f}")
+            st.table([
+                {'Этап': stage, 'Время, с': entry['wall_time'], 'Вызовов LLM': entry.get('llm', {}).get('calls', 0),
+                 'Токенов': entry.get('llm', {}).get('prompt_tokens', 0) + entry.get('llm', {}).get('completion_tokens', 0),
+                 'Стоимость, $': round(entry.get('llm', {}).get('cost_usd', 0), 4),
+                 'Модели': ', '.join(entry.get('llm', {}).get('models', []))}
+                for stage, entry in run_metrics['stages'].items()
+            ])
+            col_metrics_1, col_metrics_2 = st.columns(2)
+            with col_metrics_1:
+                st.download_button(
+                    label="📥 Сводка запуска (JSON)",
+                    data=json.dumps(run_metrics, ensure_ascii=False, indent=2).encode('utf-8'),
+                    file_name=f"ux_run_metrics_{datetime.now().strftime('%Y%m%d_%H%M')}.json",
+                    mime="application/json"
+                )
+            with col_metrics_2:
+                st.download_button(
+                    label="📥 Метрики Prometheus",
+                    data=st.session_state['run_metrics_prometheus'].encode('utf-8'),
+                    file_name="ux_analyzer.prom",
+                    mime="text/plain"
+                )
+
+    # Информация о следующих шагах
+    st.markdown("""
+    <div class="info-card">
+        <h3>🎯 Результат анализа</h3>
+        <p>• Анализ выполнен успешно</p>
+        <p>• Сгенерирован детальный HTML отчет</p>
+        <p>• Ответы основаны на реальных транскриптах интервью</p>
+        <p>• Цитаты взяты из интервью</p>
+    </div>
+    """, unsafe_allow_html=True)
+
+
 # Кнопка анализа
 if st.button("🚀 Генерация отчета", type="primary", disabled=not (uploaded_files and api_key), use_container_width=True):
     if not api_key:
@@ -2042,138 +2418,67 @@ if st.button("🚀 Генерация отчета", type="primary", disabled=no
             st.error("⚠️ Проверьте формат API ключа")
             st.stop()
         
-        # Показываем прогресс
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        # Читаем транскрипты
-        status_text.text("📖 Чтение файлов...")
-        progress_bar.progress(20)
-        
-        transcripts = []
-        for file in uploaded_files:
-            content = read_file_content(file)
-            transcripts.append(content)
-        
-        # Реальный анализ через новые классы
-        status_text.text("🤖 Анализ данных...")
-        progress_bar.progress(40)
-        
-        try:
-            # Создаем анализатор
-            analyzer = AdvancedUXAnalyzer(api_key)
-            
-            # Устанавливаем бриф если есть
-            if uploaded_brief:
-                brief_text = read_file_content(uploaded_brief)
-                analyzer.set_brief(brief_text)
-            
-            # Запускаем анализ
-            status_text.text("🔄 Запуск комплексного анализа...")
-            progress_bar.progress(60)
-            
-            analysis_results = analyzer.analyze_transcripts(transcripts)
-            
-            # Отладочная информация
-            st.write("🔍 Отладка анализа:")
-            st.write(f"Тип результата: {type(analysis_results)}")
-            st.write(f"Ключи результата: {list(analysis_results.keys()) if isinstance(analysis_results, dict) else 'Не словарь'}")
-            
-            # Детальная отладка
-            if isinstance(analysis_results, dict):
-                st.write("🔍 Детальная отладка:")
-                st.write(f"findings: {type(analysis_results.get('findings'))}")
-                st.write(f"personas: {len(analysis_results.get('personas', []))}")
-                st.write(f"interview_summaries: {len(analysis_results.get('interview_summaries', []))}")
-                
-                # Проверяем findings
-                findings = analysis_results.get('findings')
-                if hasattr(findings, 'key_insights'):
-                    st.write(f"key_insights: {len(getattr(findings, 'key_insights', []))}")
-                elif isinstance(findings, dict):
-                    st.write(f"key_insights (dict): {len(findings.get('key_insights', []))}")
-                else:
-                    st.write(f"findings type: {type(findings)}")
-            
-            status_text.text("✅ Анализ завершен!")
-            progress_bar.progress(80)
-            
-            # Извлекаем результаты
-            analysis_result = "Анализ выполнен успешно"
-            report_data = analysis_results
-            
-        except Exception as e:
-            analysis_result = f"Ошибка анализа: {str(e)}"
-            st.error(f"❌ Ошибка: {e}")
-            report_data = None
-        
-        # Создаем структурированные данные для отчета
-        status_text.text("📋 Генерация отчета...")
-        progress_bar.progress(90)
-        
-        if report_data:
-            # Создаем конфигурацию компании
-            company_config = CompanyConfig(
-                name=company_name,
-                report_title=report_title,
-                author=author
+        # Один запуск - одна трасса: чтение файлов, анализ, отчет
+        tracer = get_tracer()
+        with tracer.span('run', app='working_app', files=len(uploaded_files)) as run_span:
+            run_report_generation()
+
+        # Трасса запуска для просмотра в ui.perfetto.dev
+        st.session_state['run_trace'] = tracer.to_chrome_trace(run_span.trace_id)
+        if os.environ.get('UX_TRACE_DIR'):
+            tracer.export_chrome_trace(
+                os.path.join(os.environ['UX_TRACE_DIR'], f"ux_trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{run_span.trace_id[:8]}.json"),
+                run_span.trace_id
             )
-            
-            # Генерируем полный HTML отчет
-            generator = EnhancedReportGenerator(company_config)
-            html_report = generator.generate_html(report_data)
-            
-            # Сохраняем отчет в session_state для скачивания
-            st.session_state['html_report'] = html_report
-        else:
-            st.error("❌ Не удалось сгенерировать отчет")
-            html_report = None
-        
-        # Завершаем прогресс
-        status_text.text("🎉 Готово!")
-        progress_bar.progress(100)
-        
-        st.success("🎉 Анализ успешно завершен!")
-        
-        # Сохраняем данные отчета в session_state
-        if report_data:
-            st.session_state['report_data'] = report_data
-        
-        # Показываем результаты
-        st.markdown("## 📊 Результаты анализа")
-        
-        # Кнопка скачивания полного отчета
-        col_download_1, col_download_2, col_download_3 = st.columns([1, 2, 1])
-        
-        with col_download_2:
-            if 'html_report' in st.session_state and st.session_state['html_report']:
-                st.download_button(
-                    label="📥 Скачать полный отчет",
-                    data=st.session_state['html_report'].encode('utf-8'),
-                    file_name=f"ux_report_full_{company_name}_{datetime.now().strftime('%Y%m%d_%H%M')}.html",
-                    mime="text/html",
-                    use_container_width=True,
-                    type="primary"
-                )
+        tracer.clear(run_span.trace_id)
+        st.download_button(
+            label="📥 Трасса запуска (Perfetto / chrome://tracing)",
+            data=json.dumps(st.session_state['run_trace'], ensure_ascii=False, default=str).encode('utf-8'),
+            file_name=f"ux_trace_{datetime.now().strftime('%Y%m%d_%H%M')}.json",
+            mime="application/json"
+        )
+
+# Реквизиты изменены после построения отчета: отчет перестраивается сразу,
+# из памяти разделов заново рендерятся только шапка и подвал
+report_requisites = (company_name, report_title, author)
+if st.session_state.get('report_data') and st.session_state.get('report_requisites') not in (None, report_requisites):
+    write_html_report(get_report_generator(*report_requisites), st.session_state['report_data'])
+
+# Сохраненные результаты: отчет строится заново без вызовов LLM
+saved_results = get_result_store().history()
+if saved_results:
+    with st.expander(f"📚 Сохраненные результаты ({len(saved_results)})"):
+        saved_labels = {
+            entry['key']: f"{entry['created_at'].replace('T', ' ')} - {entry['label'] or 'без названия'} "
+                          f"({entry['interviews']} интервью, {entry['settings'].get('model', '?')})"
+            for entry in saved_results
+        }
+        saved_key = st.selectbox("Результат анализа", list(saved_labels), format_func=saved_labels.get)
+        if st.button("📄 Построить отчет", use_container_width=True):
+            saved_data = get_result_store().get(saved_key)
+            if saved_data is None:
+                st.error("❌ Сохраненный результат не удалось прочитать")
             else:
-                st.button("📥 Скачать полный отчет", disabled=True, use_container_width=True)
-                st.warning("⚠️ Отчет еще не сгенерирован. Запустите анализ сначала.")
-        
-        # Информация о следующих шагах
-        st.markdown("""
-        <div class="info-card">
-            <h3>🎯 Результат анализа</h3>
-            <p>• Анализ выполнен успешно</p>
-            <p>• Сгенерирован детальный HTML отчет</p>
-            <p>• Ответы основаны на реальных транскриптах интервью</p>
-            <p>• Цитаты взяты из интервью</p>
-        </div>
-        """, unsafe_allow_html=True)
+                st.session_state['report_data'] = saved_data
+                write_html_report(get_report_generator(company_name, report_title, author), saved_data)
+                st.session_state.pop('run_metrics', None)
+                st.session_state.pop('run_metrics_prometheus', None)
+        if session_report_path():
+            html_report_download(
+                "📥 Скачать отчет",
+                f"ux_report_full_{company_name}_{datetime.now().strftime('%Y%m%d_%H%M')}.html",
+                use_container_width=True,
+                key="saved_report_download"
+            )
 
 # Кнопка очистки внизу
 st.markdown("---")
 col_clear_1, col_clear_2, col_clear_3 = st.columns([1, 1, 1])
 
 with col_clear_2:
-    if st.button("🗑️ Очистить все", type="secondary", use_container_width=True):
+    if st.button("🗑️ Очистить все", type="secondary", use_container_width=True, on_click=cancel_running_analysis):
+        remove_html_report()
+        for key in ('report_data', 'report_timings', 'report_requisites', 'cancel_token', 'run_metrics',
+                    'run_metrics_prometheus', 'run_trace'):
+            st.session_state.pop(key, None)
         st.rerun()